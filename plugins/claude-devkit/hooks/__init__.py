@@ -9,9 +9,21 @@ Claude Code Hooks를 통한 세션 제어 시스템.
 - PostToolUse: knowledge.yaml 자동 업데이트 및 코드 패턴 분석
 - PreCompact: 컨텍스트 압축 전 세션 상태 주입
 - SubagentStop: 서브에이전트 결과 수집
+- PreToolUse: Task tool 서브에이전트 배정 기록 (depends_on 병렬 진행)
+
+실행 구조:
+- client.py: hooks.json의 모든 이벤트 진입점 (데몬 위임 또는 in-process 실행)
+- daemon.py: 프로젝트별 Unix 소켓 상주 데몬 (opt-in)
+- profiler.py: SessionStart에서 분리 실행되는 프로젝트 전체 패턴 스캔 (opt-in)
+- knowledge_extract.py: 요청 완료 시 Stop에서 전체 Contract를 파싱하여 knowledge 추출
+
+저장소:
+- common.py: state.json snapshot + events.jsonl journal, knowledge.yaml (기본 file 백엔드)
+- sqlite_store.py: storage.backend: sqlite 선택 시 WAL 모드 orchestrator.db
+- state_admin.py: journal compaction / 이력 조회 / replay
 
 STUB (향후 구현):
-- PreToolUse: 도구 실행 전 검증
+- PreToolUse: 위험 명령어 차단 / 민감 파일 보호
 - UserPromptSubmit: 키워드 감지
 - Notification: 외부 알림
 """
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Contract 로드 속도 측정 (µs/contract)
+
+임시 contracts 디렉토리에 test-result.yaml / design-contract.yaml을 만들고
+이전 방식(매번 yaml.safe_load), CSafeLoader 파싱, load_contract의 디스크 캐시 hit
+(새 훅 프로세스의 첫 호출), 프로세스 내 캐시 hit(같은 훅 안의 두 번째 호출)을 비교한다.
+
+사용법:
+    python3 hooks/benchmarks/bench_contract_load.py [--contracts 40] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# hooks 패키지 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from hooks import common
+from hooks.common import get_yaml, load_contract, unwrap_contract, yaml_safe_load
+
+
+def make_contracts(root: Path, count: int) -> list:
+    """sessions/{hash}/contracts/R1/T*/T*-S1/ 아래 contract 생성"""
+    paths = []
+    for i in range(count):
+        subtask_dir = root / "sessions" / "bench" / "contracts" / "R1" / f"T{i}" / f"T{i}-S1"
+        subtask_dir.mkdir(parents=True)
+        failed = "".join(
+            f"    - name: test_case_{j}\n      reason: \"expected {j} but was {j + 1}\"\n"
+            f"      category: assertion\n      suggestion: check boundary {j}\n"
+            for j in range(8)
+        )
+        (subtask_dir / "test-result.yaml").write_text(
+            f"test_result:\n  subtask_id: T{i}-S1\n  passed: false\n  total: 20\n  failed_tests:\n{failed}",
+            encoding="utf-8",
+        )
+        invariants = "".join(
+            f"    - id: INV-{i}-{j}\n      rule: \"value {j} must stay positive\"\n      reason: domain rule\n"
+            for j in range(6)
+        )
+        (subtask_dir.parent / "design-contract.yaml").write_text(
+            f"design_contract:\n  task_id: T{i}\n  invariants:\n{invariants}", encoding="utf-8",
+        )
+        paths.extend([subtask_dir / "test-result.yaml", subtask_dir.parent / "design-contract.yaml"])
+    return paths
+
+
+def bench(load, paths: list, repeat: int, reset=None) -> float:
+    """contract 1개당 평균 시간 (µs, 최고값)"""
+    best = float("inf")
+    for _ in range(repeat):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        for path in paths:
+            load(path)
+        best = min(best, time.perf_counter() - start)
+    return best / len(paths) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contract 로드 속도 측정")
+    parser.add_argument("--contracts", type=int, default=40, help="Task 수 (Task당 contract 2개)")
+    parser.add_argument("--repeat", type=int, default=20, help="반복 횟수 (최고값 사용)")
+    args = parser.parse_args()
+
+    yaml = get_yaml()
+    if yaml is None:
+        print("PyYAML not installed")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [str(p) for p in make_contracts(Path(tmp), args.contracts)]
+
+        def legacy(path):
+            return unwrap_contract(yaml.safe_load(Path(path).read_text(encoding="utf-8")), os.path.basename(path))
+
+        def cold(path):
+            return unwrap_contract(yaml_safe_load(Path(path).read_text(encoding="utf-8")), os.path.basename(path))
+
+        # 디스크 캐시 채우기
+        for path in paths:
+            load_contract(path)
+
+        def reset_process_cache():
+            common._CONTRACT_CACHE.clear()
+            common._CONTRACT_DISK_CACHE.clear()
+
+        mismatches = [path for path in paths if legacy(path) != load_contract(path)]
+        for path in mismatches:
+            print(f"MISMATCH {path}")
+
+        results = [
+            ("legacy (yaml.safe_load)", bench(legacy, paths, args.repeat)),
+            ("CSafeLoader" if hasattr(yaml, "CSafeLoader") else "SafeLoader (no libyaml)",
+             bench(cold, paths, args.repeat)),
+            ("load_contract (disk cache)", bench(load_contract, paths, args.repeat, reset_process_cache)),
+            ("load_contract (process cache)", bench(load_contract, paths, args.repeat)),
+        ]
+
+    print(f"contracts: {len(paths)}")
+    baseline = results[0][1]
+    for label, value in results:
+        print(f"{label:<32} {value:>9.2f} µs/contract  ({baseline / value:.1f}x)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+detect_code_patterns 처리량 측정 (MB/s)
+
+큰 소스/테스트/빌드 파일을 합성하여 이전 방식(파일 종류별 if 분기 + marker마다 `in` / content.lower())과
+단일 패스 규칙 엔진의 처리량을 파일 종류별로 비교하고, 감지 결과(key 순서 포함)가 같은지 확인한다.
+marker는 끝에 두어 두 방식 모두 내용 전체를 훑게 한다.
+규칙 테이블과 scanner 컴파일은 첫 호출에서 끝나므로 측정에서 제외한다.
+
+사용법:
+    python3 hooks/benchmarks/bench_detect_patterns.py [--size-mb 8] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# hooks 패키지 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from hooks.common import detect_code_patterns
+
+
+JAVA_WORDS = [
+    "public", "private", "static", "final", "class", "void", "return", "import",
+    "java.util.List;", "String", "int", "if", "else", "for", "while", "new", "this",
+    "@Override", "{", "}", "(", ")", ";", "userRepository", "service", "assertEquals",
+]
+
+JS_WORDS = [
+    "const", "let", "function", "return", "import", "from", "'./module'", "=>",
+    "expect", "toBe", "await", "async", "{", "}", "(", ")", ";", "render", "props",
+]
+
+# (파일 경로, 단어 목록, 끝에 붙일 marker)
+CASES = [
+    ("src/main/java/com/example/UserService.java", JAVA_WORDS, "@Service"),
+    ("src/test/java/com/example/UserControllerTest.java", JAVA_WORDS, "@Test org.junit.jupiter Mockito"),
+    ("web/src/app.test.ts", JS_WORDS, "describe( it( vitest"),
+    ("build.gradle", JAVA_WORDS, "org.springframework.boot"),
+    ("docs/notes.md", JS_WORDS, ""),
+]
+
+
+def synthesize(words, size: int, tail: str, seed: int = 1) -> str:
+    """size 바이트 이상의 합성 소스 (marker는 끝에 두어 전체를 훑게 함)"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < size:
+        word = rng.choice(words)
+        parts.append(word)
+        total += len(word) + 1
+    parts.append(tail)
+    return " ".join(parts)
+
+
+def legacy_detect_code_patterns(file_path: str, content: str) -> dict:
+    """규칙 테이블 도입 전 detect_code_patterns"""
+    file_name = os.path.basename(file_path)
+    patterns = {}
+    if file_name == "build.gradle" or file_name == "build.gradle.kts":
+        patterns["build_tool"] = "Gradle"
+        if "spring" in content.lower():
+            patterns["framework"] = "Spring"
+    elif file_name == "pom.xml":
+        patterns["build_tool"] = "Maven"
+        if "spring" in content.lower():
+            patterns["framework"] = "Spring"
+    elif file_name == "package.json":
+        patterns["build_tool"] = "npm"
+        if '"react"' in content:
+            patterns["framework"] = "React"
+        elif '"vue"' in content:
+            patterns["framework"] = "Vue"
+        elif '"@angular' in content:
+            patterns["framework"] = "Angular"
+
+    if "Test" in file_name or ".spec." in file_name or ".test." in file_name:
+        if "@Test" in content or "org.junit" in content:
+            if "jupiter" in content or "junit5" in content.lower():
+                patterns["testing"] = "JUnit 5"
+            else:
+                patterns["testing"] = "JUnit 4"
+        if "mockito" in content.lower():
+            patterns["mocking"] = "Mockito"
+        if "describe(" in content or "it(" in content:
+            if "jest" in content.lower():
+                patterns["testing"] = "Jest"
+            elif "vitest" in content.lower():
+                patterns["testing"] = "Vitest"
+            elif "mocha" in content.lower():
+                patterns["testing"] = "Mocha"
+        if "pytest" in content or "@pytest" in content:
+            patterns["testing"] = "pytest"
+
+    if "Controller" in file_name or "@Controller" in content or "@RestController" in content:
+        patterns["architecture_hint"] = "MVC/Layered"
+    if "Repository" in file_name or "@Repository" in content:
+        patterns["data_layer"] = "Repository Pattern"
+    if "Service" in file_name or "@Service" in content:
+        patterns["service_layer"] = "Service Layer"
+
+    if file_path.endswith(".java"):
+        patterns["language"] = "Java"
+    elif file_path.endswith(".py"):
+        patterns["language"] = "Python"
+    elif file_path.endswith((".ts", ".tsx")):
+        patterns["language"] = "TypeScript"
+    elif file_path.endswith((".js", ".jsx")):
+        patterns["language"] = "JavaScript"
+    elif file_path.endswith(".go"):
+        patterns["language"] = "Go"
+    elif file_path.endswith(".rs"):
+        patterns["language"] = "Rust"
+    return patterns
+
+
+def bench(detect, file_path: str, content: str, repeat: int) -> float:
+    """최고 처리량 (MB/s)"""
+    detect(file_path, content)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        detect(file_path, content)
+        best = min(best, time.perf_counter() - start)
+    return len(content.encode("utf-8")) / 1e6 / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="detect_code_patterns 처리량 측정")
+    parser.add_argument("--size-mb", type=float, default=8.0, help="파일당 합성 크기 (MB)")
+    parser.add_argument("--repeat", type=int, default=5, help="반복 횟수 (최고값 사용)")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1e6)
+    mismatches = 0
+    print(f"{'file':<52} {'legacy':>9} {'engine':>9}  (MB/s)  patterns")
+    for file_path, words, tail in CASES:
+        content = synthesize(words, size, tail)
+        legacy = bench(legacy_detect_code_patterns, file_path, content, args.repeat)
+        engine = bench(detect_code_patterns, file_path, content, args.repeat)
+        patterns = detect_code_patterns(file_path, content)
+        expected = legacy_detect_code_patterns(file_path, content)
+        if list(patterns.items()) != list(expected.items()):
+            mismatches += 1
+            print(f"MISMATCH {file_path}: legacy={expected}")
+        print(f"{file_path:<52} {legacy:>9.1f} {engine:>9.1f}  ({engine / legacy:.2f}x)  {patterns}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+UserPromptSubmit 의도 분류 속도 측정 (µs/prompt)
+
+실제 사용 형태의 프롬프트 묶음에 대해 이전 방식(키워드 목록마다 re.search)과
+classify_prompt_intent(합친 정규식 한 번)의 결과가 같은지 확인하고 속도를 비교한다.
+기본 config와, 최상위 alternation("fix|implement")이 있는 사용자 trigger를 추가한
+config 두 가지로 측정한다.
+config snapshot 로드와 정규식 컴파일은 첫 호출에서 끝나므로 측정에서 제외한다.
+
+사용법:
+    python3 hooks/benchmarks/bench_prompt_intent.py [--repeat 200]
+"""
+
+import argparse
+import copy
+import os
+import re
+import sys
+import time
+
+# hooks 패키지 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from hooks import common
+from hooks.common import (
+    RESUME_KEYWORDS,
+    NEW_SESSION_KEYWORDS,
+    load_orchestrator_config,
+    classify_prompt_intent,
+    build_config_snapshot,
+)
+
+
+CORPUS = [
+    "로그인 기능 구현해줘",
+    "회원가입 API 만들어 줘. 이메일 인증도 포함해서",
+    "UserService에 비밀번호 재설정 메서드 추가해줘",
+    "결제 모듈 리팩터링해줘, 지금 너무 복잡해",
+    "주문 목록 화면에서 페이지네이션이 안 되는데 수정해줘",
+    "이 함수가 왜 느린지 설명해줘",
+    "JWT랑 세션 방식 차이 알려줘",
+    "프로젝트에서 deprecated API 쓰는 곳 찾아줘",
+    "로그 파일에서 NullPointerException 원인 분석해줘",
+    "이어서 진행",
+    "이어서 작업해줘",
+    "계속 해줘",
+    "resume",
+    "/orchestrator resume",
+    "새 세션으로 시작하자",
+    "처음부터 다시 하자",
+    "/orchestrator reset",
+    "ok",
+    "네 좋아요",
+    "테스트 실패한 거 다시 돌려볼래?",
+    "Can you explain how the gate enforcement works in this plugin?",
+    "Please add retry logic to the HTTP client and make it configurable",
+    "/orchestrate 알림 기능 개발해줘",
+    "README에 설치 방법 추가해줘. 그리고 예시도 알려줘",
+    "아까 하던 거 이어서 해줘, 로그인 API 구현해줘",
+    "캐시 레이어 설계 방향을 조사해줘",
+    "빌드가 깨졌는데 gradle 설정 변경해줘",
+    "git log 보고 최근 변경 사항 요약해줘",
+    "T2 작업은 계속 진행해도 될까?",
+    "배포 스크립트 검색해줘",
+    "다크 모드 토글 컴포넌트 만들어줘 " + "상세 요구사항: 시스템 설정을 따르고, 사용자가 바꾸면 저장. " * 8,
+    "이 에러 로그 봐줘:\n" + "\n".join(f"  at com.example.Service.method{i}(Service.java:{i * 7})" for i in range(40)),
+]
+
+
+# 사용자가 추가할 수 있는 alternation trigger (첫 글자가 선택지마다 다름)
+ALTERNATION_TRIGGERS = ["fix|implement", "add(?:ed)? tests?|refactor"]
+
+ALTERNATION_CORPUS = [
+    "please implement it",
+    "can you fix the parser",
+    "refactor this module",
+    "we should add tests for login",
+    "Implement retry, then explain the change",
+    "explain how this works",
+]
+
+
+def use_extra_triggers(triggers: list) -> None:
+    """trigger를 추가한 config snapshot을 프로세스 내 snapshot으로 사용"""
+    config = copy.deepcopy(load_orchestrator_config())
+    keywords = config.setdefault("keywords", {}) or {}
+    keywords["trigger"] = list(keywords.get("trigger") or []) + triggers
+    config["keywords"] = keywords
+    common._CONFIG_SNAPSHOT = build_config_snapshot(config, None)
+
+
+def find_mismatches(corpus: list) -> list:
+    """(프롬프트, 이전 방식, 합친 정규식) 결과가 다른 항목"""
+    return [
+        (prompt, legacy_classify(prompt), classify_prompt_intent(prompt))
+        for prompt in corpus
+        if legacy_classify(prompt) != classify_prompt_intent(prompt)
+    ]
+
+
+def legacy_classify(prompt: str) -> str:
+    """이전 UserPromptSubmit 방식: 목록마다 순서대로 re.search"""
+    for pattern in RESUME_KEYWORDS:
+        if re.search(pattern, prompt, re.IGNORECASE):
+            return "resume"
+    for pattern in NEW_SESSION_KEYWORDS:
+        if re.search(pattern, prompt, re.IGNORECASE):
+            return "new"
+    keywords = load_orchestrator_config().get("keywords", {}) or {}
+    for pattern in keywords.get("skip", []):
+        if re.search(pattern, prompt, re.IGNORECASE):
+            return "skip"
+    for pattern in keywords.get("trigger", []):
+        if re.search(pattern, prompt, re.IGNORECASE):
+            return "trigger"
+    return "none"
+
+
+def bench(classify, repeat: int) -> float:
+    """코퍼스 1회당 프롬프트 평균 시간 (µs, 최고값)"""
+    for prompt in CORPUS:
+        classify(prompt)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for prompt in CORPUS:
+            classify(prompt)
+        best = min(best, time.perf_counter() - start)
+    return best / len(CORPUS) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="프롬프트 의도 분류 속도 측정")
+    parser.add_argument("--repeat", type=int, default=200, help="반복 횟수 (최고값 사용)")
+    args = parser.parse_args()
+
+    mismatches = []
+    print(f"prompts: {len(CORPUS)}")
+    for label, triggers in (("default config", []), ("+ alternation triggers", ALTERNATION_TRIGGERS)):
+        if triggers:
+            use_extra_triggers(triggers)
+        found = find_mismatches(CORPUS + ALTERNATION_CORPUS)
+        for prompt, expected, actual in found:
+            print(f"MISMATCH [{label}] {prompt[:40]!r}: legacy={expected} unified={actual}")
+        mismatches.extend(found)
+
+        legacy = bench(legacy_classify, args.repeat)
+        unified = bench(classify_prompt_intent, args.repeat)
+        print(f"[{label}]")
+        print(f"  {'legacy (re.search per keyword)':<34} {legacy:>8.2f} µs/prompt")
+        print(f"  {'classify_prompt_intent':<34} {unified:>8.2f} µs/prompt  ({legacy / unified:.1f}x)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
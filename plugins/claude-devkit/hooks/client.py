@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Hook Client - 훅 데몬 thin client
+
+hooks.json의 모든 이벤트가 이 스크립트를 통해 실행된다:
+1. 프로젝트별 Unix 소켓으로 데몬이 떠 있으면 stdin payload를 전달하고 응답을 출력
+2. 데몬이 없거나 응답하지 않거나 다른 훅을 실행 중(busy)이면 훅 스크립트를 in-process로 실행 (fallback)
+
+데몬 경로에서 PyYAML/hooks.common import 비용을 피하기 위해 표준 라이브러리만 사용한다.
+
+사용법:
+    python3 client.py <hook_name>      # 예: python3 client.py pre_tool_use
+"""
+
+import hashlib
+import io
+import json
+import os
+import runpy
+import socket
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+HOOKS_DIR = Path(__file__).resolve().parent
+
+# hooks.json에서 사용하는 훅 이름 → 스크립트
+HOOK_SCRIPTS = {
+    "user_prompt_submit": "user_prompt_submit.py",
+    "session_start": "session_start.py",
+    "stop": "stop.py",
+    "pre_tool_use": "pre_tool_use.py",
+    "post_tool_use": "post_tool_use.py",
+    "pre_compact": "pre_compact.py",
+    "subagent_stop": "subagent_stop.py",
+    "notification": "notification.py",
+}
+
+# 데몬 사용 비활성화 환경변수 (0/off/false)
+DAEMON_ENV_KEY = "CLAUDE_DEVKIT_DAEMON"
+
+# 데몬에 전달할 환경변수 prefix
+FORWARDED_ENV_PREFIXES = ("CLAUDE_",)
+
+CONNECT_TIMEOUT = 0.2
+RESPONSE_TIMEOUT = 30.0
+
+
+def get_project_hash(cwd: Optional[str] = None) -> str:
+    """프로젝트 경로 해시 (common.get_project_hash와 동일한 규칙)"""
+    return hashlib.md5((cwd or os.getcwd()).encode()).hexdigest()[:8]
+
+
+def get_daemon_socket_path(project_hash: str) -> Path:
+    """
+    프로젝트별 데몬 소켓 경로
+
+    Unix 소켓 경로 길이 제한(약 104~108바이트) 때문에 프로젝트 디렉토리가 아닌
+    임시 디렉토리 아래에 둔다.
+    """
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return Path(tempfile.gettempdir()) / f"claude-devkit-{uid}-{project_hash}.sock"
+
+
+def is_daemon_disabled() -> bool:
+    """환경변수로 데몬 사용이 꺼져 있는지 확인"""
+    return os.environ.get(DAEMON_ENV_KEY, "").lower() in ("0", "off", "false", "no")
+
+
+class DaemonRequestError(Exception):
+    """요청을 데몬에 보낸 뒤 응답을 받지 못함 (데몬이 이미 훅을 실행했을 수 있음)"""
+
+
+def send_request(socket_path: Path, request: Dict[str, Any],
+                 timeout: float = RESPONSE_TIMEOUT) -> Optional[Dict[str, Any]]:
+    """
+    데몬에 요청 1건 전송 (한 줄 JSON 요청 → 한 줄 JSON 응답)
+
+    Returns:
+        응답 딕셔너리, 요청을 보내기 전에 연결이 실패하면 None
+
+    Raises:
+        DaemonRequestError: 요청을 보낸 뒤 응답 대기 시간 초과 / 연결 끊김 / 잘못된 응답
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(str(socket_path))
+            sock.settimeout(timeout)
+            sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        except OSError:
+            return None
+
+        # 여기부터는 데몬이 요청을 받았으므로 in-process로 다시 실행하면 안 됨
+        try:
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except OSError as e:
+            raise DaemonRequestError(f"no response from daemon: {e}") from e
+        if not chunks:
+            raise DaemonRequestError("daemon closed the connection without a response")
+        try:
+            return json.loads(b"".join(chunks).decode("utf-8"))
+        except ValueError as e:
+            raise DaemonRequestError(f"invalid daemon response: {e}") from e
+    finally:
+        sock.close()
+
+
+def forward_to_daemon(hook_name: str, payload: str) -> Optional[Dict[str, Any]]:
+    """데몬이 실행 중이면 훅 실행을 위임하고 응답 반환"""
+    if is_daemon_disabled():
+        return None
+
+    socket_path = get_daemon_socket_path(get_project_hash())
+    if not socket_path.exists():
+        return None
+
+    env = {
+        key: value for key, value in os.environ.items()
+        if key.startswith(FORWARDED_ENV_PREFIXES)
+    }
+    response = send_request(socket_path, {
+        "hook": hook_name,
+        "cwd": os.getcwd(),
+        "payload": payload,
+        "env": env,
+    })
+
+    # 연결 실패, 데몬이 재시작 중(소스 변경 감지 등, retry 응답) 또는 다른 훅을 실행 중(busy 응답)이면
+    # fallback (retry/busy는 데몬이 훅을 실행하지 않았음을 뜻함)
+    if not response or response.get("retry") or response.get("busy"):
+        return None
+    return response
+
+
+def run_in_process(hook_name: str, payload: str) -> None:
+    """훅 스크립트를 현재 프로세스에서 실행 (데몬 없을 때 fallback)"""
+    sys.stdin = io.StringIO(payload)
+    runpy.run_path(str(HOOKS_DIR / HOOK_SCRIPTS[hook_name]), run_name="__main__")
+
+
+def main():
+    """Hook Client 메인 함수"""
+    if len(sys.argv) < 2 or sys.argv[1] not in HOOK_SCRIPTS:
+        print(f"usage: client.py <{'|'.join(HOOK_SCRIPTS)}>", file=sys.stderr)
+        sys.exit(2)
+
+    hook_name = sys.argv[1]
+    try:
+        payload = sys.stdin.read()
+    except IOError:
+        payload = ""
+
+    try:
+        response = forward_to_daemon(hook_name, payload)
+    except DaemonRequestError as e:
+        # 데몬이 이미 실행했을 수 있으므로 state/knowledge를 두 번 쓰지 않도록 재실행하지 않음
+        print(f"[Orchestrator] {hook_name}: {e}", file=sys.stderr)
+        sys.exit(1)
+    if response is None:
+        run_in_process(hook_name, payload)
+        return
+
+    if response.get("stdout"):
+        sys.stdout.write(response["stdout"])
+    if response.get("stderr"):
+        sys.stderr.write(response["stderr"])
+    sys.exit(response.get("exit_code", 0) or 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,38 +5,307 @@ Claude DevKit Hooks - 공통 유틸리티
 모든 Hook에서 공통으로 사용하는 함수들.
 """
 
+import contextlib
+import copy
 import hashlib
+import itertools
 import json
+import math
 import os
+import pickle
 import re
 import sys
+import tempfile
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 try:
-    import yaml
+    import fcntl
 except ImportError:
-    yaml = None
+    fcntl = None
+
+
+# PyYAML은 config snapshot이 유효한 warm path에서 import하지 않도록 필요할 때 로드
+_YAML_MODULE: Any = None
+
+
+def get_yaml():
+    """PyYAML 모듈 (없으면 None). 최초 호출 시 import."""
+    global _YAML_MODULE
+    if _YAML_MODULE is None:
+        try:
+            import yaml as module
+        except ImportError:
+            module = False
+        _YAML_MODULE = module
+    return _YAML_MODULE or None
+
+
+def yaml_safe_load(text: str) -> Any:
+    """yaml.safe_load와 같은 결과 (libyaml이 있으면 CSafeLoader 사용). PyYAML이 없으면 호출하지 않는다."""
+    yaml = get_yaml()
+    return yaml.load(text, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
 
 
 # =============================================================================
 # Orchestrator Config 관련 함수
 # =============================================================================
 
-def load_orchestrator_config() -> Dict[str, Any]:
-    """orchestrator-config.yaml 설정 로드"""
-    config_path = Path(__file__).parent / "orchestrator-config.yaml"
+CONFIG_PATH = Path(__file__).parent / "orchestrator-config.yaml"
+CONFIG_SNAPSHOT_PATH = Path(__file__).parent / ".orchestrator-config.cache"
+CONFIG_SNAPSHOT_VERSION = 2
+
+# 프로세스 단위 config snapshot (한 번 로드 후 재사용)
+_CONFIG_SNAPSHOT: Optional[Dict[str, Any]] = None
+
+
+def _get_config_source_key() -> Optional[Tuple[int, int, int, int]]:
+    """
+    snapshot 무효화 기준: orchestrator-config.yaml과 common.py의 (mtime_ns, size)
+
+    snapshot에는 이 모듈의 코드로 만든 값(의도 분류기, prefilter 등)도 들어 있으므로
+    빌더 코드가 바뀌면 CONFIG_SNAPSHOT_VERSION을 올리지 않아도 다시 계산한다.
+    """
+    try:
+        config_stat = CONFIG_PATH.stat()
+        code_stat = os.stat(__file__)
+    except OSError:
+        return None
+    return (config_stat.st_mtime_ns, config_stat.st_size, code_stat.st_mtime_ns, code_stat.st_size)
+
+
+# 세션 관리 키워드 (UserPromptSubmit 의도 분류기에 config trigger/skip과 함께 컴파일)
+RESUME_KEYWORDS = [
+    r"이어서\s*진행",
+    r"이어서\s*작업",
+    r"이어서\s*해줘",
+    r"계속\s*진행",
+    r"계속\s*해줘",
+    r"resume",
+    r"/orchestrator\s+resume",
+]
+
+NEW_SESSION_KEYWORDS = [
+    r"새\s*세션",
+    r"새로\s*시작",
+    r"처음부터",
+    r"reset",
+    r"/orchestrator\s+reset",
+]
+
+# 의도 우선순위 (앞일수록 우선)
+PROMPT_INTENTS = ("resume", "new", "skip", "trigger")
+
+
+def _compile_patterns(patterns: List[str]) -> List[Any]:
+    """키워드 정규식 컴파일 (잘못된 패턴은 제외)"""
+    compiled = []
+    for pattern in patterns or []:
+        try:
+            compiled.append(re.compile(pattern, re.IGNORECASE))
+        except (re.error, TypeError):
+            continue
+    return compiled
+
+
+def _has_top_level_alternation(pattern: str) -> bool:
+    """그룹/문자 클래스 밖에 "|"가 있는지 (있으면 선택지마다 첫 글자가 다를 수 있음)"""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            # 문자 클래스 끝까지 건너뜀 ("[]...]", "[^]...]"의 첫 "]"는 리터럴)
+            i += 1
+            if i < len(pattern) and pattern[i] == "^":
+                i += 1
+            if i < len(pattern) and pattern[i] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def _literal_first_char(pattern: str) -> Optional[str]:
+    """정규식이 반드시 시작하는 리터럴 문자 (메타문자/선택적 첫 글자/최상위 alternation이면 None)"""
+    if not pattern or pattern[0] in "\\.^$*+?{}[]|()":
+        return None
+    if len(pattern) > 1 and pattern[1] in "*?{":
+        return None
+    if _has_top_level_alternation(pattern):
+        return None
+    return pattern[0]
+
+
+def compile_intent_classifier(patterns_by_intent: Dict[str, List[str]]) -> Optional[Any]:
+    """
+    의도별 키워드를 하나의 정규식으로 컴파일
+
+    alternation을 PROMPT_INTENTS 순서로 나열하므로, 한 위치에서 여러 의도가 맞으면
+    우선순위가 높은 그룹이 잡힌다. 모든 키워드의 첫 글자가 리터럴이면 앞에 첫 글자
+    lookahead를 두어 대부분의 위치를 문자 하나 비교로 건너뛴다.
+    패턴끼리 합칠 수 없으면(번호 backreference 등) None을 반환하고 개별 검사로 대체한다.
+    """
+    groups = []
+    first_chars: Optional[set] = set()
+    for intent in PROMPT_INTENTS:
+        valid = [compiled.pattern for compiled in _compile_patterns(patterns_by_intent.get(intent, []))]
+        if valid:
+            groups.append(f"(?P<{intent}>{'|'.join(f'(?:{pattern})' for pattern in valid)})")
+        for pattern in valid:
+            first = _literal_first_char(pattern) if first_chars is not None else None
+            if first is None:
+                first_chars = None
+            else:
+                first_chars.update((first.lower(), first.upper()))
+    if not groups:
+        return None
+    prefilter = f"(?=[{''.join(re.escape(c) for c in sorted(first_chars))}])" if first_chars else ""
+    try:
+        return re.compile(f"{prefilter}(?:{'|'.join(groups)})", re.IGNORECASE)
+    except re.error:
+        return None
+
+
+def build_config_snapshot(config: Dict[str, Any], source_key: Optional[Tuple[int, int, int, int]]) -> Dict[str, Any]:
+    """
+    config를 훅에서 바로 쓸 수 있는 형태로 사전 계산
+
+    - keyword_patterns: trigger/skip 컴파일된 정규식
+    - intent_classifier: 세션 키워드 + trigger/skip을 합친 단일 정규식 (classify_prompt_intent)
+    - agents/gates/phase_transitions/templates: 조회 테이블
+    - agent_outputs: 에이전트별 출력 Contract 목록 (output/outputs 정규화)
+    - gates[*]["contract"]: "X exists" 조건의 Contract 이름
+    """
+    keywords = config.get("keywords", {}) or {}
+    agents = config.get("agents", {}) or {}
+
+    agent_outputs = {}
+    for agent_type, agent_config in agents.items():
+        agent_config = agent_config or {}
+        output = agent_config.get("output")
+        agent_outputs[agent_type] = [c for c in agent_config.get("outputs", [output] if output else []) if c]
+
+    gates = {}
+    for gate_id, gate in (config.get("gates", {}) or {}).items():
+        gate = dict(gate or {})
+        condition = gate.get("condition", "")
+        if "exists" in condition:
+            gate["contract"] = condition.replace(" exists", "").strip()
+        gates[gate_id] = gate
+
+    return {
+        "version": CONFIG_SNAPSHOT_VERSION,
+        "source": source_key,
+        "config": config,
+        "keyword_patterns": {
+            "trigger": _compile_patterns(keywords.get("trigger", [])),
+            "skip": _compile_patterns(keywords.get("skip", [])),
+        },
+        "session_keywords": (tuple(RESUME_KEYWORDS), tuple(NEW_SESSION_KEYWORDS)),
+        "intent_classifier": compile_intent_classifier({
+            "resume": RESUME_KEYWORDS,
+            "new": NEW_SESSION_KEYWORDS,
+            "skip": keywords.get("skip", []),
+            "trigger": keywords.get("trigger", []),
+        }),
+        "agents": agents,
+        "agent_outputs": agent_outputs,
+        "gates": gates,
+        "phase_transitions": config.get("phase_transitions", {}) or {},
+        "templates": config.get("templates", {}) or {},
+    }
+
+
+def _read_config_snapshot_file(source_key: Tuple[int, int, int, int]) -> Optional[Dict[str, Any]]:
+    """디스크 snapshot 로드 (버전/config·common.py mtime·size 불일치 시 None)"""
+    try:
+        with open(CONFIG_SNAPSHOT_PATH, "rb") as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return None
+
+    if not isinstance(snapshot, dict):
+        return None
+    if snapshot.get("version") != CONFIG_SNAPSHOT_VERSION or snapshot.get("source") != source_key:
+        return None
+    # 코드에 있는 세션 키워드가 바뀌어도 다시 계산
+    if snapshot.get("session_keywords") != (tuple(RESUME_KEYWORDS), tuple(NEW_SESSION_KEYWORDS)):
+        return None
+    return snapshot
+
 
-    # YAML 로드 시도
-    if yaml is not None and config_path.exists():
+def _write_config_snapshot_file(snapshot: Dict[str, Any]) -> None:
+    """디스크 snapshot 저장 (플러그인 디렉토리가 읽기 전용이면 무시)"""
+    tmp_path = CONFIG_SNAPSHOT_PATH.with_name(f"{CONFIG_SNAPSHOT_PATH.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, CONFIG_SNAPSHOT_PATH)
+    except Exception:
         try:
-            return yaml.safe_load(config_path.read_text(encoding="utf-8"))
-        except yaml.YAMLError:
+            tmp_path.unlink()
+        except OSError:
             pass
 
-    # Fallback: 기본 설정 반환
-    return get_default_orchestrator_config()
+
+def load_config_snapshot() -> Dict[str, Any]:
+    """
+    사전 계산된 config snapshot 로드
+
+    1. 프로세스 메모리 (데몬 모드에서는 원본 변경 여부 확인)
+    2. 디스크 snapshot (.orchestrator-config.cache, PyYAML import 없음)
+    3. orchestrator-config.yaml 파싱 후 snapshot 저장
+    """
+    global _CONFIG_SNAPSHOT
+
+    if _CONFIG_SNAPSHOT is not None and not _DAEMON_MODE:
+        return _CONFIG_SNAPSHOT
+
+    source_key = _get_config_source_key()
+    if _CONFIG_SNAPSHOT is not None and _CONFIG_SNAPSHOT.get("source") == source_key:
+        return _CONFIG_SNAPSHOT
+
+    snapshot = _read_config_snapshot_file(source_key) if source_key else None
+    if snapshot is None:
+        config = None
+        yaml = get_yaml()
+        if yaml is not None and source_key:
+            try:
+                config = yaml_safe_load(CONFIG_PATH.read_text(encoding="utf-8"))
+            except (yaml.YAMLError, IOError):
+                config = None
+
+        if isinstance(config, dict):
+            snapshot = build_config_snapshot(config, source_key)
+            _write_config_snapshot_file(snapshot)
+        else:
+            # Fallback: 기본 설정 (디스크에 저장하지 않음)
+            snapshot = build_config_snapshot(get_default_orchestrator_config(), None)
+
+    _CONFIG_SNAPSHOT = snapshot
+    return snapshot
+
+
+def load_orchestrator_config() -> Dict[str, Any]:
+    """
+    orchestrator-config.yaml 설정 로드
+
+    프로세스 내에서 공유되는 딕셔너리를 반환하므로 수정하지 않는다.
+    """
+    return load_config_snapshot()["config"]
 
 
 def get_default_orchestrator_config() -> Dict[str, Any]:
@@ -93,38 +362,69 @@ def is_orchestration_enabled() -> bool:
 
 def is_orchestration_keyword(prompt: str) -> bool:
     """오케스트레이션 키워드 감지"""
-    config = load_orchestrator_config()
-    keywords = config.get("keywords", {})
+    keyword_patterns = load_config_snapshot()["keyword_patterns"]
 
     # Skip 키워드 확인 (먼저 체크)
-    for pattern in keywords.get("skip", []):
-        try:
-            if re.search(pattern, prompt, re.IGNORECASE):
-                return False
-        except re.error:
-            continue
+    for pattern in keyword_patterns["skip"]:
+        if pattern.search(prompt):
+            return False
 
     # Trigger 키워드 확인
-    for pattern in keywords.get("trigger", []):
-        try:
-            if re.search(pattern, prompt, re.IGNORECASE):
-                return True
-        except re.error:
-            continue
+    for pattern in keyword_patterns["trigger"]:
+        if pattern.search(prompt):
+            return True
 
     return False
 
 
+def classify_prompt_intent(prompt: str) -> str:
+    """
+    사용자 프롬프트 의도 분류 (한 번의 정규식 스캔)
+
+    Returns:
+        "resume" | "new" | "skip" | "trigger" | "none"
+        (여러 키워드가 있으면 resume > new > skip > trigger 순)
+    """
+    snapshot = load_config_snapshot()
+    classifier = snapshot.get("intent_classifier")
+    if classifier is None:
+        # 합친 정규식을 만들 수 없는 config면 의도별로 검사
+        keyword_patterns = snapshot["keyword_patterns"]
+        patterns_by_intent = {
+            "resume": _compile_patterns(RESUME_KEYWORDS),
+            "new": _compile_patterns(NEW_SESSION_KEYWORDS),
+            "skip": keyword_patterns["skip"],
+            "trigger": keyword_patterns["trigger"],
+        }
+        for intent in PROMPT_INTENTS:
+            if any(pattern.search(prompt) for pattern in patterns_by_intent[intent]):
+                return intent
+        return "none"
+
+    # 매칭이 시작된 위치 바로 다음부터 다시 찾아, 겹치는 위치에서 시작하는 키워드도 놓치지 않음
+    best = len(PROMPT_INTENTS)
+    match = classifier.search(prompt)
+    while match is not None:
+        best = min(best, PROMPT_INTENTS.index(match.lastgroup))
+        if best == 0:
+            break
+        match = classifier.search(prompt, match.start() + 1)
+    return PROMPT_INTENTS[best] if best < len(PROMPT_INTENTS) else "none"
+
+
 def get_gate_config(gate_id: str) -> Optional[Dict[str, Any]]:
     """게이트 설정 조회"""
-    config = load_orchestrator_config()
-    return config.get("gates", {}).get(gate_id)
+    return load_config_snapshot()["gates"].get(gate_id)
 
 
 def get_agent_config(agent_type: str) -> Optional[Dict[str, Any]]:
     """에이전트 설정 조회"""
-    config = load_orchestrator_config()
-    return config.get("agents", {}).get(agent_type)
+    return load_config_snapshot()["agents"].get(agent_type)
+
+
+def get_agent_outputs(agent_type: str) -> List[str]:
+    """에이전트 출력 Contract 목록 (output/outputs 정규화)"""
+    return load_config_snapshot()["agent_outputs"].get(agent_type, [])
 
 
 def get_next_phase_for_agent(agent_type: str, current_phase: str) -> Optional[str]:
@@ -152,14 +452,12 @@ def get_next_phase_for_agent(agent_type: str, current_phase: str) -> Optional[st
 
 def get_phase_transition(phase: str) -> Optional[Dict[str, Any]]:
     """Phase 전환 설정 조회"""
-    config = load_orchestrator_config()
-    return config.get("phase_transitions", {}).get(phase)
+    return load_config_snapshot()["phase_transitions"].get(phase)
 
 
 def get_template(template_name: str) -> str:
     """오케스트레이션 템플릿 조회"""
-    config = load_orchestrator_config()
-    return config.get("templates", {}).get(template_name, "")
+    return load_config_snapshot()["templates"].get(template_name, "")
 
 
 def get_gate_enforcement() -> str:
@@ -168,12 +466,220 @@ def get_gate_enforcement() -> str:
     return config.get("orchestration", {}).get("gate_enforcement", "warn")
 
 
+def get_storage_config() -> Dict[str, Any]:
+    """저장소 설정 (backend, lock_timeout, journal_compact_every)"""
+    config = load_orchestrator_config()
+    return config.get("storage", {}) or {}
+
+
+def is_sqlite_backend() -> bool:
+    """storage.backend가 sqlite인지 확인 (기본값 file)"""
+    return get_storage_config().get("backend", "file") == "sqlite"
+
+
+def get_knowledge_config() -> Dict[str, Any]:
+    """knowledge 설정 (auto_update, detect_patterns, read_max_bytes 등)"""
+    config = load_orchestrator_config()
+    return config.get("knowledge", {}) or {}
+
+
+def get_profiler_config() -> Dict[str, Any]:
+    """백그라운드 프로젝트 스캔 설정 (autostart, workers, max_files, rescan_after, skip_dirs)"""
+    config = load_orchestrator_config()
+    return config.get("profiler", {}) or {}
+
+
+def get_daemon_config() -> Dict[str, Any]:
+    """훅 데몬 설정 (autostart, idle_timeout)"""
+    config = load_orchestrator_config()
+    return config.get("daemon", {}) or {}
+
+
 def get_project_hash() -> str:
     """현재 프로젝트 경로의 해시값 반환 (8자리)"""
     cwd = os.getcwd()
     return hashlib.md5(cwd.encode()).hexdigest()[:8]
 
 
+# =============================================================================
+# 데몬 모드 warm cache
+# =============================================================================
+
+# 데몬 프로세스에서만 사용: 파일 경로 → ((mtime_ns, size), 파싱 결과)
+_WARM_CACHE: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+_DAEMON_MODE = False
+
+
+def enter_daemon_mode() -> None:
+    """상주 데몬 프로세스임을 표시하고 warm cache 활성화"""
+    global _DAEMON_MODE
+    _DAEMON_MODE = True
+
+
+def is_daemon_process() -> bool:
+    """현재 프로세스가 훅 데몬인지 여부"""
+    return _DAEMON_MODE
+
+
+def _read_with_warm_cache(path: Path, parse, copy_result: bool = True) -> Any:
+    """
+    파일을 읽어 파싱. 데몬 모드에서는 (mtime_ns, size)가 같으면 캐시 재사용.
+
+    호출자가 결과를 수정해도 캐시가 오염되지 않도록 사본을 반환한다.
+    조회만 하는 호출자는 copy_result=False로 사본 생성을 생략할 수 있다.
+    """
+    if not _DAEMON_MODE:
+        return parse(path.read_text(encoding="utf-8"))
+
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _WARM_CACHE.get(str(path))
+    if cached is None or cached[0] != key:
+        cached = (key, parse(path.read_text(encoding="utf-8")))
+        _WARM_CACHE[str(path)] = cached
+    return copy.deepcopy(cached[1]) if copy_result else cached[1]
+
+
+# =============================================================================
+# 원자적 쓰기 / 파일 잠금
+# =============================================================================
+
+DEFAULT_LOCK_TIMEOUT = 10.0
+
+# 프로세스 내 재진입 허용: lock 경로 → 보유 횟수
+_HELD_LOCKS: Dict[str, int] = {}
+
+
+def atomic_write_text(path: Path, text: str, durable: bool = True) -> None:
+    """
+    임시 파일에 쓰고 fsync 후 os.replace로 교체
+
+    중간에 프로세스가 죽어도 기존 파일 또는 새 파일 둘 중 하나만 남는다.
+    durable=False면 fsync를 생략한다 (원본에서 다시 만들 수 있는 파생 파일용).
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_name, str(path))
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+    if not durable:
+        return
+
+    # rename 자체의 내구성 확보 (지원하지 않는 플랫폼은 무시)
+    try:
+        dir_fd = os.open(str(path.parent), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+
+@contextlib.contextmanager
+def file_lock(lock_path: Path, timeout: Optional[float] = None) -> Iterator[bool]:
+    """
+    fcntl.flock 기반 배타적 advisory lock
+
+    - 대기 시간은 timeout으로 제한 (지수 backoff sleep, busy-wait 없음)
+    - 보유 프로세스가 죽으면 커널이 lock을 해제하므로 별도 회수는 하지 않음
+      (lock 파일을 지우면 살아 있는 보유자와 새 inode를 잠근 프로세스가 동시에 진입함)
+    - 같은 프로세스 안에서 재진입 가능 (StateSession 안에서 save_state 호출 등)
+    - fcntl이 없는 플랫폼에서는 잠금 없이 진행
+
+    Yields:
+        lock 획득 여부 (timeout 안에 얻지 못하면 False)
+    """
+    key = str(lock_path)
+    if fcntl is None or _HELD_LOCKS.get(key):
+        _HELD_LOCKS[key] = _HELD_LOCKS.get(key, 0) + 1
+        try:
+            yield True
+        finally:
+            _HELD_LOCKS[key] -= 1
+        return
+
+    if timeout is None:
+        timeout = float(get_storage_config().get("lock_timeout", DEFAULT_LOCK_TIMEOUT))
+
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+    fd = os.open(key, os.O_RDWR | os.O_CREAT, 0o644)
+    acquired = False
+
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            acquired = True
+            break
+        except BlockingIOError:
+            pass
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+    if not acquired:
+        os.close(fd)
+        yield False
+        return
+
+    try:
+        _HELD_LOCKS[key] = 1
+        yield True
+    finally:
+        _HELD_LOCKS.pop(key, None)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+# =============================================================================
+# SQLite 저장소 백엔드 (storage.backend: sqlite)
+# =============================================================================
+
+def get_sqlite_store():
+    """hooks.sqlite_store 모듈 (sqlite 백엔드에서만 import)"""
+    from hooks import sqlite_store
+    return sqlite_store
+
+
+def get_sqlite_path() -> Path:
+    """orchestrator.db 경로"""
+    return get_orchestrator_base_path() / "orchestrator.db"
+
+
+def get_sqlite_connection():
+    """프로세스 내에서 재사용되는 WAL 모드 연결"""
+    timeout = float(get_storage_config().get("lock_timeout", DEFAULT_LOCK_TIMEOUT))
+    return get_sqlite_store().connect(get_sqlite_path(), busy_timeout=timeout)
+
+
+def storage_lock(lock_path: Path):
+    """
+    state/knowledge read-modify-write 구간 잠금
+
+    file 백엔드는 file_lock(), sqlite 백엔드는 BEGIN IMMEDIATE 트랜잭션을 사용한다.
+    둘 다 잠금을 얻으면 참, 얻지 못하면 거짓인 값을 yield한다.
+    """
+    if is_sqlite_backend():
+        return get_sqlite_store().transaction(get_sqlite_connection())
+    return file_lock(lock_path)
+
+
 # =============================================================================
 # Claude Code 세션 ID 관련 함수
 # =============================================================================
@@ -204,8 +710,12 @@ def save_current_session_id(session_id: str) -> None:
 
 def is_same_session(state: Dict[str, Any]) -> bool:
     """state의 세션 ID와 현재 세션 ID 비교"""
+    return is_current_claude_session(state.get("request", {}).get("claude_session_id"))
+
+
+def is_current_claude_session(state_id: Optional[str]) -> bool:
+    """주어진 세션 ID가 현재 Claude Code 세션인지 확인 (state 요약용)"""
     current_id = get_current_session_id()
-    state_id = state.get("request", {}).get("claude_session_id")
     return bool(current_id and state_id and current_id == state_id)
 
 
@@ -224,448 +734,3506 @@ def get_knowledge_path(project_hash: str) -> Path:
     return get_orchestrator_base_path() / "knowledge" / project_hash / "knowledge.yaml"
 
 
+def get_state_path(project_hash: str) -> Path:
+    """state.json (snapshot) 경로"""
+    return get_sessions_path(project_hash) / "state.json"
+
+
+def get_journal_path(project_hash: str) -> Path:
+    """events.jsonl (append-only 상태 이벤트 journal) 경로"""
+    return get_sessions_path(project_hash) / "events.jsonl"
+
+
 def load_state(project_hash: str) -> Optional[Dict[str, Any]]:
-    """state.json 로드"""
-    state_path = get_sessions_path(project_hash) / "state.json"
+    """
+    state.json 로드
+
+    state.json은 마지막 compaction 시점의 snapshot이며, 이후 events.jsonl에
+    추가된 이벤트를 replay하여 최신 상태를 만든다.
+    """
+    state, _ = _load_state_with_snapshot_seq(project_hash)
+    return state
+
+
+def _load_state_from_sqlite(project_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    sqlite 백엔드에서 state 로드
+
+    DB에 세션이 없고 state.json이 있으면 (file → sqlite 전환 직후) 한 번 가져온다.
+    """
+    store = get_sqlite_store()
+    conn = get_sqlite_connection()
+    state = store.load_state(conn, project_hash)
+    if state is None and (get_state_path(project_hash).exists() or get_journal_path(project_hash).exists()):
+        state, _ = _load_state_from_files(project_hash)
+        if state:
+            state.pop("journal", None)
+            with store.transaction(conn) as txn:
+                if txn is not None:
+                    store.write_full_state(txn, project_hash, state)
+                    store.append_events(txn, project_hash, read_state_events(project_hash, backend="file"))
+    return state
+
+
+def _load_state_with_snapshot_seq(project_hash: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    snapshot + journal replay
+
+    Returns:
+        (최신 state 또는 None, snapshot에 반영된 마지막 이벤트 seq)
+    """
+    if is_sqlite_backend():
+        # sqlite는 이벤트마다 행을 갱신하므로 snapshot 개념이 없음
+        return _load_state_from_sqlite(project_hash), 0
+    return _load_state_from_files(project_hash)
+
+
+def _load_state_from_files(project_hash: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """state.json snapshot + events.jsonl replay"""
+    state_path = get_state_path(project_hash)
+    state = None
     if state_path.exists():
         try:
-            return json.loads(state_path.read_text(encoding="utf-8"))
+            state = _read_with_warm_cache(state_path, json.loads)
         except (json.JSONDecodeError, IOError):
-            pass
-    return None
+            # snapshot이 손상되었으면 journal 처음부터 복구
+            state = None
 
+    snapshot_seq = (state or {}).get("journal", {}).get("seq", 0)
 
-def save_state(project_hash: str, state: Dict[str, Any]) -> bool:
-    """state.json 저장"""
-    state_path = get_sessions_path(project_hash) / "state.json"
-    try:
-        state_path.parent.mkdir(parents=True, exist_ok=True)
-        state_path.write_text(
-            json.dumps(state, ensure_ascii=False, indent=2),
-            encoding="utf-8"
-        )
-        return True
-    except IOError:
-        return False
+    journal_path = get_journal_path(project_hash)
+    if journal_path.exists():
+        replayed = replay_state_events(journal_path, state if state is not None else {})
+        if state is not None or replayed.get("request"):
+            state = replayed
 
+    return state, snapshot_seq
 
-def load_session(project_hash: str) -> Optional[Dict[str, Any]]:
-    """session.json 로드"""
-    session_path = get_sessions_path(project_hash) / "session.json"
-    if session_path.exists():
-        try:
-            return json.loads(session_path.read_text(encoding="utf-8"))
-        except (json.JSONDecodeError, IOError):
-            pass
-    return None
 
+def get_summary_path(project_hash: str) -> Path:
+    """summary.json (읽기 전용 훅용 상태 요약 sidecar) 경로"""
+    return get_sessions_path(project_hash) / "summary.json"
 
-def load_knowledge(project_hash: str) -> Optional[Dict[str, Any]]:
-    """knowledge.yaml 로드"""
-    if yaml is None:
-        return None
 
-    knowledge_path = get_knowledge_path(project_hash)
-    if knowledge_path.exists():
-        try:
-            return yaml.safe_load(knowledge_path.read_text(encoding="utf-8"))
-        except (yaml.YAMLError, IOError):
-            pass
-    return None
+def get_state_lock_path(project_hash: str) -> Path:
+    """state.json read-modify-write 잠금 파일 경로"""
+    return get_sessions_path(project_hash) / "state.json.lock"
 
 
-def save_knowledge(project_hash: str, knowledge: Dict[str, Any]) -> bool:
-    """knowledge.yaml 저장"""
-    if yaml is None:
-        return False
+def save_state(project_hash: str, state: Dict[str, Any]) -> bool:
+    """
+    state.json snapshot 저장 (잠금 + 원자적 교체)
 
-    knowledge_path = get_knowledge_path(project_hash)
-    try:
-        knowledge_path.parent.mkdir(parents=True, exist_ok=True)
-        knowledge_path.write_text(
-            yaml.dump(knowledge, allow_unicode=True, default_flow_style=False, sort_keys=False),
-            encoding="utf-8"
-        )
-        return True
-    except IOError:
-        return False
+    snapshot에는 반영된 journal 위치(state["journal"])가 함께 기록되어
+    다음 로드 시 그 이후 이벤트만 replay한다.
+    """
+    if is_sqlite_backend():
+        store = get_sqlite_store()
+        try:
+            with store.transaction(get_sqlite_connection()) as conn:
+                if conn is None:
+                    log_orchestrator("orchestrator.db busy - save skipped")
+                    return False
+                store.write_full_state(conn, project_hash, state)
+            return True
+        except store.Error as e:
+            store.rollback(get_sqlite_connection())
+            log_orchestrator(f"orchestrator.db write failed: {e}")
+            return False
+
+    state_path = get_state_path(project_hash)
+    with file_lock(get_state_lock_path(project_hash)) as acquired:
+        if not acquired:
+            log_orchestrator("state.json lock timeout - save skipped")
+            return False
+        try:
+            if "journal" not in state:
+                seq, offset = _get_journal_end(get_journal_path(project_hash))
+                state["journal"] = {"seq": seq, "offset": offset}
+            atomic_write_text(state_path, json.dumps(state, ensure_ascii=False, indent=2))
+            write_state_summary(project_hash, state)
+            return True
+        except IOError:
+            return False
 
 
-def count_pending_subtasks(state: Dict[str, Any]) -> int:
-    """미완료 Subtask 개수 계산"""
-    count = 0
-    tasks = state.get("tasks", {})
-    for task_data in tasks.values():
-        for subtask_data in task_data.get("subtasks", {}).values():
-            if subtask_data.get("status") != "completed":
-                count += 1
-    return count
+# =============================================================================
+# 상태 이벤트 journal
+# =============================================================================
 
+DEFAULT_JOURNAL_COMPACT_EVERY = 50
 
-def count_pending_tasks(state: Dict[str, Any]) -> int:
-    """미완료 Task 개수 계산"""
-    count = 0
-    tasks = state.get("tasks", {})
-    for task_data in tasks.values():
-        if task_data.get("status") != "completed":
-            count += 1
-    return count
 
+class JournaledState(dict):
+    """
+    StateSession이 다루는 state 딕셔너리
 
-def get_current_work(state: Dict[str, Any]) -> Dict[str, str]:
-    """현재 진행 중인 작업 정보 추출"""
-    request = state.get("request", {})
-    current_task_id = request.get("current_task")
+    일반 dict와 동일하게 직렬화되며, 아직 journal에 기록되지 않은 이벤트를
+    pending_events에 모아 둔다.
+    """
 
-    if not current_task_id:
-        return {}
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_events: List[Dict[str, Any]] = []
+        self.snapshot_seq = 0
 
-    task = state.get("tasks", {}).get(current_task_id, {})
-    current_subtask_id = task.get("current_subtask")
-    subtask = task.get("subtasks", {}).get(current_subtask_id, {}) if current_subtask_id else {}
 
-    return {
+def record_state_event(state: Dict[str, Any], event: Dict[str, Any]) -> None:
+    """
+    상태 이벤트를 state에 적용하고, JournaledState면 journal 기록 대기열에 추가
+
+    이벤트 종류:
+        session_init        {"state": 초기 state}
+        breakdown_applied   {"task_order": [...], "tasks": {...}, "scheduling": "dag" (depends_on 사용 시)}
+        global_phase        {"phase": "task_loop"}
+        task_started        {"task_id": "T1", "subtask_id": "T1-S1" | None}
+        subtask_started     {"task_id", "subtask_id", "phase"}        (depends_on 스케줄링)
+        subtask_dispatched  {"task_id", "subtask_id", "agent_type"}   (Task tool로 에이전트 호출)
+        subtask_released    {"task_id", "subtask_id"}                 (배정된 에이전트 종료)
+        phase_update        {"task_id", "subtask_id", "phase"}
+        subtask_completed   {"task_id", "subtask_id", "next_subtask_id" | None}
+        task_completed      {"task_id"}
+        request_status      {"status": "cancelled"}
+        request_completed   {}
+    """
+    event = dict(event)
+    event.setdefault("ts", get_timestamp())
+    apply_state_event(state, event)
+    if isinstance(state, JournaledState):
+        state.pending_events.append(event)
+
+
+def apply_state_event(state: Dict[str, Any], event: Dict[str, Any]) -> None:
+    """이벤트 1건을 state에 반영 (실시간 처리와 replay가 같은 경로를 사용)"""
+    event_type = event.get("type")
+    request = state.setdefault("request", {})
+    tasks = state.setdefault("tasks", {})
+    # 렌더링 memoize 등에 쓰는 변경 번호 (새 세션에서도 이어서 증가)
+    revision = state.get("revision", 0) + 1
+    state["revision"] = revision
+
+    if event_type == "session_init":
+        journal = state.get("journal")
+        state.clear()
+        state.update(copy.deepcopy(event.get("state", {})))
+        state["revision"] = revision
+        if journal is not None:
+            state["journal"] = journal
+
+    elif event_type == "breakdown_applied":
+        state["task_order"] = list(event.get("task_order", []))
+        state["tasks"] = copy.deepcopy(event.get("tasks", {}))
+        rebuild_state_rollups(state)
+        if event.get("scheduling"):
+            request["scheduling"] = event["scheduling"]
+        else:
+            request.pop("scheduling", None)
+        request.pop("in_flight", None)
+
+    elif event_type == "global_phase":
+        request["global_phase"] = event.get("phase")
+
+    elif event_type == "task_started":
+        task_id = event.get("task_id")
+        request["current_task"] = task_id
+        task = tasks.get(task_id)
+        if task is not None:
+            task["status"] = "in_progress"
+            subtask_id = event.get("subtask_id")
+            if subtask_id:
+                task["current_subtask"] = subtask_id
+                task.get("subtasks", {}).get(subtask_id, {})["status"] = "in_progress"
+                _add_in_flight(request, task_id, subtask_id)
+
+    elif event_type == "subtask_started":
+        task_id = event.get("task_id")
+        task = tasks.get(task_id)
+        subtask = task.get("subtasks", {}).get(event.get("subtask_id")) if task is not None else None
+        if subtask is not None:
+            subtask_id = event.get("subtask_id")
+            subtask["status"] = "in_progress"
+            if "phase" in event:
+                subtask["phase"] = event.get("phase")
+            task["status"] = "in_progress"
+            current = task.get("subtasks", {}).get(task.get("current_subtask"), {})
+            if current.get("status") != "in_progress":
+                task["current_subtask"] = subtask_id
+            _add_in_flight(request, task_id, subtask_id)
+            _refocus_in_flight(state)
+
+    elif event_type == "subtask_dispatched":
+        subtask = tasks.get(event.get("task_id"), {}).get("subtasks", {}).get(event.get("subtask_id"))
+        if subtask is not None:
+            subtask["agent"] = event.get("agent_type")
+
+    elif event_type == "subtask_released":
+        subtask = tasks.get(event.get("task_id"), {}).get("subtasks", {}).get(event.get("subtask_id"))
+        if subtask is not None:
+            subtask.pop("agent", None)
+
+    elif event_type == "phase_update":
+        subtask = tasks.get(event.get("task_id"), {}).get("subtasks", {}).get(event.get("subtask_id"))
+        if subtask is not None:
+            subtask["phase"] = event.get("phase")
+
+    elif event_type == "subtask_completed":
+        task = tasks.get(event.get("task_id"), {})
+        subtasks = task.get("subtasks", {})
+        subtask = subtasks.get(event.get("subtask_id"))
+        if subtask is not None:
+            if subtask.get("status") != "completed":
+                _shift_rollup(task.get("rollup"))
+                _shift_rollup(state.get("rollup", {}).get("subtasks"))
+            subtask["status"] = "completed"
+            subtask["phase"] = "complete"
+        _remove_in_flight(request, event.get("task_id"), event.get("subtask_id"))
+        next_subtask_id = event.get("next_subtask_id")
+        if next_subtask_id and next_subtask_id in subtasks:
+            task["current_subtask"] = next_subtask_id
+            subtasks[next_subtask_id]["status"] = "in_progress"
+            _add_in_flight(request, event.get("task_id"), next_subtask_id)
+        if request.get("scheduling") == "dag":
+            if task.get("current_subtask") == event.get("subtask_id"):
+                task["current_subtask"] = next(
+                    (sid for tid, sid in request.get("in_flight", []) if tid == event.get("task_id")),
+                    task.get("current_subtask"),
+                )
+            _refocus_in_flight(state)
+
+    elif event_type == "task_completed":
+        task = tasks.get(event.get("task_id"))
+        if task is not None:
+            if task.get("status") != "completed":
+                _shift_rollup(state.get("rollup", {}).get("tasks"))
+            task["status"] = "completed"
+            task["current_subtask"] = None
+        if request.get("scheduling") == "dag":
+            _refocus_in_flight(state)
+
+    elif event_type == "request_status":
+        request["status"] = event.get("status")
+
+    elif event_type == "request_completed":
+        request["status"] = "completed"
+        request["global_phase"] = "complete"
+        request["current_task"] = None
+
+
+def _add_in_flight(request: Dict[str, Any], task_id: str, subtask_id: str) -> None:
+    """진행 중 subtask 목록(request["in_flight"], 시작 순서)에 추가"""
+    in_flight = request.setdefault("in_flight", [])
+    if [task_id, subtask_id] not in in_flight:
+        in_flight.append([task_id, subtask_id])
+
+
+def _remove_in_flight(request: Dict[str, Any], task_id: str, subtask_id: str) -> None:
+    """진행 중 subtask 목록에서 제거"""
+    in_flight = request.get("in_flight")
+    if in_flight and [task_id, subtask_id] in in_flight:
+        in_flight.remove([task_id, subtask_id])
+
+
+def _refocus_in_flight(state: Dict[str, Any]) -> None:
+    """
+    현재 Task의 현재 subtask가 진행 중이 아니면 가장 먼저 시작한 진행 중 subtask의
+    Task로 request.current_task를 옮김 (진행 중인 것이 없으면 그대로)
+
+    진행 중 subtask가 있는 Task의 current_subtask는 항상 그중 하나이므로
+    (subtask_started / subtask_completed에서 유지) request 행만 바뀐다.
+    """
+    request = state.get("request", {})
+    current_task = state.get("tasks", {}).get(request.get("current_task"), {})
+    current = current_task.get("subtasks", {}).get(current_task.get("current_subtask"), {})
+    if current.get("status") == "in_progress" or not request.get("in_flight"):
+        return
+    request["current_task"] = request["in_flight"][0][0]
+
+
+def _get_journal_end(journal_path: Path) -> Tuple[int, int]:
+    """journal 끝 위치: (마지막 이벤트 seq, 파일 크기)"""
+    try:
+        size = journal_path.stat().st_size
+    except OSError:
+        return 0, 0
+    if size == 0:
+        return 0, 0
+
+    # 마지막 완전한 줄이 나올 때까지 64KB씩 뒤에서부터 읽음 (한 줄이 64KB보다 클 수 있음)
+    tail = b""
+    end = size
+    with open(journal_path, "rb") as f:
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            tail = f.read(end - start) + tail
+            end = start
+            lines = tail.splitlines()
+            # 파일 처음부터 읽은 게 아니면 첫 줄은 앞부분이 잘렸을 수 있음
+            for line in reversed(lines if start == 0 else lines[1:]):
+                try:
+                    return int(json.loads(line).get("seq", 0)), size
+                except (ValueError, AttributeError, TypeError):
+                    continue
+    return 0, size
+
+
+def replay_state_events(journal_path: Path, state: Dict[str, Any],
+                        until_seq: Optional[int] = None) -> Dict[str, Any]:
+    """
+    snapshot 이후 journal 이벤트를 state에 적용
+
+    state["journal"]의 offset부터 읽고 seq가 이미 반영된 이벤트는 건너뛴다.
+    크래시로 잘린 마지막 줄은 무시한다.
+    """
+    pointer = state.get("journal", {}) or {}
+    seq = pointer.get("seq", 0)
+    offset = pointer.get("offset", 0)
+
+    try:
+        size = journal_path.stat().st_size
+    except OSError:
+        return state
+    if size < offset:
+        # journal이 교체된 경우: 처음부터 읽고 seq로 필터링
+        offset = 0
+
+    if size > offset:
+        with open(journal_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    offset += len(line)
+                    continue
+                event_seq = event.get("seq", 0)
+                if until_seq is not None and event_seq > until_seq:
+                    break
+                if event_seq > seq:
+                    apply_state_event(state, event)
+                    seq = event_seq
+                offset += len(line)
+
+    state["journal"] = {"seq": seq, "offset": offset}
+    return state
+
+
+def append_state_events(project_hash: str, state: Dict[str, Any], events: List[Dict[str, Any]]) -> bool:
+    """
+    이벤트를 events.jsonl에 추가 (호출자가 state 잠금을 보유해야 함)
+
+    쓰기 비용은 이벤트 크기에만 비례하고 plan 크기와 무관하다.
+    """
+    journal_path = get_journal_path(project_hash)
+    try:
+        journal_path.parent.mkdir(parents=True, exist_ok=True)
+        # state 잠금 아래에서 replay로 맞춰 둔 위치를 사용 (없으면 journal 끝에서 조회)
+        pointer = state.get("journal")
+        seq = pointer["seq"] if pointer else _get_journal_end(journal_path)[0]
+        lines = []
+        for event in events:
+            seq += 1
+            event["seq"] = seq
+            lines.append(json.dumps(event, ensure_ascii=False, separators=(",", ":")))
+
+        with open(journal_path, "ab") as f:
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            offset = f.tell()
+    except IOError:
+        return False
+
+    state["journal"] = {"seq": seq, "offset": offset}
+    return True
+
+
+def compact_state_journal(project_hash: str) -> bool:
+    """journal을 state.json snapshot으로 접기 (journal 자체는 이력으로 보존)"""
+    with StateSession(project_hash) as session:
+        if session.state is not None:
+            session.mark_dirty(snapshot=True)
+    return bool(session.committed)
+
+
+def read_state_events(project_hash: str, backend: Optional[str] = None) -> List[Dict[str, Any]]:
+    """journal 전체 이벤트 목록 (진행 이력 조회용)"""
+    if backend is None and is_sqlite_backend():
+        return get_sqlite_store().read_events(get_sqlite_connection(), project_hash)
+
+    events = []
+    journal_path = get_journal_path(project_hash)
+    if not journal_path.exists():
+        return events
+    with open(journal_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+
+class StateSession:
+    """
+    state.json 단일 로드/단일 저장 트랜잭션
+
+    진입 시 state 잠금을 잡고 한 번 로드하며, 헬퍼의 *_in_state 변형이 같은
+    state 객체를 수정하도록 한 뒤, 변경이 있었을 때만 종료 시점에 한 번 기록한다.
+    예외가 발생하면 기록하지 않는다. 잠금을 얻지 못하면 state는 None이다.
+
+    병렬 에이전트의 SubagentStop 훅이 동시에 실행되어도 read-modify-write 구간이
+    직렬화되어 lost update가 발생하지 않는다.
+
+    기록 방식:
+    - *_in_state 헬퍼가 남긴 이벤트는 events.jsonl에 append만 한다
+    - 이벤트 없이 직접 수정했거나 mark_dirty(snapshot=True)면 state.json snapshot을 쓴다
+    - snapshot 이후 이벤트가 storage.journal_compact_every개 이상이면 snapshot으로 compaction
+
+    사용 예:
+        with StateSession(project_hash) as session:
+            if session.state and update_subtask_phase_in_state(session.state, "verification"):
+                session.mark_dirty()
+        saved = session.committed
+    """
+
+    def __init__(self, project_hash: str):
+        self.project_hash = project_hash
+        self.state: Optional[JournaledState] = None
+        self.locked = False
+        self.dirty = False
+        self.snapshot = False
+        self.committed: Optional[bool] = None
+        self.base_revision = 0
+        self._lock = None
+
+    def __enter__(self) -> "StateSession":
+        self._lock = storage_lock(get_state_lock_path(self.project_hash))
+        self.locked = bool(self._lock.__enter__())
+        if self.locked:
+            state, snapshot_seq = _load_state_with_snapshot_seq(self.project_hash)
+            if state is not None:
+                self.state = JournaledState(state)
+                self.state.snapshot_seq = snapshot_seq
+                self.base_revision = get_state_revision(state)
+        else:
+            log_orchestrator("state.json lock timeout - state not loaded")
+        return self
+
+    def mark_dirty(self, snapshot: bool = False) -> None:
+        """
+        종료 시 기록이 필요함을 표시
+
+        Args:
+            snapshot: 이벤트로 표현되지 않은 직접 수정이 있어 snapshot 저장이 필요한 경우
+        """
+        self.dirty = True
+        self.snapshot = self.snapshot or snapshot
+
+    def replace(self, state: Dict[str, Any]) -> None:
+        """state 전체 교체 (snapshot으로 저장)"""
+        self.state = JournaledState(state)
+        self.mark_dirty(snapshot=True)
+
+    def ensure_state(self) -> Optional[JournaledState]:
+        """state가 없으면 빈 state 생성 (잠금을 얻은 경우에만)"""
+        if self.state is None and self.locked:
+            self.state = JournaledState()
+        return self.state
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        try:
+            if exc_type is None and self.dirty and self.state is not None:
+                self.committed = self._commit()
+        finally:
+            self._lock.__exit__(exc_type, exc_value, traceback)
+        return False
+
+    def _commit(self) -> bool:
+        state = self.state
+        events = state.pending_events
+
+        if self.snapshot or not events:
+            # 이벤트 없이 바뀐 state(replace, 직접 수정)도 revision 기준 memoize가 갱신되도록
+            # 로드 시점보다 큰 번호를 부여
+            state["revision"] = max(get_state_revision(state), self.base_revision) + 1
+
+        if is_sqlite_backend():
+            # 트랜잭션 안: 이벤트 기록 + 이벤트가 건드린 행만 갱신
+            store = get_sqlite_store()
+            conn = get_sqlite_connection()
+            try:
+                store.commit_state(conn, self.project_hash, state, events, full=self.snapshot)
+            except store.Error as e:
+                store.rollback(conn)
+                log_orchestrator(f"orchestrator.db write failed: {e}")
+                return False
+            state.pending_events = []
+            return True
+
+        if events:
+            if not append_state_events(self.project_hash, state, events):
+                # journal 기록 실패 시 메모리 상태를 snapshot으로 보존
+                return save_state(self.project_hash, state)
+            state.pending_events = []
+
+        compact_every = int(get_storage_config().get("journal_compact_every", DEFAULT_JOURNAL_COMPACT_EVERY))
+        events_since_snapshot = state.get("journal", {}).get("seq", 0) - state.snapshot_seq
+        if not events or self.snapshot or events_since_snapshot >= compact_every:
+            return save_state(self.project_hash, state)
+        write_state_summary(self.project_hash, state)
+        return True
+
+
+# =============================================================================
+# session.json / knowledge.yaml 관련 함수
+# =============================================================================
+
+def load_session(project_hash: str) -> Optional[Dict[str, Any]]:
+    """session.json 로드"""
+    session_path = get_sessions_path(project_hash) / "session.json"
+    if session_path.exists():
+        try:
+            return json.loads(session_path.read_text(encoding="utf-8"))
+        except (json.JSONDecodeError, IOError):
+            pass
+    return None
+
+
+def load_knowledge(project_hash: str) -> Optional[Dict[str, Any]]:
+    """knowledge.yaml 로드"""
+    if is_sqlite_backend():
+        return _load_knowledge_from_sqlite(project_hash)
+    return _load_knowledge_from_file(project_hash)
+
+
+def _load_knowledge_from_sqlite(project_hash: str) -> Optional[Dict[str, Any]]:
+    """sqlite 백엔드에서 knowledge 로드 (DB에 없고 knowledge.yaml이 있으면 한 번 가져옴)"""
+    store = get_sqlite_store()
+    conn = get_sqlite_connection()
+    knowledge = store.load_knowledge(conn, project_hash)
+    if knowledge is None and get_knowledge_path(project_hash).exists():
+        knowledge = _load_knowledge_from_file(project_hash)
+        if knowledge:
+            with store.transaction(conn) as txn:
+                if txn is not None:
+                    store.save_knowledge(txn, project_hash, knowledge)
+    return knowledge
+
+
+def _load_knowledge_from_file(project_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    knowledge.yaml + 목록 shard(decisions.jsonl, pitfalls.jsonl)를 합친 knowledge
+
+    shard가 없는 이전 형식은 knowledge.yaml 안의 목록을 그대로 사용한다.
+    """
+    yaml = get_yaml()
+    if yaml is None:
+        return None
+
+    knowledge_path = get_knowledge_path(project_hash)
+    if not knowledge_path.exists():
+        return None
+    try:
+        knowledge = _read_with_warm_cache(knowledge_path, yaml_safe_load)
+    except (yaml.YAMLError, IOError):
+        return None
+    if not isinstance(knowledge, dict):
+        return knowledge
+    # 목록이 knowledge.yaml 안에 있는 이전 형식이면 다음 저장에서 knowledge.yaml도 다시 씀
+    _remember_knowledge_core(
+        knowledge_path, knowledge, stale=any(section in knowledge for section in KNOWLEDGE_LIST_SHARDS)
+    )
+
+    for section in KNOWLEDGE_LIST_SHARDS:
+        shard = _load_knowledge_shard(project_hash, section)
+        if shard is None:
+            continue
+        knowledge[section] = list(shard["items"].values())
+        if shard["updated_at"] > str(knowledge.get("updated_at") or ""):
+            knowledge["updated_at"] = shard["updated_at"]
+    if get_knowledge_shard_path(project_hash, "pitfalls").exists():
+        knowledge["pitfalls"] = rank_pitfalls(knowledge.get("pitfalls") or [])
+    return knowledge
+
+
+# =============================================================================
+# knowledge 목록 shard
+# =============================================================================
+#
+# file 백엔드의 knowledge/{hash}/ 구성:
+#   knowledge.yaml    patterns, pattern_votes, profile 등 목록이 아닌 섹션
+#   decisions.jsonl   {"op": "put", "id", "item", "ts"} / {"op": "del", "id", "ts"} 한 줄씩
+#   pitfalls.jsonl    같은 형식 (id는 pitfall key)
+#
+# save_knowledge는 마지막으로 읽거나 쓴 내용과 비교하여 바뀐 항목만 shard에 append하고,
+# updated_at 외에 바뀐 것이 없으면 knowledge.yaml은 다시 쓰지 않는다.
+# 같은 id는 나중 기록이 이기며, 대체된 기록이 많아지면 shard를 살아 있는 항목만으로 다시 쓴다.
+# pitfalls 순서는 저장하지 않고 로드 시 점수 순으로 정렬한다.
+
+KNOWLEDGE_LIST_SHARDS = ("decisions", "pitfalls")
+
+# 기록 수가 이 값과 살아 있는 항목 수의 2배를 모두 넘으면 shard 재작성
+SHARD_COMPACT_MIN_RECORDS = 64
+
+# shard 경로 → ((mtime_ns, size), {id: 항목 서명}, 기록 수)
+_SHARD_SIGNATURES: Dict[str, Tuple[Tuple[int, int], Dict[str, str], int]] = {}
+
+# knowledge.yaml 경로 → ((mtime_ns, size), updated_at을 제외한 내용 서명)
+_CORE_SIGNATURES: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def get_knowledge_shard_path(project_hash: str, section: str) -> Path:
+    """knowledge 목록 shard 경로 (decisions.jsonl / pitfalls.jsonl)"""
+    return get_knowledge_path(project_hash).with_name(f"{section}.jsonl")
+
+
+def get_knowledge_mtime_ns(project_hash: str) -> int:
+    """knowledge.yaml과 shard 중 가장 최근 수정 시각 (knowledge.yaml이 없으면 OSError)"""
+    mtime_ns = get_knowledge_path(project_hash).stat().st_mtime_ns
+    for section in KNOWLEDGE_LIST_SHARDS:
+        try:
+            mtime_ns = max(mtime_ns, get_knowledge_shard_path(project_hash, section).stat().st_mtime_ns)
+        except OSError:
+            pass
+    return mtime_ns
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _signature(value: Any) -> str:
+    """항목 비교용 서명"""
+    text = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _shard_item_id(section: str, item: Dict[str, Any]) -> str:
+    """shard 안에서 항목을 식별하는 id"""
+    if section == "pitfalls":
+        return item.get("key") or get_pitfall_key(item)
+    return str(item.get("id") or _signature(item))
+
+
+def _parse_knowledge_shard(text: str) -> Dict[str, Any]:
+    """
+    shard 기록 재생
+
+    Returns:
+        {"items": id → 항목 (처음 기록된 순서), "records": 기록 수, "updated_at": 마지막 ts}
+    """
+    items: Dict[str, Any] = {}
+    records = 0
+    updated_at = ""
+    for line in text.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # 크래시로 잘린 줄은 무시
+            continue
+        records += 1
+        if record.get("op") == "del":
+            items.pop(record.get("id"), None)
+        else:
+            items[record.get("id")] = record.get("item")
+        updated_at = max(updated_at, str(record.get("ts") or ""))
+    return {"items": items, "records": records, "updated_at": updated_at}
+
+
+def _load_knowledge_shard(project_hash: str, section: str) -> Optional[Dict[str, Any]]:
+    """shard 로드 (없으면 None). 다음 저장에서 비교할 수 있도록 항목 서명을 기억한다."""
+    shard_path = get_knowledge_shard_path(project_hash, section)
+    key = _stat_key(shard_path)
+    if key is None:
+        return None
+    try:
+        shard = _read_with_warm_cache(shard_path, _parse_knowledge_shard)
+    except (OSError, ValueError):
+        return None
+    _SHARD_SIGNATURES[str(shard_path)] = (
+        key,
+        {item_id: _signature(item) for item_id, item in shard["items"].items()},
+        shard["records"],
+    )
+    return shard
+
+
+def _remember_knowledge_core(knowledge_path: Path, knowledge: Dict[str, Any], stale: bool = False) -> None:
+    """다음 저장에서 비교할 knowledge.yaml 서명 기억 (stale이면 다음 저장에서 항상 다시 씀)"""
+    key = _stat_key(knowledge_path)
+    if key is not None:
+        _CORE_SIGNATURES[str(knowledge_path)] = (key, "" if stale else _knowledge_core_signature(knowledge))
+
+
+def _knowledge_core_signature(knowledge: Dict[str, Any]) -> str:
+    """knowledge.yaml에 들어가는 섹션의 서명 (updated_at 제외)"""
+    return _signature({
+        key: value for key, value in knowledge.items()
+        if key not in KNOWLEDGE_LIST_SHARDS and key != "updated_at"
+    })
+
+
+def _append_lines(path: Path, lines: List[str]) -> None:
+    """append 후 fsync (잘린 마지막 줄이 있으면 줄바꿈부터)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as f:
+        if f.tell() > 0:
+            with open(path, "rb") as tail:
+                tail.seek(-1, os.SEEK_END)
+                if tail.read(1) != b"\n":
+                    f.write(b"\n")
+        f.write("".join(lines).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_knowledge_shard(project_hash: str, section: str, items: List[Dict[str, Any]],
+                           timestamp: str) -> None:
+    """목록 섹션을 shard에 반영 (바뀐 항목만 append, 필요 시 재작성)"""
+    shard_path = get_knowledge_shard_path(project_hash, section)
+    cached = _SHARD_SIGNATURES.get(str(shard_path))
+    if cached is None or cached[0] != _stat_key(shard_path):
+        _load_knowledge_shard(project_hash, section)
+        cached = _SHARD_SIGNATURES.get(str(shard_path), (None, {}, 0))
+    _, old_signatures, old_records = cached
+
+    new_items = {}
+    for item in items:
+        new_items[_shard_item_id(section, item)] = item
+    new_signatures = {item_id: _signature(item) for item_id, item in new_items.items()}
+
+    records = [
+        {"op": "del", "id": item_id, "ts": timestamp}
+        for item_id in old_signatures if item_id not in new_signatures
+    ]
+    records.extend(
+        {"op": "put", "id": item_id, "item": new_items[item_id], "ts": timestamp}
+        for item_id, signature in new_signatures.items()
+        if old_signatures.get(item_id) != signature
+    )
+    if not records and shard_path.exists():
+        return
+
+    total_records = old_records + len(records)
+    if total_records > max(SHARD_COMPACT_MIN_RECORDS, 2 * len(new_items)):
+        records = [
+            {"op": "put", "id": item_id, "item": item, "ts": timestamp}
+            for item_id, item in new_items.items()
+        ]
+        atomic_write_text(shard_path, "".join(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records
+        ))
+        total_records = len(records)
+    else:
+        _append_lines(shard_path, [
+            json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records
+        ])
+
+    _SHARD_SIGNATURES[str(shard_path)] = (_stat_key(shard_path), new_signatures, total_records)
+
+
+def _save_knowledge_to_file(project_hash: str, knowledge: Dict[str, Any]) -> None:
+    """
+    knowledge를 shard와 knowledge.yaml에 나누어 저장 (knowledge 잠금 보유 상태에서 호출)
+
+    목록 섹션은 바뀐 항목만 append하고, knowledge.yaml은 다른 섹션이 바뀌었을 때만 다시 쓴다.
+    """
+    timestamp = str(knowledge.get("updated_at") or get_timestamp())
+    for section in KNOWLEDGE_LIST_SHARDS:
+        _write_knowledge_shard(project_hash, section, knowledge.get(section) or [], timestamp)
+
+    knowledge_path = get_knowledge_path(project_hash)
+    signature = _knowledge_core_signature(knowledge)
+    cached = _CORE_SIGNATURES.get(str(knowledge_path))
+    if cached and cached[1] == signature and cached[0] == _stat_key(knowledge_path):
+        return
+
+    core = {key: value for key, value in knowledge.items() if key not in KNOWLEDGE_LIST_SHARDS}
+    atomic_write_text(
+        knowledge_path,
+        get_yaml().dump(core, allow_unicode=True, default_flow_style=False, sort_keys=False),
+    )
+    _CORE_SIGNATURES[str(knowledge_path)] = (_stat_key(knowledge_path), signature)
+
+
+def get_knowledge_summary_path(project_hash: str) -> Path:
+    """knowledge 요약 sidecar 경로 (knowledge.yaml 옆 summary.json)"""
+    return get_knowledge_path(project_hash).with_name("summary.json")
+
+
+# 요약 sidecar에 보관하는 pitfall 개수
+KNOWLEDGE_SUMMARY_ITEMS = 3
+
+
+def build_knowledge_summary(knowledge: Dict[str, Any]) -> Dict[str, Any]:
+    """format_knowledge_summary / PreCompact가 사용하는 부분만 추린 knowledge 요약"""
+    patterns = knowledge.get("patterns", {}) or {}
+    pitfalls = knowledge.get("pitfalls", []) or []
+    return {
+        "patterns": {
+            key: patterns[key] for key in ("architecture", "testing", "error_handling")
+            if patterns.get(key)
+        },
+        "pitfalls": pitfalls[:KNOWLEDGE_SUMMARY_ITEMS],
+        "pitfall_count": len(pitfalls),
+        "decision_count": len(knowledge.get("decisions", []) or []),
+    }
+
+
+def _write_knowledge_summary(project_hash: str, knowledge: Dict[str, Any]) -> None:
+    """knowledge 요약 sidecar 기록 (knowledge.yaml에서 다시 만들 수 있으므로 fsync 생략)"""
+    try:
+        atomic_write_text(
+            get_knowledge_summary_path(project_hash),
+            json.dumps(build_knowledge_summary(knowledge), ensure_ascii=False, default=str),
+            durable=False,
+        )
+    except (IOError, TypeError, ValueError):
+        pass
+
+
+def load_knowledge_summary(project_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    knowledge 요약 로드 (knowledge.yaml 전체를 파싱하지 않음)
+
+    sidecar가 없거나 knowledge.yaml/shard보다 오래되었으면 knowledge를 로드하여 계산한다.
+    """
+    if not is_sqlite_backend():
+        summary_path = get_knowledge_summary_path(project_hash)
+        try:
+            if summary_path.stat().st_mtime_ns >= get_knowledge_mtime_ns(project_hash):
+                return json.loads(summary_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+
+    knowledge = load_knowledge(project_hash)
+    return build_knowledge_summary(knowledge) if knowledge else None
+
+
+def get_knowledge_lock_path(project_hash: str) -> Path:
+    """knowledge.yaml read-modify-write 잠금 파일 경로"""
+    knowledge_path = get_knowledge_path(project_hash)
+    return knowledge_path.with_name(f"{knowledge_path.name}.lock")
+
+
+def save_knowledge(project_hash: str, knowledge: Dict[str, Any]) -> bool:
+    """knowledge 저장 (잠금 + 바뀐 목록 항목 append / knowledge.yaml 원자적 교체)"""
+    if is_sqlite_backend():
+        store = get_sqlite_store()
+        try:
+            with store.transaction(get_sqlite_connection()) as conn:
+                if conn is None:
+                    log_orchestrator("orchestrator.db busy - save skipped")
+                    return False
+                store.save_knowledge(conn, project_hash, knowledge)
+            update_knowledge_index(project_hash, knowledge)
+            return True
+        except store.Error as e:
+            store.rollback(get_sqlite_connection())
+            log_orchestrator(f"orchestrator.db write failed: {e}")
+            return False
+
+    if get_yaml() is None:
+        return False
+
+    with file_lock(get_knowledge_lock_path(project_hash)) as acquired:
+        if not acquired:
+            log_orchestrator("knowledge.yaml lock timeout - save skipped")
+            return False
+        try:
+            _save_knowledge_to_file(project_hash, knowledge)
+            _write_knowledge_summary(project_hash, knowledge)
+            update_knowledge_index(project_hash, knowledge)
+            return True
+        except IOError:
+            return False
+
+
+def create_initial_knowledge(project_hash: str) -> Dict[str, Any]:
+    """빈 knowledge 구조 생성"""
+    return {
+        "version": 1,
+        "project": {
+            "path": os.getcwd(),
+            "hash": project_hash,
+        },
+        "patterns": {},
+        "decisions": [],
+        "pitfalls": [],
+    }
+
+
+class KnowledgeSession:
+    """
+    knowledge.yaml 잠금 구간 내 로드/저장 트랜잭션 (StateSession과 동일한 사용법)
+
+    create=True면 knowledge.yaml이 없을 때 빈 구조로 시작한다.
+    """
+
+    def __init__(self, project_hash: str, create: bool = True):
+        self.project_hash = project_hash
+        self.create = create
+        self.knowledge: Optional[Dict[str, Any]] = None
+        self.dirty = False
+        self.committed: Optional[bool] = None
+        self._lock = None
+
+    def __enter__(self) -> "KnowledgeSession":
+        self._lock = storage_lock(get_knowledge_lock_path(self.project_hash))
+        if self._lock.__enter__():
+            self.knowledge = load_knowledge(self.project_hash)
+            if not self.knowledge and self.create:
+                self.knowledge = create_initial_knowledge(self.project_hash)
+        else:
+            log_orchestrator("knowledge.yaml lock timeout - knowledge not loaded")
+        return self
+
+    def mark_dirty(self) -> None:
+        """종료 시 저장이 필요함을 표시"""
+        self.dirty = True
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        try:
+            if exc_type is None and self.dirty and self.knowledge is not None:
+                self.committed = save_knowledge(self.project_hash, self.knowledge)
+        finally:
+            self._lock.__exit__(exc_type, exc_value, traceback)
+        return False
+
+
+def count_pending_subtasks(state: Dict[str, Any]) -> int:
+    """미완료 Subtask 개수 (rollup이 있으면 O(1), 없으면 전체 순회)"""
+    rollup = state.get("rollup")
+    if rollup:
+        return rollup["subtasks"]["pending"]
+
+    count = 0
+    tasks = state.get("tasks", {})
+    for task_data in tasks.values():
+        for subtask_data in task_data.get("subtasks", {}).values():
+            if subtask_data.get("status") != "completed":
+                count += 1
+    return count
+
+
+def count_pending_tasks(state: Dict[str, Any]) -> int:
+    """미완료 Task 개수 (rollup이 있으면 O(1), 없으면 전체 순회)"""
+    rollup = state.get("rollup")
+    if rollup:
+        return rollup["tasks"]["pending"]
+
+    count = 0
+    tasks = state.get("tasks", {})
+    for task_data in tasks.values():
+        if task_data.get("status") != "completed":
+            count += 1
+    return count
+
+
+# =============================================================================
+# Pitfall / Decision 저장소
+# =============================================================================
+#
+# pitfall은 정규화한 내용의 해시(key)로 식별하고, 같은 실패가 다시 기록되면
+# 새 항목을 추가하지 않고 count와 last_seen만 갱신한다.
+# 목록은 count × 2^(-경과/반감기) 점수 순으로 유지하며, knowledge.pitfall_capacity를
+# 넘으면 점수가 낮은 항목부터 제거한다 (요약/PreCompact는 앞쪽 항목을 보여줌).
+
+DEFAULT_PITFALL_CAPACITY = 200
+DEFAULT_PITFALL_HALF_LIFE_DAYS = 30.0
+
+# 재시도마다 달라지는 독립된 숫자/주소는 같은 실패로 취급 (test_case_1 같은 이름은 유지)
+_PITFALL_VOLATILE_RE = re.compile(r"\b(?:0x[0-9a-f]+|\d+(?:\.\d+)?)\b")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_pitfall_text(text: str) -> str:
+    """비교용 정규화 (소문자, 독립된 숫자/주소 → #, 공백 정리)"""
+    text = _PITFALL_VOLATILE_RE.sub("#", str(text).lower())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def get_pitfall_key(pitfall: Dict[str, Any]) -> str:
+    """pitfall 내용 해시 (description 기준)"""
+    normalized = normalize_pitfall_text(pitfall.get("description", ""))
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def parse_timestamp(timestamp: Any) -> float:
+    """get_timestamp() 형식 → epoch 초 (해석할 수 없으면 0)"""
+    try:
+        parsed = datetime.fromisoformat(str(timestamp).rstrip("Z"))
+    except ValueError:
+        return 0.0
+    return (parsed - datetime(1970, 1, 1)).total_seconds()
+
+
+def index_pitfalls(pitfalls: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    key → pitfall 인덱스 (존재 확인 O(1))
+
+    key가 없는 이전 형식 항목은 key/count/last_seen(지금)을 채우고, 같은 key끼리는 하나로 합친다.
+    """
+    index: Dict[str, Dict[str, Any]] = {}
+    timestamp = None
+    for pitfall in pitfalls:
+        key = pitfall.get("key") or get_pitfall_key(pitfall)
+        pitfall["key"] = key
+        pitfall.setdefault("count", 1)
+        if not pitfall.get("last_seen"):
+            timestamp = timestamp or get_timestamp()
+            pitfall["last_seen"] = timestamp
+        existing = index.get(key)
+        if existing is None:
+            index[key] = pitfall
+            continue
+        existing["count"] += pitfall["count"]
+        if str(pitfall.get("last_seen", "")) > str(existing.get("last_seen", "")):
+            existing["last_seen"] = pitfall["last_seen"]
+    return index
+
+
+def _pitfall_score(pitfall: Dict[str, Any], now: float, half_life: float) -> float:
+    """최근성 × 빈도 점수"""
+    last_seen = parse_timestamp(pitfall.get("last_seen"))
+    return _decayed_score([float(pitfall.get("count", 1)), last_seen], now, half_life)
+
+
+def record_pitfalls(knowledge: Dict[str, Any], new_pitfalls: List[Dict[str, Any]],
+                    now: Optional[float] = None) -> List[str]:
+    """
+    pitfall 기록 (같은 내용이면 count 증가, 용량 초과 시 점수 낮은 항목 제거)
+
+    Args:
+        now: 관측 시각 (epoch 초, 변경 버퍼 재생 시). 없으면 현재 시각.
+
+    Returns:
+        변경 내역 목록
+    """
+    if not new_pitfalls:
+        return []
+
+    if now is None:
+        now, timestamp = time.time(), get_timestamp()
+    else:
+        timestamp = datetime.utcfromtimestamp(now).isoformat() + "Z"
+    capacity = int(get_knowledge_config().get("pitfall_capacity", DEFAULT_PITFALL_CAPACITY))
+
+    index = index_pitfalls(knowledge.get("pitfalls", []) or [])
+    updates = []
+    for pitfall in new_pitfalls:
+        key = get_pitfall_key(pitfall)
+        desc = pitfall.get("description", "")[:30]
+        existing = index.get(key)
+        if existing is not None:
+            existing["count"] += 1
+            existing["last_seen"] = timestamp
+            existing["learned_from"] = pitfall.get("learned_from", existing.get("learned_from"))
+            updates.append(f"Pitfall repeated (x{existing['count']}): {desc}...")
+            continue
+        index[key] = {
+            **pitfall,
+            "id": f"P-{key[:8]}",
+            "key": key,
+            "count": 1,
+            "first_seen": timestamp,
+            "last_seen": timestamp,
+        }
+        updates.append(f"Pitfall added: {desc}...")
+
+    knowledge["pitfalls"] = rank_pitfalls(list(index.values()), now)[:max(capacity, 0)]
+    return updates
+
+
+def rank_pitfalls(pitfalls: List[Dict[str, Any]], now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """최근성 × 빈도 점수 순 정렬 (동점이면 기존 순서)"""
+    now = time.time() if now is None else now
+    half_life = float(
+        get_knowledge_config().get("pitfall_half_life_days", DEFAULT_PITFALL_HALF_LIFE_DAYS)
+    ) * 86400
+    return sorted(pitfalls, key=lambda p: _pitfall_score(p, now, half_life), reverse=True)
+
+
+def record_decisions(knowledge: Dict[str, Any], new_decisions: List[Dict[str, Any]]) -> List[str]:
+    """design decision 기록 (같은 id면 생략)"""
+    decisions = knowledge.setdefault("decisions", [])
+    existing_ids = {d.get("id") for d in decisions}
+    updates = []
+    for dec in new_decisions:
+        if dec.get("id") and dec.get("id") not in existing_ids:
+            decisions.append(dec)
+            existing_ids.add(dec.get("id"))
+            updates.append(f"Decision added: {dec.get('id')}")
+    return updates
+
+
+# =============================================================================
+# knowledge 변경 버퍼 (knowledge.durability)
+# =============================================================================
+#
+# batched(기본): PostToolUse는 변경 내용을 knowledge/{hash}/pending.jsonl에 한 줄 append만
+# 하고, Stop / PreCompact / SubagentStop / SessionStart 경계에서 flush_knowledge_updates()가
+# 쌓인 변경을 관측 시각 그대로 재생하여 한 번에 저장한다.
+# immediate: 변경마다 바로 knowledge를 저장한다 (이전 동작).
+#
+# 변경 형식: {"op": "patterns", "observed": {...}, "weight": 1.0, "at": epoch}
+#            {"op": "decisions" | "pitfalls", "items": [...], "at": epoch}
+
+DEFAULT_KNOWLEDGE_DURABILITY = "batched"
+
+
+def get_knowledge_durability() -> str:
+    """knowledge 저장 방식 (immediate | batched)"""
+    durability = get_knowledge_config().get("durability", DEFAULT_KNOWLEDGE_DURABILITY)
+    return durability if durability in ("immediate", "batched") else DEFAULT_KNOWLEDGE_DURABILITY
+
+
+def get_knowledge_pending_path(project_hash: str) -> Path:
+    """아직 반영하지 않은 knowledge 변경 버퍼 경로"""
+    return get_knowledge_path(project_hash).with_name("pending.jsonl")
+
+
+def get_knowledge_pending_lock_path(project_hash: str) -> Path:
+    """변경 버퍼 append / flush 잠금 파일 경로"""
+    pending_path = get_knowledge_pending_path(project_hash)
+    return pending_path.with_name(f"{pending_path.name}.lock")
+
+
+def apply_knowledge_update(knowledge: Dict[str, Any], update: Dict[str, Any]) -> List[str]:
+    """변경 1건을 knowledge에 반영 (관측 시각 at 기준)"""
+    op = update.get("op")
+    now = update.get("at")
+    if op == "patterns":
+        return vote_patterns(knowledge, update.get("observed") or {}, float(update.get("weight", 1.0)), now)
+    if op == "decisions":
+        return record_decisions(knowledge, update.get("items") or [])
+    if op == "pitfalls":
+        return record_pitfalls(knowledge, update.get("items") or [], now)
+    return []
+
+
+def queue_knowledge_update(project_hash: str, update: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    knowledge 변경 기록
+
+    batched면 변경 버퍼에 append만 하고 빈 목록을, immediate면 바로 저장하고 변경 내역을 반환한다.
+
+    Returns:
+        변경 내역 목록 (knowledge/버퍼를 열지 못했으면 None)
+    """
+    update = {**update, "at": time.time()}
+    if get_knowledge_durability() == "immediate":
+        with KnowledgeSession(project_hash) as session:
+            knowledge = session.knowledge
+            if knowledge is None:
+                return None
+            updates = apply_knowledge_update(knowledge, update)
+            knowledge["updated_at"] = get_timestamp()
+            session.mark_dirty()
+        return updates if session.committed else None
+
+    pending_path = get_knowledge_pending_path(project_hash)
+    line = json.dumps(update, ensure_ascii=False, default=str) + "\n"
+    try:
+        with file_lock(get_knowledge_pending_lock_path(project_hash)) as acquired:
+            if not acquired:
+                return None
+            pending_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(pending_path, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError:
+        return None
+    return []
+
+
+def flush_knowledge_updates(project_hash: str) -> Optional[List[str]]:
+    """
+    변경 버퍼를 knowledge에 반영하여 한 번에 저장
+
+    저장에 실패하면 버퍼를 남겨 다음 경계에서 다시 시도한다.
+
+    Returns:
+        변경 내역 목록 (반영할 것이 없으면 빈 목록, 저장 실패 시 None)
+    """
+    pending_path = get_knowledge_pending_path(project_hash)
+    if not pending_path.exists():
+        return []
+
+    with file_lock(get_knowledge_pending_lock_path(project_hash)) as acquired:
+        if not acquired:
+            return None
+        try:
+            lines = pending_path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return []
+
+        updates = []
+        for line in lines:
+            try:
+                updates.append(json.loads(line))
+            except ValueError:
+                continue
+
+        changes: List[str] = []
+        if updates:
+            with KnowledgeSession(project_hash) as session:
+                knowledge = session.knowledge
+                if knowledge is None:
+                    return None
+                for update in updates:
+                    changes.extend(apply_knowledge_update(knowledge, update))
+                knowledge["updated_at"] = get_timestamp()
+                session.mark_dirty()
+            if not session.committed:
+                return None
+
+        try:
+            pending_path.unlink()
+        except OSError:
+            pass
+    return changes
+
+
+# =============================================================================
+# knowledge 검색 (BM25)
+# =============================================================================
+#
+# knowledge/{hash}/search-index.json:
+#   {"version": 1, "total_len": 전체 token 수,
+#    "docs": {doc_id: [서명, token 수, 종류, 표시 문자열, 색인 문자열]},
+#    "postings": {token: {doc_id: 빈도}}}
+# doc_id는 "D:{decision id}" / "P:{pitfall key}"이며, save_knowledge마다 서명(내용 해시)이
+# 바뀐 문서만 postings에서 빼고 다시 넣는다.
+
+KNOWLEDGE_INDEX_VERSION = 1
+DEFAULT_CONTEXT_TOP_K = 5
+DEFAULT_CONTEXT_MAX_BYTES = 1024
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# camelCase/snake_case 분리, 한글 어절은 조사가 붙어도 맞도록 2-gram 추가
+_SEARCH_TOKEN_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+|[가-힣]+")
+SEARCH_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the to was with"
+    " this not but should when".split()
+)
+
+
+def tokenize_for_search(text: str) -> List[str]:
+    """검색용 token 목록 (소문자)"""
+    tokens = []
+    for match in _SEARCH_TOKEN_RE.findall(str(text)):
+        token = match.lower()
+        if token in SEARCH_STOPWORDS or (len(token) < 2 and token.isascii()):
+            continue
+        tokens.append(token)
+        if len(token) > 2 and not token.isascii():
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+
+def get_knowledge_index_path(project_hash: str) -> Path:
+    """knowledge 검색 인덱스 경로 (knowledge.yaml 옆 search-index.json)"""
+    return get_knowledge_path(project_hash).with_name("search-index.json")
+
+
+def _knowledge_documents(knowledge: Dict[str, Any]) -> Dict[str, Tuple[str, str, str]]:
+    """검색 대상 문서: doc_id → (종류, 표시 문자열, 색인 문자열)"""
+    documents = {}
+    for decision in knowledge.get("decisions", []) or []:
+        if decision.get("id"):
+            display = f"{decision['id']}: {decision.get('decision', '')}"
+            text = f"{decision.get('topic', '')} {display} {decision.get('rationale', '')}"
+            documents[f"D:{decision['id']}"] = ("decision", display, text)
+    for pitfall in knowledge.get("pitfalls", []) or []:
+        key = pitfall.get("key") or get_pitfall_key(pitfall)
+        display = pitfall.get("description", "")
+        text = f"{display} {pitfall.get('reason', '')}"
+        documents[f"P:{key}"] = ("pitfall", display, text)
+    return documents
+
+
+def _empty_knowledge_index() -> Dict[str, Any]:
+    return {"version": KNOWLEDGE_INDEX_VERSION, "total_len": 0, "docs": {}, "postings": {}}
+
+
+def _load_knowledge_index(project_hash: str, copy_result: bool = True) -> Optional[Dict[str, Any]]:
+    """검색 인덱스 로드 (없거나 형식이 다르면 None)"""
+    try:
+        index = _read_with_warm_cache(get_knowledge_index_path(project_hash), json.loads, copy_result)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != KNOWLEDGE_INDEX_VERSION:
+        return None
+    return index
+
+
+def _apply_knowledge_documents(index: Dict[str, Any], knowledge: Dict[str, Any]) -> bool:
+    """
+    인덱스를 knowledge 문서 목록에 맞춤 (바뀐 문서만 postings 갱신)
+
+    Returns:
+        인덱스 변경 여부
+    """
+    docs = index["docs"]
+    postings = index["postings"]
+    documents = _knowledge_documents(knowledge)
+    changed = False
+
+    signatures = {
+        doc_id: hashlib.blake2b(f"{kind}\0{display}\0{text}".encode("utf-8"), digest_size=8).hexdigest()
+        for doc_id, (kind, display, text) in documents.items()
+    }
+
+    for doc_id in [d for d in docs if signatures.get(d) != docs[d][0]]:
+        signature, length, kind, display, text = docs.pop(doc_id)
+        for token in set(tokenize_for_search(text)):
+            token_postings = postings.get(token)
+            if token_postings is not None:
+                token_postings.pop(doc_id, None)
+                if not token_postings:
+                    del postings[token]
+        index["total_len"] -= length
+        changed = True
+
+    for doc_id, (kind, display, text) in documents.items():
+        if doc_id in docs:
+            continue
+        tokens = tokenize_for_search(text)
+        for token in tokens:
+            token_postings = postings.setdefault(token, {})
+            token_postings[doc_id] = token_postings.get(doc_id, 0) + 1
+        docs[doc_id] = [signatures[doc_id], len(tokens), kind, display, text]
+        index["total_len"] += len(tokens)
+        changed = True
+
+    return changed
+
+
+def update_knowledge_index(project_hash: str, knowledge: Dict[str, Any]) -> None:
+    """knowledge 저장 직후 검색 인덱스 갱신 (knowledge에서 다시 만들 수 있으므로 fsync 생략)"""
+    index = _load_knowledge_index(project_hash) or _empty_knowledge_index()
+    index_path = get_knowledge_index_path(project_hash)
+    if not _apply_knowledge_documents(index, knowledge) and index_path.exists():
+        return
+    try:
+        atomic_write_text(
+            index_path,
+            json.dumps(index, ensure_ascii=False, separators=(",", ":")),
+            durable=False,
+        )
+    except (IOError, TypeError, ValueError):
+        pass
+
+
+def _load_fresh_knowledge_index(project_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    검색 인덱스 (읽기 전용)
+
+    인덱스가 없거나 knowledge.yaml/shard가 더 새로우면 (직접 수정 등) knowledge에서 다시 만든다.
+    """
+    index_path = get_knowledge_index_path(project_hash)
+    try:
+        fresh = is_sqlite_backend() or (
+            index_path.stat().st_mtime_ns >= get_knowledge_mtime_ns(project_hash)
+        )
+    except OSError:
+        fresh = index_path.exists()
+    index = _load_knowledge_index(project_hash, copy_result=False) if fresh else None
+    if index is not None:
+        return index
+
+    knowledge = load_knowledge(project_hash)
+    if not knowledge:
+        return None
+    update_knowledge_index(project_hash, knowledge)
+    return _load_knowledge_index(project_hash, copy_result=False)
+
+
+def build_knowledge_query(current_work: Dict[str, Any]) -> str:
+    """현재 작업으로 검색어 구성 (task/subtask 이름과 설명)"""
+    return " ".join(
+        str(current_work.get(key) or "")
+        for key in ("task_name", "task_objective", "subtask_name", "subtask_description")
+    )
+
+
+def search_knowledge(project_hash: str, query: str, top_k: Optional[int] = None,
+                     max_bytes: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    decisions/pitfalls 중 query와 관련된 항목 (BM25 점수 순)
+
+    표시 문자열 합계가 max_bytes를 넘지 않는 범위에서 최대 top_k개를 반환한다.
+
+    Returns:
+        [{"kind", "id", "text", "score"}, ...]
+    """
+    config = get_knowledge_config()
+    if top_k is None:
+        top_k = int(config.get("context_top_k", DEFAULT_CONTEXT_TOP_K))
+    if max_bytes is None:
+        max_bytes = int(config.get("context_max_bytes", DEFAULT_CONTEXT_MAX_BYTES))
+
+    terms = set(tokenize_for_search(query))
+    if not terms or top_k <= 0:
+        return []
+    index = _load_fresh_knowledge_index(project_hash)
+    if not index or not index["docs"]:
+        return []
+
+    docs = index["docs"]
+    doc_count = len(docs)
+    avg_len = index["total_len"] / doc_count or 1.0
+    scores: Dict[str, float] = {}
+    for term in terms:
+        token_postings = index["postings"].get(term)
+        if not token_postings:
+            continue
+        df = len(token_postings)
+        idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        for doc_id, tf in token_postings.items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * docs[doc_id][1] / avg_len)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+    results = []
+    used = 0
+    for doc_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+        kind, display = docs[doc_id][2], docs[doc_id][3]
+        size = len(display.encode("utf-8"))
+        if used + size > max_bytes:
+            continue
+        used += size
+        results.append({"kind": kind, "id": doc_id.split(":", 1)[1], "text": display, "score": round(score, 4)})
+        if len(results) >= top_k:
+            break
+    return results
+
+
+def format_relevant_knowledge(items: List[Dict[str, Any]]) -> str:
+    """search_knowledge 결과 포맷"""
+    return "\n".join(f"- [{item['kind']}] {item['text']}" for item in items)
+
+
+# =============================================================================
+# 진행 카운터 (rollup)
+# =============================================================================
+#
+# state["rollup"] = {"tasks": {"pending", "done"}, "subtasks": {"pending", "done"}}
+# state["tasks"][T]["rollup"] = {"pending", "done"}   (해당 task의 subtask 개수)
+#
+# breakdown 반영 시 한 번 계산하고, 이후 subtask_completed / task_completed 이벤트에서
+# 증감한다. rollup이 없는 이전 state는 count_pending_*가 전체 순회로 계산한다.
+
+def compute_task_rollup(task: Dict[str, Any]) -> Dict[str, int]:
+    """task 하나의 subtask pending/done 개수 계산"""
+    subtasks = task.get("subtasks", {})
+    done = sum(1 for st in subtasks.values() if st.get("status") == "completed")
+    return {"pending": len(subtasks) - done, "done": done}
+
+
+def compute_state_rollup(state: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+    """state 전체 rollup 계산 (전체 순회)"""
+    rollup = {"tasks": {"pending": 0, "done": 0}, "subtasks": {"pending": 0, "done": 0}}
+    for task in state.get("tasks", {}).values():
+        task_rollup = compute_task_rollup(task)
+        rollup["subtasks"]["pending"] += task_rollup["pending"]
+        rollup["subtasks"]["done"] += task_rollup["done"]
+        key = "done" if task.get("status") == "completed" else "pending"
+        rollup["tasks"][key] += 1
+    return rollup
+
+
+def rebuild_state_rollups(state: Dict[str, Any]) -> None:
+    """task별 rollup과 request rollup을 다시 계산하여 state에 기록"""
+    for task in state.get("tasks", {}).values():
+        task["rollup"] = compute_task_rollup(task)
+    state["rollup"] = compute_state_rollup(state)
+
+
+def verify_state_rollups(state: Dict[str, Any]) -> List[str]:
+    """
+    유지 중인 rollup과 실제 개수 비교
+
+    Returns:
+        불일치 설명 목록 (비어 있으면 정상)
+    """
+    problems = []
+    for task_id, task in state.get("tasks", {}).items():
+        expected = compute_task_rollup(task)
+        if task.get("rollup") != expected:
+            problems.append(f"{task_id}: rollup {task.get('rollup')} != {expected}")
+
+    expected = compute_state_rollup(state)
+    if state.get("rollup") != expected:
+        problems.append(f"request: rollup {state.get('rollup')} != {expected}")
+    return problems
+
+
+def _shift_rollup(counts: Optional[Dict[str, int]]) -> None:
+    """pending 1개를 done으로 이동 (rollup이 없으면 무시)"""
+    if counts:
+        counts["pending"] -= 1
+        counts["done"] += 1
+
+
+def get_current_work(state: Dict[str, Any]) -> Dict[str, str]:
+    """현재 진행 중인 작업 정보 추출"""
+    request = state.get("request", {})
+    current_task_id = request.get("current_task")
+
+    if not current_task_id:
+        return {}
+
+    task = state.get("tasks", {}).get(current_task_id, {})
+    return get_subtask_work(state, current_task_id, task.get("current_subtask"))
+
+
+def get_subtask_work(state: Dict[str, Any], task_id: str, subtask_id: Optional[str]) -> Dict[str, str]:
+    """지정한 Task/Subtask의 작업 정보 (get_current_work와 같은 형태)"""
+    request = state.get("request", {})
+    task = state.get("tasks", {}).get(task_id, {})
+    subtask = task.get("subtasks", {}).get(subtask_id, {}) if subtask_id else {}
+
+    return {
         "request": request.get("original_request", ""),
         "request_id": request.get("id", ""),
         "global_phase": request.get("global_phase", ""),
-        "task_id": current_task_id,
+        "task_id": task_id,
         "task_name": task.get("name", ""),
-        "subtask_id": current_subtask_id or "",
+        "task_objective": task.get("objective", ""),
+        "subtask_id": subtask_id or "",
         "subtask_name": subtask.get("name", ""),
+        "subtask_description": subtask.get("description", ""),
         "phase": subtask.get("phase", ""),
     }
 
 
-def is_contract_file(file_path: str) -> bool:
-    """Contract 파일 여부 확인"""
-    contract_patterns = [
-        "explored.yaml",
-        "task-breakdown.yaml",
-        "design-brief.yaml",
-        "design-contract.yaml",
-        "test-contract.yaml",
-        "test-result.yaml",
+def build_state_summary(state: Dict[str, Any]) -> Dict[str, Any]:
+    """state에서 읽기 전용 훅이 필요로 하는 고정 형태 요약 생성"""
+    request = state.get("request", {})
+    return {
+        "status": request.get("status"),
+        "global_phase": request.get("global_phase"),
+        "claude_session_id": request.get("claude_session_id"),
+        "current_work": get_current_work(state),
+        "pending_subtasks": count_pending_subtasks(state),
+        "pending_tasks": count_pending_tasks(state),
+        **build_in_flight_summary(state),
+    }
+
+
+def build_in_flight_summary(state: Dict[str, Any]) -> Dict[str, Any]:
+    """depends_on 스케줄링일 때 요약에 넣는 진행 중 subtask 목록 (순차 진행이면 빈 dict)"""
+    if not is_dag_scheduling(state):
+        return {}
+    return {
+        "scheduling": "dag",
+        "in_flight": [
+            {key: work[key] for key in ("task_id", "subtask_id", "subtask_name", "phase")}
+            for work in get_in_flight_work(state)
+        ],
+    }
+
+
+def write_state_summary(project_hash: str, state: Dict[str, Any]) -> None:
+    """
+    summary.json 기록 (state 잠금 구간 안에서 커밋 직후 호출)
+
+    state.json/events.jsonl에서 언제든 다시 만들 수 있으므로 fsync하지 않는다.
+    """
+    try:
+        atomic_write_text(
+            get_summary_path(project_hash),
+            json.dumps(build_state_summary(state), ensure_ascii=False),
+            durable=False,
+        )
+    except IOError:
+        pass
+
+
+def _load_state_summary(project_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    summary.json 로드
+
+    state.json 또는 events.jsonl이 summary.json보다 나중에 수정되었으면
+    (커밋 도중 중단 등) 오래된 요약으로 보고 None을 반환한다.
+    """
+    summary_path = get_summary_path(project_hash)
+    try:
+        summary_mtime = summary_path.stat().st_mtime_ns
+        for source in (get_state_path(project_hash), get_journal_path(project_hash)):
+            try:
+                if source.stat().st_mtime_ns > summary_mtime:
+                    return None
+            except FileNotFoundError:
+                continue
+        return json.loads(summary_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def get_state_overview(project_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    읽기 전용 훅용 상태 요약
+
+    Returns:
+        {"status", "global_phase", "claude_session_id", "current_work",
+         "pending_subtasks", "pending_tasks"}, 세션이 없으면 None.
+        depends_on 스케줄링이면 "scheduling": "dag"와 진행 중 subtask 목록 "in_flight"가 추가된다.
+        file 백엔드는 summary.json을, sqlite 백엔드는 인덱스 조회를 사용하며
+        둘 다 불가능하면 전체 state를 로드하여 계산한다.
+    """
+    if is_sqlite_backend():
+        overview = get_sqlite_store().query_overview(get_sqlite_connection(), project_hash)
+    else:
+        overview = _load_state_summary(project_hash)
+    if overview is not None:
+        return overview
+
+    state = load_state(project_hash)
+    if not state:
+        return None
+    return build_state_summary(state)
+
+
+# =============================================================================
+# 컨텍스트 주입 기록 (UserPromptSubmit delta)
+# =============================================================================
+#
+# 같은 Claude Code 세션의 프롬프트마다 전체 재개 메시지(진행 트리 포함)를 넣는 대신,
+# 마지막으로 주입한 상태 view를 sessions/{hash}/injected.json에 기록해 두고
+# 바뀐 항목만(delta) 또는 변화 없음 한 줄만 주입한다.
+# PreCompact / SessionStart는 기록을 지워 다음 프롬프트에서 전체 메시지를 다시 주입한다.
+
+def get_context_injection_mode() -> str:
+    """UserPromptSubmit 컨텍스트 주입 방식 (delta | full)"""
+    mode = load_orchestrator_config().get("orchestration", {}).get("context_injection", "delta")
+    return mode if mode in ("delta", "full") else "delta"
+
+
+def get_injected_context_path(project_hash: str) -> Path:
+    """injected.json (마지막으로 주입한 상태 view) 경로"""
+    return get_sessions_path(project_hash) / "injected.json"
+
+
+def build_context_view(overview: Dict[str, Any]) -> Dict[str, Any]:
+    """주입 여부를 판단하는 상태 view (get_state_overview 결과에서 생성)"""
+    current_work = overview.get("current_work") or {}
+    return {
+        "global_phase": current_work.get("global_phase") or overview.get("global_phase"),
+        "task_id": current_work.get("task_id"),
+        "subtask_id": current_work.get("subtask_id"),
+        "phase": current_work.get("phase"),
+        "pending_tasks": overview.get("pending_tasks"),
+        "pending_subtasks": overview.get("pending_subtasks"),
+        **({"in_flight": format_in_flight_ids(overview["in_flight"])} if "in_flight" in overview else {}),
+    }
+
+
+def format_in_flight_ids(in_flight: List[Dict[str, Any]]) -> str:
+    """진행 중 subtask 목록 한 줄 ("T1-S2 (implementation), T2-S1 (test_first)")"""
+    return ", ".join(
+        f"{work.get('subtask_id')} ({work.get('phase') or 'design'})" for work in in_flight
+    )
+
+
+def get_context_view_hash(view: Dict[str, Any]) -> str:
+    """상태 view 해시"""
+    encoded = json.dumps(view, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+def load_injected_context(project_hash: str, session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """현재 Claude Code 세션에 마지막으로 주입한 기록 {"session_id", "hash", "view"} (없으면 None)"""
+    try:
+        record = json.loads(get_injected_context_path(project_hash).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(record, dict) or not session_id or record.get("session_id") != session_id:
+        return None
+    return record
+
+
+def save_injected_context(project_hash: str, session_id: Optional[str], view: Dict[str, Any]) -> None:
+    """주입한 상태 view 기록 (잃어버려도 다음 프롬프트가 전체 메시지를 넣을 뿐이므로 fsync하지 않음)"""
+    if not session_id:
+        return
+    record = {"session_id": session_id, "hash": get_context_view_hash(view), "view": view}
+    try:
+        atomic_write_text(get_injected_context_path(project_hash), json.dumps(record, ensure_ascii=False), durable=False)
+    except IOError:
+        pass
+
+
+def reset_injected_context(project_hash: str) -> None:
+    """주입 기록 삭제 (다음 프롬프트에서 전체 메시지 주입)"""
+    try:
+        get_injected_context_path(project_hash).unlink()
+    except OSError:
+        pass
+
+
+def describe_context_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """두 상태 view의 차이를 사람이 읽는 줄 목록으로 변환"""
+    labels = [
+        ("global_phase", "Global Phase"),
+        ("task_id", "Task"),
+        ("subtask_id", "Subtask"),
+        ("phase", "Subtask Phase"),
+        ("pending_tasks", "Remaining Tasks"),
+        ("pending_subtasks", "Remaining Subtasks"),
+        ("in_flight", "In Flight"),
+    ]
+    def shown(value: Any) -> Any:
+        return "N/A" if value in (None, "") else value
+
+    return [
+        f"- {label}: {shown(previous.get(key))} → {shown(current.get(key))}"
+        for key, label in labels
+        if previous.get(key) != current.get(key)
+    ]
+
+
+def is_contract_file(file_path: str) -> bool:
+    """Contract 파일 여부 확인"""
+    contract_patterns = [
+        "explored.yaml",
+        "task-breakdown.yaml",
+        "design-brief.yaml",
+        "design-contract.yaml",
+        "test-contract.yaml",
+        "test-result.yaml",
+    ]
+    return any(pattern in file_path for pattern in contract_patterns)
+
+
+def get_status_icon(status: str) -> str:
+    """상태에 따른 아이콘 반환"""
+    icons = {
+        "completed": "[v]",
+        "in_progress": "[>]",
+        "pending": "[ ]",
+        "failed": "[x]",
+        "active": "[>]",
+    }
+    return icons.get(status, "[ ]")
+
+
+# 진행 트리 출력 예산 (progress_tree 설정)
+DEFAULT_PROGRESS_MAX_LINES = 40
+DEFAULT_PROGRESS_MAX_BYTES = 4096
+DEFAULT_PROGRESS_LOOKAHEAD = 1
+
+# 현재 Task의 subtask를 줄일 때 현재 subtask 뒤로 보여주는 개수
+PROGRESS_SUBTASK_WINDOW = 3
+
+# (request 생성 시각, state revision, 예산) → 렌더링 결과
+_PROGRESS_TREE_CACHE: Dict[Tuple[Any, ...], str] = {}
+_PROGRESS_TREE_CACHE_SIZE = 8
+
+
+def get_progress_tree_config() -> Dict[str, Any]:
+    """진행 트리 출력 예산 설정 (max_lines, max_bytes, lookahead)"""
+    config = load_orchestrator_config()
+    return config.get("progress_tree", {}) or {}
+
+
+def get_state_revision(state: Dict[str, Any]) -> int:
+    """state 변경 번호 (apply_state_event마다, 이벤트 없는 snapshot 저장마다 증가)"""
+    return int(state.get("revision", 0))
+
+
+def _progress_subtask_line(subtask_id: str, subtask: Dict[str, Any], current_subtask_id: Optional[str]) -> str:
+    """subtask 한 줄 (트리 prefix 제외)"""
+    sub_status = get_status_icon(subtask.get("status"))
+    sub_current = " <- current" if subtask_id == current_subtask_id else ""
+    phase_info = f" ({subtask.get('phase', '')})" if subtask.get("phase") else ""
+    return f"{subtask_id} {subtask.get('name', '')} {sub_status}{phase_info}{sub_current}"
+
+
+def _progress_run_line(ids: List[str], status: str, unit: str, subtask_count: Optional[int] = None) -> str:
+    """연속된 같은 상태 항목을 접은 한 줄 (트리 prefix 제외)"""
+    label = "completed" if status == "completed" else "pending"
+    subtasks = f" ({subtask_count} subtasks)" if subtask_count is not None else ""
+    return f"{ids[0]} ~ {ids[-1]} {get_status_icon(status)} {len(ids)} {unit} {label}{subtasks}"
+
+
+def _window_subtasks(task: Dict[str, Any], window: Optional[int]) -> List[str]:
+    """
+    Task의 subtask 줄 목록
+
+    window가 None이면 전부, 아니면 완료된 앞부분과 현재 subtask 뒤 window개 이후의
+    대기 subtask를 각각 한 줄로 접는다.
+    """
+    subtask_order = task.get("subtask_order", [])
+    subtasks = task.get("subtasks", {})
+    current_subtask_id = task.get("current_subtask")
+    lines = []
+
+    if window is None:
+        for subtask_id in subtask_order:
+            lines.append(_progress_subtask_line(subtask_id, subtasks.get(subtask_id, {}), current_subtask_id))
+        return lines
+
+    if current_subtask_id in subtask_order:
+        anchor = subtask_order.index(current_subtask_id)
+    else:
+        anchor = next(
+            (i for i, sid in enumerate(subtask_order) if subtasks.get(sid, {}).get("status") != "completed"),
+            len(subtask_order),
+        )
+    head = subtask_order[:anchor]
+    tail = subtask_order[anchor + 1 + window:]
+    if head and all(subtasks.get(sid, {}).get("status") == "completed" for sid in head) and len(head) > 1:
+        lines.append(_progress_run_line(head, "completed", "subtasks"))
+    else:
+        lines.extend(_progress_subtask_line(sid, subtasks.get(sid, {}), current_subtask_id) for sid in head)
+    for subtask_id in subtask_order[anchor:anchor + 1 + window]:
+        lines.append(_progress_subtask_line(subtask_id, subtasks.get(subtask_id, {}), current_subtask_id))
+    if len(tail) > 1:
+        lines.append(_progress_run_line(tail, "pending", "subtasks"))
+    else:
+        lines.extend(_progress_subtask_line(sid, subtasks.get(sid, {}), current_subtask_id) for sid in tail)
+    return lines
+
+
+def _render_progress_entries(entries: List[Tuple[str, List[str]]]) -> List[str]:
+    """(Task 줄, subtask 줄 목록) 항목을 트리 prefix와 함께 출력"""
+    lines = []
+    for i, (head, children) in enumerate(entries):
+        is_last_task = i == len(entries) - 1
+        lines.append(f"{'`-' if is_last_task else '|-'} {head}")
+        for j, child in enumerate(children):
+            is_last_subtask = j == len(children) - 1
+            if is_last_task:
+                sub_prefix = "   `-" if is_last_subtask else "   |-"
+            else:
+                sub_prefix = "|  `-" if is_last_subtask else "|  |-"
+            lines.append(f"{sub_prefix} {child}")
+    return lines
+
+
+def _progress_entries(state: Dict[str, Any], lookahead: Optional[int],
+                      subtask_window: Optional[int]) -> List[Tuple[str, List[str]]]:
+    """
+    진행 트리 항목 구성
+
+    lookahead가 None이면 모든 Task를 펼친다. 아니면 현재 Task와 그 뒤 lookahead개의
+    미완료 Task만 펼치고, 나머지 연속된 완료/대기 Task는 한 줄씩으로 접는다.
+    """
+    task_order = state.get("task_order", [])
+    tasks = state.get("tasks", {})
+    current_task_id = state.get("request", {}).get("current_task")
+
+    def task_head(task_id: str, collapsed: bool) -> str:
+        task = tasks.get(task_id, {})
+        status_icon = get_status_icon(task.get("status"))
+        current_marker = " <- current" if task_id == current_task_id else ""
+        counts = ""
+        if collapsed and task.get("subtasks"):
+            rollup = task.get("rollup") or compute_task_rollup(task)
+            counts = f" ({rollup['done']}/{rollup['done'] + rollup['pending']})"
+        return f"{task_id} {task.get('name', '')} {status_icon}{counts}{current_marker}"
+
+    if lookahead is None:
+        return [(task_head(task_id, False), _window_subtasks(tasks.get(task_id, {}), None)) for task_id in task_order]
+
+    # 펼칠 Task: 현재 Task(없으면 첫 미완료 Task)와 그 뒤 미완료 Task lookahead개
+    is_done = {task_id: tasks.get(task_id, {}).get("status") == "completed" for task_id in task_order}
+    if current_task_id in is_done:
+        anchor = task_order.index(current_task_id)
+    else:
+        anchor = next((i for i, task_id in enumerate(task_order) if not is_done[task_id]), len(task_order))
+    expanded = set(task_order[anchor:anchor + 1])
+    for task_id in task_order[anchor + 1:]:
+        if len(expanded) > lookahead:
+            break
+        if not is_done[task_id]:
+            expanded.add(task_id)
+
+    def run_kind(task_id: str) -> Optional[str]:
+        # 완료 / 대기 Task만 접고, 진행 중·실패 Task는 한 줄씩 표시
+        if is_done[task_id]:
+            return "completed"
+        return "pending" if tasks.get(task_id, {}).get("status") in (None, "pending") else None
+
+    entries: List[Tuple[str, List[str]]] = []
+    run: List[str] = []
+
+    def flush_run() -> None:
+        if len(run) > 1:
+            subtask_count = sum(len(tasks.get(task_id, {}).get("subtasks", {})) for task_id in run)
+            entries.append((_progress_run_line(run, run_kind(run[0]), "tasks", subtask_count), []))
+        elif run:
+            entries.append((task_head(run[0], True), []))
+        run.clear()
+
+    for task_id in task_order:
+        if task_id in expanded:
+            flush_run()
+            entries.append((task_head(task_id, False), _window_subtasks(tasks.get(task_id, {}), subtask_window)))
+            continue
+        kind = run_kind(task_id)
+        if run and (kind is None or kind != run_kind(run[0])):
+            flush_run()
+        run.append(task_id)
+        if kind is None:
+            flush_run()
+    flush_run()
+    return entries
+
+
+def _fits_progress_budget(lines: List[str], max_lines: int, max_bytes: int) -> bool:
+    """출력 줄 수/바이트 예산 이내인지"""
+    return len(lines) <= max_lines and len("\n".join(lines).encode("utf-8")) <= max_bytes
+
+
+def render_progress_tree(state: Dict[str, Any], max_lines: int, max_bytes: int, lookahead: int) -> str:
+    """
+    예산 안의 진행 트리
+
+    전체 트리가 예산 안이면 그대로 출력한다. 넘으면 완료/대기 Task를 접고 현재 Task와
+    lookahead 범위만 펼치며, 그래도 넘으면 lookahead를 줄이고 현재 Task의 subtask도
+    현재 위치 주변만 남긴다. 마지막으로 줄 수/바이트 기준으로 잘라낸다.
+    """
+    tasks = state.get("tasks", {})
+    full_line_count = sum(1 + len(tasks.get(task_id, {}).get("subtask_order", [])) for task_id in state.get("task_order", []))
+    if full_line_count <= max_lines:
+        lines = _render_progress_entries(_progress_entries(state, None, None))
+        if _fits_progress_budget(lines, max_lines, max_bytes):
+            return "\n".join(lines)
+
+    for window_lookahead in range(max(0, lookahead), -1, -1):
+        for subtask_window in (None, PROGRESS_SUBTASK_WINDOW, 0):
+            lines = _render_progress_entries(_progress_entries(state, window_lookahead, subtask_window))
+            if _fits_progress_budget(lines, max_lines, max_bytes):
+                return "\n".join(lines)
+
+    # 최소 형태도 넘으면 잘라내고 생략한 줄 수 표시
+    total = len(lines)
+    kept: List[str] = []
+    size = 0
+    for line in lines:
+        line_size = len(line.encode("utf-8")) + 1
+        if len(kept) + 1 >= max_lines or size + line_size + 32 > max_bytes:
+            break
+        kept.append(line)
+        size += line_size
+    kept.append(f"... ({total - len(kept)} more lines)")
+    return "\n".join(kept)
+
+
+def format_progress_tree(state: Dict[str, Any]) -> str:
+    """
+    진행 상황 트리 형식으로 포맷 (progress_tree.max_lines / max_bytes 예산)
+
+    결과는 (request 생성 시각, state revision, 예산)으로 memoize하므로 같은 상태를
+    여러 번 출력해도 다시 계산하지 않는다 (데몬 모드에서는 훅 호출 간에도 재사용).
+    """
+    config = get_progress_tree_config()
+    max_lines = int(config.get("max_lines", DEFAULT_PROGRESS_MAX_LINES))
+    max_bytes = int(config.get("max_bytes", DEFAULT_PROGRESS_MAX_BYTES))
+    lookahead = int(config.get("lookahead", DEFAULT_PROGRESS_LOOKAHEAD))
+
+    revision = get_state_revision(state)
+    key = (state.get("request", {}).get("created_at"), revision, max_lines, max_bytes, lookahead)
+    if revision:
+        cached = _PROGRESS_TREE_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+    tree = render_progress_tree(state, max_lines, max_bytes, lookahead)
+    if revision:
+        if len(_PROGRESS_TREE_CACHE) >= _PROGRESS_TREE_CACHE_SIZE:
+            _PROGRESS_TREE_CACHE.pop(next(iter(_PROGRESS_TREE_CACHE)))
+        _PROGRESS_TREE_CACHE[key] = tree
+    return tree
+
+
+def format_knowledge_summary(knowledge: Dict[str, Any], max_items: int = 3) -> str:
+    """knowledge.yaml 요약 포맷 (knowledge 전체 또는 build_knowledge_summary 결과)"""
+    lines = []
+
+    patterns = knowledge.get("patterns", {})
+    if patterns:
+        if patterns.get("architecture"):
+            lines.append(f"- Architecture: {patterns['architecture']}")
+        if patterns.get("testing"):
+            lines.append(f"- Testing: {patterns['testing']}")
+        if patterns.get("error_handling"):
+            lines.append(f"- Error handling: {patterns['error_handling']}")
+
+    pitfalls = knowledge.get("pitfalls", [])
+    if pitfalls:
+        lines.append(f"- Pitfalls: {knowledge.get('pitfall_count', len(pitfalls))} items")
+        for p in pitfalls[:max_items]:
+            desc = p.get("description", "")[:50]
+            lines.append(f"  * {desc}")
+
+    decision_count = knowledge.get("decision_count", len(knowledge.get("decisions", [])))
+    if decision_count:
+        lines.append(f"- Decisions: {decision_count} items")
+
+    return "\n".join(lines) if lines else "No knowledge recorded yet"
+
+
+def read_stdin_json() -> Dict[str, Any]:
+    """stdin에서 JSON 입력 읽기"""
+    try:
+        input_text = sys.stdin.read()
+        if not input_text.strip():
+            return {}
+        return json.loads(input_text)
+    except (json.JSONDecodeError, IOError):
+        return {}
+
+
+def output_json(data: Dict[str, Any]) -> None:
+    """JSON 출력"""
+    print(json.dumps(data, ensure_ascii=False))
+
+
+def output_result(message: str, hook_event: str = "UserPromptSubmit") -> None:
+    """Claude 컨텍스트에 메시지 주입 (Claude Code 공식 형식)"""
+    output = {
+        "hookSpecificOutput": {
+            "hookEventName": hook_event,
+            "additionalContext": message
+        }
+    }
+    print(json.dumps(output, ensure_ascii=False))
+
+
+def log_orchestrator(message: str) -> None:
+    """오케스트레이션 진행 상황을 stderr로 출력 (사용자에게 보임)"""
+    print(f"[Orchestrator] {message}", file=sys.stderr)
+
+
+def get_timestamp() -> str:
+    """현재 시각 ISO 8601 형식"""
+    return datetime.utcnow().isoformat() + "Z"
+
+
+def check_yaml_available() -> bool:
+    """PyYAML 사용 가능 여부"""
+    return get_yaml() is not None
+
+
+# =============================================================================
+# 컨텍스트 메시지 토큰 예산 (context_budget 설정)
+# =============================================================================
+#
+# 훅이 additionalContext로 주입하는 메시지를 section 목록으로 조립한다.
+# section = {"text", "priority", "compact", "required"} (context_section으로 생성)
+#   priority: 작을수록 중요 (CONTEXT_PRIORITY_*)
+#   compact:  예산을 넘을 때 대신 쓸 짧은 텍스트 (없으면 압축 없이 제외 대상)
+#   required: 제외하지 않는 section (현재 작업, 다음 행동). 그래도 넘치면 잘라낸다.
+#
+# 예산 안이면 section을 그대로 이어 붙이므로 이전 메시지와 같다.
+
+CONTEXT_PRIORITY_CURRENT_WORK = 0
+CONTEXT_PRIORITY_NEXT_ACTION = 1
+CONTEXT_PRIORITY_PROGRESS = 2
+CONTEXT_PRIORITY_KNOWLEDGE = 3
+
+DEFAULT_CONTEXT_MAX_TOKENS = 2000
+
+# 예산을 넘을 때 진행 트리/knowledge를 줄이는 크기
+COMPACT_PROGRESS_MAX_LINES = 8
+COMPACT_PROGRESS_MAX_BYTES = 1024
+COMPACT_KNOWLEDGE_ITEMS = 2
+
+CONTEXT_TRUNCATED_MARK = "... (생략)"
+
+
+def get_context_budget(hook_event: Optional[str] = None) -> int:
+    """훅별 컨텍스트 토큰 예산 (context_budget.per_hook > context_budget.max_tokens)"""
+    config = load_orchestrator_config().get("context_budget", {}) or {}
+    per_hook = config.get("per_hook", {}) or {}
+    if hook_event and hook_event in per_hook:
+        return int(per_hook[hook_event])
+    return int(config.get("max_tokens", DEFAULT_CONTEXT_MAX_TOKENS))
+
+
+def estimate_tokens(text: str) -> int:
+    """토큰 수 근사치 (ASCII 4자당 1토큰, 한글 등 그 외 문자는 1자당 1토큰)"""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def context_section(text: str, priority: int, compact: Optional[str] = None,
+                    required: bool = False) -> Dict[str, Any]:
+    """build_context_message에 넘길 section"""
+    return {"text": text, "priority": priority, "compact": compact, "required": required}
+
+
+def format_progress_tree_compact(state: Dict[str, Any]) -> str:
+    """예산 초과 시 쓰는 짧은 진행 트리 (현재 Task 주변만, lookahead 없음)"""
+    return render_progress_tree(state, COMPACT_PROGRESS_MAX_LINES, COMPACT_PROGRESS_MAX_BYTES, 0)
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """토큰 근사치가 max_tokens 이하가 되도록 뒤쪽 줄부터 잘라냄"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens("\n" + CONTEXT_TRUNCATED_MARK)
+    kept: List[str] = []
+    used = 0
+    for line in text.split("\n"):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            # 긴 줄은 남은 예산만큼 앞부분을 남김 (문자당 최대 1토큰)
+            if budget - used > 1:
+                kept.append(line[:budget - used - 1])
+            break
+        kept.append(line)
+        used += cost
+    kept.append(CONTEXT_TRUNCATED_MARK)
+    return "\n".join(kept)
+
+
+def build_context_message(header: str, sections: List[Dict[str, Any]],
+                          hook_event: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+    """
+    header와 section들을 빈 줄로 이어 붙인 메시지 (토큰 예산 적용)
+
+    예산을 넘으면 priority가 낮은 section부터 compact로 바꾸고, 그래도 넘으면
+    required가 아닌 section을 낮은 priority부터 제외한다. required section만으로도
+    넘으면 남은 예산을 section들에 고르게 나눠 긴 section을 잘라낸다.
+    section 순서는 바뀌지 않는다.
+    """
+    if max_tokens is None:
+        max_tokens = get_context_budget(hook_event)
+
+    texts = [section["text"] for section in sections]
+
+    def total() -> int:
+        return estimate_tokens("\n\n".join([header] + [text for text in texts if text]))
+
+    if total() <= max_tokens:
+        return "\n\n".join([header] + [text for text in texts if text])
+
+    # priority가 낮은(숫자가 큰) section부터, 같으면 뒤쪽 section부터
+    by_priority = sorted(range(len(sections)), key=lambda i: (sections[i]["priority"], i), reverse=True)
+
+    for i in by_priority:
+        if sections[i].get("compact") is not None and texts[i]:
+            texts[i] = sections[i]["compact"]
+            if total() <= max_tokens:
+                break
+
+    for i in by_priority:
+        if total() <= max_tokens:
+            break
+        if not sections[i].get("required"):
+            texts[i] = ""
+
+    if total() > max_tokens:
+        # 짧은 section은 그대로 두고, 남은 예산을 긴 section들에 고르게 나눠 잘라냄
+        kept = [i for i, text in enumerate(texts) if text]
+        available = max_tokens - estimate_tokens(header) - len(kept)
+        for n, i in enumerate(sorted(kept, key=lambda i: estimate_tokens(texts[i]))):
+            texts[i] = _truncate_to_tokens(texts[i], available // (len(kept) - n))
+            available -= estimate_tokens(texts[i])
+
+    return "\n\n".join([header] + [text for text in texts if text])
+
+
+# =============================================================================
+# Contract 파싱 / knowledge 추출
+# =============================================================================
+#
+# 에이전트 문서의 Contract 형식은 내용을 최상위 key(design_contract: / test_result: ...)
+# 아래에 둔다. 최상위에 바로 필드를 쓴 파일도 같은 결과가 나오도록 감싼 key를 벗겨서 읽는다.
+
+CONTRACT_ROOT_KEYS = {
+    "design-contract.yaml": "design_contract",
+    "test-contract.yaml": "test_contract",
+    "test-result.yaml": "test_result",
+    "design-brief.yaml": "design_brief",
+}
+
+
+def unwrap_contract(content: Any, file_name: str) -> Dict[str, Any]:
+    """Contract 최상위 key(design_contract 등) 아래 내용 반환 (없으면 그대로)"""
+    if not isinstance(content, dict):
+        return {}
+    root_key = CONTRACT_ROOT_KEYS.get(file_name)
+    inner = content.get(root_key) if root_key else None
+    return inner if isinstance(inner, dict) else content
+
+
+# 파싱 결과 캐시 (contract 경로, mtime_ns, size 기준)
+#   프로세스 내: 절대 경로 → ((mtime_ns, size), 내용)
+#   훅 간: sessions/{hash}/contract-cache.json
+#          {"version": 2, "entries": {절대 경로: [[mtime_ns, size], 내용]}} (삽입 순서 = 오래된 순)
+#          프로젝트 작업 트리 안에 있으므로 pickle이 아닌 JSON으로 저장한다 (받아 온 저장소의
+#          파일을 읽어도 코드가 실행되지 않음). JSON으로 그대로 왕복되지 않는 내용(날짜 등)은 저장하지 않는다.
+CONTRACT_CACHE_VERSION = 2
+CONTRACT_CACHE_MAX_ENTRIES = 256
+
+_CONTRACT_CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+# 디스크 캐시 경로 → entries (프로세스당 한 번 로드)
+_CONTRACT_DISK_CACHE: Dict[str, Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]]] = {}
+
+
+def get_contract_cache_path(file_path: str) -> Optional[Path]:
+    """contract가 속한 세션의 파싱 캐시 경로 (sessions/{hash}/contracts/ 밖이면 None)"""
+    parts = Path(file_path).parts
+    if "contracts" not in parts:
+        return None
+    index = len(parts) - 1 - parts[::-1].index("contracts")
+    return Path(*parts[:index]) / "contract-cache.json"
+
+
+def _load_contract_disk_cache(cache_path: Path) -> Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]]:
+    """디스크 파싱 캐시 entries (없거나 버전/형식이 다르면 빈 dict)"""
+    entries = _CONTRACT_DISK_CACHE.get(str(cache_path))
+    if entries is not None:
+        return entries
+    entries = {}
+    try:
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        if isinstance(cache, dict) and cache.get("version") == CONTRACT_CACHE_VERSION:
+            for file_path, (key, content) in cache["entries"].items():
+                mtime_ns, size = key
+                if isinstance(content, dict):
+                    entries[file_path] = ((int(mtime_ns), int(size)), content)
+    except Exception:
+        entries = {}
+    _CONTRACT_DISK_CACHE[str(cache_path)] = entries
+    return entries
+
+
+def _is_json_roundtrip(content: Dict[str, Any]) -> bool:
+    """JSON으로 저장했다 읽어도 같은 내용인지 (날짜, 숫자 key 등은 False)"""
+    try:
+        return json.loads(json.dumps(content, ensure_ascii=False)) == content
+    except (TypeError, ValueError):
+        return False
+
+
+def _save_contract_disk_cache(cache_path: Path, entries: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]]) -> None:
+    """디스크 파싱 캐시 저장 (오래된 항목부터 CONTRACT_CACHE_MAX_ENTRIES개 초과분 제거, 실패 시 무시)"""
+    for file_path in list(itertools.islice(entries, max(len(entries) - CONTRACT_CACHE_MAX_ENTRIES, 0))):
+        del entries[file_path]
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": CONTRACT_CACHE_VERSION,
+                "entries": {file_path: [list(key), content] for file_path, (key, content) in entries.items()},
+            }, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+
+
+def load_contract(file_path: str, persist: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Contract YAML 로드 (감싼 key 제거, 읽기/파싱 실패 시 None)
+
+    (경로, mtime_ns, size)당 한 번만 파싱한다. 결과는 프로세스 내 캐시와
+    sessions/{hash}/contract-cache.json에서 재사용하므로 호출자는 수정하지 않는다.
+    persist=False면 디스크 캐시를 읽기만 한다 (한꺼번에 많이 읽는 knowledge 추출용).
+    """
+    path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _CONTRACT_CACHE.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    cache_path = get_contract_cache_path(path)
+    entries = _load_contract_disk_cache(cache_path) if cache_path else {}
+    cached = entries.get(path)
+    if cached is not None and cached[0] == key:
+        _CONTRACT_CACHE[path] = cached
+        return cached[1]
+
+    if get_yaml() is None:
+        return None
+    try:
+        content = yaml_safe_load(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    content = unwrap_contract(content, os.path.basename(path))
+
+    if len(_CONTRACT_CACHE) >= CONTRACT_CACHE_MAX_ENTRIES:
+        _CONTRACT_CACHE.pop(next(iter(_CONTRACT_CACHE)))
+    _CONTRACT_CACHE[path] = (key, content)
+    if cache_path and persist and cache_path.parent.is_dir() and _is_json_roundtrip(content):
+        entries.pop(path, None)
+        entries[path] = (key, content)
+        _save_contract_disk_cache(cache_path, entries)
+    return content
+
+
+def extract_contract_decisions(content: Dict[str, Any], file_path: str) -> List[Dict[str, Any]]:
+    """design-contract 내용에서 설계 결정 추출 (invariants, 허용되지 않은 의존성 boundaries)"""
+    decisions = []
+    created_at = get_timestamp()[:10]  # YYYY-MM-DD
+
+    # invariants를 decisions로 변환
+    for inv in content.get("invariants") or []:
+        if not isinstance(inv, dict):
+            continue
+        decisions.append({
+            "id": inv.get("id", ""),
+            "topic": inv.get("id", ""),
+            "decision": inv.get("rule", ""),
+            "rationale": "Design invariant",
+            "refs": [file_path],
+            "created_at": created_at,
+        })
+
+    # 금지된 의존 방향은 이후 Task에서도 지켜야 하는 결정으로 보관
+    for boundary in content.get("boundaries") or []:
+        if not isinstance(boundary, dict) or boundary.get("allowed", True) is not False:
+            continue
+        source, target = boundary.get("from", ""), boundary.get("to", "")
+        if not source or not target:
+            continue
+        decisions.append({
+            "id": f"BND-{source}->{target}",
+            "topic": "boundary",
+            "decision": f"{source} must not depend on {target}",
+            "rationale": boundary.get("note") or "Design boundary",
+            "refs": [file_path],
+            "created_at": created_at,
+        })
+
+    return decisions
+
+
+def extract_contract_pitfalls(content: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """test-result 내용의 실패 케이스에서 pitfalls 추출"""
+    execution = content.get("execution") or {}
+    if not isinstance(execution, dict) or execution.get("result") != "fail":
+        return []
+
+    pitfalls = []
+    subtask_id = content.get("subtask_id", "")
+    for failed in content.get("failed_tests") or []:
+        if not isinstance(failed, dict):
+            continue
+        pitfalls.append({
+            "description": f"{failed.get('name', '')}: {failed.get('reason', '')}",
+            "reason": failed.get("suggestion") or failed.get("category") or "Test failure analysis needed",
+            "learned_from": subtask_id,
+        })
+    return pitfalls
+
+
+# =============================================================================
+# Contract manifest
+# =============================================================================
+
+# sessions/{hash}/contract-manifest.json:
+#   {"version": 1, "contracts": {"R1/T1/T1-S1/test-contract.yaml": {
+#       "level": "subtask", "request_id": "R1", "task_id": "T1", "subtask_id": "T1-S1",
+#       "mtime_ns": ..., "size": ..., "hash": blake2b 128bit}}}
+#
+# PostToolUse가 contract Write/Edit마다 항목을 갱신하고, SessionStart에서 contracts
+# 디렉토리를 순회해 다시 만든다 (mtime/size가 같은 파일은 해시 재계산 생략).
+# 존재 확인/게이트 검사는 "{R}/{T}/{S}/{name}" 키 조회로 처리하며, manifest에 없는
+# 경로만 stat하여 (PostToolUse를 거치지 않고 생성된 파일) 있으면 등록한다.
+# sqlite 백엔드는 contracts 테이블이 같은 역할을 한다.
+
+CONTRACT_MANIFEST_VERSION = 1
+
+# 프로세스 내 재사용: manifest 경로 → ((mtime_ns, size), manifest)
+_CONTRACT_MANIFEST_CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+
+def get_contracts_path(project_hash: str) -> Path:
+    """contracts 디렉토리 경로"""
+    return get_sessions_path(project_hash) / "contracts"
+
+
+def get_contract_manifest_path(project_hash: str) -> Path:
+    """contract manifest 경로"""
+    return get_sessions_path(project_hash) / "contract-manifest.json"
+
+
+def get_contract_level(scope: Tuple[str, str, str]) -> str:
+    """scope (request_id, task_id, subtask_id)의 level (request / task / subtask)"""
+    if scope[2]:
+        return "subtask"
+    return "task" if scope[1] else "request"
+
+
+def get_contract_scope(current_work: Dict[str, Any], level: str) -> Optional[Tuple[str, str, str]]:
+    """현재 작업 기준 level의 scope (해당 level의 작업이 없으면 None)"""
+    request_id = current_work.get("request_id", "R1")
+    task_id = current_work.get("task_id", "")
+    subtask_id = current_work.get("subtask_id", "")
+
+    if level == "request":
+        return (request_id, "", "")
+    if level == "task" and task_id:
+        return (request_id, task_id, "")
+    if level == "subtask" and task_id and subtask_id:
+        return (request_id, task_id, subtask_id)
+    return None
+
+
+def get_contract_key(scope: Tuple[str, str, str], name: str) -> str:
+    """manifest 키 ("R1/T1/T1-S1/test-contract.yaml")"""
+    return "/".join([part for part in scope if part] + [name])
+
+
+def parse_contract_path(project_hash: str, file_path: str) -> Optional[Tuple[Tuple[str, str, str], str]]:
+    """contracts/{R}/{T}/{S}/name 경로의 (scope, name). contracts 밖이면 None."""
+    contracts_path = get_contracts_path(project_hash)
+    try:
+        parts = Path(file_path).resolve().relative_to(contracts_path.resolve()).parts
+    except (OSError, ValueError):
+        return None
+    if not 2 <= len(parts) <= 4:
+        return None
+    scope = (list(parts[:-1]) + ["", ""])[:3]
+    return (scope[0], scope[1], scope[2]), parts[-1]
+
+
+def build_contract_entry(path: Path, scope: Tuple[str, str, str],
+                         previous: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    contract 파일의 manifest 항목 (파일이 없으면 None)
+
+    previous와 mtime/size가 같으면 내용 해시를 다시 계산하지 않는다.
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+
+    if previous and previous.get("mtime_ns") == stat.st_mtime_ns and previous.get("size") == stat.st_size:
+        digest = previous.get("hash")
+    else:
+        try:
+            digest = hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+        except OSError:
+            return None
+
+    return {
+        "level": get_contract_level(scope),
+        "request_id": scope[0],
+        "task_id": scope[1],
+        "subtask_id": scope[2],
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": digest,
+    }
+
+
+def _empty_contract_manifest() -> Dict[str, Any]:
+    return {"version": CONTRACT_MANIFEST_VERSION, "contracts": {}}
+
+
+def _save_contract_manifest(project_hash: str, manifest: Dict[str, Any]) -> None:
+    """manifest 기록 (디렉토리 순회로 다시 만들 수 있으므로 fsync 생략)"""
+    path = get_contract_manifest_path(project_hash)
+    atomic_write_text(path, json.dumps(manifest, ensure_ascii=False, separators=(",", ":")), durable=False)
+    try:
+        stat = path.stat()
+        _CONTRACT_MANIFEST_CACHE[str(path)] = ((stat.st_mtime_ns, stat.st_size), manifest)
+    except OSError:
+        pass
+
+
+def get_contract_manifest_lock_path(project_hash: str) -> Path:
+    """manifest read-modify-write 잠금 파일 경로"""
+    path = get_contract_manifest_path(project_hash)
+    return path.with_name(f"{path.name}.lock")
+
+
+def iter_contract_files(project_hash: str) -> Iterator[Tuple[Path, Tuple[str, str, str], str]]:
+    """contracts 디렉토리의 (경로, scope, 이름) - request/task/subtask 깊이의 *.yaml만"""
+    contracts_path = get_contracts_path(project_hash)
+    for dirpath, dirnames, filenames in os.walk(str(contracts_path)):
+        parts = Path(dirpath).relative_to(contracts_path).parts
+        if len(parts) >= 3:
+            dirnames[:] = []
+        if not parts:
+            continue
+        scope = (list(parts) + ["", ""])[:3]
+        for name in filenames:
+            if name.endswith(".yaml"):
+                yield Path(dirpath) / name, (scope[0], scope[1], scope[2]), name
+
+
+def rebuild_contract_manifest(project_hash: str) -> Dict[str, Any]:
+    """contracts 디렉토리를 순회하여 manifest를 다시 만듦 (삭제된 파일 항목 제거)"""
+    if is_sqlite_backend():
+        store = get_sqlite_store()
+        conn = get_sqlite_connection()
+        manifest = _empty_contract_manifest()
+        with store.transaction(conn) as txn:
+            if txn is None:
+                return manifest
+            store.clear_contracts(conn, project_hash)
+            for path, scope, name in iter_contract_files(project_hash):
+                entry = build_contract_entry(path, scope)
+                if entry:
+                    store.register_contract(conn, project_hash, scope, name, path, entry["hash"])
+                    manifest["contracts"][get_contract_key(scope, name)] = entry
+        return manifest
+
+    if not get_contracts_path(project_hash).is_dir():
+        return _empty_contract_manifest()
+
+    try:
+        with file_lock(get_contract_manifest_lock_path(project_hash)) as acquired:
+            previous = _load_contract_manifest_file(project_hash) or _empty_contract_manifest()
+            manifest = _empty_contract_manifest()
+            for path, scope, name in iter_contract_files(project_hash):
+                key = get_contract_key(scope, name)
+                entry = build_contract_entry(path, scope, previous["contracts"].get(key))
+                if entry:
+                    manifest["contracts"][key] = entry
+            # 잠금을 얻지 못하면 이번 호출에서만 사용
+            if acquired:
+                _save_contract_manifest(project_hash, manifest)
+    except (IOError, TypeError, ValueError):
+        manifest = _empty_contract_manifest()
+    return manifest
+
+
+def _load_contract_manifest_file(project_hash: str) -> Optional[Dict[str, Any]]:
+    """manifest 파일 로드 (없거나 형식이 다르면 None, 프로세스 내 (mtime_ns, size) 캐시)"""
+    path = get_contract_manifest_path(project_hash)
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _CONTRACT_MANIFEST_CACHE.get(str(path))
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if (not isinstance(manifest, dict) or manifest.get("version") != CONTRACT_MANIFEST_VERSION
+            or not isinstance(manifest.get("contracts"), dict)):
+        return None
+    _CONTRACT_MANIFEST_CACHE[str(path)] = (key, manifest)
+    return manifest
+
+
+def load_contract_manifest(project_hash: str) -> Dict[str, Any]:
+    """
+    contract manifest (file 백엔드, 없거나 형식이 다르면 디렉토리 순회로 다시 만듦)
+
+    프로세스 내 캐시 원본을 반환하므로 수정하지 않는다.
+    """
+    manifest = _load_contract_manifest_file(project_hash)
+    if manifest is None:
+        manifest = rebuild_contract_manifest(project_hash)
+    return manifest
+
+
+def register_contract_file(project_hash: str, file_path: str) -> None:
+    """
+    Contract 파일을 manifest에 등록/갱신 (sqlite 백엔드는 contracts 테이블)
+
+    contracts/{R}/{T}/{S}/name 경로에서 scope를 추출한다.
+    """
+    parsed = parse_contract_path(project_hash, file_path)
+    if not parsed:
+        return
+    scope, name = parsed
+    path = get_contracts_path(project_hash).joinpath(*[part for part in scope if part], name)
+
+    if is_sqlite_backend():
+        entry = build_contract_entry(path, scope)
+        if entry:
+            get_sqlite_store().register_contract(
+                get_sqlite_connection(), project_hash, scope, name, path, entry["hash"],
+            )
+        return
+
+    try:
+        with file_lock(get_contract_manifest_lock_path(project_hash)) as acquired:
+            if not acquired:
+                return
+            manifest = _load_contract_manifest_file(project_hash)
+            if manifest is None:
+                rebuild_contract_manifest(project_hash)
+                return
+            key = get_contract_key(scope, name)
+            entry = build_contract_entry(path, scope, manifest["contracts"].get(key))
+            contracts = dict(manifest["contracts"])
+            if entry:
+                contracts[key] = entry
+            else:
+                contracts.pop(key, None)
+            _save_contract_manifest(project_hash, {"version": CONTRACT_MANIFEST_VERSION, "contracts": contracts})
+    except (IOError, TypeError, ValueError):
+        pass
+
+
+def find_contract(project_hash: str, scopes: List[Tuple[str, str, str]], name: str) -> Optional[Dict[str, Any]]:
+    """
+    주어진 scope들 중 처음으로 등록된 contract의 manifest 항목
+
+    manifest에 없으면 해당 경로를 stat하여 (PostToolUse를 거치지 않고 생성된 파일) 등록한다.
+    """
+    contracts_path = get_contracts_path(project_hash)
+
+    if is_sqlite_backend():
+        store = get_sqlite_store()
+        conn = get_sqlite_connection()
+        row = store.find_contract(conn, project_hash, scopes, name)
+        if row:
+            scope = (row["request_id"], row["task_id"], row["subtask_id"])
+            return {"level": get_contract_level(scope), **row}
+        for scope in scopes:
+            path = contracts_path.joinpath(*[part for part in scope if part], name)
+            entry = build_contract_entry(path, scope)
+            if entry:
+                store.register_contract(conn, project_hash, scope, name, path, entry["hash"])
+                return entry
+        return None
+
+    contracts = load_contract_manifest(project_hash)["contracts"]
+    for scope in scopes:
+        entry = contracts.get(get_contract_key(scope, name))
+        if entry:
+            return entry
+
+    for scope in scopes:
+        path = contracts_path.joinpath(*[part for part in scope if part], name)
+        if path.is_file():
+            register_contract_file(project_hash, str(path))
+            return load_contract_manifest(project_hash)["contracts"].get(get_contract_key(scope, name)) or {}
+    return None
+
+
+def contract_exists(project_hash: str, scope: Tuple[str, str, str], name: str) -> bool:
+    """scope의 contract 존재 여부 (manifest 조회)"""
+    return find_contract(project_hash, [scope], name) is not None
+
+
+# =============================================================================
+# 게이트 검증 함수
+# =============================================================================
+
+def check_gate(gate_id: str, project_hash: str, current_work: Dict[str, Any]) -> Tuple[bool, str]:
+    """
+    게이트 검증 수행.
+
+    Returns:
+        (passed, message) - 통과 여부와 메시지
+    """
+    gate = get_gate_config(gate_id)
+    if not gate:
+        return True, ""
+
+    message = gate.get("message", f"Gate {gate_id} blocked")
+
+    # Contract 파일 존재 여부 확인
+    contract_name = gate.get("contract")
+    if contract_name:
+        if not check_contract_exists_for_gate(project_hash, current_work, contract_name):
+            return False, message
+
+    # GATE-3, GATE-4는 별도 로직 필요 (현재는 통과 처리)
+    # TODO: 스코프 변경, 설계 불변 조건 검증 로직 구현
+
+    return True, ""
+
+
+def check_contract_exists_for_gate(project_hash: str, current_work: Dict[str, Any], contract_name: str) -> bool:
+    """게이트 검증용 Contract 파일 존재 확인 (request / task / subtask scope 중 하나, manifest 조회)"""
+    scopes = [
+        scope for scope in (get_contract_scope(current_work, level) for level in ("request", "task", "subtask"))
+        if scope
     ]
-    return any(pattern in file_path for pattern in contract_patterns)
+    return find_contract(project_hash, scopes, contract_name) is not None
 
 
-def get_status_icon(status: str) -> str:
-    """상태에 따른 아이콘 반환"""
-    icons = {
-        "completed": "[v]",
-        "in_progress": "[>]",
-        "pending": "[ ]",
-        "failed": "[x]",
-        "active": "[>]",
+def get_next_phase(current_phase: str, current_work: Dict[str, Any]) -> Optional[str]:
+    """현재 phase에서 다음 phase 결정"""
+    transition = get_phase_transition(current_phase)
+    if not transition:
+        return None
+
+    return transition.get("next")
+
+
+def update_state_phase(project_hash: str, new_phase: str, level: str = "subtask") -> bool:
+    """state.json의 phase 업데이트"""
+    with StateSession(project_hash) as session:
+        if session.state and update_state_phase_in_state(session.state, new_phase, level):
+            session.mark_dirty()
+    return bool(session.committed)
+
+
+def update_state_phase_in_state(state: Dict[str, Any], new_phase: str, level: str = "subtask") -> bool:
+    """update_state_phase의 in-memory 버전 (StateSession.state 대상)"""
+    if level == "global":
+        record_state_event(state, {"type": "global_phase", "phase": new_phase})
+        return True
+
+    if level == "subtask":
+        current_task_id = state.get("request", {}).get("current_task")
+        if current_task_id:
+            task = state.get("tasks", {}).get(current_task_id, {})
+            current_subtask_id = task.get("current_subtask")
+            if current_subtask_id:
+                record_state_event(state, {
+                    "type": "phase_update",
+                    "task_id": current_task_id,
+                    "subtask_id": current_subtask_id,
+                    "phase": new_phase,
+                })
+                return True
+
+    return False
+
+
+# =============================================================================
+# 세션 초기화 함수
+# =============================================================================
+
+def create_initial_state(project_hash: str, request: str) -> Dict[str, Any]:
+    """새 오케스트레이션 세션 초기 상태 생성"""
+    return {
+        "version": 1,
+        "request": {
+            "id": "R1",
+            "original_request": request,
+            "status": "active",
+            "global_phase": "global_discovery",
+            "current_task": None,
+            "created_at": get_timestamp(),
+            "claude_session_id": get_current_session_id(),
+        },
+        "task_order": [],
+        "tasks": {},
+        "rollup": {"tasks": {"pending": 0, "done": 0}, "subtasks": {"pending": 0, "done": 0}},
     }
-    return icons.get(status, "[ ]")
 
 
-def format_progress_tree(state: Dict[str, Any]) -> str:
-    """진행 상황 트리 형식으로 포맷"""
-    lines = []
-    task_order = state.get("task_order", [])
-    tasks = state.get("tasks", {})
-    current_task_id = state.get("request", {}).get("current_task")
+def initialize_session(project_hash: str, request: str) -> bool:
+    """새 세션 초기화 (journal에 session_init 이벤트 기록)"""
+    with StateSession(project_hash) as session:
+        state = session.ensure_state()
+        if state is not None:
+            record_state_event(state, {
+                "type": "session_init",
+                "state": create_initial_state(project_hash, request),
+            })
+            # 새 세션 시작 시점은 항상 snapshot으로 남긴다
+            session.mark_dirty(snapshot=True)
+    return bool(session.committed)
 
-    for i, task_id in enumerate(task_order):
-        task = tasks.get(task_id, {})
-        is_last_task = i == len(task_order) - 1
-        prefix = "`-" if is_last_task else "|-"
 
-        status_icon = get_status_icon(task.get("status"))
-        current_marker = " <- current" if task_id == current_task_id else ""
-        lines.append(f"{prefix} {task_id} {task.get('name', '')} {status_icon}{current_marker}")
+# =============================================================================
+# 코드 패턴 감지
+# =============================================================================
 
-        # Subtasks
-        subtask_order = task.get("subtask_order", [])
-        subtasks = task.get("subtasks", {})
-        current_subtask_id = task.get("current_subtask")
+# 패턴 분석 대상 파일 최대 크기 기본값 (knowledge.read_max_bytes)
+DEFAULT_READ_MAX_BYTES = 1024 * 1024
 
-        for j, subtask_id in enumerate(subtask_order):
-            subtask = subtasks.get(subtask_id, {})
-            is_last_subtask = j == len(subtask_order) - 1
+# 바이너리 판별용 앞부분 크기와 매직 넘버
+BINARY_SNIFF_BYTES = 8192
+BINARY_SIGNATURES = (
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"%PDF", b"PK\x03\x04",
+    b"\x7fELF", b"\x1f\x8b", b"\xca\xfe\xba\xbe", b"MZ",
+)
 
-            if is_last_task:
-                sub_prefix = "   `-" if is_last_subtask else "   |-"
-            else:
-                sub_prefix = "|  `-" if is_last_subtask else "|  |-"
 
-            sub_status = get_status_icon(subtask.get("status"))
-            sub_current = " <- current" if subtask_id == current_subtask_id else ""
-            phase_info = f" ({subtask.get('phase', '')})" if subtask.get("phase") else ""
-            lines.append(f"{sub_prefix} {subtask_id} {subtask.get('name', '')} {sub_status}{phase_info}{sub_current}")
+def is_binary_content(head: bytes) -> bool:
+    """앞부분 바이트로 바이너리 여부 판별 (매직 넘버 또는 NUL 바이트)"""
+    return head.startswith(BINARY_SIGNATURES) or b"\x00" in head[:BINARY_SNIFF_BYTES]
 
-    return "\n".join(lines)
 
+def get_read_max_bytes() -> int:
+    """패턴 분석 대상 파일 최대 크기"""
+    return int(get_knowledge_config().get("read_max_bytes", DEFAULT_READ_MAX_BYTES))
 
-def format_knowledge_summary(knowledge: Dict[str, Any], max_items: int = 3) -> str:
-    """knowledge.yaml 요약 포맷"""
-    lines = []
 
-    patterns = knowledge.get("patterns", {})
-    if patterns:
-        if patterns.get("architecture"):
-            lines.append(f"- Architecture: {patterns['architecture']}")
-        if patterns.get("testing"):
-            lines.append(f"- Testing: {patterns['testing']}")
-        if patterns.get("error_handling"):
-            lines.append(f"- Error handling: {patterns['error_handling']}")
+def read_text_capped(file_path: str, max_bytes: Optional[int] = None) -> Optional[str]:
+    """
+    패턴 분석용 파일 읽기
 
-    pitfalls = knowledge.get("pitfalls", [])
-    if pitfalls:
-        lines.append(f"- Pitfalls: {len(pitfalls)} items")
-        for p in pitfalls[:max_items]:
-            desc = p.get("description", "")[:50]
-            lines.append(f"  * {desc}")
+    stat으로 크기를 먼저 확인하여 max_bytes를 넘는 파일은 열지 않고,
+    앞부분이 바이너리이거나 UTF-8이 아니면 None을 반환한다.
+    """
+    if max_bytes is None:
+        max_bytes = get_read_max_bytes()
+    try:
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size > max_bytes:
+                return None
+            data = f.read(max_bytes + 1)
+    except OSError:
+        return None
+
+    if len(data) > max_bytes or is_binary_content(data[:BINARY_SNIFF_BYTES]):
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
 
-    decisions = knowledge.get("decisions", [])
-    if decisions:
-        lines.append(f"- Decisions: {len(decisions)} items")
 
-    return "\n".join(lines) if lines else "No knowledge recorded yet"
+# 감지 규칙 필드:
+#   key, value   감지 시 patterns[key] = value
+#   names        파일명이 이 중 하나와 일치
+#   name_contains 파일명이 이 중 하나를 포함
+#   ext          경로가 이 확장자 중 하나로 끝남
+#   markers      내용 조건: 그룹 목록(AND), 그룹은 marker 정규식 목록(OR)
+#                marker는 literal 문자로 시작해야 하며 bytes 정규식으로 검사한다
+#                ("(?i)"는 ASCII 대소문자 무시, ".", "(" 등 메타문자는 escape)
+#   priority     같은 key에 여러 규칙이 감지되면 높은 값 우선 (같으면 먼저 나온 규칙)
+#
+# 결과 key 순서는 key별로 처음 감지된 규칙의 테이블 순서를 따른다.
+#
+# 파일 조건을 통과한 규칙의 marker만 모아 내용을 한 번 훑고, 발견된 marker 집합으로 규칙을 평가한다.
+# re는 첫 글자가 하나로 정해진 정규식만 빠르게 건너뛰고, 첫 글자가 여러 개인 alternation은
+# 위치마다 문자 집합을 검사하여 느리다 (~140MB/s). 그래서 marker마다 literal 접두어에서
+# 소스 코드에 드문 바이트 하나(anchor)를 고르고, 내용을 bytes.translate로 한 번 변환하여
+# (ASCII 소문자화 + 모든 anchor 바이트 → sentinel 한 글자) 모든 marker가 sentinel로 시작하는
+# 하나의 정규식으로 훑는다. anchor 뒤 literal은 trie로, 앞은 lookbehind로 거르고,
+# 걸린 위치는 원문에서 marker 정규식으로 확인한다. 발견된 marker는 빼고 컴파일한 정규식(캐시)으로
+# 같은 변환 결과를 이어서 훑으므로 자주 나오는 marker가 반복해서 걸리지 않는다.
+# marker를 추가해도 정규식의 분기만 늘어나고 내용을 훑는 횟수는 그대로다.
+
+TEST_FILE_NAME_MARKERS = ["Test", ".spec.", ".test."]
+JUNIT_MARKERS = ["@Test", r"org\.junit"]
+JS_TEST_MARKERS = [r"describe\(", r"it\("]
+
+PATTERN_RULES: List[Dict[str, Any]] = [
+    # 빌드 도구
+    {"key": "build_tool", "value": "Gradle", "names": ["build.gradle", "build.gradle.kts"]},
+    {"key": "build_tool", "value": "Maven", "names": ["pom.xml"]},
+    {"key": "build_tool", "value": "npm", "names": ["package.json"]},
+    {"key": "framework", "value": "Spring", "names": ["build.gradle", "build.gradle.kts", "pom.xml"],
+     "markers": [["(?i)spring"]]},
+    {"key": "framework", "value": "React", "names": ["package.json"], "markers": [['"react"']], "priority": 3},
+    {"key": "framework", "value": "Vue", "names": ["package.json"], "markers": [['"vue"']], "priority": 2},
+    {"key": "framework", "value": "Angular", "names": ["package.json"], "markers": [['"@angular']], "priority": 1},
+
+    # 테스팅 프레임워크
+    {"key": "testing", "value": "JUnit 4", "name_contains": TEST_FILE_NAME_MARKERS,
+     "markers": [JUNIT_MARKERS], "priority": 1},
+    {"key": "testing", "value": "JUnit 5", "name_contains": TEST_FILE_NAME_MARKERS,
+     "markers": [JUNIT_MARKERS, ["jupiter", "(?i)junit5"]], "priority": 2},
+    {"key": "mocking", "value": "Mockito", "name_contains": TEST_FILE_NAME_MARKERS,
+     "markers": [["(?i)mockito"]]},
+    {"key": "testing", "value": "Mocha", "name_contains": TEST_FILE_NAME_MARKERS,
+     "markers": [JS_TEST_MARKERS, ["(?i)mocha"]], "priority": 3},
+    {"key": "testing", "value": "Vitest", "name_contains": TEST_FILE_NAME_MARKERS,
+     "markers": [JS_TEST_MARKERS, ["(?i)vitest"]], "priority": 4},
+    {"key": "testing", "value": "Jest", "name_contains": TEST_FILE_NAME_MARKERS,
+     "markers": [JS_TEST_MARKERS, ["(?i)jest"]], "priority": 5},
+    {"key": "testing", "value": "pytest", "name_contains": TEST_FILE_NAME_MARKERS,
+     "markers": [["pytest"]], "priority": 6},
+
+    # 아키텍처 패턴
+    {"key": "architecture_hint", "value": "MVC/Layered", "name_contains": ["Controller"]},
+    {"key": "architecture_hint", "value": "MVC/Layered", "markers": [["@Controller", "@RestController"]]},
+    {"key": "data_layer", "value": "Repository Pattern", "name_contains": ["Repository"]},
+    {"key": "data_layer", "value": "Repository Pattern", "markers": [["@Repository"]]},
+    {"key": "service_layer", "value": "Service Layer", "name_contains": ["Service"]},
+    {"key": "service_layer", "value": "Service Layer", "markers": [["@Service"]]},
+
+    # 언어
+    {"key": "language", "value": "Java", "ext": [".java"]},
+    {"key": "language", "value": "Python", "ext": [".py"]},
+    {"key": "language", "value": "TypeScript", "ext": [".ts", ".tsx"]},
+    {"key": "language", "value": "JavaScript", "ext": [".js", ".jsx"]},
+    {"key": "language", "value": "Go", "ext": [".go"]},
+    {"key": "language", "value": "Rust", "ext": [".rs"]},
+]
+
+# 소스 코드 바이트 빈도 순 (앞일수록 흔함, 없는 바이트는 가장 드묾)
+# java/js/ts/go/rs/py 소스 파일 약 2,400개에서 언어별 같은 가중치로 측정
+COMMON_SOURCE_BYTES = (
+    b" etrsinao\nlcupd.fm_,h:()g\"yb/=\tASTv;Ek{}x0-w*\\[]CRI12PN'O4>LDMF3B<j6`@U#z8|G5&HY+Vq!K9W7Q?X%Z$J^~"
+)
+
+# marker 앞의 전역 inline flag ("(?i)" 등)
+_MARKER_FLAGS_RE = re.compile(r"\(\?([aiLmsux]+)\)")
+# 정규식의 literal 한 글자 (escape된 기호 또는 메타문자가 아닌 문자)
+_REGEX_LITERAL_CHAR_RE = re.compile(r"\\([^\w])|([^\\.^$*+?{}\[\]|()])")
+
+PATTERN_SCANNER_CACHE_SIZE = 64
+
+# 프로세스 단위 컴파일 결과
+_PATTERN_ENGINE: Optional[Dict[str, Any]] = None
+
+
+def _regex_literal_prefix(pattern: str) -> str:
+    """정규식이 반드시 시작하는 literal 접두어 (최상위 alternation이면 빈 문자열)"""
+    if _has_top_level_alternation(pattern):
+        return ""
+    chars = []
+    pos = 0
+    while True:
+        match = _REGEX_LITERAL_CHAR_RE.match(pattern, pos)
+        # 반복자가 붙은 글자는 생략될 수 있으므로 접두어에서 제외
+        if match is None or pattern[match.end():match.end() + 1] in ("*", "+", "?", "{"):
+            break
+        chars.append(match.group(1) or match.group(2))
+        pos = match.end()
+    return "".join(chars)
+
+
+def _case_variants(byte: int) -> Tuple[int, ...]:
+    """ASCII 대소문자 변형 (글자가 아니면 자기 자신)"""
+    char = bytes([byte])
+    return tuple(sorted({char.lower()[0], char.upper()[0]}))
+
+
+def _byte_rarity(byte: int) -> int:
+    """클수록 드문 바이트 (대소문자 중 흔한 쪽 기준, 변환 후 둘 다 anchor가 되므로)"""
+    ranks = [COMMON_SOURCE_BYTES.find(bytes([variant])) for variant in _case_variants(byte)]
+    return min(len(COMMON_SOURCE_BYTES) if rank < 0 else rank for rank in ranks)
+
+
+def compile_marker(marker: str) -> Dict[str, Any]:
+    """
+    marker 정규식 컴파일
+
+    Returns:
+        {"regex": bytes 정규식, "prefix": literal 접두어(bytes), "ignore_case": bool,
+         "anchor": 접두어에서 가장 드문 바이트의 위치}
 
+    Raises:
+        ValueError: 잘못된 정규식이거나 literal 문자로 시작하지 않는 marker
+    """
+    flags_match = _MARKER_FLAGS_RE.match(marker)
+    flags = flags_match.group(1) if flags_match else ""
+    body = marker[flags_match.end():] if flags_match else marker
 
-def read_stdin_json() -> Dict[str, Any]:
-    """stdin에서 JSON 입력 읽기"""
     try:
-        input_text = sys.stdin.read()
-        if not input_text.strip():
-            return {}
-        return json.loads(input_text)
-    except (json.JSONDecodeError, IOError):
-        return {}
+        regex = re.compile(marker.encode("utf-8"))
+    except re.error as e:
+        raise ValueError(f"invalid marker {marker!r}: {e}") from e
 
+    prefix = b"" if "x" in flags else _regex_literal_prefix(body).encode("utf-8")
+    if not prefix:
+        raise ValueError(f"marker must start with a literal character: {marker!r}")
 
-def output_json(data: Dict[str, Any]) -> None:
-    """JSON 출력"""
-    print(json.dumps(data, ensure_ascii=False))
+    return {
+        "regex": regex,
+        "prefix": prefix,
+        "ignore_case": "i" in flags,
+        "anchor": max(range(len(prefix)), key=lambda i: _byte_rarity(prefix[i])),
+    }
 
 
-def output_result(message: str, hook_event: str = "UserPromptSubmit") -> None:
-    """Claude 컨텍스트에 메시지 주입 (Claude Code 공식 형식)"""
-    output = {
-        "hookSpecificOutput": {
-            "hookEventName": hook_event,
-            "additionalContext": message
+def compile_pattern_rules(rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    규칙 테이블 컴파일
+
+    Returns:
+        {"rules": [...], "markers": [compile_marker 결과], "scanners": {}}
+        rules의 markers는 marker 번호 tuple 목록(groups)으로 변환된다.
+    """
+    marker_ids: Dict[str, int] = {}
+    markers = []
+    compiled = []
+
+    for rule in rules:
+        groups = []
+        for group in rule.get("markers", []):
+            ids = []
+            for marker in group:
+                if marker not in marker_ids:
+                    marker_ids[marker] = len(markers)
+                    markers.append(compile_marker(marker))
+                ids.append(marker_ids[marker])
+            groups.append(tuple(ids))
+
+        compiled.append({
+            "key": rule["key"],
+            "value": rule["value"],
+            "names": frozenset(rule.get("names", [])),
+            "name_contains": tuple(rule.get("name_contains", [])),
+            "ext": tuple(rule.get("ext", [])),
+            "groups": groups,
+            "priority": rule.get("priority", 0),
+        })
+
+    return {"rules": compiled, "markers": markers, "scanners": {}}
+
+
+def get_pattern_engine() -> Dict[str, Any]:
+    """컴파일된 규칙 엔진 (프로세스당 1회)"""
+    global _PATTERN_ENGINE
+    if _PATTERN_ENGINE is None:
+        _PATTERN_ENGINE = compile_pattern_rules(PATTERN_RULES)
+    return _PATTERN_ENGINE
+
+
+def _build_tail_trie(entries: List[Tuple[bytes, bytes]]) -> bytes:
+    """
+    (anchor 뒤 literal, lookbehind) 목록을 공통 접두어로 묶은 정규식
+
+    lookbehind는 anchor 앞을 포함한 접두어 전체이며, 필요 없으면(anchor가 첫 글자) 빈 bytes.
+    """
+    trie: Dict[Any, Any] = {}
+    for tail, behind in entries:
+        node = trie
+        for byte in tail:
+            node = node.setdefault(byte, {})
+        node.setdefault(None, set()).add(behind)
+
+    def to_regex(node: Dict[Any, Any]) -> bytes:
+        branches = [re.escape(bytes([byte])) + to_regex(child)
+                    for byte, child in sorted((k, v) for k, v in node.items() if k is not None)]
+        behinds = node.get(None)
+        if behinds is not None:
+            if b"" in behinds:
+                branches.append(b"")
+            else:
+                branches.extend(b"(?<=" + re.escape(behind) + b")" for behind in sorted(behinds))
+        return branches[0] if len(branches) == 1 else b"(?:" + b"|".join(branches) + b")"
+
+    return to_regex(trie)
+
+
+def _build_marker_scanner(markers: List[Dict[str, Any]], ids: frozenset) -> Dict[str, Any]:
+    """
+    marker 번호 집합을 훑는 scanner 생성
+
+    anchor가 접두어 끝 글자라 뒤에 literal이 없으면 모든 sentinel 위치에서 lookbehind를
+    검사하게 되므로, 다른 marker가 이미 쓰는 anchor 바이트가 앞쪽에 있으면 그 위치로 옮긴다.
+
+    Returns:
+        {"anchors": {marker 번호: 접두어 내 anchor 위치}, "table": translate 표 또는 None,
+         "sentinel": bytes, "by_byte": {원문 바이트: [(marker 번호, anchor 위치)]}, "regexes": {}}
+    """
+    anchors = {marker_id: markers[marker_id]["anchor"] for marker_id in ids}
+    used = {markers[marker_id]["prefix"][k:k + 1].lower() for marker_id, k in anchors.items()}
+    for marker_id in ids:
+        prefix = markers[marker_id]["prefix"]
+        if anchors[marker_id] == len(prefix) - 1:
+            shared = [k for k in range(len(prefix) - 1) if prefix[k:k + 1].lower() in used]
+            if shared:
+                anchors[marker_id] = shared[0]
+
+    # 변환 후 모든 anchor 바이트가 sentinel이 되므로 대소문자 변형을 모두 포함
+    translated = sorted({variant for marker_id, k in anchors.items()
+                         for variant in _case_variants(markers[marker_id]["prefix"][k])})
+    sentinel = translated[0]
+    table = None
+    # anchor가 바이트 하나이고 대소문자 무시 marker가 없으면 원문을 그대로 훑음
+    if len(translated) > 1 or any(markers[marker_id]["ignore_case"] for marker_id in ids):
+        table = bytearray(bytes(range(256)).lower())
+        for byte in translated:
+            table[byte] = sentinel
+        table = bytes(table)
+
+    by_byte: Dict[int, List[Tuple[int, int]]] = {}
+    for marker_id, k in sorted(anchors.items()):
+        marker = markers[marker_id]
+        anchor = marker["prefix"][k]
+        for byte in _case_variants(anchor) if marker["ignore_case"] else (anchor,):
+            by_byte.setdefault(byte, []).append((marker_id, k))
+
+    return {"anchors": anchors, "table": table, "sentinel": bytes([sentinel]), "by_byte": by_byte, "regexes": {}}
+
+
+def _scanner_regex(markers: List[Dict[str, Any]], scanner: Dict[str, Any], ids: frozenset) -> Any:
+    """scanner 변환 기준으로 marker 번호 집합을 거르는 정규식 (sentinel로 시작)"""
+    regex = scanner["regexes"].get(ids)
+    if regex is None:
+        entries = []
+        for marker_id in ids:
+            k = scanner["anchors"][marker_id]
+            prefix = markers[marker_id]["prefix"]
+            if scanner["table"] is not None:
+                prefix = prefix.translate(scanner["table"])
+            entries.append((prefix[k + 1:], prefix if k else b""))
+        regex = scanner["regexes"][ids] = re.compile(re.escape(scanner["sentinel"]) + _build_tail_trie(entries))
+    return regex
+
+
+def scan_markers(engine: Dict[str, Any], content: str, ids: frozenset) -> set:
+    """내용을 한 번 훑어 발견된 marker 번호 집합 반환 (모두 찾으면 조기 종료)"""
+    markers = engine["markers"]
+    scanner = engine["scanners"].get(ids)
+    if scanner is None:
+        if len(engine["scanners"]) >= PATTERN_SCANNER_CACHE_SIZE:
+            engine["scanners"].pop(next(iter(engine["scanners"])))
+        scanner = engine["scanners"][ids] = _build_marker_scanner(markers, ids)
+
+    data = content.encode("utf-8", "surrogatepass")
+    haystack = data.translate(scanner["table"]) if scanner["table"] is not None else data
+    regex = _scanner_regex(markers, scanner, ids)
+    remaining = ids
+    found = set()
+    pos = 0
+
+    while remaining:
+        match = regex.search(haystack, pos)
+        if match is None:
+            break
+        # 걸린 위치를 anchor로 하는 남은 marker를 원문에서 모두 확인
+        pos = match.start()
+        hits = {
+            marker_id
+            for marker_id, k in scanner["by_byte"].get(data[pos], ())
+            if marker_id in remaining and pos >= k and markers[marker_id]["regex"].match(data, pos - k)
         }
-    }
-    print(json.dumps(output, ensure_ascii=False))
+        if hits:
+            found |= hits
+            remaining = remaining - hits
+            if remaining:
+                regex = _scanner_regex(markers, scanner, remaining)
+        pos += 1
+
+    return found
+
+
+def detect_code_patterns(file_path: str, content: str) -> Dict[str, Any]:
+    """
+    파일 내용에서 코드 패턴 감지
+
+    Returns:
+        감지된 패턴 딕셔너리 또는 빈 딕셔너리
+    """
+    engine = get_pattern_engine()
+    file_name = os.path.basename(file_path)
+
+    # 1. 파일 조건으로 후보 규칙 선택
+    #    앞선 marker 없는 규칙이 같은 key를 같거나 높은 priority로 이미 정하면 그 marker는 훑지 않음
+    candidates = []
+    decided: Dict[str, int] = {}
+    needed = set()
+    for rule in engine["rules"]:
+        if rule["names"] and file_name not in rule["names"]:
+            continue
+        if rule["name_contains"] and not any(part in file_name for part in rule["name_contains"]):
+            continue
+        if rule["ext"] and not file_path.endswith(rule["ext"]):
+            continue
+        key = rule["key"]
+        if key in decided and rule["priority"] <= decided[key]:
+            continue
+        if rule["groups"]:
+            for group in rule["groups"]:
+                needed.update(group)
+        else:
+            decided[key] = rule["priority"]
+        candidates.append(rule)
+
+    # 2. 후보 규칙의 marker만 모아 내용을 한 번 훑기
+    found = scan_markers(engine, content, frozenset(needed)) if needed and content else set()
+
+    # 3. 모든 marker 그룹이 충족된 규칙 중 key별 최고 priority 선택
+    patterns: Dict[str, Any] = {}
+    priorities: Dict[str, int] = {}
+    for rule in candidates:
+        key = rule["key"]
+        if key in priorities and rule["priority"] <= priorities[key]:
+            continue
+        if all(any(marker_id in found for marker_id in group) for group in rule["groups"]):
+            patterns[key] = rule["value"]
+            priorities[key] = rule["priority"]
 
+    return patterns
 
-def log_orchestrator(message: str) -> None:
-    """오케스트레이션 진행 상황을 stderr로 출력 (사용자에게 보임)"""
-    print(f"[Orchestrator] {message}", file=sys.stderr)
 
+# =============================================================================
+# 패턴 히스토그램
+# =============================================================================
 
-def get_timestamp() -> str:
-    """현재 시각 ISO 8601 형식"""
-    return datetime.utcnow().isoformat() + "Z"
+# knowledge["pattern_votes"] = {key: {value: [점수, 마지막 관측 시각(epoch 초)]}}
+# 점수는 마지막 관측 시각 기준으로 감쇠된 누적 관측 수이다. 관측할 때마다
+# 점수 × 2^(-경과/반감기) + 가중치로 갱신하므로 관측 1건당 O(1)이다.
+# 같은 key의 값끼리 비교할 때도 각자 마지막 관측 이후만큼 감쇠시켜 비교하며,
+# 이 비율은 현재 시각과 무관하므로 knowledge["patterns"]의 argmax는 관측이 있을 때만 바뀐다.
 
+DEFAULT_PATTERN_HALF_LIFE_DAYS = 30.0
+DEFAULT_PATTERN_MAX_VALUES = 8
 
-def check_yaml_available() -> bool:
-    """PyYAML 사용 가능 여부"""
-    return yaml is not None
 
+def _decayed_score(vote: List[float], now: float, half_life: float) -> float:
+    """now 시점으로 감쇠시킨 점수"""
+    score, last_seen = vote
+    if half_life <= 0 or now <= last_seen:
+        return score
+    return score * 0.5 ** ((now - last_seen) / half_life)
 
-# =============================================================================
-# 게이트 검증 함수
-# =============================================================================
 
-def check_gate(gate_id: str, project_hash: str, current_work: Dict[str, Any]) -> Tuple[bool, str]:
+def _pattern_vote_settings() -> Tuple[float, int]:
+    """(반감기 초, key당 보관할 최대 값 개수)"""
+    config = get_knowledge_config()
+    half_life_days = float(config.get("pattern_half_life_days", DEFAULT_PATTERN_HALF_LIFE_DAYS))
+    max_values = int(config.get("pattern_max_values", DEFAULT_PATTERN_MAX_VALUES))
+    return half_life_days * 86400, max(max_values, 1)
+
+
+def vote_patterns(knowledge: Dict[str, Any], observed: Dict[str, Any],
+                  weight: float = 1.0, now: Optional[float] = None) -> List[str]:
     """
-    게이트 검증 수행.
+    관측된 패턴을 key별 값 히스토그램에 반영하고 knowledge["patterns"]를 argmax로 갱신
+
+    히스토그램이 없는 기존 패턴은 현재 값에 1표를 준 상태로 시작한다.
+    동점이면 현재 값을 유지한다.
+
+    Args:
+        observed: key → 관측된 값
+        weight: 관측 1건의 가중치 (프로파일러는 감지된 파일 수)
 
     Returns:
-        (passed, message) - 통과 여부와 메시지
+        값이 새로 정해지거나 바뀐 항목 목록 ("key: value")
     """
-    gate = get_gate_config(gate_id)
-    if not gate:
-        return True, ""
-
-    condition = gate.get("condition", "")
-    message = gate.get("message", f"Gate {gate_id} blocked")
+    if not observed:
+        return []
+
+    now = time.time() if now is None else now
+    half_life, max_values = _pattern_vote_settings()
+    patterns = knowledge.setdefault("patterns", {}) or {}
+    knowledge["patterns"] = patterns
+    votes = knowledge.setdefault("pattern_votes", {}) or {}
+    knowledge["pattern_votes"] = votes
+    changed = []
+
+    for key, value in observed.items():
+        histogram = votes.get(key)
+        if histogram is None:
+            histogram = votes[key] = {}
+            if key in patterns:
+                histogram[patterns[key]] = [1.0, int(now)]
+
+        vote = histogram.get(value)
+        score = _decayed_score(vote, now, half_life) if vote else 0.0
+        histogram[value] = [round(score + weight, 4), int(now)]
+
+        if len(histogram) > max_values:
+            weakest = min(
+                (v for v in histogram if v != value),
+                key=lambda v: _decayed_score(histogram[v], now, half_life),
+            )
+            del histogram[weakest]
+
+        current = patterns.get(key)
+        best = max(
+            histogram,
+            key=lambda v: (_decayed_score(histogram[v], now, half_life), v == current),
+        )
+        if best != current:
+            patterns[key] = best
+            changed.append(f"{key}: {best}")
 
-    # Contract 파일 존재 여부 확인
-    if "exists" in condition:
-        contract_name = condition.replace(" exists", "").strip()
-        if not check_contract_exists_for_gate(project_hash, current_work, contract_name):
-            return False, message
+    return changed
 
-    # GATE-3, GATE-4는 별도 로직 필요 (현재는 통과 처리)
-    # TODO: 스코프 변경, 설계 불변 조건 검증 로직 구현
 
-    return True, ""
+# =============================================================================
+# 파일 fingerprint 캐시
+# =============================================================================
 
+# knowledge/{hash}/fingerprints.json:
+#   {"version": 1, "hits": N, "misses": M,
+#    "entries": {절대 경로: [mtime_ns, size, 내용 해시, 감지된 패턴]}}
+# entries의 순서가 LRU 순서이다 (앞쪽이 가장 오래 쓰이지 않은 항목).
+#
+# hit은 index를 다시 쓰지 않고 fingerprints.hits에 경로 한 줄만 append한다.
+# miss로 index를 쓸 때 (또는 hits 파일이 커졌을 때) hit 기록을 LRU 순서와
+# hit 횟수에 접고 비운다.
 
-def check_contract_exists_for_gate(project_hash: str, current_work: Dict[str, Any], contract_name: str) -> bool:
-    """게이트 검증용 Contract 파일 존재 확인"""
-    sessions_path = get_sessions_path(project_hash)
-    request_id = current_work.get("request_id", "R1")
-    task_id = current_work.get("task_id", "")
-    subtask_id = current_work.get("subtask_id", "")
+FINGERPRINT_INDEX_VERSION = 1
+DEFAULT_FINGERPRINT_CACHE_SIZE = 1024
 
-    # 가능한 경로들 확인
-    possible_paths = [
-        sessions_path / "contracts" / request_id / contract_name,
-    ]
+# hits 파일이 이보다 커지면 hit 경로에서도 index에 접음
+FINGERPRINT_HITS_FOLD_BYTES = 64 * 1024
 
-    if task_id:
-        possible_paths.append(sessions_path / "contracts" / request_id / task_id / contract_name)
 
-    if task_id and subtask_id:
-        possible_paths.append(sessions_path / "contracts" / request_id / task_id / subtask_id / contract_name)
+def get_fingerprint_index_path(project_hash: str) -> Path:
+    """파일 fingerprint index 경로 (knowledge.yaml 옆 fingerprints.json)"""
+    return get_knowledge_path(project_hash).with_name("fingerprints.json")
 
-    return any(p.exists() for p in possible_paths)
 
+def get_fingerprint_hits_path(project_hash: str) -> Path:
+    """아직 index에 접지 않은 hit 기록 경로"""
+    return get_knowledge_path(project_hash).with_name("fingerprints.hits")
 
-def get_next_phase(current_phase: str, current_work: Dict[str, Any]) -> Optional[str]:
-    """현재 phase에서 다음 phase 결정"""
-    transition = get_phase_transition(current_phase)
-    if not transition:
-        return None
 
-    return transition.get("next")
+def get_fingerprint_cache_size() -> int:
+    """fingerprint index 최대 항목 수 (knowledge.fingerprint_cache_size)"""
+    return int(get_knowledge_config().get("fingerprint_cache_size", DEFAULT_FINGERPRINT_CACHE_SIZE))
 
 
-def update_state_phase(project_hash: str, new_phase: str, level: str = "subtask") -> bool:
-    """state.json의 phase 업데이트"""
-    state = load_state(project_hash)
-    if not state:
-        return False
+def stat_fingerprint(file_path: str) -> Optional[Tuple[int, int]]:
+    """파일 (mtime_ns, size). 파일이 없으면 None."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
-    if level == "global":
-        state["request"]["global_phase"] = new_phase
-    elif level == "subtask":
-        current_task_id = state.get("request", {}).get("current_task")
-        if current_task_id:
-            task = state.get("tasks", {}).get(current_task_id, {})
-            current_subtask_id = task.get("current_subtask")
-            if current_subtask_id:
-                state["tasks"][current_task_id]["subtasks"][current_subtask_id]["phase"] = new_phase
 
-    return save_state(project_hash, state)
+def fingerprint_content(content: str) -> Tuple[int, str]:
+    """내용의 (UTF-8 바이트 크기, blake2b 128bit 해시)"""
+    data = content.encode("utf-8", "surrogatepass")
+    return len(data), hashlib.blake2b(data, digest_size=16).hexdigest()
 
 
-# =============================================================================
-# 세션 초기화 함수
-# =============================================================================
+def _empty_fingerprint_index() -> Dict[str, Any]:
+    return {"version": FINGERPRINT_INDEX_VERSION, "hits": 0, "misses": 0, "entries": {}}
 
-def create_initial_state(project_hash: str, request: str) -> Dict[str, Any]:
-    """새 오케스트레이션 세션 초기 상태 생성"""
-    return {
-        "version": 1,
-        "request": {
-            "id": "R1",
-            "original_request": request,
-            "status": "active",
-            "global_phase": "global_discovery",
-            "current_task": None,
-            "created_at": get_timestamp(),
-            "claude_session_id": get_current_session_id(),
-        },
-        "task_order": [],
-        "tasks": {},
-    }
 
+def _load_fingerprint_index(project_hash: str, copy_result: bool = True) -> Dict[str, Any]:
+    """fingerprint index 로드 (없거나 형식이 다르면 빈 index)"""
+    try:
+        index = _read_with_warm_cache(get_fingerprint_index_path(project_hash), json.loads, copy_result)
+    except (OSError, ValueError):
+        return _empty_fingerprint_index()
+    if (not isinstance(index, dict) or index.get("version") != FINGERPRINT_INDEX_VERSION
+            or not isinstance(index.get("entries"), dict)):
+        return _empty_fingerprint_index()
+    return index
 
-def initialize_session(project_hash: str, request: str) -> bool:
-    """새 세션 초기화"""
-    state = create_initial_state(project_hash, request)
-    return save_state(project_hash, state)
 
+def get_cached_fingerprint(project_hash: str, file_path: str) -> Optional[List[Any]]:
+    """
+    파일의 index 항목 [mtime_ns, size, 내용 해시, 감지된 패턴]
 
-def detect_code_patterns(file_path: str, content: str) -> Dict[str, Any]:
+    데몬 모드에서는 warm cache 원본을 그대로 반환하므로 수정하지 않는다.
     """
-    파일 내용에서 코드 패턴 감지
+    return _load_fingerprint_index(project_hash, copy_result=False)["entries"].get(file_path)
 
-    Returns:
-        감지된 패턴 딕셔너리 또는 빈 딕셔너리
+
+def _fold_fingerprint_hits(project_hash: str, index: Dict[str, Any]) -> None:
     """
-    patterns = {}
-    file_name = os.path.basename(file_path)
+    hits 파일의 기록을 index에 반영 (LRU 순서 갱신, hit 횟수 누적) 후 제거
 
-    # 빌드 도구 감지
-    if file_name == "build.gradle" or file_name == "build.gradle.kts":
-        patterns["build_tool"] = "Gradle"
-        if "spring" in content.lower():
-            patterns["framework"] = "Spring"
-    elif file_name == "pom.xml":
-        patterns["build_tool"] = "Maven"
-        if "spring" in content.lower():
-            patterns["framework"] = "Spring"
-    elif file_name == "package.json":
-        patterns["build_tool"] = "npm"
-        if '"react"' in content:
-            patterns["framework"] = "React"
-        elif '"vue"' in content:
-            patterns["framework"] = "Vue"
-        elif '"@angular' in content:
-            patterns["framework"] = "Angular"
-
-    # 테스팅 프레임워크 감지
-    if "Test" in file_name or ".spec." in file_name or ".test." in file_name:
-        if "@Test" in content or "org.junit" in content:
-            if "jupiter" in content or "junit5" in content.lower():
-                patterns["testing"] = "JUnit 5"
-            else:
-                patterns["testing"] = "JUnit 4"
-        if "mockito" in content.lower():
-            patterns["mocking"] = "Mockito"
-        if "describe(" in content or "it(" in content:
-            if "jest" in content.lower():
-                patterns["testing"] = "Jest"
-            elif "vitest" in content.lower():
-                patterns["testing"] = "Vitest"
-            elif "mocha" in content.lower():
-                patterns["testing"] = "Mocha"
-        if "pytest" in content or "@pytest" in content:
-            patterns["testing"] = "pytest"
-
-    # 아키텍처 패턴 감지
-    if "Controller" in file_name or "@Controller" in content or "@RestController" in content:
-        patterns["architecture_hint"] = "MVC/Layered"
-    if "Repository" in file_name or "@Repository" in content:
-        patterns["data_layer"] = "Repository Pattern"
-    if "Service" in file_name or "@Service" in content:
-        patterns["service_layer"] = "Service Layer"
-
-    # 언어 감지
-    if file_path.endswith(".java"):
-        patterns["language"] = "Java"
-    elif file_path.endswith(".py"):
-        patterns["language"] = "Python"
-    elif file_path.endswith((".ts", ".tsx")):
-        patterns["language"] = "TypeScript"
-    elif file_path.endswith((".js", ".jsx")):
-        patterns["language"] = "JavaScript"
-    elif file_path.endswith(".go"):
-        patterns["language"] = "Go"
-    elif file_path.endswith(".rs"):
-        patterns["language"] = "Rust"
+    파일을 옮긴 뒤 읽으므로 그 사이 append된 기록은 다음 번에 접힌다.
+    """
+    hits_path = get_fingerprint_hits_path(project_hash)
+    folding_path = hits_path.with_name(f"{hits_path.name}.folding")
+    try:
+        os.replace(str(hits_path), str(folding_path))
+        lines = folding_path.read_text(encoding="utf-8").splitlines()
+        folding_path.unlink()
+    except OSError:
+        return
+
+    entries = index["entries"]
+    for line in lines:
+        try:
+            file_path = json.loads(line)
+        except ValueError:
+            continue
+        index["hits"] += 1
+        entry = entries.pop(file_path, None)
+        if entry is not None:
+            entries[file_path] = entry
+
+
+def _save_fingerprint_index(project_hash: str, index: Dict[str, Any]) -> None:
+    """LRU 상한을 적용하여 index 기록 (다시 만들 수 있는 캐시이므로 fsync 생략)"""
+    entries = index["entries"]
+    excess = len(entries) - max(get_fingerprint_cache_size(), 0)
+    if excess > 0:
+        for file_path in list(itertools.islice(entries, excess)):
+            del entries[file_path]
+    atomic_write_text(
+        get_fingerprint_index_path(project_hash),
+        json.dumps(index, ensure_ascii=False, separators=(",", ":")),
+        durable=False,
+    )
+
+
+def get_fingerprint_lock_path(project_hash: str) -> Path:
+    """fingerprint index read-modify-write 잠금 파일 경로"""
+    index_path = get_fingerprint_index_path(project_hash)
+    return index_path.with_name(f"{index_path.name}.lock")
+
+
+def update_fingerprint(project_hash: str, file_path: str, fingerprint: Tuple[int, int],
+                       digest: str, patterns: Dict[str, Any], hit: bool = False) -> None:
+    """
+    파일 fingerprint 기록 (가장 최근 사용 위치로 이동)
 
-    return patterns
+    hit=True는 mtime만 바뀌고 내용 해시가 같은 경우 (재감지 없이 fingerprint만 갱신).
+    """
+    try:
+        with file_lock(get_fingerprint_lock_path(project_hash)) as acquired:
+            if not acquired:
+                return
+            index = _load_fingerprint_index(project_hash)
+            _fold_fingerprint_hits(project_hash, index)
+            index["entries"].pop(file_path, None)
+            index["entries"][file_path] = [fingerprint[0], fingerprint[1], digest, patterns]
+            index["hits" if hit else "misses"] += 1
+            _save_fingerprint_index(project_hash, index)
+    except (IOError, TypeError, ValueError):
+        pass
 
 
-def merge_patterns(existing: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+def record_fingerprint_hit(project_hash: str, file_path: str) -> None:
     """
-    기존 패턴에 새 패턴 병합 (중복 방지)
+    fingerprint hit 기록 (index는 다시 쓰지 않고 hits 파일에 append)
 
-    Returns:
-        병합된 패턴과 새로 추가된 항목 목록
+    hits 파일이 FINGERPRINT_HITS_FOLD_BYTES를 넘으면 index에 접는다.
     """
-    merged = existing.copy()
-    added = []
+    hits_path = get_fingerprint_hits_path(project_hash)
+    try:
+        with open(hits_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(file_path, ensure_ascii=False) + "\n")
+            size = f.tell()
+    except OSError:
+        return
+
+    if size < FINGERPRINT_HITS_FOLD_BYTES:
+        return
+    try:
+        with file_lock(get_fingerprint_lock_path(project_hash)) as acquired:
+            if acquired:
+                index = _load_fingerprint_index(project_hash)
+                _fold_fingerprint_hits(project_hash, index)
+                _save_fingerprint_index(project_hash, index)
+    except (IOError, TypeError, ValueError):
+        pass
 
-    for key, value in new.items():
-        if key not in merged:
-            merged[key] = value
-            added.append(f"{key}: {value}")
-        elif merged[key] != value:
-            # 기존 값과 다르면 리스트로 관리하거나 덮어쓰지 않음
-            pass
 
-    return merged, added
+def get_fingerprint_stats(project_hash: str) -> Dict[str, Any]:
+    """fingerprint index 항목 수와 hit rate (접히지 않은 hit 포함)"""
+    index = _load_fingerprint_index(project_hash, copy_result=False)
+    hits = index["hits"]
+    try:
+        with open(get_fingerprint_hits_path(project_hash), "rb") as f:
+            hits += sum(1 for _ in f)
+    except OSError:
+        pass
+    misses = index["misses"]
+    lookups = hits + misses
+    return {
+        "entries": len(index["entries"]),
+        "capacity": get_fingerprint_cache_size(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
 
 
 # =============================================================================
@@ -674,23 +4242,14 @@ def merge_patterns(existing: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, A
 
 def load_task_breakdown(project_hash: str, request_id: str = "R1") -> Optional[Dict[str, Any]]:
     """
-    task-breakdown.yaml 로드
+    task-breakdown.yaml 로드 (load_contract 파싱 캐시 사용)
 
     경로: .claude/orchestrator/sessions/{hash}/contracts/{requestId}/task-breakdown.yaml
+    반환값의 목록이 state에 그대로 들어가므로 캐시 원본 대신 사본을 반환한다.
     """
-    if yaml is None:
-        return None
-
-    sessions_path = get_sessions_path(project_hash)
-    breakdown_path = sessions_path / "contracts" / request_id / "task-breakdown.yaml"
-
-    if not breakdown_path.exists():
-        return None
-
-    try:
-        return yaml.safe_load(breakdown_path.read_text(encoding="utf-8"))
-    except (yaml.YAMLError, IOError):
-        return None
+    breakdown_path = get_contracts_path(project_hash) / request_id / "task-breakdown.yaml"
+    breakdown = load_contract(str(breakdown_path))
+    return copy.deepcopy(breakdown) if breakdown else None
 
 
 def convert_task_breakdown_to_state(breakdown: Dict[str, Any]) -> Dict[str, Any]:
@@ -721,10 +4280,14 @@ def convert_task_breakdown_to_state(breakdown: Dict[str, Any]) -> Dict[str, Any]
                     "subtask_order": ["T1-S1", "T1-S2"],
                     "subtasks": {
                         "T1-S1": {"name": "...", "description": "...", "status": "pending", "phase": ""}
-                    }
+                    },
+                    "rollup": {"pending": 2, "done": 0}
                 }
             }
         }
+
+    Task나 Subtask에 depends_on이 하나라도 있으면 result["scheduling"] = "dag"이고
+    각 subtask의 "depends_on"에 선행 subtask id 목록을 채운다 (resolve_subtask_dependencies).
     """
     result = {
         "task_order": [],
@@ -767,16 +4330,96 @@ def convert_task_breakdown_to_state(breakdown: Dict[str, Any]) -> Dict[str, Any]
             "current_subtask": None,
             "subtask_order": subtask_order,
             "subtasks": subtasks_dict,
+            "rollup": {"pending": len(subtasks_dict), "done": 0},
         }
 
+    dependencies = resolve_subtask_dependencies(tasks_list, result["tasks"])
+    if dependencies is not None:
+        result["scheduling"] = "dag"
+        for task in result["tasks"].values():
+            for subtask_id, subtask in task["subtasks"].items():
+                subtask["depends_on"] = dependencies.get(subtask_id, [])
+
     return result
 
 
+def _as_id_list(value: Any) -> List[str]:
+    """depends_on 값 정규화 (문자열 하나 또는 목록)"""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [str(item) for item in value if item]
+    return []
+
+
+def resolve_subtask_dependencies(tasks_list: List[Dict[str, Any]],
+                                 tasks: Dict[str, Any]) -> Optional[Dict[str, List[str]]]:
+    """
+    task-breakdown.yaml의 depends_on을 subtask 단위 선행 목록으로 변환
+
+    - subtask.depends_on: subtask id 또는 task id (task id는 그 task의 모든 subtask)
+    - task.depends_on: task id 목록 (task의 모든 subtask가 선행 task의 모든 subtask에 의존)
+
+    depends_on 키가 하나도 없으면 None (기존 순차 진행, 빈 목록은 "선행 조건 없음"으로 선언한 것).
+    알 수 없는 id와 자기 자신은 무시하며, 순환이 있으면 로그를 남기고 None을 반환하여 순차 진행으로
+    처리한다.
+    """
+    subtask_ids = {sid: task_id for task_id, task in tasks.items() for sid in task["subtask_order"]}
+
+    def expand(ref: str) -> List[str]:
+        if ref in subtask_ids:
+            return [ref]
+        return list(tasks.get(ref, {}).get("subtask_order", []))
+
+    declared = False
+    dependencies: Dict[str, List[str]] = {}
+    for task in tasks_list:
+        task_id = task.get("id", "")
+        if task_id not in tasks:
+            continue
+        task_refs = _as_id_list(task.get("depends_on"))
+        declared = declared or "depends_on" in task
+        for subtask in task.get("subtasks", []):
+            subtask_id = subtask.get("id", "")
+            if subtask_id not in subtask_ids:
+                continue
+            refs = task_refs + _as_id_list(subtask.get("depends_on"))
+            declared = declared or "depends_on" in subtask
+            deps: List[str] = []
+            for ref in refs:
+                for dep in expand(ref):
+                    if dep != subtask_id and dep not in deps:
+                        deps.append(dep)
+            dependencies[subtask_id] = deps
+
+    if not declared:
+        return None
+
+    # 순환 검사 (Kahn)
+    indegree = {sid: len(deps) for sid, deps in dependencies.items()}
+    dependents: Dict[str, List[str]] = {}
+    for sid, deps in dependencies.items():
+        for dep in deps:
+            dependents.setdefault(dep, []).append(sid)
+    queue = [sid for sid, count in indegree.items() if count == 0]
+    visited = 0
+    while queue:
+        sid = queue.pop()
+        visited += 1
+        for dependent in dependents.get(sid, []):
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                queue.append(dependent)
+    if visited < len(dependencies):
+        blocked = [sid for sid, count in indegree.items() if count > 0]
+        log_orchestrator(f"depends_on cycle among {', '.join(blocked)}; falling back to sequential order")
+        return None
+    return dependencies
+
+
 def check_explored_exists(project_hash: str, request_id: str = "R1") -> bool:
-    """explored.yaml 존재 여부 확인"""
-    sessions_path = get_sessions_path(project_hash)
-    explored_path = sessions_path / "contracts" / request_id / "explored.yaml"
-    return explored_path.exists()
+    """explored.yaml 존재 여부 확인 (manifest 조회)"""
+    return contract_exists(project_hash, (request_id, "", ""), "explored.yaml")
 
 
 def check_global_discovery_complete(project_hash: str) -> Tuple[bool, List[str]]:
@@ -790,6 +4433,11 @@ def check_global_discovery_complete(project_hash: str) -> Tuple[bool, List[str]]
     if not state:
         return False, ["state.json not found"]
 
+    return check_global_discovery_complete_in_state(project_hash, state)
+
+
+def check_global_discovery_complete_in_state(project_hash: str, state: Dict[str, Any]) -> Tuple[bool, List[str]]:
+    """check_global_discovery_complete의 in-memory 버전"""
     request_id = state.get("request", {}).get("id", "R1")
     missing = []
 
@@ -797,11 +4445,8 @@ def check_global_discovery_complete(project_hash: str) -> Tuple[bool, List[str]]
     transition = get_phase_transition("global_discovery")
     requires = transition.get("requires", ["explored.yaml", "task-breakdown.yaml"]) if transition else ["explored.yaml", "task-breakdown.yaml"]
 
-    sessions_path = get_sessions_path(project_hash)
-    contract_path = sessions_path / "contracts" / request_id
-
     for contract in requires:
-        if not (contract_path / contract).exists():
+        if not contract_exists(project_hash, (request_id, "", ""), contract):
             missing.append(contract)
 
     return len(missing) == 0, missing
@@ -825,10 +4470,14 @@ def transition_to_task_loop(project_hash: str) -> bool:
     Returns:
         성공 여부
     """
-    state = load_state(project_hash)
-    if not state:
-        return False
+    with StateSession(project_hash) as session:
+        if session.state and transition_to_task_loop_in_state(project_hash, session.state):
+            session.mark_dirty()
+    return bool(session.committed)
+
 
+def transition_to_task_loop_in_state(project_hash: str, state: Dict[str, Any]) -> bool:
+    """transition_to_task_loop의 in-memory 버전"""
     request_id = state.get("request", {}).get("id", "R1")
 
     # 조건 확인
@@ -839,33 +4488,47 @@ def transition_to_task_loop(project_hash: str) -> bool:
     if not breakdown:
         return False
 
-    # task-breakdown을 state 형식으로 변환
-    converted = convert_task_breakdown_to_state(breakdown)
-
-    # state 업데이트
-    state["task_order"] = converted["task_order"]
-    state["tasks"] = converted["tasks"]
+    # task-breakdown을 state 형식으로 변환 후 반영
+    converted = apply_task_breakdown_in_state(state, breakdown)
 
     # global_phase 전환
-    state["request"]["global_phase"] = "task_loop"
+    record_state_event(state, {"type": "global_phase", "phase": "task_loop"})
 
-    # 첫 번째 task 설정
+    # depends_on 스케줄링: 선행 조건이 없는 subtask를 max_parallel_subtasks개까지 시작
+    if converted.get("scheduling") == "dag":
+        schedule_ready_subtasks_in_state(project_hash, state)
+        return True
+
+    # 첫 번째 task / subtask를 in_progress로
     if converted["task_order"]:
         first_task_id = converted["task_order"][0]
-        state["request"]["current_task"] = first_task_id
+        subtask_order = converted["tasks"].get(first_task_id, {}).get("subtask_order", [])
+        record_state_event(state, {
+            "type": "task_started",
+            "task_id": first_task_id,
+            "subtask_id": subtask_order[0] if subtask_order else None,
+        })
 
-        # 첫 번째 task의 상태를 in_progress로
-        if first_task_id in state["tasks"]:
-            state["tasks"][first_task_id]["status"] = "in_progress"
+    return True
 
-            # 첫 번째 subtask 설정
-            subtask_order = state["tasks"][first_task_id].get("subtask_order", [])
-            if subtask_order:
-                first_subtask_id = subtask_order[0]
-                state["tasks"][first_task_id]["current_subtask"] = first_subtask_id
-                state["tasks"][first_task_id]["subtasks"][first_subtask_id]["status"] = "in_progress"
 
-    return save_state(project_hash, state)
+def apply_task_breakdown_in_state(state: Dict[str, Any], breakdown: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    task-breakdown.yaml을 state의 task_order/tasks에 반영
+
+    Returns:
+        convert_task_breakdown_to_state 결과
+    """
+    converted = convert_task_breakdown_to_state(breakdown)
+    event = {
+        "type": "breakdown_applied",
+        "task_order": converted["task_order"],
+        "tasks": converted["tasks"],
+    }
+    if converted.get("scheduling"):
+        event["scheduling"] = converted["scheduling"]
+    record_state_event(state, event)
+    return converted
 
 
 # =============================================================================
@@ -883,10 +4546,14 @@ def update_subtask_phase(project_hash: str, new_phase: str) -> bool:
     Returns:
         성공 여부
     """
-    state = load_state(project_hash)
-    if not state:
-        return False
+    with StateSession(project_hash) as session:
+        if session.state and update_subtask_phase_in_state(session.state, new_phase):
+            session.mark_dirty()
+    return bool(session.committed)
+
 
+def update_subtask_phase_in_state(state: Dict[str, Any], new_phase: str) -> bool:
+    """update_subtask_phase의 in-memory 버전"""
     current_task_id = state.get("request", {}).get("current_task")
     if not current_task_id:
         return False
@@ -903,9 +4570,14 @@ def update_subtask_phase(project_hash: str, new_phase: str) -> bool:
     if not subtask:
         return False
 
-    state["tasks"][current_task_id]["subtasks"][current_subtask_id]["phase"] = new_phase
+    record_state_event(state, {
+        "type": "phase_update",
+        "task_id": current_task_id,
+        "subtask_id": current_subtask_id,
+        "phase": new_phase,
+    })
 
-    return save_state(project_hash, state)
+    return True
 
 
 def complete_current_subtask(project_hash: str) -> Tuple[bool, Optional[str]]:
@@ -918,10 +4590,17 @@ def complete_current_subtask(project_hash: str) -> Tuple[bool, Optional[str]]:
         - (True, None): 모든 subtask 완료 (task 완료 필요)
         - (False, None): 오류
     """
-    state = load_state(project_hash)
-    if not state:
-        return False, None
+    result = (False, None)
+    with StateSession(project_hash) as session:
+        if session.state:
+            result = complete_current_subtask_in_state(session.state)
+            if result[0]:
+                session.mark_dirty()
+    return result
+
 
+def complete_current_subtask_in_state(state: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+    """complete_current_subtask의 in-memory 버전"""
     current_task_id = state.get("request", {}).get("current_task")
     if not current_task_id:
         return False, None
@@ -934,30 +4613,22 @@ def complete_current_subtask(project_hash: str) -> Tuple[bool, Optional[str]]:
     if not current_subtask_id:
         return False, None
 
-    # 현재 subtask 완료 처리
-    state["tasks"][current_task_id]["subtasks"][current_subtask_id]["status"] = "completed"
-    state["tasks"][current_task_id]["subtasks"][current_subtask_id]["phase"] = "complete"
-
     # 다음 subtask 찾기
     subtask_order = task.get("subtask_order", [])
-    try:
-        current_idx = subtask_order.index(current_subtask_id)
-        next_idx = current_idx + 1
-    except ValueError:
-        save_state(project_hash, state)
-        return True, None
-
-    # 다음 subtask 있음
-    if next_idx < len(subtask_order):
-        next_subtask_id = subtask_order[next_idx]
-        state["tasks"][current_task_id]["current_subtask"] = next_subtask_id
-        state["tasks"][current_task_id]["subtasks"][next_subtask_id]["status"] = "in_progress"
-        save_state(project_hash, state)
-        return True, next_subtask_id
-
-    # 모든 subtask 완료
-    save_state(project_hash, state)
-    return True, None
+    next_subtask_id = None
+    if current_subtask_id in subtask_order:
+        next_idx = subtask_order.index(current_subtask_id) + 1
+        if next_idx < len(subtask_order):
+            next_subtask_id = subtask_order[next_idx]
+
+    # 현재 subtask 완료 처리 및 다음 subtask 시작 (없으면 모든 subtask 완료)
+    record_state_event(state, {
+        "type": "subtask_completed",
+        "task_id": current_task_id,
+        "subtask_id": current_subtask_id,
+        "next_subtask_id": next_subtask_id,
+    })
+    return True, next_subtask_id
 
 
 def complete_current_task(project_hash: str) -> Tuple[bool, Optional[str]]:
@@ -970,10 +4641,17 @@ def complete_current_task(project_hash: str) -> Tuple[bool, Optional[str]]:
         - (True, None): 모든 task 완료 (request 완료 필요)
         - (False, None): 오류
     """
-    state = load_state(project_hash)
-    if not state:
-        return False, None
+    result = (False, None)
+    with StateSession(project_hash) as session:
+        if session.state:
+            result = complete_current_task_in_state(session.state)
+            if result[0]:
+                session.mark_dirty()
+    return result
+
 
+def complete_current_task_in_state(state: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+    """complete_current_task의 in-memory 버전"""
     current_task_id = state.get("request", {}).get("current_task")
     if not current_task_id:
         return False, None
@@ -983,37 +4661,27 @@ def complete_current_task(project_hash: str) -> Tuple[bool, Optional[str]]:
         return False, None
 
     # 현재 task 완료 처리
-    state["tasks"][current_task_id]["status"] = "completed"
-    state["tasks"][current_task_id]["current_subtask"] = None
+    record_state_event(state, {"type": "task_completed", "task_id": current_task_id})
 
     # 다음 task 찾기
     task_order = state.get("task_order", [])
-    try:
-        current_idx = task_order.index(current_task_id)
-        next_idx = current_idx + 1
-    except ValueError:
-        save_state(project_hash, state)
+    if current_task_id not in task_order:
         return True, None
 
-    # 다음 task 있음
-    if next_idx < len(task_order):
-        next_task_id = task_order[next_idx]
-        state["request"]["current_task"] = next_task_id
-        state["tasks"][next_task_id]["status"] = "in_progress"
-
-        # 첫 번째 subtask 설정
-        subtask_order = state["tasks"][next_task_id].get("subtask_order", [])
-        if subtask_order:
-            first_subtask_id = subtask_order[0]
-            state["tasks"][next_task_id]["current_subtask"] = first_subtask_id
-            state["tasks"][next_task_id]["subtasks"][first_subtask_id]["status"] = "in_progress"
-
-        save_state(project_hash, state)
-        return True, next_task_id
+    next_idx = task_order.index(current_task_id) + 1
+    if next_idx >= len(task_order):
+        # 모든 task 완료
+        return True, None
 
-    # 모든 task 완료
-    save_state(project_hash, state)
-    return True, None
+    # 다음 task와 첫 번째 subtask 시작
+    next_task_id = task_order[next_idx]
+    subtask_order = state["tasks"][next_task_id].get("subtask_order", [])
+    record_state_event(state, {
+        "type": "task_started",
+        "task_id": next_task_id,
+        "subtask_id": subtask_order[0] if subtask_order else None,
+    })
+    return True, next_task_id
 
 
 def complete_request(project_hash: str) -> bool:
@@ -1027,12 +4695,299 @@ def complete_request(project_hash: str) -> bool:
     Returns:
         성공 여부
     """
-    state = load_state(project_hash)
-    if not state:
+    with StateSession(project_hash) as session:
+        if session.state and complete_request_in_state(session.state):
+            session.mark_dirty()
+    return bool(session.committed)
+
+
+def complete_request_in_state(state: Dict[str, Any]) -> bool:
+    """complete_request의 in-memory 버전"""
+    record_state_event(state, {"type": "request_completed"})
+    return True
+
+
+def cancel_request(project_hash: str) -> bool:
+    """
+    Request 취소 처리 (새 세션 시작 시 기존 active 세션 정리)
+
+    Returns:
+        성공 여부
+    """
+    with StateSession(project_hash) as session:
+        if session.state:
+            record_state_event(session.state, {"type": "request_status", "status": "cancelled"})
+            session.mark_dirty()
+    return bool(session.committed)
+
+
+# =============================================================================
+# Subtask 스케줄러 (task-breakdown.yaml depends_on)
+# =============================================================================
+#
+# depends_on을 쓰는 breakdown이면 request.scheduling = "dag"가 되고, 선행 subtask가 모두
+# 완료된 subtask(ready)를 orchestration.max_parallel_subtasks개까지 동시에 진행한다.
+# 진행 중 subtask는 request.in_flight([[task_id, subtask_id], ...], 시작 순서)에 있고 각자
+# phase와 게이트를 가진다. request.current_task / task.current_subtask는 그중 가장 먼저 시작한
+# 것을 가리키므로 단일 작업 기준 출력(재개 메시지, 진행 트리 등)은 그대로 동작한다.
+#
+# 완료 귀속:
+#   PostToolUse  - Contract 경로(contracts/{R}/{T}/{S}/)의 진행 중 subtask
+#   SubagentStop - 에이전트가 맡는 phase의 진행 중 subtask 중 PreToolUse가 기록한 배정(Task tool
+#                  프롬프트의 subtask id)이 같은 것, 없으면 다음 phase의 게이트를 통과한 것.
+#                  후보가 둘 이상이면 귀속하지 않고 로그만 남김 (PostToolUse가 전환)
+
+DEFAULT_MAX_PARALLEL_SUBTASKS = 3
+
+# subtask phase 진행 순서 ("" = Task 설계 대기)
+SUBTASK_PHASES = ("", "test_first", "implementation", "verification", "complete")
+
+
+def is_dag_scheduling(state: Dict[str, Any]) -> bool:
+    """depends_on 스케줄링 여부"""
+    return state.get("request", {}).get("scheduling") == "dag"
+
+
+def get_max_parallel_subtasks() -> int:
+    """동시에 진행할 최대 subtask 수 (orchestration.max_parallel_subtasks)"""
+    config = load_orchestrator_config().get("orchestration", {}) or {}
+    return max(int(config.get("max_parallel_subtasks", DEFAULT_MAX_PARALLEL_SUBTASKS)), 1)
+
+
+def get_in_flight_subtasks(state: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """진행 중 subtask (task_id, subtask_id) 목록, 시작 순서 (in_flight가 없는 이전 state는 현재 subtask)"""
+    request = state.get("request", {})
+    if "in_flight" in request:
+        return [(task_id, subtask_id) for task_id, subtask_id in request["in_flight"]]
+    current_work = get_current_work(state)
+    if current_work.get("subtask_id"):
+        return [(current_work["task_id"], current_work["subtask_id"])]
+    return []
+
+
+def get_in_flight_work(state: Dict[str, Any]) -> List[Dict[str, str]]:
+    """진행 중 subtask별 작업 정보 (get_subtask_work + 배정된 에이전트 "agent")"""
+    works = []
+    for task_id, subtask_id in get_in_flight_subtasks(state):
+        work = get_subtask_work(state, task_id, subtask_id)
+        subtask = state.get("tasks", {}).get(task_id, {}).get("subtasks", {}).get(subtask_id, {})
+        work["agent"] = subtask.get("agent") or ""
+        works.append(work)
+    return works
+
+
+def get_ready_subtasks(state: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """선행 subtask가 모두 완료된 대기 subtask (task_order / subtask_order 순)"""
+    tasks = state.get("tasks", {})
+    done = {
+        subtask_id
+        for task in tasks.values()
+        for subtask_id, subtask in task.get("subtasks", {}).items()
+        if subtask.get("status") == "completed"
+    }
+    ready = []
+    for task_id in state.get("task_order", []):
+        task = tasks.get(task_id, {})
+        for subtask_id in task.get("subtask_order", []):
+            subtask = task.get("subtasks", {}).get(subtask_id, {})
+            if subtask.get("status", "pending") != "pending":
+                continue
+            if all(dep in done for dep in subtask.get("depends_on", [])):
+                ready.append((task_id, subtask_id))
+    return ready
+
+
+def get_initial_subtask_phase(project_hash: str, state: Dict[str, Any], task_id: str) -> str:
+    """새로 시작하는 subtask의 phase (Task의 design-contract.yaml이 있으면 test_first, 없으면 설계 대기)"""
+    request_id = state.get("request", {}).get("id", "R1")
+    if contract_exists(project_hash, (request_id, task_id, ""), "design-contract.yaml"):
+        return "test_first"
+    return ""
+
+
+def schedule_ready_subtasks_in_state(project_hash: str, state: Dict[str, Any]) -> List[str]:
+    """
+    ready subtask를 빈 자리(max_parallel_subtasks - 진행 중 수)만큼 시작
+
+    Returns:
+        새로 시작한 subtask id 목록
+    """
+    slots = get_max_parallel_subtasks() - len(get_in_flight_subtasks(state))
+    started = []
+    for task_id, subtask_id in get_ready_subtasks(state)[:max(slots, 0)]:
+        record_state_event(state, {
+            "type": "subtask_started",
+            "task_id": task_id,
+            "subtask_id": subtask_id,
+            "phase": get_initial_subtask_phase(project_hash, state, task_id),
+        })
+        started.append(subtask_id)
+    return started
+
+
+def update_subtask_phase_for_in_state(state: Dict[str, Any], task_id: str, subtask_id: str, new_phase: str) -> bool:
+    """지정한 subtask의 phase 업데이트 (update_subtask_phase_in_state의 대상 지정 버전)"""
+    subtask = state.get("tasks", {}).get(task_id, {}).get("subtasks", {}).get(subtask_id)
+    if subtask is None:
         return False
+    record_state_event(state, {
+        "type": "phase_update",
+        "task_id": task_id,
+        "subtask_id": subtask_id,
+        "phase": new_phase,
+    })
+    return True
+
+
+def promote_designed_subtasks_in_state(project_hash: str, state: Dict[str, Any]) -> List[str]:
+    """설계 대기 중인 진행 중 subtask 중 Task의 design-contract.yaml이 생긴 것을 test_first로"""
+    promoted = []
+    for work in get_in_flight_work(state):
+        if work["phase"] or not get_initial_subtask_phase(project_hash, state, work["task_id"]):
+            continue
+        if update_subtask_phase_for_in_state(state, work["task_id"], work["subtask_id"], "test_first"):
+            promoted.append(work["subtask_id"])
+    return promoted
+
+
+def get_contract_work(project_hash: str, state: Dict[str, Any], file_path: str) -> Dict[str, str]:
+    """Contract 경로의 subtask가 진행 중이면 그 작업 정보, 아니면 현재 작업 정보"""
+    parsed = parse_contract_path(project_hash, file_path)
+    if parsed:
+        (_, task_id, subtask_id), _ = parsed
+        if subtask_id and (task_id, subtask_id) in get_in_flight_subtasks(state):
+            return get_subtask_work(state, task_id, subtask_id)
+    return get_current_work(state)
+
+
+def check_phase_gates(project_hash: str, work: Dict[str, Any], next_phase: str) -> Tuple[bool, str]:
+    """next_phase로 넘어가기 전에 통과해야 하는 게이트(gates.*.blocks == next_phase) 검증"""
+    for gate_id, gate in load_config_snapshot()["gates"].items():
+        if gate.get("blocks") == next_phase:
+            passed, message = check_gate(gate_id, project_hash, work)
+            if not passed:
+                return False, message
+    return True, ""
+
+
+def get_agent_source_phases(agent_type: str) -> List[str]:
+    """에이전트가 맡는 subtask phase (next_phase_map의 key, 없으면 next_phase 바로 앞 phase)"""
+    agent_config = get_agent_config(agent_type) or {}
+    next_phase_map = agent_config.get("next_phase_map")
+    if next_phase_map:
+        return list(next_phase_map)
+    next_phase = agent_config.get("next_phase")
+    if next_phase in SUBTASK_PHASES[1:]:
+        return [SUBTASK_PHASES[SUBTASK_PHASES.index(next_phase) - 1]]
+    return []
 
-    state["request"]["status"] = "completed"
-    state["request"]["global_phase"] = "complete"
-    state["request"]["current_task"] = None
 
-    return save_state(project_hash, state)
+def find_agent_subtasks(project_hash: str, state: Dict[str, Any],
+                        agent_type: str) -> List[Tuple[Dict[str, str], str]]:
+    """
+    SubagentStop의 에이전트 완료를 귀속할 진행 중 subtask 후보
+
+    에이전트가 맡는 phase의 진행 중 subtask 중 PreToolUse가 같은 에이전트를 배정한 것이 있으면
+    그것들, 없으면 다음 phase의 게이트를 통과한 것들 (배정된 subtask가 이미 phase를 지났으면
+    없음, find_advanced_agent_subtask). 후보가 하나일 때만 귀속하며, 둘 이상이면
+    (같은 타입 에이전트 병렬 실행) 어느 에이전트가 끝났는지 알 수 없으므로 추측하지 않고
+    phase 전환을 PostToolUse의 subtask 경로 Contract 저장에 맡긴다.
+
+    Returns:
+        [(작업 정보, 다음 phase), ...] (시작 순서)
+    """
+    source_phases = get_agent_source_phases(agent_type)
+    works = []
+    for work in get_in_flight_work(state):
+        if work["phase"] not in source_phases:
+            continue
+        next_phase = get_next_phase_for_agent(agent_type, work["phase"])
+        if next_phase:
+            works.append((work, next_phase))
+
+    assigned = [(work, next_phase) for work, next_phase in works if work["agent"] == agent_type]
+    if len(assigned) > 1:
+        return assigned
+    if not assigned and find_advanced_agent_subtask(state, agent_type):
+        # 배정된 subtask는 Contract 저장으로 이미 넘어감 (다른 subtask에 귀속하지 않음)
+        return []
+    return [
+        (work, next_phase) for work, next_phase in (assigned or works)
+        if check_phase_gates(project_hash, work, next_phase)[0]
+    ]
+
+
+def find_advanced_agent_subtask(state: Dict[str, Any], agent_type: str) -> Optional[Tuple[str, str]]:
+    """
+    agent_type이 배정된 subtask 중 에이전트가 맡는 phase를 이미 지난 것 (task_order 순 첫 번째)
+
+    QA Engineer처럼 subtask 경로에 Contract를 쓰는 에이전트는 PostToolUse가 먼저 phase를
+    넘기므로(test-contract.yaml → implementation, test-result.yaml → 완료) SubagentStop에서는
+    이미 처리된 완료로 본다.
+
+    Returns:
+        (task_id, subtask_id), 없으면 None
+    """
+    source_phases = get_agent_source_phases(agent_type)
+    if not source_phases:
+        return None
+    first_index = min(SUBTASK_PHASES.index(phase) for phase in source_phases)
+    tasks = state.get("tasks", {})
+    for task_id in state.get("task_order", []):
+        subtasks = tasks.get(task_id, {}).get("subtasks", {})
+        for subtask_id, subtask in subtasks.items():
+            phase = subtask.get("phase", "")
+            if (subtask.get("agent") == agent_type and phase not in source_phases
+                    and phase in SUBTASK_PHASES and SUBTASK_PHASES.index(phase) > first_index):
+                return task_id, subtask_id
+    return None
+
+
+def release_subtask_agent_in_state(state: Dict[str, Any], task_id: str, subtask_id: str) -> None:
+    """SubagentStop이 처리한 subtask의 에이전트 배정 해제 (이후 완료가 다시 귀속되지 않도록)"""
+    record_state_event(state, {"type": "subtask_released", "task_id": task_id, "subtask_id": subtask_id})
+
+
+def record_subtask_dispatch_in_state(state: Dict[str, Any], agent_type: str, prompt: str) -> Optional[str]:
+    """Task tool 프롬프트에 id가 언급된 진행 중 subtask에 에이전트 배정 기록 (배정한 subtask id 반환)"""
+    for task_id, subtask_id in get_in_flight_subtasks(state):
+        if re.search(rf"(?<![\w-]){re.escape(subtask_id)}(?![\w-])", prompt):
+            record_state_event(state, {
+                "type": "subtask_dispatched",
+                "task_id": task_id,
+                "subtask_id": subtask_id,
+                "agent_type": agent_type,
+            })
+            return subtask_id
+    return None
+
+
+def complete_subtask_in_state(project_hash: str, state: Dict[str, Any],
+                              task_id: str, subtask_id: str) -> Tuple[bool, List[str]]:
+    """
+    depends_on 스케줄링에서 subtask 완료
+
+    subtask가 모두 끝난 Task를 완료 처리하고, 새로 풀린 subtask를 시작하며,
+    모든 Task가 끝나면 Request를 완료한다.
+
+    Returns:
+        (성공 여부, 새로 시작한 subtask id 목록)
+    """
+    task = state.get("tasks", {}).get(task_id)
+    if not task or subtask_id not in task.get("subtasks", {}):
+        return False, []
+
+    record_state_event(state, {"type": "subtask_completed", "task_id": task_id, "subtask_id": subtask_id})
+
+    tasks = state.get("tasks", {})
+    for other_id in state.get("task_order", []):
+        other = tasks.get(other_id, {})
+        if other.get("status") != "completed" and all(
+            subtask.get("status") == "completed" for subtask in other.get("subtasks", {}).values()
+        ):
+            record_state_event(state, {"type": "task_completed", "task_id": other_id})
+
+    started = schedule_ready_subtasks_in_state(project_hash, state)
+    if count_pending_tasks(state) == 0:
+        complete_request_in_state(state)
+    return True, started
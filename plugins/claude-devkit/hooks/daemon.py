@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Hook Daemon - 상주형 훅 실행 서버 (opt-in)
+
+훅 이벤트마다 python3를 새로 띄우는 대신, 프로젝트별 Unix 소켓에서 대기하며
+client.py가 전달한 payload로 훅 main()을 실행한다:
+1. hooks.common / PyYAML import 및 설정 파싱을 프로세스 수명 동안 1회만 수행
+2. state.json, knowledge.yaml을 mtime 기준으로 메모리에 유지 (warm cache)
+3. 훅은 한 번에 하나만 실행하고, 실행 중에 들어온 훅 요청에는 실행하지 않고 busy로 응답
+   (client가 in-process로 실행, 상태 경합은 file_lock으로 방지). 요청이 대기열에 쌓여
+   client 응답 대기 시간을 넘기는 일이 없다.
+4. idle_timeout 동안 요청이 없거나 훅 소스가 변경되면 스스로 종료
+
+사용법:
+    python3 daemon.py start     # 백그라운드 실행
+    python3 daemon.py stop      # 종료
+    python3 daemon.py status    # 실행 여부 확인
+    python3 daemon.py run       # foreground 실행 (디버깅용)
+"""
+
+import contextlib
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# hooks 패키지 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hooks.client import (
+    HOOK_SCRIPTS,
+    HOOKS_DIR,
+    DaemonRequestError,
+    get_daemon_socket_path,
+    get_project_hash,
+    send_request,
+)
+from hooks.common import (
+    enter_daemon_mode,
+    get_daemon_config,
+)
+
+
+DEFAULT_IDLE_TIMEOUT = 1800
+START_WAIT_SECONDS = 2.0
+# 요청 한 줄을 읽는 최대 시간 (client는 연결 직후 바로 보냄)
+REQUEST_READ_TIMEOUT = 5.0
+
+
+def get_daemon_pid_path(project_hash: str) -> Path:
+    """데몬 PID 파일 경로 (소켓 옆)"""
+    return get_daemon_socket_path(project_hash).with_suffix(".pid")
+
+
+def snapshot_sources() -> Dict[str, int]:
+    """훅 소스 파일 mtime 스냅샷 (플러그인 업데이트 감지용)"""
+    return {p.name: p.stat().st_mtime_ns for p in HOOKS_DIR.glob("*.py")}
+
+
+def ping_daemon(project_hash: str, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+    """데몬 응답 확인"""
+    socket_path = get_daemon_socket_path(project_hash)
+    if not socket_path.exists():
+        return None
+    try:
+        response = send_request(socket_path, {"command": "ping"}, timeout=timeout)
+    except DaemonRequestError:
+        return None
+    if response and response.get("pong"):
+        return response
+    return None
+
+
+def run_hook(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    요청된 훅의 main()을 현재 프로세스에서 실행
+
+    stdin/stdout/stderr, cwd, 환경변수를 요청 단위로 교체했다가 복구한다.
+    """
+    hook_name = request.get("hook", "")
+    if hook_name not in HOOK_SCRIPTS:
+        return {"stdout": "", "stderr": f"Unknown hook: {hook_name}\n", "exit_code": 2}
+
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    exit_code = 0
+
+    saved_env = dict(os.environ)
+    saved_cwd = os.getcwd()
+    saved_stdin = sys.stdin
+
+    try:
+        os.environ.update(request.get("env", {}))
+        os.chdir(request.get("cwd") or saved_cwd)
+        sys.stdin = io.StringIO(request.get("payload", ""))
+
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                module = importlib.import_module(f"hooks.{hook_name}")
+                module.main()
+            except SystemExit as e:
+                if isinstance(e.code, int):
+                    exit_code = e.code
+                elif e.code is not None:
+                    exit_code = 1
+            except Exception:
+                traceback.print_exc()
+                exit_code = 1
+    finally:
+        os.environ.clear()
+        os.environ.update(saved_env)
+        os.chdir(saved_cwd)
+        sys.stdin = saved_stdin
+
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "exit_code": exit_code}
+
+
+def read_request(conn: socket.socket) -> Dict[str, Any]:
+    """한 줄 JSON 요청 읽기"""
+    chunks = []
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if chunk.endswith(b"\n"):
+            break
+    try:
+        return json.loads(b"".join(chunks).decode("utf-8") or "{}")
+    except ValueError:
+        return {}
+
+
+def _send_response(conn: socket.socket, response: Dict[str, Any]) -> None:
+    """응답 전송 후 연결 종료 (client가 이미 끊었으면 무시)"""
+    with conn:
+        try:
+            conn.sendall(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+        except OSError:
+            pass
+
+
+def serve(project_hash: str, idle_timeout: float) -> None:
+    """
+    소켓 요청 처리 루프
+
+    accept와 ping/shutdown 응답은 메인 스레드, 훅 실행은 작업 스레드 하나가 맡는다.
+    훅이 실행 중이면(다른 훅이 state lock을 기다리는 중 포함) 새 훅 요청은 실행하지 않고
+    {"busy": true}로 바로 응답하여 client가 in-process로 실행하게 한다.
+    """
+    socket_path = get_daemon_socket_path(project_hash)
+    pid_path = get_daemon_pid_path(project_hash)
+
+    if socket_path.exists():
+        socket_path.unlink()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    os.chmod(str(socket_path), 0o600)
+    server.listen(16)
+    server.settimeout(idle_timeout)
+    pid_path.write_text(str(os.getpid()), encoding="utf-8")
+
+    # SIGTERM 수신 시 finally 블록에서 소켓 정리
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    enter_daemon_mode()
+    sources = snapshot_sources()
+    busy = threading.Lock()
+    worker: Optional[threading.Thread] = None
+
+    def run_and_respond(conn: socket.socket, request: Dict[str, Any]) -> None:
+        try:
+            _send_response(conn, run_hook(request))
+        finally:
+            busy.release()
+
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                if busy.locked():
+                    continue
+                break
+
+            conn.settimeout(REQUEST_READ_TIMEOUT)
+            try:
+                request = read_request(conn)
+            except OSError:
+                conn.close()
+                continue
+            command = request.get("command")
+
+            if command == "ping":
+                _send_response(conn, {"pong": True, "pid": os.getpid(), "project_hash": project_hash})
+            elif command == "shutdown":
+                _send_response(conn, {"ok": True})
+                break
+            elif not busy.acquire(blocking=False):
+                # 실행 중인 훅이 있음: 대기열에 두지 않고 client가 직접 실행
+                _send_response(conn, {"busy": True})
+            elif snapshot_sources() != sources:
+                # 훅 소스가 바뀌었으면 client가 in-process로 실행하도록 하고 종료
+                busy.release()
+                _send_response(conn, {"retry": True})
+                break
+            else:
+                worker = threading.Thread(target=run_and_respond, args=(conn, request))
+                worker.start()
+    finally:
+        server.close()
+        # 실행 중인 훅은 끝까지 실행 (응답을 받지 못한 client는 재실행하지 않음)
+        if worker is not None:
+            worker.join()
+        for path in (socket_path, pid_path):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def start_daemon(wait: bool = True) -> bool:
+    """
+    데몬을 백그라운드로 실행
+
+    Args:
+        wait: 소켓이 응답할 때까지 대기할지 여부
+
+    Returns:
+        실행 중 여부 (wait=False면 프로세스 생성 여부)
+    """
+    project_hash = get_project_hash()
+    if ping_daemon(project_hash):
+        return True
+
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "run"],
+            cwd=os.getcwd(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        return False
+
+    if not wait:
+        return True
+
+    deadline = time.monotonic() + START_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        if ping_daemon(project_hash, timeout=0.2):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def stop_daemon() -> bool:
+    """데몬 종료 요청"""
+    socket_path = get_daemon_socket_path(get_project_hash())
+    if not socket_path.exists():
+        return False
+    try:
+        return send_request(socket_path, {"command": "shutdown"}, timeout=5.0) is not None
+    except DaemonRequestError:
+        return False
+
+
+def main():
+    """Hook Daemon 메인 함수"""
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    project_hash = get_project_hash()
+
+    if command == "run":
+        idle_timeout = get_daemon_config().get("idle_timeout", DEFAULT_IDLE_TIMEOUT)
+        serve(project_hash, float(idle_timeout))
+    elif command == "start":
+        if start_daemon():
+            print(f"daemon running: {get_daemon_socket_path(project_hash)}")
+        else:
+            print("daemon failed to start", file=sys.stderr)
+            sys.exit(1)
+    elif command == "stop":
+        print("daemon stopped" if stop_daemon() else "daemon not running")
+    elif command == "status":
+        response = ping_daemon(project_hash)
+        if response:
+            print(f"daemon running (pid {response.get('pid')}): {get_daemon_socket_path(project_hash)}")
+        else:
+            print("daemon not running")
+            sys.exit(1)
+    else:
+        print("usage: daemon.py start|stop|status|run", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
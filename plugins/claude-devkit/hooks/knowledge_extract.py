@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Knowledge Extract - 요청 완료 시 전체 Contract에서 knowledge 추출
+
+요청이 completed가 된 뒤 Stop 훅에서 한 번 실행되어:
+1. contracts/{request_id}/** 아래 knowledge.extract_from Contract 파일을 스트리밍 탐색
+2. 파일 묶음을 process pool에서 파싱 (knowledge.extract_budget_seconds 안에서만)
+3. 설계 결정(invariants, 금지된 boundaries), 놓친 실패 사례, 반복된 실패 추출
+4. events.jsonl 이벤트 시각으로 subtask 소요 시간 / 재검증 횟수 집계
+5. 한 번의 KnowledgeSession으로 knowledge에 합치고 request_history에 요약 기록
+
+사용법:
+    python3 knowledge_extract.py [--budget 초] [--force]    # 현재 요청 수동 (재)추출
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# hooks 패키지 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hooks.common import (
+    get_project_hash,
+    get_knowledge_config,
+    get_sessions_path,
+    load_state,
+    load_knowledge,
+    read_state_events,
+    load_contract,
+    extract_contract_decisions,
+    extract_contract_pitfalls,
+    get_pitfall_key,
+    index_pitfalls,
+    record_decisions,
+    record_pitfalls,
+    parse_timestamp,
+    get_timestamp,
+    KnowledgeSession,
+    log_orchestrator,
+)
+
+
+DEFAULT_EXTRACT_FROM = ["design-contract.yaml", "test-contract.yaml", "test-result.yaml"]
+DEFAULT_EXTRACT_BUDGET = 5.0
+
+# worker 1회 호출에 넘기는 파일 수, 이보다 파일이 적으면 pool 없이 파싱
+CHUNK_SIZE = 16
+POOL_MIN_FILES = 48
+
+# knowledge.yaml에 보관하는 요청 요약 개수
+REQUEST_HISTORY_SIZE = 20
+
+# 가장 오래 걸린 subtask 보관 개수
+SLOWEST_SUBTASKS = 3
+
+
+# =============================================================================
+# Contract 탐색 / 파싱
+# =============================================================================
+
+def iter_request_contracts(project_hash: str, request_id: str, names: List[str]) -> Iterator[str]:
+    """contracts/{request_id}/** 아래 names에 해당하는 파일 경로 (디렉토리 순서대로 스트리밍)"""
+    root = get_sessions_path(project_hash) / "contracts" / request_id
+    wanted = set(names)
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if name in wanted:
+                yield os.path.join(directory, name)
+
+
+def parse_contract_file(root: str, file_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Contract 1개를 knowledge 추출용 레코드로 변환
+
+    task_id/subtask_id는 Contract 내용에 없으면 contracts/{request_id}/ 아래 경로에서 얻는다.
+    """
+    content = load_contract(file_path, persist=False)
+    if content is None:
+        return None
+
+    scope = os.path.relpath(os.path.dirname(file_path), root).split(os.sep)
+    scope = [part for part in scope if part not in ("", ".")]
+    name = os.path.basename(file_path)
+    record = {
+        "name": name,
+        "task_id": content.get("task_id") or (scope[0] if scope else ""),
+        "subtask_id": content.get("subtask_id") or (scope[1] if len(scope) > 1 else ""),
+        "decisions": [],
+        "pitfalls": [],
+        "tests": 0,
+    }
+    if name == "design-contract.yaml":
+        record["decisions"] = extract_contract_decisions(content, file_path)
+    elif name == "test-contract.yaml":
+        record["tests"] = len(content.get("test_cases") or [])
+    elif name == "test-result.yaml":
+        record["pitfalls"] = extract_contract_pitfalls(content)
+        for pitfall in record["pitfalls"]:
+            pitfall["learned_from"] = pitfall.get("learned_from") or record["subtask_id"]
+    return record
+
+
+def parse_contract_chunk(root: str, paths: List[str]) -> List[Dict[str, Any]]:
+    """Contract 묶음 파싱 (process pool worker)"""
+    records = []
+    for path in paths:
+        record = parse_contract_file(root, path)
+        if record is not None:
+            records.append(record)
+    return records
+
+
+def parse_contracts(root: str, paths: List[str], budget: float,
+                    workers: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Contract 파일들을 budget(초) 안에서 파싱
+
+    파일이 적으면 현재 프로세스에서, 많으면 process pool에서 파싱한다.
+    시간 안에 끝나지 않은 묶음은 버린다 (`knowledge_extract.py --force`로 다시 추출 가능).
+
+    Returns:
+        (파싱한 레코드 목록, 시간 초과로 건너뛴 파일 수)
+    """
+    deadline = time.monotonic() + budget
+    if workers <= 1 or len(paths) < POOL_MIN_FILES:
+        records = []
+        for index, path in enumerate(paths):
+            if time.monotonic() > deadline:
+                return records, len(paths) - index
+            record = parse_contract_file(root, path)
+            if record is not None:
+                records.append(record)
+        return records, 0
+
+    from concurrent.futures import ProcessPoolExecutor, wait
+
+    chunks = [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)]
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(chunks)))
+    try:
+        futures = [pool.submit(parse_contract_chunk, root, chunk) for chunk in chunks]
+        done, _ = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        records = []
+        skipped = 0
+        # 제출 순서대로 합쳐 실행마다 같은 결과
+        for future, chunk in zip(futures, chunks):
+            if future in done and future.exception() is None:
+                records.extend(future.result())
+            else:
+                skipped += len(chunk)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return records, skipped
+
+
+# =============================================================================
+# 소요 시간 집계
+# =============================================================================
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """정렬된 values의 nearest-rank 백분위수"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize_request_timings(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    journal 이벤트 시각으로 요청/subtask 소요 시간 집계
+
+    subtask는 시작(task_started / 이전 subtask_completed의 next_subtask_id / 첫 phase_update)부터
+    subtask_completed까지, 재검증 횟수는 verification 진입 횟수 - 1로 계산한다.
+    """
+    # 마지막 session_init 이후가 이번 요청
+    for index in range(len(events) - 1, -1, -1):
+        if events[index].get("type") == "session_init":
+            events = events[index:]
+            break
+
+    starts: Dict[str, float] = {}
+    ends: Dict[str, float] = {}
+    verifications: Dict[str, int] = {}
+    first_ts = last_ts = 0.0
+    for event in events:
+        ts = parse_timestamp(event.get("ts"))
+        if not ts:
+            continue
+        first_ts = first_ts or ts
+        last_ts = ts
+        event_type = event.get("type")
+        subtask_id = event.get("subtask_id")
+        if event_type == "task_started" and subtask_id:
+            starts.setdefault(subtask_id, ts)
+        elif event_type == "phase_update" and subtask_id:
+            starts.setdefault(subtask_id, ts)
+            if event.get("phase") == "verification":
+                verifications[subtask_id] = verifications.get(subtask_id, 0) + 1
+        elif event_type == "subtask_completed" and subtask_id:
+            ends[subtask_id] = ts
+            if event.get("next_subtask_id"):
+                starts.setdefault(event["next_subtask_id"], ts)
+
+    durations = {
+        subtask_id: round(end - starts[subtask_id], 3)
+        for subtask_id, end in ends.items() if subtask_id in starts
+    }
+    ordered = sorted(durations.values())
+    slowest = sorted(durations.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_SUBTASKS]
+    return {
+        "duration_seconds": round(last_ts - first_ts, 3),
+        "subtasks": len(ends),
+        "subtask_seconds": {
+            "median": _percentile(ordered, 0.5),
+            "p90": _percentile(ordered, 0.9),
+            "max": ordered[-1] if ordered else 0.0,
+        },
+        "slowest": [{"id": subtask_id, "seconds": seconds} for subtask_id, seconds in slowest],
+        "retries": sum(max(0, count - 1) for count in verifications.values()),
+    }
+
+
+# =============================================================================
+# knowledge 병합
+# =============================================================================
+
+def is_request_extracted(knowledge: Optional[Dict[str, Any]], request: Dict[str, Any]) -> bool:
+    """같은 요청(id + 생성 시각)의 요약이 이미 request_history에 있는지"""
+    for entry in (knowledge or {}).get("request_history") or []:
+        if entry.get("request_id") == request.get("id") and entry.get("created_at") == request.get("created_at"):
+            return True
+    return False
+
+
+def merge_request_knowledge(knowledge: Dict[str, Any], request: Dict[str, Any],
+                            records: List[Dict[str, Any]], skipped: int,
+                            timings: Dict[str, Any]) -> List[str]:
+    """
+    추출 결과를 knowledge에 합침
+
+    test-result의 실패는 PostToolUse가 관측할 때마다 이미 기록하므로, 저장소에 없는 실패만
+    추가하고 다시 세지 않는다. 이번 요청 중 2번 이상 관측된 실패는 반복 실패로 요약에 남긴다.
+
+    Returns:
+        변경 내용 목록
+    """
+    updates = []
+    decisions = [decision for record in records for decision in record["decisions"]]
+    updates.extend(record_decisions(knowledge, decisions))
+
+    known = index_pitfalls(knowledge.setdefault("pitfalls", []))
+    missed = []
+    for record in records:
+        for pitfall in record["pitfalls"]:
+            key = get_pitfall_key(pitfall)
+            if key not in known:
+                known[key] = pitfall
+                missed.append(pitfall)
+    updates.extend(record_pitfalls(knowledge, missed))
+
+    started = parse_timestamp(request.get("created_at"))
+    recurring = [
+        pitfall for pitfall in knowledge.get("pitfalls", [])
+        if pitfall.get("count", 1) >= 2 and parse_timestamp(pitfall.get("last_seen")) >= started
+    ]
+    for pitfall in recurring:
+        updates.append(f"Recurring failure (x{pitfall['count']}): {pitfall.get('description', '')[:40]}...")
+
+    entry = {
+        "request_id": request.get("id"),
+        "request": (request.get("original_request") or "")[:200],
+        "created_at": request.get("created_at"),
+        "completed_at": get_timestamp(),
+        "contracts": len(records),
+        "skipped_contracts": skipped,
+        "tests": sum(record["tests"] for record in records),
+        "recurring_failures": [pitfall.get("id") for pitfall in recurring],
+    }
+    entry.update(timings)
+    # 같은 요청을 다시 추출하면 이전 요약을 대체
+    history = [
+        item for item in knowledge.get("request_history") or []
+        if not (item.get("request_id") == entry["request_id"] and item.get("created_at") == entry["created_at"])
+    ]
+    history.append(entry)
+    knowledge["request_history"] = history[-REQUEST_HISTORY_SIZE:]
+    updates.append(
+        f"Request history: {entry['request_id']} ({entry['subtasks']} subtasks, {entry['duration_seconds']:.0f}s)"
+    )
+    return updates
+
+
+def extract_request_knowledge(project_hash: str, budget: Optional[float] = None,
+                              force: bool = False) -> Optional[List[str]]:
+    """
+    완료된 현재 요청의 Contract 전체에서 knowledge 추출 (요청당 1회, force면 다시 추출)
+
+    Returns:
+        변경 내용 목록 (이미 추출했거나 완료되지 않은 요청이면 [], 저장 실패 시 None)
+    """
+    config = get_knowledge_config()
+    if config.get("auto_update", True) is False:
+        return []
+
+    state = load_state(project_hash)
+    request = (state or {}).get("request") or {}
+    if request.get("status") != "completed":
+        return []
+    if not force and is_request_extracted(load_knowledge(project_hash), request):
+        return []
+
+    started = time.monotonic()
+    if budget is None:
+        budget = float(config.get("extract_budget_seconds", DEFAULT_EXTRACT_BUDGET))
+    workers = int(config.get("extract_workers", 0)) or os.cpu_count() or 1
+    names = config.get("extract_from") or DEFAULT_EXTRACT_FROM
+    request_id = request.get("id", "R1")
+
+    # 파싱은 knowledge 잠금 밖에서 수행
+    root = str(get_sessions_path(project_hash) / "contracts" / request_id)
+    paths = list(iter_request_contracts(project_hash, request_id, names))
+    records, skipped = parse_contracts(root, paths, budget, workers)
+    timings = summarize_request_timings(read_state_events(project_hash))
+
+    with KnowledgeSession(project_hash) as session:
+        knowledge = session.knowledge
+        if knowledge is None:
+            return None
+        if not force and is_request_extracted(knowledge, request):
+            return []
+        updates = merge_request_knowledge(knowledge, request, records, skipped, timings)
+        knowledge["updated_at"] = get_timestamp()
+        session.mark_dirty()
+    if not session.committed:
+        return None
+
+    log_orchestrator(
+        f"Request knowledge extracted: {len(records)}/{len(paths)} contracts in "
+        f"{time.monotonic() - started:.2f}s" + (f", {skipped} skipped (budget)" if skipped else "")
+    )
+    return updates
+
+
+def main():
+    """Knowledge Extract 메인 함수"""
+    parser = argparse.ArgumentParser(description="완료된 요청의 Contract에서 knowledge 추출")
+    parser.add_argument("--budget", type=float, default=None, help="Contract 파싱 시간 한도 (초)")
+    parser.add_argument("--force", action="store_true", help="이미 추출한 요청도 다시 추출")
+    args = parser.parse_args()
+
+    updates = extract_request_knowledge(get_project_hash(), args.budget, args.force)
+    if updates is None:
+        print("knowledge save failed", file=sys.stderr)
+        sys.exit(1)
+    for update in updates:
+        print(update)
+    if not updates:
+        print("nothing to extract (request not completed or already extracted)")
+
+
+if __name__ == "__main__":
+    main()
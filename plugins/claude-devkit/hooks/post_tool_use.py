@@ -9,129 +9,77 @@ PostToolUse Hook - knowledge.yaml 자동 업데이트 및 코드 패턴 분석
 
 import sys
 import os
-from pathlib import Path
+from typing import Optional
 
 # hooks 패키지 경로 추가
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-try:
-    import yaml
-except ImportError:
-    yaml = None
-
 from hooks.common import (
     read_stdin_json,
     output_result,
     output_json,
     log_orchestrator,
     get_project_hash,
-    load_knowledge,
-    save_knowledge,
-    load_state,
-    save_state,
     is_contract_file,
+    register_contract_file,
     detect_code_patterns,
-    merge_patterns,
-    get_timestamp,
-    check_yaml_available,
-    get_current_work,
+    queue_knowledge_update,
+    load_contract,
+    extract_contract_decisions,
+    extract_contract_pitfalls,
+    get_contract_work,
     check_gate,
     get_gate_enforcement,
     get_phase_transition,
-    update_state_phase,
+    update_subtask_phase_for_in_state,
+    is_dag_scheduling,
+    promote_designed_subtasks_in_state,
+    complete_subtask_in_state,
+    StateSession,
     get_template,
     initialize_session,
+    get_read_max_bytes,
+    read_text_capped,
+    BINARY_SNIFF_BYTES,
+    stat_fingerprint,
+    fingerprint_content,
+    get_cached_fingerprint,
+    update_fingerprint,
+    record_fingerprint_hit,
 )
 
 
 def extract_decisions_from_design_contract(file_path: str) -> list:
     """design-contract.yaml에서 설계 결정 추출"""
-    if not check_yaml_available():
-        return []
-
-    decisions = []
-    try:
-        content = yaml.safe_load(Path(file_path).read_text(encoding="utf-8"))
-
-        # invariants를 decisions로 변환
-        for inv in content.get("invariants", []):
-            decisions.append({
-                "id": inv.get("id", ""),
-                "topic": inv.get("id", ""),
-                "decision": inv.get("rule", ""),
-                "rationale": "Design invariant",
-                "refs": [file_path],
-                "created_at": get_timestamp()[:10],  # YYYY-MM-DD
-            })
-    except Exception:
-        pass
-
-    return decisions
+    content = load_contract(file_path)
+    return extract_contract_decisions(content, file_path) if content else []
 
 
 def extract_pitfalls_from_test_result(file_path: str) -> list:
     """test-result.yaml 실패 케이스에서 pitfalls 추출"""
-    if not check_yaml_available():
-        return []
-
-    pitfalls = []
-    try:
-        content = yaml.safe_load(Path(file_path).read_text(encoding="utf-8"))
-
-        if content.get("execution", {}).get("result") == "fail":
-            subtask_id = content.get("subtask_id", "")
-            for failed in content.get("failed_tests", []):
-                pitfalls.append({
-                    "id": f"P-{failed.get('name', 'unknown')[:20]}",
-                    "description": f"{failed.get('name', '')}: {failed.get('reason', '')}",
-                    "reason": failed.get("suggestion", "Test failure analysis needed"),
-                    "learned_from": subtask_id,
-                })
-    except Exception:
-        pass
-
-    return pitfalls
+    content = load_contract(file_path)
+    return extract_contract_pitfalls(content) if content else []
 
 
 def process_contract_file(file_path: str, project_hash: str) -> list:
     """Contract 파일 처리"""
     updates = []
 
-    knowledge = load_knowledge(project_hash)
-    if not knowledge:
-        knowledge = {
-            "version": 1,
-            "project": {
-                "path": os.getcwd(),
-                "hash": project_hash,
-            },
-            "patterns": {},
-            "decisions": [],
-            "pitfalls": [],
-        }
-
-    # design-contract.yaml 처리
+    # Contract 파싱은 잠금 밖에서 수행
+    new_decisions = []
+    new_pitfalls = []
     if "design-contract.yaml" in file_path:
         new_decisions = extract_decisions_from_design_contract(file_path)
-        for dec in new_decisions:
-            # 중복 체크 (같은 id면 스킵)
-            existing_ids = [d.get("id") for d in knowledge.get("decisions", [])]
-            if dec.get("id") and dec.get("id") not in existing_ids:
-                knowledge["decisions"].append(dec)
-                updates.append(f"Decision added: {dec.get('id')}")
-
-    # test-result.yaml 처리
     elif "test-result.yaml" in file_path:
         new_pitfalls = extract_pitfalls_from_test_result(file_path)
-        for pit in new_pitfalls:
-            knowledge["pitfalls"].append(pit)
-            desc = pit.get("description", "")[:30]
-            updates.append(f"Pitfall added: {desc}...")
 
-    # 변경사항 저장
-    if updates:
-        knowledge["updated_at"] = get_timestamp()
-        save_knowledge(project_hash, knowledge)
+    if not new_decisions and not new_pitfalls:
+        return updates
+
+    # knowledge.durability: batched면 변경 버퍼에 기록만 하고 경계 훅에서 한 번에 저장
+    for op, items in (("decisions", new_decisions), ("pitfalls", new_pitfalls)):
+        if items:
+            updates.extend(queue_knowledge_update(project_hash, {"op": op, "items": items}) or [])
 
     return updates
 
@@ -149,68 +97,98 @@ def process_state_transition(file_path: str, project_hash: str) -> dict:
         "next_action": None,
     }
 
-    state = load_state(project_hash)
-    if not state:
-        return result
-
-    request = state.get("request", {})
-    if request.get("status") != "active":
-        return result
-
-    current_work = get_current_work(state)
-    current_phase = current_work.get("phase", "")
-    global_phase = current_work.get("global_phase", "")
-
-    # Contract별 상태 전환 처리
-    if "explored.yaml" in file_path or "task-breakdown.yaml" in file_path:
-        # Global Discovery 단계
-        result["transition"] = "Global Discovery progress"
-        result["next_action"] = "Complete Global Discovery, then proceed to Task Loop"
-
-    elif "design-contract.yaml" in file_path:
-        # Task Design 완료 → test_first로 전환
-        result["transition"] = "Task Design completed"
-        update_state_phase(project_hash, "test_first", "subtask")
-        result["next_action"] = "QA Engineer로 테스트 먼저 작성하세요 (test-contract.yaml)"
-
-    elif "test-contract.yaml" in file_path:
-        # GATE-1 검증
-        passed, message = check_gate("GATE-1", project_hash, current_work)
-        result["gate_result"] = (passed, message)
-
-        if passed:
-            result["transition"] = "GATE-1 passed: test_first → implementation"
-            update_state_phase(project_hash, "implementation", "subtask")
-            result["next_action"] = "Implementer로 구현을 진행하세요"
-        else:
-            result["transition"] = "GATE-1 blocked"
-            result["next_action"] = message
-
-    elif "test-result.yaml" in file_path:
-        # 테스트 결과 분석
-        try:
-            content = yaml.safe_load(Path(file_path).read_text(encoding="utf-8"))
-            test_passed = content.get("execution", {}).get("result") == "pass"
-
-            if current_phase == "verification":
-                # GATE-2 검증
-                passed, message = check_gate("GATE-2", project_hash, current_work)
-                result["gate_result"] = (passed, message)
-
-                if passed and test_passed:
-                    result["transition"] = "GATE-2 passed: verification → complete"
-                    update_state_phase(project_hash, "complete", "subtask")
-                    result["next_action"] = "Subtask 완료. 다음 Subtask로 진행하세요."
-                elif not test_passed:
-                    result["transition"] = "Verification failed"
-                    result["next_action"] = "테스트 실패. 구현을 수정하세요."
+    with StateSession(project_hash) as session:
+        state = session.state
+        if not state:
+            return result
+
+        request = state.get("request", {})
+        if request.get("status") != "active":
+            return result
+
+        # depends_on 스케줄링이면 Contract 경로의 진행 중 subtask가 대상 (순차 진행은 현재 subtask)
+        current_work = get_contract_work(project_hash, state, file_path)
+        # (Global Discovery 중에는 현재 작업이 없으므로 빈 값)
+        task_id, subtask_id = current_work.get("task_id", ""), current_work.get("subtask_id", "")
+        current_phase = current_work.get("phase", "")
+        global_phase = current_work.get("global_phase", "")
+
+        # Contract별 상태 전환 처리
+        if "explored.yaml" in file_path or "task-breakdown.yaml" in file_path:
+            # Global Discovery 단계
+            result["transition"] = "Global Discovery progress"
+            result["next_action"] = "Complete Global Discovery, then proceed to Task Loop"
+
+        elif "design-contract.yaml" in file_path:
+            # Task Design 완료 → test_first로 전환
+            result["transition"] = "Task Design completed"
+            if is_dag_scheduling(state):
+                # 설계를 기다리던 진행 중 subtask 모두
+                if promote_designed_subtasks_in_state(project_hash, state):
+                    session.mark_dirty()
+            elif subtask_id and update_subtask_phase_for_in_state(state, task_id, subtask_id, "test_first"):
+                session.mark_dirty()
+            result["next_action"] = "QA Engineer로 테스트 먼저 작성하세요 (test-contract.yaml)"
+
+        elif "test-contract.yaml" in file_path:
+            # GATE-1 검증
+            passed, message = check_gate("GATE-1", project_hash, current_work)
+            result["gate_result"] = (passed, message)
+
+            if passed:
+                result["transition"] = "GATE-1 passed: test_first → implementation"
+                if subtask_id and update_subtask_phase_for_in_state(state, task_id, subtask_id, "implementation"):
+                    session.mark_dirty()
+                result["next_action"] = "Implementer로 구현을 진행하세요"
             else:
-                # test_first 단계에서 테스트 결과
-                result["transition"] = "Test first result recorded"
-                result["next_action"] = "테스트 결과가 기록되었습니다."
+                result["transition"] = "GATE-1 blocked"
+                result["next_action"] = message
 
-        except Exception:
-            pass
+        elif "test-result.yaml" in file_path:
+            # 테스트 결과 분석
+            try:
+                content = load_contract(file_path) or {}
+                test_passed = (content.get("execution") or {}).get("result") == "pass"
+
+                # 같은 타입 implementer가 병렬이라 SubagentStop이 귀속하지 못한 subtask:
+                # subtask 경로의 test-result.yaml을 구현 완료로 보고 verification으로 전환
+                if current_phase == "implementation" and is_dag_scheduling(state) and subtask_id:
+                    if update_subtask_phase_for_in_state(state, task_id, subtask_id, "verification"):
+                        session.mark_dirty()
+                        current_phase = "verification"
+
+                if current_phase == "verification":
+                    # GATE-2 검증
+                    passed, message = check_gate("GATE-2", project_hash, current_work)
+                    result["gate_result"] = (passed, message)
+
+                    if passed and test_passed:
+                        result["transition"] = "GATE-2 passed: verification → complete"
+                        if is_dag_scheduling(state):
+                            # 바로 완료 처리하고 선행 작업이 끝난 subtask 시작
+                            success, started = complete_subtask_in_state(project_hash, state, task_id, subtask_id)
+                            if success:
+                                session.mark_dirty()
+                            if state.get("request", {}).get("status") == "completed":
+                                result["next_action"] = "모든 Task가 완료되었습니다."
+                            elif started:
+                                result["next_action"] = f"{subtask_id} 완료. 새로 시작한 Subtask: {', '.join(started)}"
+                            else:
+                                result["next_action"] = f"{subtask_id} 완료. 진행 중인 Subtask를 계속하세요."
+                        else:
+                            if subtask_id and update_subtask_phase_for_in_state(state, task_id, subtask_id, "complete"):
+                                session.mark_dirty()
+                            result["next_action"] = "Subtask 완료. 다음 Subtask로 진행하세요."
+                    elif not test_passed:
+                        result["transition"] = "Verification failed"
+                        result["next_action"] = "테스트 실패. 구현을 수정하세요."
+                else:
+                    # test_first 단계에서 테스트 결과
+                    result["transition"] = "Test first result recorded"
+                    result["next_action"] = "테스트 결과가 기록되었습니다."
+
+            except Exception:
+                pass
 
     return result
 
@@ -229,40 +207,100 @@ def generate_gate_blocked_message(gate_id: str, message: str) -> str:
 """
 
 
-def process_code_read(file_path: str, content: str, project_hash: str) -> list:
-    """코드 파일 Read 시 패턴 분석"""
-    if not content:
-        return []
+def extract_read_response_content(tool_response) -> Optional[str]:
+    """
+    Read 도구 응답에서 텍스트 내용 추출
 
-    # 패턴 감지
-    new_patterns = detect_code_patterns(file_path, content)
+    지원 형태:
+        "..."                                          (문자열)
+        {"type": "text", "file": {"content": "..."}}
+        {"content": "..."} 또는 {"content": [{"type": "text", "text": "..."}]}
+
+    이미지/노트북 등 텍스트가 아닌 응답이면 None.
+    """
+    if isinstance(tool_response, str):
+        return tool_response
+    if not isinstance(tool_response, dict):
+        return None
+    if tool_response.get("type") not in (None, "text"):
+        return None
+
+    file_info = tool_response.get("file")
+    if isinstance(file_info, dict) and isinstance(file_info.get("content"), str):
+        return file_info["content"]
+
+    content = tool_response.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        texts = [
+            block.get("text", "") for block in content
+            if isinstance(block, dict) and block.get("type") == "text"
+        ]
+        return "".join(texts) if texts else None
+    return None
+
+
+def get_read_content(file_path: str, tool_response) -> Optional[str]:
+    """
+    패턴 분석할 Read 내용
+
+    tool_response에 내용이 있으면 그대로 쓰고 (크기 상한 적용),
+    없으면 크기 상한/바이너리 검사를 거쳐 디스크에서 읽는다.
+    """
+    max_bytes = get_read_max_bytes()
+    content = extract_read_response_content(tool_response)
+    if content is not None:
+        if len(content) > max_bytes or "\x00" in content[:BINARY_SNIFF_BYTES]:
+            return None
+        return content
+    return read_text_capped(file_path, max_bytes)
+
+
+def merge_code_patterns(new_patterns: dict, project_hash: str) -> Optional[list]:
+    """
+    감지된 패턴을 knowledge 패턴 히스토그램에 관측 1건으로 기록
+
+    Returns:
+        값이 새로 정해지거나 바뀐 항목 목록 (batched면 빈 목록, 기록하지 못했으면 None)
+    """
     if not new_patterns:
         return []
+    return queue_knowledge_update(project_hash, {"op": "patterns", "observed": new_patterns})
+
+
+def process_code_read(file_path: str, tool_response, project_hash: str) -> list:
+    """
+    코드 파일 Read 시 패턴 분석
+
+    fingerprint index에 (mtime_ns, size)가 같은 항목이 있으면 stat과 조회만 하고 끝낸다.
+    mtime만 바뀌고 내용 해시가 같으면 패턴 감지와 knowledge 병합 없이 fingerprint만 갱신한다.
+    """
+    file_key = os.path.abspath(file_path)
+    fingerprint = stat_fingerprint(file_key)
+    cached = get_cached_fingerprint(project_hash, file_key)
+    if fingerprint and cached and (cached[0], cached[1]) == fingerprint:
+        record_fingerprint_hit(project_hash, file_key)
+        return []
 
-    # knowledge.yaml 로드/생성
-    knowledge = load_knowledge(project_hash)
-    if not knowledge:
-        knowledge = {
-            "version": 1,
-            "project": {
-                "path": os.getcwd(),
-                "hash": project_hash,
-            },
-            "patterns": {},
-            "decisions": [],
-            "pitfalls": [],
-        }
+    # 도구가 방금 읽은 내용(tool_response)을 우선 사용하고, 없을 때만 디스크에서 읽음
+    content = get_read_content(file_path, tool_response)
+    if not content:
+        return []
 
-    # 패턴 병합
-    existing_patterns = knowledge.get("patterns", {})
-    merged, added = merge_patterns(existing_patterns, new_patterns)
+    # 일부만 읽은 경우 (offset/limit) 파일 전체의 fingerprint로 기록하지 않음
+    size, digest = fingerprint_content(content)
+    is_whole_file = fingerprint is not None and size == fingerprint[1]
 
-    if added:
-        knowledge["patterns"] = merged
-        knowledge["updated_at"] = get_timestamp()
-        save_knowledge(project_hash, knowledge)
+    if is_whole_file and cached and cached[2] == digest:
+        update_fingerprint(project_hash, file_key, fingerprint, digest, cached[3], hit=True)
+        return []
 
-    return added
+    new_patterns = detect_code_patterns(file_path, content)
+    added = merge_code_patterns(new_patterns, project_hash)
+    if added is not None and is_whole_file:
+        update_fingerprint(project_hash, file_key, fingerprint, digest, new_patterns)
+    return added or []
 
 
 def main():
@@ -287,6 +325,9 @@ def main():
     # Write/Edit: Contract 파일 처리
     if tool_name in ["Write", "Edit"]:
         if is_contract_file(file_path):
+            # 0. contract manifest 갱신 (sqlite 백엔드는 contracts 테이블)
+            register_contract_file(project_hash, file_path)
+
             # 1. knowledge.yaml 업데이트
             updates = process_contract_file(file_path, project_hash)
 
@@ -320,14 +361,10 @@ def main():
 
     # Read: 코드 패턴 분석
     elif tool_name == "Read":
-        # Read 도구의 경우 content가 tool_input에 없을 수 있음
-        # 실제로 파일 내용을 읽어야 함
-        if Path(file_path).exists():
-            try:
-                content = Path(file_path).read_text(encoding="utf-8")
-                updates = process_code_read(file_path, content, project_hash)
-            except Exception:
-                pass
+        try:
+            updates = process_code_read(file_path, input_data.get("tool_response"), project_hash)
+        except Exception:
+            pass
 
     # 결과 출력
     all_outputs = []
@@ -18,12 +18,19 @@ from hooks.common import (
     read_stdin_json,
     output_result,
     get_project_hash,
-    load_state,
-    load_knowledge,
-    count_pending_subtasks,
-    count_pending_tasks,
-    get_current_work,
-    format_knowledge_summary,
+    get_state_overview,
+    load_knowledge_summary,
+    search_knowledge,
+    build_knowledge_query,
+    format_relevant_knowledge,
+    context_section,
+    build_context_message,
+    CONTEXT_PRIORITY_CURRENT_WORK,
+    CONTEXT_PRIORITY_NEXT_ACTION,
+    CONTEXT_PRIORITY_KNOWLEDGE,
+    COMPACT_KNOWLEDGE_ITEMS,
+    flush_knowledge_updates,
+    reset_injected_context,
 )
 
 
@@ -34,27 +41,29 @@ def main():
 
     project_hash = get_project_hash()
 
-    # state.json 확인
-    state = load_state(project_hash)
-    if not state:
+    # 압축 전에 knowledge 변경 버퍼 반영 (관련 knowledge 검색에 포함되도록)
+    flush_knowledge_updates(project_hash)
+
+    # 압축 후 첫 프롬프트에는 전체 재개 메시지를 다시 주입
+    reset_injected_context(project_hash)
+
+    # 상태 요약 확인
+    overview = get_state_overview(project_hash)
+    if not overview:
         # 오케스트레이터 세션 없음
         return
 
-    request = state.get("request", {})
-    if request.get("status") != "active":
+    if overview.get("status") != "active":
         # 활성 세션 아님
         return
 
     # 현재 작업 정보
-    current_work = get_current_work(state)
-    pending_subtasks = count_pending_subtasks(state)
-    pending_tasks = count_pending_tasks(state)
+    current_work = overview["current_work"]
+    pending_subtasks = overview["pending_subtasks"]
+    pending_tasks = overview["pending_tasks"]
 
     # 핵심 상태 요약 생성
-    lines = [
-        "[Orchestrator Context - Preserve after compaction]",
-        "",
-    ]
+    lines = []
 
     if current_work.get("request"):
         lines.append(f"Request: {current_work.get('request')[:100]}")
@@ -66,27 +75,33 @@ def main():
         phase = current_work.get("phase", "")
         lines.append(f"Current Subtask: {current_work.get('subtask_id')} - {phase}")
 
-    lines.extend([
-        f"Remaining: {pending_tasks} tasks, {pending_subtasks} subtasks",
-    ])
-
-    # knowledge 핵심 정보
-    knowledge = load_knowledge(project_hash)
-    if knowledge:
-        pitfalls = knowledge.get("pitfalls", [])
+    lines.append(f"Remaining: {pending_tasks} tasks, {pending_subtasks} subtasks")
+
+    sections = [context_section("\n".join(lines), CONTEXT_PRIORITY_CURRENT_WORK, required=True)]
+
+    # knowledge 핵심 정보 (현재 작업과 관련된 항목, 없으면 상위 pitfalls)
+    relevant = search_knowledge(project_hash, build_knowledge_query(current_work))
+    if relevant:
+        sections.append(context_section(
+            f"Relevant Knowledge:\n{format_relevant_knowledge(relevant)}",
+            CONTEXT_PRIORITY_KNOWLEDGE,
+            compact=f"Relevant Knowledge:\n{format_relevant_knowledge(relevant[:COMPACT_KNOWLEDGE_ITEMS])}",
+        ))
+    else:
+        knowledge = load_knowledge_summary(project_hash)
+        pitfalls = knowledge.get("pitfalls", []) if knowledge else []
         if pitfalls:
-            lines.append("")
-            lines.append("Key Pitfalls:")
-            for p in pitfalls[:3]:
-                desc = p.get("description", "")[:60]
-                lines.append(f"- {desc}")
-
-    lines.extend([
-        "",
-        "To resume: '/orchestrator resume'",
-    ])
-
-    output_result("\n".join(lines), hook_event="PreCompact")
+            pitfall_lines = [f"- {p.get('description', '')[:60]}" for p in pitfalls[:3]]
+            sections.append(context_section(
+                "Key Pitfalls:\n" + "\n".join(pitfall_lines),
+                CONTEXT_PRIORITY_KNOWLEDGE,
+                compact="Key Pitfalls:\n" + "\n".join(pitfall_lines[:COMPACT_KNOWLEDGE_ITEMS]),
+            ))
+
+    sections.append(context_section("To resume: '/orchestrator resume'", CONTEXT_PRIORITY_NEXT_ACTION, required=True))
+
+    header = "[Orchestrator Context - Preserve after compaction]"
+    output_result(build_context_message(header, sections, hook_event="PreCompact"), hook_event="PreCompact")
 
 
 if __name__ == "__main__":
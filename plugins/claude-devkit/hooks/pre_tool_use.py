@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 """
-PreToolUse Hook - STUB
+PreToolUse Hook - 서브에이전트 배정 기록
+
+도구 실행 전 실행되어:
+1. depends_on 스케줄링 세션에서 Task tool로 subtask 레벨 에이전트를 띄우면
+   프롬프트에 id가 언급된 진행 중 subtask에 에이전트 배정 기록
+   (SubagentStop이 병렬 에이전트의 완료를 어느 subtask에 귀속할지 정할 때 사용)
 
-도구 실행 전 검증을 위한 훅.
 향후 구현 예정:
 - 위험 명령어 차단 (rm -rf, git push --force 등)
 - 민감 파일 보호 (.env, credentials 등)
 - 특정 디렉터리 보호
 
-현재는 모든 도구 실행을 허용합니다.
+도구 실행은 모두 허용합니다 (아무것도 출력하지 않음).
 """
 
 import sys
@@ -17,17 +21,44 @@ import os
 # hooks 패키지 경로 추가
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from hooks.common import read_stdin_json
+from hooks.common import (
+    read_stdin_json,
+    log_orchestrator,
+    get_project_hash,
+    get_agent_config,
+    StateSession,
+    is_dag_scheduling,
+    record_subtask_dispatch_in_state,
+)
 
 
 def main():
-    """PreToolUse Hook 메인 함수 - STUB"""
-    # stdin에서 입력 읽기 (프로토콜 준수)
-    _ = read_stdin_json()
+    """PreToolUse Hook 메인 함수"""
+    input_data = read_stdin_json()
+
+    # 모든 도구 호출마다 실행되므로 Task tool이 아니면 state를 읽지 않음
+    if input_data.get("tool_name") != "Task":
+        return
+
+    tool_input = input_data.get("tool_input") or {}
+    # "claude-devkit:qa-engineer" 형태의 plugin 접두사 제거
+    agent_type = str(tool_input.get("subagent_type", "")).lower().rsplit(":", 1)[-1]
+    agent_config = get_agent_config(agent_type)
+    if not agent_config or agent_config.get("level") != "subtask":
+        return
+
+    prompt = f"{tool_input.get('description', '')}\n{tool_input.get('prompt', '')}"
+
+    project_hash = get_project_hash()
+    with StateSession(project_hash) as session:
+        state = session.state
+        if not state or state.get("request", {}).get("status") != "active" or not is_dag_scheduling(state):
+            return
 
-    # TODO: 향후 구현
-    # 현재는 모든 도구 실행 허용 (아무것도 출력하지 않음)
-    pass
+        subtask_id = record_subtask_dispatch_in_state(state, agent_type, prompt)
+        if subtask_id:
+            session.mark_dirty()
+            log_orchestrator(f"{agent_type} dispatched for {subtask_id}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Project Profiler - 백그라운드 프로젝트 패턴 스캔 (opt-in)
+
+에이전트가 우연히 Read한 파일에서만 패턴을 배우는 대신, 저장소 전체를 한 번 훑어
+knowledge.yaml에 프로젝트 프로필을 기록한다:
+1. .gitignore를 따르는 파일 목록 (git ls-files, git이 없으면 직접 탐색)
+2. vendor/빌드 산출물 디렉토리와 바이너리 파일 제외
+3. 파일 묶음을 process pool에 나눠 detect_code_patterns 규칙 적용
+4. key별 값 빈도를 집계하여 패턴 히스토그램에 파일 수만큼 투표
+
+사용법:
+    python3 profiler.py start     # 백그라운드 실행
+    python3 profiler.py run       # foreground 실행
+    python3 profiler.py status    # 마지막 스캔 시각 확인
+"""
+
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# hooks 패키지 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hooks.common import (
+    get_project_hash,
+    get_profiler_config,
+    get_knowledge_path,
+    get_read_max_bytes,
+    read_text_capped,
+    detect_code_patterns,
+    vote_patterns,
+    get_timestamp,
+    file_lock,
+    KnowledgeSession,
+    log_orchestrator,
+)
+
+
+DEFAULT_MAX_FILES = 20000
+DEFAULT_RESCAN_AFTER = 86400
+
+# worker 1회 호출에 넘기는 파일 수 (이보다 적으면 pool 없이 실행)
+CHUNK_SIZE = 64
+
+DEFAULT_SKIP_DIRS = [
+    ".git", ".claude", ".idea", ".vscode", ".gradle", ".venv", "venv", "__pycache__",
+    "node_modules", "vendor", "third_party", "build", "dist", "target", "out", "coverage",
+]
+
+# 내용을 열지 않고 제외하는 바이너리 확장자
+BINARY_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".pdf", ".zip", ".gz",
+    ".tgz", ".tar", ".7z", ".jar", ".war", ".class", ".so", ".dylib", ".dll", ".exe",
+    ".o", ".a", ".pyc", ".woff", ".woff2", ".ttf", ".otf", ".mp3", ".mp4", ".mov",
+    ".sqlite", ".db",
+}
+
+
+# =============================================================================
+# 파일 목록
+# =============================================================================
+
+def get_profile_stamp_path(project_hash: str) -> Path:
+    """마지막 스캔 완료 시각 기록 (mtime 사용)"""
+    return get_knowledge_path(project_hash).with_name("profile.stamp")
+
+
+def get_profile_lock_path(project_hash: str) -> Path:
+    """동시 스캔 방지 잠금 파일 경로"""
+    return get_knowledge_path(project_hash).with_name("profile.lock")
+
+
+def git_ls_files(root: Path) -> Optional[List[str]]:
+    """git이 추적 중이거나 .gitignore에 걸리지 않은 파일 (git 저장소가 아니면 None)"""
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(root), "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return [path for path in result.stdout.decode("utf-8", "surrogateescape").split("\0") if path]
+
+
+def compile_gitignore_pattern(pattern: str) -> Optional[Tuple[Any, bool, bool, bool]]:
+    """
+    .gitignore 한 줄 → (정규식, 부정 여부, 디렉토리 전용 여부, 경로 기준 여부)
+
+    주석/빈 줄이면 None. '/'가 들어간 패턴은 .gitignore 위치 기준 상대 경로,
+    아니면 파일/디렉토리 이름과 비교한다.
+    """
+    pattern = pattern.rstrip("\n").rstrip()
+    if not pattern or pattern.startswith("#"):
+        return None
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    if not pattern:
+        return None
+
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            parts.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            parts.append("[" + pattern[i + 1:end].replace("\\", "\\\\") + "]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return re.compile("".join(parts) + r"\Z"), negate, dir_only, anchored
+
+
+def load_gitignore(directory: Path) -> List[Tuple[Any, bool, bool, bool]]:
+    """디렉토리의 .gitignore 규칙 (없으면 빈 목록)"""
+    try:
+        lines = (directory / ".gitignore").read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return []
+    return [rule for rule in map(compile_gitignore_pattern, lines) if rule]
+
+
+def is_ignored(rules_stack: List[Tuple[Path, list]], path: Path, is_dir: bool) -> bool:
+    """상위 디렉토리의 .gitignore 규칙을 순서대로 적용 (마지막으로 일치한 규칙이 결정)"""
+    ignored = False
+    for base, rules in rules_stack:
+        rel = path.relative_to(base).as_posix()
+        for regex, negate, dir_only, anchored in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel if anchored else path.name):
+                ignored = not negate
+    return ignored
+
+
+def walk_project_files(root: Path, skip_dirs: set, max_files: int) -> List[str]:
+    """git 없이 .gitignore를 해석하며 파일 탐색"""
+    files: List[str] = []
+    stack = [(root, [(root, load_gitignore(root))])]
+    while stack and len(files) < max_files:
+        directory, rules_stack = stack.pop()
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            path = Path(entry.path)
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir and entry.name in skip_dirs:
+                continue
+            if is_ignored(rules_stack, path, is_dir):
+                continue
+            if is_dir:
+                subdirs.append(path)
+            elif entry.is_file(follow_symlinks=False):
+                files.append(path.relative_to(root).as_posix())
+        for subdir in reversed(subdirs):
+            stack.append((subdir, rules_stack + [(subdir, load_gitignore(subdir))]))
+    return files
+
+
+def list_project_files(root: Path, skip_dirs: set, max_files: int) -> List[str]:
+    """스캔 대상 파일 (root 기준 상대 경로, 정렬됨)"""
+    files = git_ls_files(root)
+    if files is None:
+        files = walk_project_files(root, skip_dirs, max_files)
+
+    selected = []
+    for rel in sorted(files):
+        parts = rel.split("/")
+        if any(part in skip_dirs for part in parts[:-1]):
+            continue
+        if os.path.splitext(parts[-1])[1].lower() in BINARY_EXTENSIONS:
+            continue
+        selected.append(rel)
+        if len(selected) >= max_files:
+            break
+    return selected
+
+
+# =============================================================================
+# 스캔 / 집계
+# =============================================================================
+
+def scan_files(root: str, paths: List[str], max_bytes: int) -> Tuple[int, Dict[str, Dict[str, int]]]:
+    """
+    파일 묶음에 detect_code_patterns 적용 (process pool worker)
+
+    Returns:
+        (분석한 파일 수, key → 값 → 감지된 파일 수)
+    """
+    scanned = 0
+    counts: Dict[str, Dict[str, int]] = {}
+    for rel in paths:
+        content = read_text_capped(os.path.join(root, rel), max_bytes)
+        if content is None:
+            continue
+        scanned += 1
+        for key, value in detect_code_patterns(rel, content).items():
+            values = counts.setdefault(key, {})
+            values[value] = values.get(value, 0) + 1
+    return scanned, counts
+
+
+def merge_counts(total: Dict[str, Dict[str, int]], counts: Dict[str, Dict[str, int]]) -> None:
+    """worker 집계 결과를 합산 (key 순서는 먼저 나온 순서 유지)"""
+    for key, values in counts.items():
+        total_values = total.setdefault(key, {})
+        for value, count in values.items():
+            total_values[value] = total_values.get(value, 0) + count
+
+
+def profile_project(root: Path, config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    프로젝트 전체 스캔
+
+    Returns:
+        {"files": 분석한 파일 수, "pattern_counts": key → 값 → 파일 수, "elapsed": 초}
+    """
+    started = time.monotonic()
+    skip_dirs = set(config.get("skip_dirs") or DEFAULT_SKIP_DIRS)
+    max_files = int(config.get("max_files", DEFAULT_MAX_FILES))
+    workers = int(config.get("workers", 0)) or os.cpu_count() or 1
+    max_bytes = get_read_max_bytes()
+
+    files = list_project_files(root, skip_dirs, max_files)
+    chunks = [files[i:i + CHUNK_SIZE] for i in range(0, len(files), CHUNK_SIZE)]
+
+    scanned = 0
+    counts: Dict[str, Dict[str, int]] = {}
+    if workers <= 1 or len(chunks) <= 1:
+        results = (scan_files(str(root), chunk, max_bytes) for chunk in chunks)
+        for chunk_scanned, chunk_counts in results:
+            scanned += chunk_scanned
+            merge_counts(counts, chunk_counts)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            # map은 제출 순서대로 결과를 돌려주므로 집계 순서가 실행마다 같음
+            results = pool.map(
+                scan_files, [str(root)] * len(chunks), chunks, [max_bytes] * len(chunks)
+            )
+            for chunk_scanned, chunk_counts in results:
+                scanned += chunk_scanned
+                merge_counts(counts, chunk_counts)
+
+    return {
+        "files": scanned,
+        "pattern_counts": counts,
+        "elapsed": round(time.monotonic() - started, 3),
+    }
+
+
+def save_profile(project_hash: str, profile: Dict[str, Any]) -> list:
+    """
+    프로필을 knowledge.yaml에 기록
+
+    key별 값마다 감지된 파일 수를 가중치로 패턴 히스토그램에 투표한다.
+
+    Returns:
+        값이 새로 정해지거나 바뀐 패턴 목록
+    """
+    with KnowledgeSession(project_hash) as session:
+        knowledge = session.knowledge
+        if knowledge is None:
+            return []
+
+        before = dict(knowledge.get("patterns") or {})
+        for key, values in profile["pattern_counts"].items():
+            for value, count in values.items():
+                vote_patterns(knowledge, {key: value}, weight=count)
+        changed = [
+            f"{key}: {value}" for key, value in knowledge["patterns"].items()
+            if before.get(key) != value
+        ]
+        knowledge["profile"] = {
+            "scanned_at": get_timestamp(),
+            "files": profile["files"],
+            "pattern_counts": profile["pattern_counts"],
+        }
+        knowledge["updated_at"] = knowledge["profile"]["scanned_at"]
+        session.mark_dirty()
+    return changed
+
+
+def run_profiler(project_hash: str) -> bool:
+    """스캔 실행 후 knowledge.yaml 기록 (다른 스캔이 진행 중이면 False)"""
+    with file_lock(get_profile_lock_path(project_hash), timeout=0) as acquired:
+        if not acquired:
+            return False
+        profile = profile_project(Path(os.getcwd()), get_profiler_config())
+        added = save_profile(project_hash, profile)
+        stamp_path = get_profile_stamp_path(project_hash)
+        stamp_path.write_text(get_timestamp(), encoding="utf-8")
+    log_orchestrator(
+        f"Project profiled: {profile['files']} files in {profile['elapsed']}s"
+        + (f", added {', '.join(added)}" if added else "")
+    )
+    return True
+
+
+# =============================================================================
+# 백그라운드 실행
+# =============================================================================
+
+def is_profile_fresh(project_hash: str) -> bool:
+    """profiler.rescan_after(초) 이내에 스캔을 마쳤는지 여부"""
+    rescan_after = float(get_profiler_config().get("rescan_after", DEFAULT_RESCAN_AFTER))
+    try:
+        return time.time() - get_profile_stamp_path(project_hash).stat().st_mtime < rescan_after
+    except OSError:
+        return False
+
+
+def start_profiler(project_hash: Optional[str] = None, force: bool = False) -> bool:
+    """
+    스캔을 분리된 백그라운드 프로세스로 실행 (기다리지 않음)
+
+    Returns:
+        프로세스 생성 여부 (최근 스캔이 있어 생략했으면 False)
+    """
+    project_hash = project_hash or get_project_hash()
+    if not force and is_profile_fresh(project_hash):
+        return False
+
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "run"],
+            cwd=os.getcwd(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        return False
+    return True
+
+
+def main():
+    """Project Profiler 메인 함수"""
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    project_hash = get_project_hash()
+
+    if command == "run":
+        if not run_profiler(project_hash):
+            print("profiler already running", file=sys.stderr)
+            sys.exit(1)
+    elif command == "start":
+        print("profiler started" if start_profiler(project_hash, force=True) else "profiler failed to start")
+    elif command == "status":
+        stamp_path = get_profile_stamp_path(project_hash)
+        try:
+            print(f"last scan: {stamp_path.read_text(encoding='utf-8')}")
+        except OSError:
+            print("not scanned")
+            sys.exit(1)
+    else:
+        print("usage: profiler.py start|run|status", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,29 +20,44 @@ from hooks.common import (
     log_orchestrator,
     get_project_hash,
     load_state,
-    load_knowledge,
+    get_state_overview,
+    load_knowledge_summary,
     count_pending_subtasks,
     count_pending_tasks,
     get_current_work,
     format_progress_tree,
+    format_progress_tree_compact,
     format_knowledge_summary,
+    search_knowledge,
+    build_knowledge_query,
+    format_relevant_knowledge,
+    context_section,
+    build_context_message,
+    CONTEXT_PRIORITY_CURRENT_WORK,
+    CONTEXT_PRIORITY_NEXT_ACTION,
+    CONTEXT_PRIORITY_PROGRESS,
+    CONTEXT_PRIORITY_KNOWLEDGE,
+    COMPACT_KNOWLEDGE_ITEMS,
+    flush_knowledge_updates,
+    reset_injected_context,
+    rebuild_contract_manifest,
     initialize_session,
     save_current_session_id,
+    get_daemon_config,
+    get_profiler_config,
+    is_daemon_process,
 )
+from hooks.daemon import start_daemon
+from hooks.profiler import start_profiler
 
 
-def generate_recovery_message(state: dict, current_work: dict, knowledge: dict) -> str:
-    """기존 세션 복구 안내 메시지 생성"""
+def generate_recovery_message(state: dict, current_work: dict, knowledge: dict,
+                              relevant: list = None) -> str:
+    """기존 세션 복구 안내 메시지 생성 (context_budget 예산 적용)"""
     pending_subtasks = count_pending_subtasks(state)
     pending_tasks = count_pending_tasks(state)
 
-    lines = [
-        "[Orchestrator Session Found]",
-        "",
-        "미완료 세션이 있습니다.",
-        "",
-        f"요청: {current_work.get('request', 'N/A')}",
-    ]
+    lines = [f"요청: {current_work.get('request', 'N/A')}"]
 
     if current_work.get("task_id"):
         lines.append(f"현재 Task: {current_work.get('task_id')} ({current_work.get('task_name')})")
@@ -55,27 +70,41 @@ def generate_recovery_message(state: dict, current_work: dict, knowledge: dict)
     lines.extend([
         f"남은 Tasks: {pending_tasks}",
         f"남은 Subtasks: {pending_subtasks}",
-        "",
-        "Progress:",
-        format_progress_tree(state),
     ])
 
+    sections = [
+        context_section("\n".join(lines), CONTEXT_PRIORITY_CURRENT_WORK, required=True),
+        context_section(
+            f"Progress:\n{format_progress_tree(state)}",
+            CONTEXT_PRIORITY_PROGRESS,
+            compact=f"Progress:\n{format_progress_tree_compact(state)}",
+        ),
+    ]
+
     # knowledge 정보 추가
     if knowledge:
-        lines.extend([
-            "",
-            "Project Knowledge:",
-            format_knowledge_summary(knowledge),
-        ])
-
-    lines.extend([
-        "",
+        sections.append(context_section(
+            f"Project Knowledge:\n{format_knowledge_summary(knowledge)}",
+            CONTEXT_PRIORITY_KNOWLEDGE,
+            compact=f"Project Knowledge:\n{format_knowledge_summary(knowledge, max_items=1)}",
+        ))
+
+    # 현재 작업과 관련된 decisions/pitfalls
+    if relevant:
+        sections.append(context_section(
+            f"Relevant Knowledge:\n{format_relevant_knowledge(relevant)}",
+            CONTEXT_PRIORITY_KNOWLEDGE,
+            compact=f"Relevant Knowledge:\n{format_relevant_knowledge(relevant[:COMPACT_KNOWLEDGE_ITEMS])}",
+        ))
+
+    sections.append(context_section("\n".join([
         "선택:",
         "- 이어서 작업하려면: '이어서 진행해줘' 또는 '/orchestrator resume'",
         "- 새로 시작하려면: '새 세션으로 시작해줘' 또는 키워드로 새 요청",
-    ])
+    ]), CONTEXT_PRIORITY_NEXT_ACTION, required=True))
 
-    return "\n".join(lines)
+    header = "[Orchestrator Session Found]\n\n미완료 세션이 있습니다."
+    return build_context_message(header, sections, hook_event="SessionStart")
 
 
 def generate_new_session_message() -> str:
@@ -104,25 +133,40 @@ def main():
     session_id = str(uuid.uuid4())[:8]
     save_current_session_id(session_id)
 
+    # 상주 훅 데몬 자동 실행 (opt-in, 기다리지 않음)
+    if get_daemon_config().get("autostart") and not is_daemon_process():
+        start_daemon(wait=False)
+
     project_hash = get_project_hash()
 
-    # 1. state.json 확인
-    state = load_state(project_hash)
+    # 이전 세션에서 반영하지 못한 knowledge 변경 버퍼 저장
+    flush_knowledge_updates(project_hash)
+
+    # 새 컨텍스트이므로 첫 프롬프트에 전체 재개 메시지 주입
+    reset_injected_context(project_hash)
+
+    # 세션 밖에서 추가/삭제된 contract 반영 (mtime/size가 같은 파일은 해시 재계산 생략)
+    rebuild_contract_manifest(project_hash)
+
+    # 프로젝트 전체 패턴 스캔 (opt-in, 기다리지 않음, rescan_after 이내면 생략)
+    if get_profiler_config().get("autostart"):
+        start_profiler(project_hash)
 
-    # 2. 기존 세션 상태 판단
-    if state:
-        request = state.get("request", {})
-        request_status = request.get("status")
+    # 1. 상태 요약 확인 (summary.json)
+    overview = get_state_overview(project_hash)
 
-        # 미완료 세션 (active 상태)
-        if request_status == "active":
-            pending_subtasks = count_pending_subtasks(state)
+    # 2. 미완료 세션 (active 상태)일 때만 전체 state 로드
+    if overview and overview.get("status") == "active":
+        pending_subtasks = overview["pending_subtasks"]
 
-            if pending_subtasks > 0:
+        if pending_subtasks > 0:
+            state = load_state(project_hash)
+            if state:
                 # 미완료 작업이 있는 세션 → 복구 안내
                 current_work = get_current_work(state)
-                knowledge = load_knowledge(project_hash)
-                message = generate_recovery_message(state, current_work, knowledge)
+                knowledge = load_knowledge_summary(project_hash)
+                relevant = search_knowledge(project_hash, build_knowledge_query(current_work))
+                message = generate_recovery_message(state, current_work, knowledge, relevant)
                 log_orchestrator(f"Session found: {pending_subtasks} subtasks remaining")
                 output_result(message, hook_event="SessionStart")
                 return
@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+SQLite 저장소 백엔드 (storage.backend: sqlite)
+
+state.json / events.jsonl / knowledge.yaml / contracts 디렉토리 탐색 대신
+프로젝트당 하나의 WAL 모드 SQLite 파일(.claude/orchestrator/orchestrator.db)에
+request, task, subtask, 상태 이벤트, contract 메타데이터, decisions, pitfalls를 저장한다.
+
+- state는 hooks.common과 동일한 딕셔너리 형태로 조립/분해한다
+- StateSession은 BEGIN IMMEDIATE 트랜잭션 안에서 로드/저장한다 (파일 잠금 불필요)
+- 이벤트가 건드린 task/subtask 행만 갱신한다
+- 미완료 개수, 현재 작업, 게이트용 contract 존재 여부는 인덱스 조회로 처리한다
+
+표준 라이브러리(sqlite3)만 사용하며 hooks.common을 import하지 않는다.
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+SCHEMA_VERSION = 2
+
+# hooks.common에서 sqlite3를 import하지 않고 예외를 잡기 위한 별칭
+Error = sqlite3.Error
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    project_hash TEXT PRIMARY KEY,
+    request_id   TEXT NOT NULL,
+    status       TEXT,
+    global_phase TEXT,
+    current_task TEXT,
+    task_order   TEXT NOT NULL,
+    request_data TEXT NOT NULL,
+    state_data   TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    project_hash    TEXT NOT NULL,
+    task_id         TEXT NOT NULL,
+    ord             INTEGER NOT NULL,
+    status          TEXT,
+    current_subtask TEXT,
+    data            TEXT NOT NULL,
+    PRIMARY KEY (project_hash, task_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (project_hash, status);
+
+CREATE TABLE IF NOT EXISTS subtasks (
+    project_hash TEXT NOT NULL,
+    task_id      TEXT NOT NULL,
+    subtask_id   TEXT NOT NULL,
+    ord          INTEGER NOT NULL,
+    status       TEXT,
+    phase        TEXT,
+    data         TEXT NOT NULL,
+    PRIMARY KEY (project_hash, task_id, subtask_id)
+);
+CREATE INDEX IF NOT EXISTS idx_subtasks_status ON subtasks (project_hash, status);
+
+CREATE TABLE IF NOT EXISTS events (
+    project_hash TEXT NOT NULL,
+    seq          INTEGER NOT NULL,
+    ts           TEXT,
+    type         TEXT,
+    data         TEXT NOT NULL,
+    PRIMARY KEY (project_hash, seq)
+);
+
+CREATE TABLE IF NOT EXISTS contracts (
+    project_hash TEXT NOT NULL,
+    request_id   TEXT NOT NULL,
+    task_id      TEXT NOT NULL DEFAULT '',
+    subtask_id   TEXT NOT NULL DEFAULT '',
+    name         TEXT NOT NULL,
+    path         TEXT NOT NULL,
+    size         INTEGER,
+    mtime_ns     INTEGER,
+    content_hash TEXT,
+    PRIMARY KEY (project_hash, request_id, task_id, subtask_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_contracts_name ON contracts (project_hash, name);
+
+CREATE TABLE IF NOT EXISTS knowledge (
+    project_hash TEXT PRIMARY KEY,
+    data         TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS decisions (
+    project_hash TEXT NOT NULL,
+    ord          INTEGER NOT NULL,
+    decision_id  TEXT,
+    data         TEXT NOT NULL,
+    PRIMARY KEY (project_hash, ord)
+);
+CREATE INDEX IF NOT EXISTS idx_decisions_id ON decisions (project_hash, decision_id);
+
+CREATE TABLE IF NOT EXISTS pitfalls (
+    project_hash TEXT NOT NULL,
+    ord          INTEGER NOT NULL,
+    data         TEXT NOT NULL,
+    PRIMARY KEY (project_hash, ord)
+);
+"""
+
+# 인덱스 컬럼으로 분리되어 data JSON에 중복 저장하지 않는 키
+REQUEST_COLUMNS = ("id", "status", "global_phase", "current_task")
+TASK_COLUMNS = ("status", "current_subtask", "subtasks")
+SUBTASK_COLUMNS = ("status", "phase")
+
+# 프로세스 단위 연결 재사용 (데몬 모드에서 요청 간 공유): "pid:db 경로" → 연결
+_CONNECTIONS: Dict[str, sqlite3.Connection] = {}
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def connect(db_path: Path, busy_timeout: float) -> sqlite3.Connection:
+    """WAL 모드 연결 (프로세스 내 재사용, 최초 연결 시 스키마 생성)"""
+    # fork된 자식 프로세스는 부모의 연결을 공유하지 않음
+    key = f"{os.getpid()}:{db_path}"
+    conn = _CONNECTIONS.get(key)
+    if conn is not None:
+        return conn
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    # 트랜잭션은 transaction()에서 직접 관리
+    conn = sqlite3.connect(str(db_path), timeout=busy_timeout, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        conn.executescript(SCHEMA)
+        if version == 1:
+            # v2: contract 내용 해시
+            conn.execute("ALTER TABLE contracts ADD COLUMN content_hash TEXT")
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    _CONNECTIONS[key] = conn
+    return conn
+
+
+@contextlib.contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[Optional[sqlite3.Connection]]:
+    """
+    쓰기 트랜잭션 (BEGIN IMMEDIATE로 시작 시점에 쓰기 잠금 확보)
+
+    이미 트랜잭션 안이면 바깥 트랜잭션에 합류한다. 예외 시 rollback.
+    잠금을 얻지 못하면 None을 yield한다 (hooks.common.file_lock과 같은 사용법).
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError:
+        # busy_timeout 내에 쓰기 잠금을 얻지 못함
+        yield None
+        return
+
+    try:
+        yield conn
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    if conn.in_transaction:
+        conn.execute("COMMIT")
+
+
+def rollback(conn: sqlite3.Connection) -> None:
+    """진행 중인 트랜잭션 취소 (transaction() 종료 시 COMMIT하지 않음)"""
+    if conn.in_transaction:
+        conn.execute("ROLLBACK")
+
+
+# =============================================================================
+# state
+# =============================================================================
+
+def load_state(conn: sqlite3.Connection, project_hash: str) -> Optional[Dict[str, Any]]:
+    """행들을 조립하여 hooks.common의 state 딕셔너리 형태로 반환"""
+    row = conn.execute(
+        "SELECT request_id, status, global_phase, current_task, task_order, request_data, state_data"
+        " FROM requests WHERE project_hash = ?",
+        (project_hash,),
+    ).fetchone()
+    if row is None:
+        return None
+
+    request_id, status, global_phase, current_task, task_order, request_data, state_data = row
+    request = {"id": request_id, **json.loads(request_data)}
+    request.update(status=status, global_phase=global_phase, current_task=current_task)
+
+    state = json.loads(state_data)
+    state["request"] = request
+    state["task_order"] = json.loads(task_order)
+    state["tasks"] = tasks = {}
+
+    for task_id, task_status, current_subtask, data in conn.execute(
+        "SELECT task_id, status, current_subtask, data FROM tasks"
+        " WHERE project_hash = ? ORDER BY ord",
+        (project_hash,),
+    ):
+        task = json.loads(data)
+        task.update(status=task_status, current_subtask=current_subtask, subtasks={})
+        tasks[task_id] = task
+
+    for task_id, subtask_id, subtask_status, phase, data in conn.execute(
+        "SELECT task_id, subtask_id, status, phase, data FROM subtasks"
+        " WHERE project_hash = ? ORDER BY task_id, ord",
+        (project_hash,),
+    ):
+        task = tasks.get(task_id)
+        if task is not None:
+            subtask = json.loads(data)
+            subtask.update(status=subtask_status, phase=phase)
+            task["subtasks"][subtask_id] = subtask
+
+    return state
+
+
+def _write_request_row(conn: sqlite3.Connection, project_hash: str, state: Dict[str, Any]) -> None:
+    request = state.get("request", {})
+    state_data = {
+        key: value for key, value in state.items()
+        if key not in ("request", "task_order", "tasks", "journal")
+    }
+    conn.execute(
+        "INSERT OR REPLACE INTO requests"
+        " (project_hash, request_id, status, global_phase, current_task, task_order, request_data, state_data)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            project_hash,
+            request.get("id", "R1"),
+            request.get("status"),
+            request.get("global_phase"),
+            request.get("current_task"),
+            _dumps(state.get("task_order", [])),
+            _dumps({k: v for k, v in request.items() if k not in REQUEST_COLUMNS}),
+            _dumps(state_data),
+        ),
+    )
+
+
+def _write_task_row(conn: sqlite3.Connection, project_hash: str, state: Dict[str, Any], task_id: str) -> None:
+    task = state.get("tasks", {}).get(task_id)
+    if task is None:
+        return
+    task_order = state.get("task_order", [])
+    ord_ = task_order.index(task_id) if task_id in task_order else len(task_order)
+    conn.execute(
+        "INSERT OR REPLACE INTO tasks (project_hash, task_id, ord, status, current_subtask, data)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            project_hash, task_id, ord_,
+            task.get("status"), task.get("current_subtask"),
+            _dumps({k: v for k, v in task.items() if k not in TASK_COLUMNS}),
+        ),
+    )
+
+
+def _write_subtask_row(conn: sqlite3.Connection, project_hash: str, state: Dict[str, Any],
+                       task_id: str, subtask_id: str) -> None:
+    task = state.get("tasks", {}).get(task_id, {})
+    subtask = task.get("subtasks", {}).get(subtask_id)
+    if subtask is None:
+        return
+    subtask_order = task.get("subtask_order", [])
+    ord_ = subtask_order.index(subtask_id) if subtask_id in subtask_order else len(subtask_order)
+    conn.execute(
+        "INSERT OR REPLACE INTO subtasks (project_hash, task_id, subtask_id, ord, status, phase, data)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            project_hash, task_id, subtask_id, ord_,
+            subtask.get("status"), subtask.get("phase"),
+            _dumps({k: v for k, v in subtask.items() if k not in SUBTASK_COLUMNS}),
+        ),
+    )
+
+
+def write_full_state(conn: sqlite3.Connection, project_hash: str, state: Dict[str, Any]) -> None:
+    """state 전체를 행 단위로 다시 기록 (새 세션, breakdown 반영, 직접 수정 시)"""
+    _write_request_row(conn, project_hash, state)
+    conn.execute("DELETE FROM tasks WHERE project_hash = ?", (project_hash,))
+    conn.execute("DELETE FROM subtasks WHERE project_hash = ?", (project_hash,))
+    for task_id, task in state.get("tasks", {}).items():
+        _write_task_row(conn, project_hash, state, task_id)
+        for subtask_id in task.get("subtasks", {}):
+            _write_subtask_row(conn, project_hash, state, task_id, subtask_id)
+
+
+def _touched_rows(event: Dict[str, Any]) -> Optional[List[Tuple[str, ...]]]:
+    """
+    이벤트가 변경한 행 목록
+
+    Returns:
+        [("request",), ("task", T), ("subtask", T, S)], 전체 재기록이 필요하면 None
+    """
+    event_type = event.get("type")
+    task_id = event.get("task_id")
+
+    if event_type in ("session_init", "breakdown_applied"):
+        return None
+    if event_type in ("global_phase", "request_status", "request_completed"):
+        return [("request",)]
+    if event_type == "task_started":
+        rows = [("request",), ("task", task_id)]
+        if event.get("subtask_id"):
+            rows.append(("subtask", task_id, event["subtask_id"]))
+        return rows
+    if event_type == "phase_update":
+        # request 행에는 state revision이 포함됨
+        return [("request",), ("subtask", task_id, event.get("subtask_id"))]
+    if event_type == "subtask_completed":
+        # request 행에는 rollup 카운터가 포함됨
+        rows = [("request",), ("task", task_id), ("subtask", task_id, event.get("subtask_id"))]
+        if event.get("next_subtask_id"):
+            rows.append(("subtask", task_id, event["next_subtask_id"]))
+        return rows
+    if event_type == "task_completed":
+        return [("request",), ("task", task_id)]
+    if event_type == "subtask_started":
+        # request 행에는 in_flight와 현재 Task가 포함됨
+        return [("request",), ("task", task_id), ("subtask", task_id, event.get("subtask_id"))]
+    if event_type in ("subtask_dispatched", "subtask_released"):
+        return [("request",), ("subtask", task_id, event.get("subtask_id"))]
+    return None
+
+
+def append_events(conn: sqlite3.Connection, project_hash: str, events: List[Dict[str, Any]]) -> int:
+    """이벤트 기록 (seq 부여), 마지막 seq 반환"""
+    seq = conn.execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM events WHERE project_hash = ?", (project_hash,)
+    ).fetchone()[0]
+    for event in events:
+        seq += 1
+        event["seq"] = seq
+        conn.execute(
+            "INSERT INTO events (project_hash, seq, ts, type, data) VALUES (?, ?, ?, ?, ?)",
+            (project_hash, seq, event.get("ts"), event.get("type"), _dumps(event)),
+        )
+    return seq
+
+
+def commit_state(conn: sqlite3.Connection, project_hash: str, state: Dict[str, Any],
+                 events: List[Dict[str, Any]], full: bool = False) -> None:
+    """
+    StateSession 종료 시 기록 (호출자가 트랜잭션을 보유)
+
+    이벤트를 기록하고, 이벤트가 건드린 행만 갱신한다.
+    이벤트가 없거나 full=True면 전체를 다시 기록한다.
+    """
+    append_events(conn, project_hash, events)
+
+    touched: List[Tuple[str, ...]] = []
+    for event in events:
+        rows = _touched_rows(event)
+        if rows is None:
+            full = True
+            break
+        touched.extend(row for row in rows if row not in touched)
+
+    if full or not events:
+        write_full_state(conn, project_hash, state)
+        return
+
+    for row in touched:
+        if row[0] == "request":
+            _write_request_row(conn, project_hash, state)
+        elif row[0] == "task":
+            _write_task_row(conn, project_hash, state, row[1])
+        elif row[0] == "subtask":
+            _write_subtask_row(conn, project_hash, state, row[1], row[2])
+
+
+def read_events(conn: sqlite3.Connection, project_hash: str) -> List[Dict[str, Any]]:
+    """이벤트 이력 (seq 순)"""
+    return [
+        json.loads(data) for (data,) in conn.execute(
+            "SELECT data FROM events WHERE project_hash = ? ORDER BY seq", (project_hash,)
+        )
+    ]
+
+
+# =============================================================================
+# 인덱스 조회
+# =============================================================================
+
+def query_overview(conn: sqlite3.Connection, project_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    상태 요약 (status, current_work, 미완료 개수)을 인덱스 조회로 계산
+
+    Returns:
+        hooks.common.build_state_summary와 같은 형태, 세션이 없으면 None
+    """
+    row = conn.execute(
+        "SELECT request_id, status, global_phase, current_task, request_data"
+        " FROM requests WHERE project_hash = ?",
+        (project_hash,),
+    ).fetchone()
+    if row is None:
+        return None
+
+    request_id, status, global_phase, current_task, request_data = row
+    request = json.loads(request_data)
+    pending_subtasks = conn.execute(
+        "SELECT COUNT(*) FROM subtasks WHERE project_hash = ? AND status IS NOT 'completed'",
+        (project_hash,),
+    ).fetchone()[0]
+    pending_tasks = conn.execute(
+        "SELECT COUNT(*) FROM tasks WHERE project_hash = ? AND status IS NOT 'completed'",
+        (project_hash,),
+    ).fetchone()[0]
+
+    current_work: Dict[str, str] = {}
+    if current_task:
+        task_row = conn.execute(
+            "SELECT current_subtask, data FROM tasks WHERE project_hash = ? AND task_id = ?",
+            (project_hash, current_task),
+        ).fetchone()
+        current_subtask, task_data = task_row if task_row else (None, "{}")
+        subtask_name, phase = "", ""
+        if current_subtask:
+            subtask_row = conn.execute(
+                "SELECT phase, data FROM subtasks"
+                " WHERE project_hash = ? AND task_id = ? AND subtask_id = ?",
+                (project_hash, current_task, current_subtask),
+            ).fetchone()
+            if subtask_row:
+                phase = subtask_row[0] or ""
+                subtask_name = json.loads(subtask_row[1]).get("name", "")
+        current_work = {
+            "request": request.get("original_request", ""),
+            "request_id": request_id,
+            "global_phase": global_phase or "",
+            "task_id": current_task,
+            "task_name": json.loads(task_data).get("name", ""),
+            "subtask_id": current_subtask or "",
+            "subtask_name": subtask_name,
+            "phase": phase,
+        }
+
+    overview = {
+        "status": status,
+        "global_phase": global_phase,
+        "claude_session_id": request.get("claude_session_id"),
+        "current_work": current_work,
+        "pending_subtasks": pending_subtasks,
+        "pending_tasks": pending_tasks,
+    }
+    if request.get("scheduling") == "dag":
+        # 진행 중 subtask 목록 (hooks.common.build_in_flight_summary와 같은 형태)
+        in_flight = []
+        for task_id, subtask_id in request.get("in_flight", []):
+            subtask_row = conn.execute(
+                "SELECT phase, data FROM subtasks"
+                " WHERE project_hash = ? AND task_id = ? AND subtask_id = ?",
+                (project_hash, task_id, subtask_id),
+            ).fetchone()
+            phase, data = subtask_row if subtask_row else ("", "{}")
+            in_flight.append({
+                "task_id": task_id,
+                "subtask_id": subtask_id,
+                "subtask_name": json.loads(data).get("name", ""),
+                "phase": phase or "",
+            })
+        overview.update(scheduling="dag", in_flight=in_flight)
+    return overview
+
+
+# =============================================================================
+# contracts 인덱스
+# =============================================================================
+
+def register_contract(conn: sqlite3.Connection, project_hash: str, scope: Tuple[str, str, str],
+                      name: str, path: Path, content_hash: Optional[str] = None) -> None:
+    """contract 파일 메타데이터 등록/갱신 (scope: (request_id, task_id, subtask_id))"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return
+    request_id, task_id, subtask_id = scope
+    conn.execute(
+        "INSERT OR REPLACE INTO contracts"
+        " (project_hash, request_id, task_id, subtask_id, name, path, size, mtime_ns, content_hash)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (project_hash, request_id, task_id, subtask_id, name, str(path), stat.st_size, stat.st_mtime_ns,
+         content_hash),
+    )
+
+
+def clear_contracts(conn: sqlite3.Connection, project_hash: str) -> None:
+    """프로젝트의 contracts 인덱스 전체 삭제 (디렉토리 순회로 다시 만들기 전)"""
+    conn.execute("DELETE FROM contracts WHERE project_hash = ?", (project_hash,))
+
+
+def find_contract(conn: sqlite3.Connection, project_hash: str, scopes: List[Tuple[str, str, str]],
+                  name: str) -> Optional[Dict[str, Any]]:
+    """
+    주어진 scope들 중 처음으로 등록된 contract 메타데이터
+
+    {"request_id", "task_id", "subtask_id", "path", "size", "mtime_ns", "hash"}
+    등록 후 파일이 삭제되었으면 행을 지우고 None으로 취급한다.
+    """
+    for request_id, task_id, subtask_id in scopes:
+        row = conn.execute(
+            "SELECT path, size, mtime_ns, content_hash FROM contracts WHERE project_hash = ?"
+            " AND request_id = ? AND task_id = ? AND subtask_id = ? AND name = ?",
+            (project_hash, request_id, task_id, subtask_id, name),
+        ).fetchone()
+        if row is None:
+            continue
+        if Path(row[0]).exists():
+            return {
+                "request_id": request_id,
+                "task_id": task_id,
+                "subtask_id": subtask_id,
+                "path": row[0],
+                "size": row[1],
+                "mtime_ns": row[2],
+                "hash": row[3],
+            }
+        conn.execute(
+            "DELETE FROM contracts WHERE project_hash = ? AND request_id = ?"
+            " AND task_id = ? AND subtask_id = ? AND name = ?",
+            (project_hash, request_id, task_id, subtask_id, name),
+        )
+    return None
+
+
+# =============================================================================
+# knowledge
+# =============================================================================
+
+def load_knowledge(conn: sqlite3.Connection, project_hash: str) -> Optional[Dict[str, Any]]:
+    """knowledge 딕셔너리 조립 (decisions/pitfalls는 별도 테이블)"""
+    row = conn.execute("SELECT data FROM knowledge WHERE project_hash = ?", (project_hash,)).fetchone()
+    if row is None:
+        return None
+
+    knowledge = json.loads(row[0])
+    knowledge["decisions"] = [
+        json.loads(data) for (data,) in conn.execute(
+            "SELECT data FROM decisions WHERE project_hash = ? ORDER BY ord", (project_hash,)
+        )
+    ]
+    knowledge["pitfalls"] = [
+        json.loads(data) for (data,) in conn.execute(
+            "SELECT data FROM pitfalls WHERE project_hash = ? ORDER BY ord", (project_hash,)
+        )
+    ]
+    return knowledge
+
+
+def save_knowledge(conn: sqlite3.Connection, project_hash: str, knowledge: Dict[str, Any]) -> None:
+    """knowledge 딕셔너리 기록 (호출자가 트랜잭션을 보유)"""
+    data = {k: v for k, v in knowledge.items() if k not in ("decisions", "pitfalls")}
+    conn.execute(
+        "INSERT OR REPLACE INTO knowledge (project_hash, data) VALUES (?, ?)",
+        (project_hash, _dumps(data)),
+    )
+    conn.execute("DELETE FROM decisions WHERE project_hash = ?", (project_hash,))
+    conn.executemany(
+        "INSERT INTO decisions (project_hash, ord, decision_id, data) VALUES (?, ?, ?, ?)",
+        [
+            (project_hash, i, decision.get("id"), _dumps(decision))
+            for i, decision in enumerate(knowledge.get("decisions", []) or [])
+        ],
+    )
+    conn.execute("DELETE FROM pitfalls WHERE project_hash = ?", (project_hash,))
+    conn.executemany(
+        "INSERT INTO pitfalls (project_hash, ord, data) VALUES (?, ?, ?)",
+        [
+            (project_hash, i, _dumps(pitfall))
+            for i, pitfall in enumerate(knowledge.get("pitfalls", []) or [])
+        ],
+    )
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+State Admin - 오케스트레이션 상태 관리 도구
+
+state.json snapshot과 events.jsonl journal(sqlite 백엔드는 events 테이블)을 점검/정리한다:
+1. compact: journal을 state.json snapshot으로 접기
+2. history: journal 이벤트 이력 출력
+3. replay: 빈 상태에서 특정 seq까지 journal을 재생한 결과 출력
+4. verify: 유지 중인 진행 카운터(rollup)와 실제 개수 비교
+5. rebuild: 진행 카운터를 전체 순회로 다시 계산하여 저장
+6. fingerprints: Read 패턴 분석 fingerprint 캐시 항목 수와 hit rate 출력
+
+사용법:
+    python3 state_admin.py compact
+    python3 state_admin.py history
+    python3 state_admin.py replay [--seq N]
+    python3 state_admin.py verify
+    python3 state_admin.py rebuild
+    python3 state_admin.py fingerprints
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# hooks 패키지 경로 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hooks.common import (
+    get_project_hash,
+    get_journal_path,
+    compact_state_journal,
+    read_state_events,
+    apply_state_event,
+    load_state,
+    StateSession,
+    rebuild_state_rollups,
+    verify_state_rollups,
+    get_fingerprint_stats,
+)
+
+
+def describe_event(event: dict) -> str:
+    """이벤트 1건을 한 줄 요약으로 변환"""
+    event_type = event.get("type", "?")
+    details = [
+        f"{key}={value}" for key, value in event.items()
+        if key not in ("seq", "ts", "type", "state", "tasks", "task_order")
+    ]
+    if event_type == "breakdown_applied":
+        details.append(f"tasks={len(event.get('task_order', []))}")
+    if event_type == "session_init":
+        details.append(f"request={event.get('state', {}).get('request', {}).get('original_request', '')!r}")
+    return f"{event.get('seq', '?'):>5}  {event.get('ts', ''):<26}  {event_type:<18} {' '.join(details)}"
+
+
+def cmd_compact(project_hash: str, args: argparse.Namespace) -> int:
+    if compact_state_journal(project_hash):
+        print(f"compacted: {get_journal_path(project_hash)}")
+        return 0
+    print("no state to compact", file=sys.stderr)
+    return 1
+
+
+def cmd_history(project_hash: str, args: argparse.Namespace) -> int:
+    events = read_state_events(project_hash)
+    if not events:
+        print("no events")
+        return 1
+    for event in events:
+        print(describe_event(event))
+    return 0
+
+
+def cmd_replay(project_hash: str, args: argparse.Namespace) -> int:
+    events = read_state_events(project_hash)
+    if not events:
+        print("no events", file=sys.stderr)
+        return 1
+    state = {}
+    for event in events:
+        if args.seq is not None and event.get("seq", 0) > args.seq:
+            break
+        apply_state_event(state, event)
+    print(json.dumps(state, indent=2, ensure_ascii=False))
+    return 0
+
+
+def cmd_verify(project_hash: str, args: argparse.Namespace) -> int:
+    state = load_state(project_hash)
+    if not state:
+        print("no state", file=sys.stderr)
+        return 1
+    problems = verify_state_rollups(state)
+    for problem in problems:
+        print(problem)
+    if problems:
+        print("rollup mismatch - run 'state_admin.py rebuild'", file=sys.stderr)
+        return 1
+    print(f"rollup ok: {state['rollup']}")
+    return 0
+
+
+def cmd_rebuild(project_hash: str, args: argparse.Namespace) -> int:
+    with StateSession(project_hash) as session:
+        if session.state:
+            rebuild_state_rollups(session.state)
+            session.mark_dirty(snapshot=True)
+    if not session.committed:
+        print("no state to rebuild", file=sys.stderr)
+        return 1
+    print(f"rollup rebuilt: {session.state['rollup']}")
+    return 0
+
+
+def cmd_fingerprints(project_hash: str, args: argparse.Namespace) -> int:
+    stats = get_fingerprint_stats(project_hash)
+    print(
+        f"entries={stats['entries']}/{stats['capacity']} hits={stats['hits']} "
+        f"misses={stats['misses']} hit_rate={stats['hit_rate']:.1%}"
+    )
+    return 0
+
+
+COMMANDS = {
+    "compact": cmd_compact,
+    "history": cmd_history,
+    "replay": cmd_replay,
+    "verify": cmd_verify,
+    "rebuild": cmd_rebuild,
+    "fingerprints": cmd_fingerprints,
+}
+
+
+def main():
+    """State Admin 메인 함수"""
+    parser = argparse.ArgumentParser(description="오케스트레이션 상태 관리 도구")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--seq", type=int, default=None, help="replay: 이 seq까지만 재생")
+    args = parser.parse_args()
+
+    sys.exit(COMMANDS[args.command](get_project_hash(), args))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,9 @@ Stop Hook - 미완료 작업 경고 및 연속 작업 유도
 
 Claude 에이전트가 응답 생성을 마쳤을 때 실행되어:
 1. 미완료 작업이 있으면 경고 메시지 출력
-2. 작업 완료 시 knowledge.yaml 자동 업데이트
-3. 세션 종료 전 최종 상태 알림
+2. PostToolUse가 쌓아 둔 knowledge 변경을 한 번에 저장 (knowledge.durability: batched)
+3. 요청 완료 시 전체 Contract에서 knowledge 추출 (knowledge_extract.py)
+4. 세션 종료 전 최종 상태 알림
 """
 
 import sys
@@ -20,41 +21,25 @@ from hooks.common import (
     log_orchestrator,
     get_project_hash,
     load_state,
-    load_knowledge,
-    save_knowledge,
-    count_pending_subtasks,
-    count_pending_tasks,
+    get_state_overview,
     get_current_work,
+    format_in_flight_ids,
     format_progress_tree,
-    get_timestamp,
+    format_progress_tree_compact,
+    context_section,
+    build_context_message,
+    CONTEXT_PRIORITY_CURRENT_WORK,
+    CONTEXT_PRIORITY_NEXT_ACTION,
+    CONTEXT_PRIORITY_PROGRESS,
+    flush_knowledge_updates,
 )
+from hooks.knowledge_extract import extract_request_knowledge
 
 
 # 무한 루프 방지용 환경변수
 STOP_HOOK_ACTIVE_KEY = "CLAUDE_DEVKIT_STOP_HOOK_ACTIVE"
 
 
-def auto_update_knowledge_on_complete(project_hash: str, state: dict) -> list:
-    """
-    완료된 작업에서 지식 추출하여 업데이트
-
-    Returns:
-        업데이트된 항목 목록
-    """
-    knowledge = load_knowledge(project_hash)
-    if not knowledge:
-        return []
-
-    updates = []
-
-    # 완료된 Task/Subtask에서 패턴 추출 (향후 확장)
-    # 현재는 timestamp만 업데이트
-    knowledge["updated_at"] = get_timestamp()
-    save_knowledge(project_hash, knowledge)
-
-    return updates
-
-
 def main():
     """Stop Hook 메인 함수"""
     # 무한 루프 방지
@@ -69,55 +54,77 @@ def main():
 
         project_hash = get_project_hash()
 
-        # state.json 로드
-        state = load_state(project_hash)
-        if not state:
+        # 응답 경계에서 knowledge 변경 버퍼를 한 번에 저장
+        flushed = flush_knowledge_updates(project_hash) or []
+        if flushed:
+            log_orchestrator(f"knowledge.yaml updated: {', '.join(flushed)}")
+
+        # 상태 요약 확인 (summary.json)
+        overview = get_state_overview(project_hash)
+        if not overview:
             # 오케스트레이터 세션 없음 - 조용히 종료
             return
 
-        request = state.get("request", {})
-        request_status = request.get("status")
+        request_status = overview.get("status")
 
         # 미완료 작업 확인
-        pending_subtasks = count_pending_subtasks(state)
-        pending_tasks = count_pending_tasks(state)
+        pending_subtasks = overview["pending_subtasks"]
+        pending_tasks = overview["pending_tasks"]
 
+        # 진행 트리가 필요할 때만 전체 state 로드
+        state = None
         if pending_subtasks > 0 and request_status == "active":
+            state = load_state(project_hash)
+
+        if state:
             # 미완료 경고 메시지
             current_work = get_current_work(state)
 
-            lines = [
-                "[Orchestrator] Incomplete tasks warning",
-                "",
-                "Progress:",
-                format_progress_tree(state),
-                "",
-                f"Remaining Tasks: {pending_tasks}",
-                f"Remaining Subtasks: {pending_subtasks}",
+            sections = [
+                context_section(
+                    f"Progress:\n{format_progress_tree(state)}",
+                    CONTEXT_PRIORITY_PROGRESS,
+                    compact=f"Progress:\n{format_progress_tree_compact(state)}",
+                ),
+                context_section(
+                    f"Remaining Tasks: {pending_tasks}\nRemaining Subtasks: {pending_subtasks}",
+                    CONTEXT_PRIORITY_CURRENT_WORK, required=True,
+                ),
             ]
 
             if current_work.get("subtask_id"):
                 phase = current_work.get("phase", "")
-                lines.extend([
-                    "",
+                sections.append(context_section(
                     f"Current: {current_work.get('task_id')} > {current_work.get('subtask_id')} ({phase})",
-                ])
-
-            lines.extend([
-                "",
-                "To continue work, keep going.",
-                "To explicitly stop: '/orchestrator stop'",
-            ])
-
+                    CONTEXT_PRIORITY_CURRENT_WORK, required=True,
+                ))
+
+            # depends_on 스케줄링: 동시에 진행 중인 subtask
+            in_flight = overview.get("in_flight") or []
+            if len(in_flight) > 1:
+                sections.append(context_section(
+                    f"In flight: {format_in_flight_ids(in_flight)}",
+                    CONTEXT_PRIORITY_CURRENT_WORK, required=True,
+                ))
+
+            sections.append(context_section(
+                "To continue work, keep going.\nTo explicitly stop: '/orchestrator stop'",
+                CONTEXT_PRIORITY_NEXT_ACTION, required=True,
+            ))
+
+            message = build_context_message("[Orchestrator] Incomplete tasks warning", sections, hook_event="Stop")
             log_orchestrator(f"Incomplete: {pending_subtasks} subtasks remaining")
-            output_result("\n".join(lines), hook_event="Stop")
+            output_result(message, hook_event="Stop")
 
         elif request_status == "completed":
-            # 완료 시 지식 자동 업데이트
-            updates = auto_update_knowledge_on_complete(project_hash, state)
-
-            if updates:
-                message = f"Session completed. knowledge.yaml updated: {len(updates)} items added"
+            # 완료 시 전체 Contract에서 knowledge 추출 (요청당 1회)
+            extracted = extract_request_knowledge(project_hash) or []
+            if extracted:
+                log_orchestrator(f"knowledge.yaml updated: {', '.join(extracted)}")
+
+            added = flushed + extracted
+            if added:
+                message = f"Session completed. knowledge.yaml updated: {len(added)} items added"
                 output_result(message, hook_event="Stop")
 
     finally:
@@ -7,11 +7,13 @@ SubagentStop Hook - 서브에이전트 결과 수집 및 상태 업데이트
 2. 에이전트별 출력 Contract 파일 확인 (config에서 로드)
 3. state.json 자동 업데이트
 4. 다음 단계 안내 메시지 반환
+
+task-breakdown.yaml에 depends_on이 있으면(request.scheduling = "dag") 완료를
+진행 중 subtask 중 하나에 귀속하고, 선행 작업이 끝난 subtask를 새로 시작한다.
 """
 
 import sys
 import os
-from pathlib import Path
 
 # hooks 패키지 경로 추가
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,49 +23,46 @@ from hooks.common import (
     output_result,
     log_orchestrator,
     get_project_hash,
-    load_state,
-    save_state,
     get_current_work,
-    get_sessions_path,
+    get_contract_scope,
+    contract_exists,
     get_agent_config,
-    load_orchestrator_config,
+    get_agent_outputs,
     load_task_breakdown,
-    convert_task_breakdown_to_state,
-    check_global_discovery_complete,
-    transition_to_task_loop,
+    StateSession,
+    apply_task_breakdown_in_state,
+    check_global_discovery_complete_in_state,
+    transition_to_task_loop_in_state,
     get_next_phase_for_agent,
-    update_subtask_phase,
-    complete_current_subtask,
-    complete_current_task,
-    complete_request,
+    update_subtask_phase_in_state,
+    complete_current_subtask_in_state,
+    complete_current_task_in_state,
+    complete_request_in_state,
+    flush_knowledge_updates,
+    is_dag_scheduling,
+    find_agent_subtasks,
+    find_advanced_agent_subtask,
+    release_subtask_agent_in_state,
+    update_subtask_phase_for_in_state,
+    promote_designed_subtasks_in_state,
+    complete_subtask_in_state,
+    get_in_flight_work,
+    format_in_flight_ids,
 )
 
 
 def check_contract_exists(project_hash: str, current_work: dict, contract_name: str, level: str) -> bool:
-    """Contract 파일 존재 여부 확인"""
-    sessions_path = get_sessions_path(project_hash)
-    request_id = current_work.get("request_id", "R1")
-    task_id = current_work.get("task_id", "")
-    subtask_id = current_work.get("subtask_id", "")
-
-    if level == "request":
-        contract_path = sessions_path / "contracts" / request_id / contract_name
-    elif level == "task" and task_id:
-        contract_path = sessions_path / "contracts" / request_id / task_id / contract_name
-    elif level == "subtask" and task_id and subtask_id:
-        contract_path = sessions_path / "contracts" / request_id / task_id / subtask_id / contract_name
-    else:
-        return False
-
-    return contract_path.exists()
+    """Contract 파일 존재 여부 확인 (manifest 조회)"""
+    scope = get_contract_scope(current_work, level)
+    return bool(scope) and contract_exists(project_hash, scope, contract_name)
 
 
-def handle_agent_completion(project_hash: str, agent_type: str, current_phase: str) -> str:
+def handle_agent_completion(state: dict, agent_type: str, current_phase: str) -> str:
     """
-    에이전트 완료 시 상태 업데이트 처리
+    에이전트 완료 시 상태 업데이트 처리 (in-memory state 수정)
 
     Args:
-        project_hash: 프로젝트 해시
+        state: StateSession의 state
         agent_type: 완료된 에이전트 타입
         current_phase: 현재 subtask phase
 
@@ -78,7 +77,7 @@ def handle_agent_completion(project_hash: str, agent_type: str, current_phase: s
     # 2. Subtask phase 업데이트
     if next_phase == "complete":
         # Subtask 완료 처리
-        success, next_subtask = complete_current_subtask(project_hash)
+        success, next_subtask = complete_current_subtask_in_state(state)
         if not success:
             return "Error: Failed to complete subtask"
 
@@ -87,7 +86,7 @@ def handle_agent_completion(project_hash: str, agent_type: str, current_phase: s
             return f"Subtask completed. Moving to next subtask: {next_subtask}"
         else:
             # 모든 subtask 완료 -> Task 완료 처리
-            success, next_task = complete_current_task(project_hash)
+            success, next_task = complete_current_task_in_state(state)
             if not success:
                 return "Error: Failed to complete task"
 
@@ -96,18 +95,68 @@ def handle_agent_completion(project_hash: str, agent_type: str, current_phase: s
                 return f"Task completed. Moving to next task: {next_task}"
             else:
                 # 모든 task 완료 -> Request 완료 처리
-                if complete_request(project_hash):
+                if complete_request_in_state(state):
                     return "All tasks completed! Request finished."
                 else:
                     return "Error: Failed to complete request"
     else:
         # Phase만 업데이트
-        if update_subtask_phase(project_hash, next_phase):
+        if update_subtask_phase_in_state(state, next_phase):
             return f"Phase updated to: {next_phase}"
         else:
             return "Error: Failed to update phase"
 
 
+def handle_scheduled_agent_completion(project_hash: str, state: dict, agent_type: str, candidates: list) -> str:
+    """
+    depends_on 스케줄링에서 에이전트 완료 시 상태 업데이트 (in-memory state 수정)
+
+    Args:
+        project_hash: 프로젝트 해시
+        state: StateSession의 state
+        agent_type: 완료된 에이전트 타입
+        candidates: find_agent_subtasks 결과 [(작업 정보, 다음 phase), ...]
+
+    Returns:
+        상태 변경 결과 메시지
+    """
+    if len(candidates) > 1:
+        # 같은 타입 에이전트가 여러 subtask에서 실행 중: 추측하지 않고 Contract 저장을 기다림
+        subtask_ids = ", ".join(work["subtask_id"] for work, _ in candidates)
+        log_orchestrator(f"{agent_type}: completion is ambiguous between {subtask_ids}; "
+                         f"waiting for subtask contracts")
+        return ""
+    if not candidates:
+        advanced = find_advanced_agent_subtask(state, agent_type)
+        if advanced:
+            # PostToolUse가 Contract 저장으로 이미 phase를 넘긴 subtask: 처리된 완료
+            task_id, subtask_id = advanced
+            release_subtask_agent_in_state(state, task_id, subtask_id)
+            phase = state["tasks"][task_id]["subtasks"][subtask_id].get("phase", "")
+            return f"{subtask_id}: {agent_type} result already applied (phase: {phase})"
+        log_orchestrator(f"{agent_type}: no in-flight subtask to attribute completion")
+        return ""
+
+    work, next_phase = candidates[0]
+    task_id, subtask_id = work["task_id"], work["subtask_id"]
+    if work["agent"] == agent_type:
+        release_subtask_agent_in_state(state, task_id, subtask_id)
+
+    if next_phase == "complete":
+        success, started = complete_subtask_in_state(project_hash, state, task_id, subtask_id)
+        if not success:
+            return "Error: Failed to complete subtask"
+        if state.get("request", {}).get("status") == "completed":
+            return "All tasks completed! Request finished."
+        if started:
+            return f"Subtask {subtask_id} completed. Started: {', '.join(started)}"
+        return f"Subtask {subtask_id} completed."
+
+    if update_subtask_phase_for_in_state(state, task_id, subtask_id, next_phase):
+        return f"{subtask_id} phase updated to: {next_phase}"
+    return "Error: Failed to update phase"
+
+
 def get_next_phase_message(agent_type: str, current_phase: str) -> str:
     """에이전트 타입과 현재 phase에 따른 다음 단계 메시지"""
     agent_config = get_agent_config(agent_type)
@@ -141,82 +190,109 @@ def main():
     agent_type = input_data.get("agent_type", "").lower()
     agent_id = input_data.get("agent_id", "")
 
+    # 서브에이전트 경계에서 knowledge 변경 버퍼를 한 번에 저장
+    project_hash = get_project_hash()
+    flushed = flush_knowledge_updates(project_hash) or []
+    if flushed:
+        log_orchestrator(f"knowledge.yaml updated: {', '.join(flushed)}")
+
     # config에서 에이전트 설정 로드
     agent_config = get_agent_config(agent_type)
     if not agent_config:
         # orchestrator 관련 에이전트가 아님
         return
 
-    project_hash = get_project_hash()
-
-    # state.json 확인
-    state = load_state(project_hash)
-    if not state:
-        return
-
-    request = state.get("request", {})
-    if request.get("status") != "active":
-        return
-
-    current_work = get_current_work(state)
-    current_phase = current_work.get("phase", "")
-    level = agent_config.get("level", "request")
-
-    # Contract 파일 존재 확인
-    contract_name = agent_config.get("output")
-    contracts = agent_config.get("outputs", [contract_name] if contract_name else [])
-
-    created_contracts = []
-    for contract in contracts:
-        if contract and check_contract_exists(project_hash, current_work, contract, level):
-            created_contracts.append(contract)
-
-    # ========== Global Discovery → Task Loop 전환 로직 ==========
-    global_phase = request.get("global_phase", "")
-    request_id = request.get("id", "R1")
-
-    # planner 완료 시: task-breakdown.yaml → state.json 반영
-    if agent_type == "planner" and "task-breakdown.yaml" in created_contracts:
-        breakdown = load_task_breakdown(project_hash, request_id)
-        if breakdown:
-            converted = convert_task_breakdown_to_state(breakdown)
-            state["task_order"] = converted["task_order"]
-            state["tasks"] = converted["tasks"]
-            save_state(project_hash, state)
-            log_orchestrator("task-breakdown.yaml parsed and state.json updated")
-
-    # Global Discovery 완료 조건 확인 및 phase 전환
-    if global_phase == "global_discovery":
-        complete, missing = check_global_discovery_complete(project_hash)
-        if complete:
-            if transition_to_task_loop(project_hash):
-                log_orchestrator("Global Discovery completed -> Task Loop started")
-                # state 다시 로드하여 최신 상태 반영
-                state = load_state(project_hash)
-                global_phase = state.get("request", {}).get("global_phase", "")
-        else:
-            log_orchestrator(f"Global Discovery incomplete. Missing: {', '.join(missing)}")
-    # ========== Global Discovery 전환 로직 끝 ==========
-
-    # ========== Task Loop 상태 업데이트 로직 ==========
-    # Task Loop 단계에서만 동작
-    if global_phase == "task_loop":
-        agent_level = agent_config.get("level", "request")
-
-        # subtask 레벨 에이전트: 상태 업데이트
-        if agent_level == "subtask":
-            status_message = handle_agent_completion(project_hash, agent_type, current_phase)
-            if status_message:
-                log_orchestrator(status_message)
-
-        # architect 완료: 첫 subtask phase를 test_first로 설정
-        elif agent_type == "architect" and agent_level == "task":
-            if update_subtask_phase(project_hash, "test_first"):
-                log_orchestrator("Architect completed. Subtask phase set to test_first")
-    # ========== Task Loop 상태 업데이트 로직 끝 ==========
-
-    # 다음 단계 메시지 생성
-    next_message = get_next_phase_message(agent_type, current_phase)
+    # state.json은 한 번만 로드하고, 모든 전환을 반영한 뒤 한 번만 저장
+    with StateSession(project_hash) as session:
+        state = session.state
+        if not state:
+            return
+
+        request = state.get("request", {})
+        if request.get("status") != "active":
+            return
+
+        current_work = get_current_work(state)
+        current_phase = current_work.get("phase", "")
+        level = agent_config.get("level", "request")
+
+        # depends_on 스케줄링: subtask 에이전트 완료를 진행 중 subtask 중 하나에 귀속
+        candidates, attributed = [], None
+        if is_dag_scheduling(state) and level == "subtask":
+            candidates = find_agent_subtasks(project_hash, state, agent_type)
+            if len(candidates) == 1:
+                attributed = candidates[0]
+                current_work = attributed[0]
+                current_phase = current_work["phase"]
+
+        # Contract 파일 존재 확인
+        created_contracts = []
+        for contract in get_agent_outputs(agent_type):
+            if check_contract_exists(project_hash, current_work, contract, level):
+                created_contracts.append(contract)
+
+        # ========== Global Discovery → Task Loop 전환 로직 ==========
+        global_phase = request.get("global_phase", "")
+        request_id = request.get("id", "R1")
+
+        # Global Discovery 완료 조건 확인 및 phase 전환 (전환하면서 task-breakdown.yaml 반영)
+        if global_phase == "global_discovery":
+            complete, missing = check_global_discovery_complete_in_state(project_hash, state)
+            if complete:
+                if transition_to_task_loop_in_state(project_hash, state):
+                    session.mark_dirty()
+                    log_orchestrator("Global Discovery completed -> Task Loop started")
+                    global_phase = state.get("request", {}).get("global_phase", "")
+            else:
+                log_orchestrator(f"Global Discovery incomplete. Missing: {', '.join(missing)}")
+
+        # planner 완료 시: 아직 전환 전이면 task-breakdown.yaml만 state.json에 반영
+        # (전환했으면 이미 반영했고, 이미 Task Loop로 전환된 뒤라면 진행 상태를 덮어쓰지 않음)
+        if (agent_type == "planner" and "task-breakdown.yaml" in created_contracts
+                and global_phase == "global_discovery"):
+            breakdown = load_task_breakdown(project_hash, request_id)
+            if breakdown:
+                apply_task_breakdown_in_state(state, breakdown)
+                session.mark_dirty()
+                log_orchestrator("task-breakdown.yaml parsed and state.json updated")
+        # ========== Global Discovery 전환 로직 끝 ==========
+
+        # ========== Task Loop 상태 업데이트 로직 ==========
+        # Task Loop 단계에서만 동작
+        if global_phase == "task_loop":
+            agent_level = agent_config.get("level", "request")
+
+            # subtask 레벨 에이전트: 상태 업데이트
+            if agent_level == "subtask":
+                if is_dag_scheduling(state):
+                    status_message = handle_scheduled_agent_completion(project_hash, state, agent_type, candidates)
+                else:
+                    status_message = handle_agent_completion(state, agent_type, current_phase)
+                if status_message:
+                    session.mark_dirty()
+                    log_orchestrator(status_message)
+
+            # architect 완료: 첫 subtask phase를 test_first로 설정
+            elif agent_type == "architect" and agent_level == "task":
+                if is_dag_scheduling(state):
+                    # 설계를 기다리던 진행 중 subtask 모두
+                    promoted = promote_designed_subtasks_in_state(project_hash, state)
+                    if promoted:
+                        session.mark_dirty()
+                        log_orchestrator(f"Architect completed. test_first: {', '.join(promoted)}")
+                elif update_subtask_phase_in_state(state, "test_first"):
+                    session.mark_dirty()
+                    log_orchestrator("Architect completed. Subtask phase set to test_first")
+        # ========== Task Loop 상태 업데이트 로직 끝 ==========
+
+        in_flight = []
+        if is_dag_scheduling(state) and state.get("request", {}).get("status") == "active":
+            in_flight = get_in_flight_work(state)
+
+    # 다음 단계 메시지 생성 (귀속할 subtask가 없었으면 진행 중 목록만 안내)
+    next_message = ""
+    if attributed or not in_flight or agent_config.get("level") != "subtask":
+        next_message = get_next_phase_message(agent_type, current_phase)
 
     # 결과 메시지 생성
     lines = []
@@ -232,6 +308,11 @@ def main():
     if next_message:
         lines.append(f"-> {next_message}")
 
+    if in_flight:
+        lines.append(f"-> In flight: {format_in_flight_ids(in_flight)}")
+        if len(in_flight) > 1:
+            lines.append("-> 독립적인 subtask입니다. 에이전트를 병렬로 띄우고 프롬프트에 subtask id를 포함하세요.")
+
     output_result("\n".join(lines), hook_event="SubagentStop")
 
 
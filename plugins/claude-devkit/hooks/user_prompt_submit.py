@@ -5,12 +5,12 @@ UserPromptSubmit Hook - 키워드 감지 및 오케스트레이션 세션 관리
 사용자 프롬프트 제출 시 실행되어:
 1. 오케스트레이션 키워드 감지
 2. 세션 생성/재개/새로시작 처리
-3. 오케스트레이션 지시문 주입
+3. 오케스트레이션 지시문 주입 (같은 세션의 이어지는 프롬프트에는 바뀐 상태만 주입)
 """
 
 import sys
 import os
-import re
+from typing import Optional
 
 # hooks 패키지 경로 추가
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -21,54 +21,38 @@ from hooks.common import (
     log_orchestrator,
     get_project_hash,
     load_state,
-    save_state,
     get_current_work,
     format_progress_tree,
+    format_progress_tree_compact,
     is_orchestration_enabled,
-    is_orchestration_keyword,
+    classify_prompt_intent,
     get_template,
     initialize_session,
-    count_pending_subtasks,
-    is_same_session,
+    cancel_request,
+    get_state_overview,
+    is_current_claude_session,
+    search_knowledge,
+    build_knowledge_query,
+    format_relevant_knowledge,
+    context_section,
+    build_context_message,
+    CONTEXT_PRIORITY_CURRENT_WORK,
+    CONTEXT_PRIORITY_NEXT_ACTION,
+    CONTEXT_PRIORITY_PROGRESS,
+    CONTEXT_PRIORITY_KNOWLEDGE,
+    COMPACT_KNOWLEDGE_ITEMS,
+    get_context_injection_mode,
+    build_context_view,
+    get_context_view_hash,
+    load_injected_context,
+    save_injected_context,
+    describe_context_delta,
+    is_dag_scheduling,
+    get_in_flight_work,
+    format_in_flight_ids,
 )
 
 
-# 세션 관리 키워드
-RESUME_KEYWORDS = [
-    r"이어서\s*진행",
-    r"이어서\s*작업",
-    r"이어서\s*해줘",
-    r"계속\s*진행",
-    r"계속\s*해줘",
-    r"resume",
-    r"/orchestrator\s+resume",
-]
-
-NEW_SESSION_KEYWORDS = [
-    r"새\s*세션",
-    r"새로\s*시작",
-    r"처음부터",
-    r"reset",
-    r"/orchestrator\s+reset",
-]
-
-
-def is_resume_keyword(prompt: str) -> bool:
-    """세션 재개 키워드 감지"""
-    for pattern in RESUME_KEYWORDS:
-        if re.search(pattern, prompt, re.IGNORECASE):
-            return True
-    return False
-
-
-def is_new_session_keyword(prompt: str) -> bool:
-    """새 세션 시작 키워드 감지"""
-    for pattern in NEW_SESSION_KEYWORDS:
-        if re.search(pattern, prompt, re.IGNORECASE):
-            return True
-    return False
-
-
 def generate_orchestration_start_message(request: str) -> str:
     """오케스트레이션 시작 메시지 생성"""
     template = get_template("orchestration_start")
@@ -108,6 +92,45 @@ Code Explore 에이전트와 Planner 에이전트를 병렬로 호출하세요.
 """
 
 
+def knowledge_section(relevant: list) -> dict:
+    """관련 knowledge section (예산 초과 시 상위 항목만)"""
+    return context_section(
+        f"## Relevant Knowledge\n\n{format_relevant_knowledge(relevant)}",
+        CONTEXT_PRIORITY_KNOWLEDGE,
+        compact=f"## Relevant Knowledge\n\n{format_relevant_knowledge(relevant[:COMPACT_KNOWLEDGE_ITEMS])}",
+    )
+
+
+# 병렬 진행 안내에서 subtask phase별로 띄울 에이전트 ("" = Task 설계 대기)
+PARALLEL_PHASE_AGENTS = {
+    "": "architect",
+    "test_first": "qa-engineer",
+    "implementation": "implementer",
+    "verification": "qa-engineer",
+}
+
+
+def parallel_work_section(in_flight: list) -> Optional[dict]:
+    """depends_on 스케줄링에서 동시에 진행 중인 subtask 안내 (2개 이상일 때만)"""
+    if not in_flight or len(in_flight) < 2:
+        return None
+    lines = "\n".join(
+        f"- {work['subtask_id']} {work.get('subtask_name', '')} ({work.get('phase') or 'design'}): "
+        f"{PARALLEL_PHASE_AGENTS.get(work.get('phase') or '', 'qa-engineer')}"
+        for work in in_flight
+    )
+    return context_section(
+        f"""## 병렬 진행 중인 Subtask
+
+선행 작업이 끝나 서로 독립적인 subtask들입니다. 한 메시지에서 Task tool을 여러 번 호출해
+에이전트를 동시에 띄우고, 각 프롬프트에 subtask id를 포함하세요.
+
+{lines}""",
+        CONTEXT_PRIORITY_NEXT_ACTION,
+        compact=f"## 병렬 진행 중인 Subtask\n\n{format_in_flight_ids(in_flight)}",
+    )
+
+
 def get_next_action_instruction(global_phase: str, phase: str, current_work: dict) -> str:
     """현재 상태에 따른 구체적인 다음 행동 지시"""
     task_name = current_work.get("task_name", "")
@@ -208,39 +231,117 @@ Task tool 사용, subagent_type: "claude-devkit:qa-engineer"
 현재 상태를 확인하고 적절한 에이전트를 호출하세요."""
 
 
-def generate_resume_message(state: dict, current_work: dict) -> str:
-    """세션 재개 메시지 생성"""
+def generate_resume_message(state: dict, current_work: dict, relevant: list = None) -> str:
+    """세션 재개 메시지 생성 (relevant: 현재 작업과 관련된 knowledge 항목)"""
     global_phase = current_work.get("global_phase", "unknown")
     current_task = current_work.get("task_id", "없음")
     current_subtask = current_work.get("subtask_id", "없음")
     phase = current_work.get("phase", "")
     request = current_work.get("request", "")
 
-    progress_tree = format_progress_tree(state)
-    next_action = get_next_action_instruction(global_phase, phase, current_work)
-
-    return f"""[TDD Orchestration Mode - Resume]
-
-기존 세션을 재개합니다.
-
-## 요청
-{request}
-
-## 현재 상태
+    sections = [
+        context_section(f"## 요청\n{request}", CONTEXT_PRIORITY_CURRENT_WORK, required=True),
+        context_section(f"""## 현재 상태
 
 | 항목 | 값 |
 |------|-----|
 | Global Phase | {global_phase} |
 | Current Task | {current_task} |
 | Current Subtask | {current_subtask} |
-| Subtask Phase | {phase or "N/A"} |
-
-## Progress
-
-{progress_tree}
+| Subtask Phase | {phase or "N/A"} |""", CONTEXT_PRIORITY_CURRENT_WORK, required=True),
+        context_section(
+            f"## Progress\n\n{format_progress_tree(state)}",
+            CONTEXT_PRIORITY_PROGRESS,
+            compact=f"## Progress\n\n{format_progress_tree_compact(state)}",
+        ),
+    ]
+    if relevant:
+        sections.append(knowledge_section(relevant))
+    sections.append(context_section(
+        get_next_action_instruction(global_phase, phase, current_work),
+        CONTEXT_PRIORITY_NEXT_ACTION, required=True,
+    ))
+    parallel = parallel_work_section(get_in_flight_work(state)) if is_dag_scheduling(state) else None
+    if parallel:
+        sections.append(parallel)
+
+    header = "[TDD Orchestration Mode - Resume]\n\n기존 세션을 재개합니다."
+    return build_context_message(header, sections, hook_event="UserPromptSubmit") + "\n"
+
+
+def generate_delta_message(previous_view: dict, view: dict, current_work: dict, relevant: list = None,
+                           in_flight: list = None) -> str:
+    """
+    이전 주입 이후 바뀐 상태만 담은 메시지
+
+    relevant: Task/Subtask가 바뀌었을 때의 관련 knowledge
+    in_flight: depends_on 스케줄링에서 진행 중인 subtask 목록 (요약의 in_flight)
+    """
+    global_phase = current_work.get("global_phase", "unknown")
+    phase = current_work.get("phase", "")
+    changes = "\n".join(describe_context_delta(previous_view, view))
+
+    sections = [context_section(f"이전 안내 이후 바뀐 상태:\n{changes}", CONTEXT_PRIORITY_CURRENT_WORK, required=True)]
+    if relevant:
+        sections.append(knowledge_section(relevant))
+    sections.append(context_section(
+        get_next_action_instruction(global_phase, phase, current_work),
+        CONTEXT_PRIORITY_NEXT_ACTION, required=True,
+    ))
+    parallel = parallel_work_section(in_flight)
+    if parallel:
+        sections.append(parallel)
+
+    return build_context_message("[TDD Orchestration Mode - Update]", sections, hook_event="UserPromptSubmit") + "\n"
+
+
+def generate_unchanged_message(view: dict) -> str:
+    """상태 변화가 없을 때의 한 줄 안내"""
+    position = " > ".join(v for v in (view.get("task_id"), view.get("subtask_id")) if v) or view.get("global_phase")
+    phase = view.get("phase") or view.get("global_phase") or "N/A"
+    return (
+        f"[Orchestrator] 상태 변화 없음: {position} ({phase}), "
+        f"남은 Subtask {view.get('pending_subtasks')}개 - 직전 안내대로 진행하세요."
+    )
+
+
+def inject_session_context(project_hash: str, overview: dict) -> None:
+    """
+    같은 Claude Code 세션의 이어지는 프롬프트에 컨텍스트 주입
+
+    마지막 주입 이후 상태가 같으면 한 줄, 바뀌었으면 delta, 기록이 없으면(첫 프롬프트,
+    압축 직후, orchestration.context_injection: full) 전체 재개 메시지를 주입한다.
+    """
+    session_id = overview.get("claude_session_id")
+    view = build_context_view(overview)
+    previous = None
+    if get_context_injection_mode() == "delta":
+        previous = load_injected_context(project_hash, session_id)
+
+    if previous and previous.get("hash") == get_context_view_hash(view):
+        log_orchestrator("Continuing session (unchanged)")
+        output_result(generate_unchanged_message(view), hook_event="UserPromptSubmit")
+        return
 
-{next_action}
-"""
+    if previous:
+        current_work = overview["current_work"]
+        previous_view = previous.get("view") or {}
+        relevant = None
+        if (previous_view.get("task_id"), previous_view.get("subtask_id")) != (view["task_id"], view["subtask_id"]):
+            relevant = search_knowledge(project_hash, build_knowledge_query(current_work))
+        message = generate_delta_message(previous_view, view, current_work, relevant, overview.get("in_flight"))
+        log_orchestrator("Continuing session (delta)")
+    else:
+        state = load_state(project_hash)
+        if not state:
+            return
+        current_work = get_current_work(state)
+        relevant = search_knowledge(project_hash, build_knowledge_query(current_work))
+        message = generate_resume_message(state, current_work, relevant)
+        log_orchestrator("Continuing session")
+
+    save_injected_context(project_hash, session_id, view)
+    output_result(message, hook_event="UserPromptSubmit")
 
 
 def main():
@@ -257,20 +358,25 @@ def main():
         return
 
     project_hash = get_project_hash()
-    state = load_state(project_hash)
 
-    # 기존 미완료 세션 존재 여부
+    # 기존 미완료 세션 존재 여부 (summary.json, 진행 트리가 필요할 때만 전체 state 로드)
+    overview = get_state_overview(project_hash)
     has_active_session = False
-    if state:
-        request_status = state.get("request", {}).get("status")
-        pending = count_pending_subtasks(state)
-        has_active_session = (request_status == "active" and pending > 0)
+    if overview:
+        has_active_session = (overview.get("status") == "active" and overview["pending_subtasks"] > 0)
+
+    # 세션 키워드 / trigger / skip을 한 번에 분류 (resume > new > skip > trigger)
+    intent = classify_prompt_intent(prompt)
 
     # 1. 세션 재개 키워드
-    if is_resume_keyword(prompt):
-        if has_active_session:
+    if intent == "resume":
+        state = load_state(project_hash) if has_active_session else None
+        if state:
             current_work = get_current_work(state)
-            message = generate_resume_message(state, current_work)
+            relevant = search_knowledge(project_hash, build_knowledge_query(current_work))
+            message = generate_resume_message(state, current_work, relevant)
+            # 명시적 재개는 항상 전체 메시지, 이후 프롬프트는 이 시점 기준 delta
+            save_injected_context(project_hash, overview.get("claude_session_id"), build_context_view(overview))
             log_orchestrator("Resuming session")
             output_result(message, hook_event="UserPromptSubmit")
         else:
@@ -279,24 +385,20 @@ def main():
         return
 
     # 2. 새 세션 시작 키워드
-    if is_new_session_keyword(prompt):
+    if intent == "new":
         # 기존 세션이 있으면 완료 처리
         if has_active_session:
-            state["request"]["status"] = "cancelled"
-            save_state(project_hash, state)
+            cancel_request(project_hash)
 
         log_orchestrator("Starting new session")
         output_result("[Orchestrator] 새 세션을 시작합니다. 요청을 입력하세요.", hook_event="UserPromptSubmit")
         return
 
     # 3. 오케스트레이션 키워드 감지
-    if not is_orchestration_keyword(prompt):
+    if intent != "trigger":
         # active 세션이 있고, 같은 Claude Code 세션이면 컨텍스트 주입
-        if has_active_session and is_same_session(state):
-            current_work = get_current_work(state)
-            message = generate_resume_message(state, current_work)
-            log_orchestrator("Continuing session")
-            output_result(message, hook_event="UserPromptSubmit")
+        if has_active_session and is_current_claude_session(overview.get("claude_session_id")):
+            inject_session_context(project_hash, overview)
         return
 
     # 4. 세션 처리
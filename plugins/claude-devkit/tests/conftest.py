@@ -0,0 +1,37 @@
+"""
+hooks 테스트 공용 fixture
+
+훅은 현재 디렉토리 기준으로 .claude/orchestrator/를 사용하므로 테스트마다
+임시 프로젝트 디렉토리로 이동한다.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PLUGIN_ROOT = Path(__file__).resolve().parent.parent
+HOOKS_DIR = PLUGIN_ROOT / "hooks"
+
+# hooks 패키지 경로 추가
+sys.path.insert(0, str(PLUGIN_ROOT))
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """임시 프로젝트 디렉토리 (cwd, HOME)"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return tmp_path
+
+
+def run_hook(project: Path, hook: str, payload: dict) -> subprocess.CompletedProcess:
+    """훅 스크립트를 별도 프로세스로 실행 (데몬 미사용)"""
+    return subprocess.run(
+        [sys.executable, str(HOOKS_DIR / f"{hook}.py")],
+        input=json.dumps(payload), capture_output=True, text=True, cwd=project,
+        env={**os.environ, "HOME": str(project)},
+    )
@@ -0,0 +1,38 @@
+"""atomic_write_text 원자적 교체"""
+
+import os
+
+import pytest
+
+from hooks.common import atomic_write_text
+
+
+def fail_fsync(fd):
+    raise OSError("disk full")
+
+
+@pytest.mark.parametrize("text, patch_fsync", [
+    ("new: contents\n" * 1000, True),   # 쓴 뒤 fsync 실패
+    ("new: \udc80\n", False),           # 쓰는 도중 인코딩 실패
+])
+def test_failed_write_keeps_original(project, monkeypatch, text, patch_fsync):
+    """쓰기 도중 실패하면 기존 파일은 그대로이고 임시 파일이 남지 않음"""
+    path = project / "state.json"
+    path.write_text('{"revision": 1}', encoding="utf-8")
+    if patch_fsync:
+        monkeypatch.setattr(os, "fsync", fail_fsync)
+
+    with pytest.raises((OSError, UnicodeEncodeError)):
+        atomic_write_text(path, text)
+
+    assert path.read_text(encoding="utf-8") == '{"revision": 1}'
+    assert sorted(p.name for p in project.iterdir()) == ["state.json"]
+
+
+def test_write_replaces_file(project):
+    """성공하면 새 내용으로 교체"""
+    path = project / "sessions" / "state.json"
+    atomic_write_text(path, '{"revision": 1}')
+    atomic_write_text(path, '{"revision": 2}')
+    assert path.read_text(encoding="utf-8") == '{"revision": 2}'
+    assert [p.name for p in path.parent.iterdir()] == ["state.json"]
@@ -0,0 +1,134 @@
+"""Hook Client 데몬 위임"""
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+from conftest import HOOKS_DIR, run_hook
+
+from hooks.client import get_daemon_socket_path, get_project_hash, send_request
+from hooks.common import file_lock, get_state_lock_path, initialize_session
+
+
+def run_client(project, hook: str) -> subprocess.CompletedProcess:
+    """client.py를 별도 프로세스로 실행 (소켓 경로가 tmp_path 아래가 되도록 TMPDIR 지정)"""
+    return subprocess.run(
+        [sys.executable, str(HOOKS_DIR / "client.py"), hook],
+        input="{}", capture_output=True, text=True, cwd=project,
+        env={**os.environ, "HOME": str(project), "TMPDIR": str(project)},
+    )
+
+
+def socket_path_for(project, monkeypatch):
+    """client.py 하위 프로세스와 같은 데몬 소켓 경로"""
+    monkeypatch.setenv("TMPDIR", str(project))
+    monkeypatch.setattr(tempfile, "tempdir", None)
+    return get_daemon_socket_path(get_project_hash())
+
+
+def test_no_fallback_after_request_sent(project, monkeypatch):
+    """요청을 보낸 뒤 연결이 끊기면 in-process로 다시 실행하지 않고 실패"""
+    path = socket_path_for(project, monkeypatch)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen(1)
+    received = []
+
+    def drop_after_request():
+        conn, _ = server.accept()
+        with conn:
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+            received.append(data)
+
+    thread = threading.Thread(target=drop_after_request)
+    thread.start()
+    try:
+        result = run_client(project, "session_start")
+    finally:
+        thread.join(5)
+        server.close()
+
+    assert received and b'"hook": "session_start"' in received[0]
+    assert result.returncode == 1
+    assert "daemon" in result.stderr
+    # in-process 실행 흔적 없음
+    assert not (project / ".claude").exists()
+
+
+def test_fallback_when_daemon_not_listening(project, monkeypatch):
+    """소켓 파일만 남은 경우(연결 실패)는 in-process로 실행"""
+    path = socket_path_for(project, monkeypatch)
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(path))
+    stale.close()
+
+    result = run_client(project, "session_start")
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.fixture
+def daemon(project, monkeypatch):
+    """임시 프로젝트의 훅 데몬 (소켓 경로 반환)"""
+    path = socket_path_for(project, monkeypatch)
+    env = {**os.environ, "HOME": str(project), "TMPDIR": str(project)}
+    subprocess.run([sys.executable, str(HOOKS_DIR / "daemon.py"), "start"], cwd=project, env=env, check=True,
+                   capture_output=True)
+    yield path
+    subprocess.run([sys.executable, str(HOOKS_DIR / "daemon.py"), "stop"], cwd=project, env=env, capture_output=True)
+
+
+def hook_request(project, hook: str, payload: str) -> dict:
+    return {"hook": hook, "cwd": str(project), "payload": payload, "env": {}}
+
+
+def test_daemon_output_matches_in_process(project, daemon):
+    """데몬에 위임한 훅의 출력이 in-process 실행과 같음"""
+    assert initialize_session(get_project_hash(), "로그인 기능 구현해줘")
+    expected = run_hook(project, "session_start", {})
+    assert expected.returncode == 0, expected.stderr
+
+    response = send_request(daemon, hook_request(project, "session_start", "{}"))
+    assert response == {"stdout": expected.stdout, "stderr": expected.stderr, "exit_code": 0}
+
+    result = run_client(project, "session_start")
+    assert (result.returncode, result.stdout, result.stderr) == (0, expected.stdout, expected.stderr)
+
+
+def test_busy_daemon_does_not_queue_hooks(project, daemon):
+    """훅 실행 중에 온 요청은 대기시키지 않고 busy로 응답 (client가 in-process로 실행)"""
+    project_hash = get_project_hash()
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+    request = hook_request(project, "subagent_stop", '{"agent_type": "planner"}')
+    responses = []
+
+    def send():
+        responses.append(send_request(daemon, request))
+
+    # state lock을 잡아 두면 먼저 실행된 훅이 lock을 기다리는 동안 나머지 요청은 busy
+    with file_lock(get_state_lock_path(project_hash), timeout=1) as acquired:
+        assert acquired
+        threads = [threading.Thread(target=send) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while not responses and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert responses == [{"busy": True}]
+        # ping은 훅 실행 중에도 응답
+        assert send_request(daemon, {"command": "ping"})["pong"]
+    for thread in threads:
+        thread.join(15)
+
+    assert len(responses) == 2
+    assert responses[1]["exit_code"] == 0, responses[1]["stderr"]
@@ -0,0 +1,81 @@
+"""컨텍스트 메시지 토큰 예산 (build_context_message)"""
+
+import pytest
+
+from hooks import common
+from hooks.common import (
+    CONTEXT_PRIORITY_CURRENT_WORK,
+    CONTEXT_PRIORITY_KNOWLEDGE,
+    CONTEXT_PRIORITY_NEXT_ACTION,
+    CONTEXT_PRIORITY_PROGRESS,
+    CONTEXT_TRUNCATED_MARK,
+    build_context_message,
+    context_section,
+    estimate_tokens,
+    get_context_budget,
+)
+
+# ASCII 4자 = 1토큰
+HEADER = "H" * 8
+SECTIONS = [
+    context_section("C" * 40, CONTEXT_PRIORITY_CURRENT_WORK, required=True),
+    context_section("P" * 400, CONTEXT_PRIORITY_PROGRESS, compact="p" * 40),
+    context_section("K" * 400, CONTEXT_PRIORITY_KNOWLEDGE, compact="k" * 40),
+    context_section("N" * 40, CONTEXT_PRIORITY_NEXT_ACTION, required=True),
+]
+
+
+def parts(message: str) -> list:
+    return message.split("\n\n")[1:]
+
+
+@pytest.mark.parametrize("max_tokens, expected", [
+    # 예산 안이면 그대로
+    (1000, ["C" * 40, "P" * 400, "K" * 400, "N" * 40]),
+    # priority가 가장 낮은 knowledge부터 compact
+    (150, ["C" * 40, "P" * 400, "k" * 40, "N" * 40]),
+    (60, ["C" * 40, "p" * 40, "k" * 40, "N" * 40]),
+    # compact로도 넘으면 knowledge, progress 순으로 제외 (required는 유지)
+    (35, ["C" * 40, "p" * 40, "N" * 40]),
+    (25, ["C" * 40, "N" * 40]),
+])
+def test_low_priority_sections_shrink_first(max_tokens, expected):
+    """예산을 넘으면 낮은 priority section부터 compact → 제외, section 순서는 유지"""
+    message = build_context_message(HEADER, SECTIONS, max_tokens=max_tokens)
+    assert message.startswith(HEADER)
+    assert parts(message) == expected
+    assert estimate_tokens(message) <= max_tokens
+
+
+def test_required_sections_are_truncated_within_budget():
+    """required section만으로도 넘으면 긴 section을 잘라 예산 안에 맞춤"""
+    sections = [
+        context_section("short", CONTEXT_PRIORITY_CURRENT_WORK, required=True),
+        context_section("\n".join(["next action line"] * 20), CONTEXT_PRIORITY_NEXT_ACTION, required=True),
+        context_section("K" * 400, CONTEXT_PRIORITY_KNOWLEDGE),
+    ]
+    message = build_context_message(HEADER, sections, max_tokens=40)
+    assert estimate_tokens(message) <= 40
+    assert message.startswith(f"{HEADER}\n\nshort\n\nnext action line\n")
+    assert message.endswith(CONTEXT_TRUNCATED_MARK)
+    assert "K" not in message
+
+
+def test_korean_text_counts_one_token_per_char():
+    """한글은 1자당 1토큰으로 계산하여 예산을 적용"""
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("현재 작업") == 5
+    sections = [
+        context_section("현재 작업", CONTEXT_PRIORITY_CURRENT_WORK, required=True),
+        context_section("관련 지식 " * 10, CONTEXT_PRIORITY_KNOWLEDGE, compact="관련 지식"),
+    ]
+    assert parts(build_context_message("H", sections, max_tokens=20)) == ["현재 작업", "관련 지식"]
+
+
+def test_per_hook_budget(monkeypatch):
+    """context_budget.per_hook이 훅별로 max_tokens보다 우선"""
+    monkeypatch.setattr(common, "load_orchestrator_config", lambda: {
+        "context_budget": {"max_tokens": 1000, "per_hook": {"SessionStart": 25}}})
+    assert get_context_budget("UserPromptSubmit") == 1000
+    assert get_context_budget("SessionStart") == 25
+    assert parts(build_context_message(HEADER, SECTIONS, hook_event="SessionStart")) == ["C" * 40, "N" * 40]
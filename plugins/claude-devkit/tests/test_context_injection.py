@@ -0,0 +1,94 @@
+"""UserPromptSubmit 컨텍스트 주입 (full / delta / 변화 없음)"""
+
+import json
+
+from conftest import run_hook
+
+from hooks.common import (
+    StateSession,
+    get_contracts_path,
+    get_injected_context_path,
+    get_project_hash,
+    initialize_session,
+    register_contract_file,
+    transition_to_task_loop,
+    update_subtask_phase_for_in_state,
+)
+
+BREAKDOWN = {"task_breakdown": {"tasks": [{"id": "T1", "name": "auth", "subtasks": [
+    {"id": "T1-S1", "name": "login"},
+    {"id": "T1-S2", "name": "logout"},
+]}]}}
+
+
+def start_task_loop(project, project_hash: str) -> None:
+    """SessionStart로 Claude Code 세션 ID를 만든 뒤 그 세션에서 Task Loop 시작"""
+    assert run_hook(project, "session_start", {}).returncode == 0
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+    for name, content in (("explored.yaml", "explored: {}\n"), ("task-breakdown.yaml", json.dumps(BREAKDOWN))):
+        path = get_contracts_path(project_hash) / "R1" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+        register_contract_file(project_hash, str(path))
+    assert transition_to_task_loop(project_hash)
+
+
+def prompt(project, text: str = "다음은 뭐야?") -> str:
+    """이어지는 프롬프트에 주입된 컨텍스트 (없으면 빈 문자열)"""
+    result = run_hook(project, "user_prompt_submit", {"prompt": text})
+    assert result.returncode == 0, result.stderr
+    if not result.stdout.strip():
+        return ""
+    return json.loads(result.stdout)["hookSpecificOutput"]["additionalContext"]
+
+
+def test_full_then_unchanged_then_delta(project):
+    """첫 프롬프트는 전체, 상태가 같으면 한 줄, 바뀌면 바뀐 항목과 다음 행동만"""
+    project_hash = get_project_hash()
+    start_task_loop(project, project_hash)
+
+    full = prompt(project)
+    assert full.startswith("[TDD Orchestration Mode - Resume]")
+    assert "## Progress" in full
+    assert json.loads(get_injected_context_path(project_hash).read_text())["view"]["task_id"] == "T1"
+
+    assert prompt(project) == (
+        "[Orchestrator] 상태 변화 없음: T1 > T1-S1 (task_loop), 남은 Subtask 2개 - 직전 안내대로 진행하세요.")
+
+    with StateSession(project_hash) as session:
+        update_subtask_phase_for_in_state(session.state, "T1", "T1-S1", "test_first")
+        session.mark_dirty()
+    delta = prompt(project)
+    assert delta.startswith("[TDD Orchestration Mode - Update]")
+    assert "- Subtask Phase: N/A → test_first" in delta
+    assert "Global Phase" not in delta and "## Progress" not in delta
+    assert "테스트를 먼저 작성하세요" in delta
+
+    assert prompt(project).startswith("[Orchestrator] 상태 변화 없음: T1 > T1-S1 (test_first)")
+
+
+def test_full_message_after_compaction_and_resume(project):
+    """PreCompact 이후 첫 프롬프트는 전체 메시지, 명시적 재개는 항상 전체 메시지"""
+    project_hash = get_project_hash()
+    start_task_loop(project, project_hash)
+    assert prompt(project).startswith("[TDD Orchestration Mode - Resume]")
+    assert prompt(project).startswith("[Orchestrator] 상태 변화 없음")
+
+    assert run_hook(project, "pre_compact", {}).returncode == 0
+    assert not get_injected_context_path(project_hash).exists()
+    assert prompt(project).startswith("[TDD Orchestration Mode - Resume]")
+    assert prompt(project).startswith("[Orchestrator] 상태 변화 없음")
+
+    assert prompt(project, "계속 진행해줘").startswith("[TDD Orchestration Mode - Resume]")
+    assert prompt(project).startswith("[Orchestrator] 상태 변화 없음")
+
+
+def test_other_claude_session_record_is_ignored(project):
+    """다른 Claude Code 세션이 남긴 주입 기록은 쓰지 않고 전체 메시지 주입"""
+    project_hash = get_project_hash()
+    start_task_loop(project, project_hash)
+    assert prompt(project).startswith("[TDD Orchestration Mode - Resume]")
+
+    record = json.loads(get_injected_context_path(project_hash).read_text())
+    get_injected_context_path(project_hash).write_text(json.dumps({**record, "session_id": "other"}))
+    assert prompt(project).startswith("[TDD Orchestration Mode - Resume]")
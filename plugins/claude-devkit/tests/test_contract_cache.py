@@ -0,0 +1,59 @@
+"""Contract 파싱 캐시"""
+
+import json
+import pickle
+
+from hooks import common
+from hooks.common import get_contracts_path, get_project_hash, load_contract
+
+
+class Exploit:
+    """unpickle되면 표식 파일을 만드는 객체"""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return (open, (self.marker, "w"))
+
+
+def write_contract(name: str, text: str):
+    path = get_contracts_path(get_project_hash()) / "R1" / "T1" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def clear_process_cache():
+    common._CONTRACT_CACHE.clear()
+    common._CONTRACT_DISK_CACHE.clear()
+
+
+def test_disk_cache_is_json_and_ignores_pickle(project):
+    """세션 디렉토리의 pickle 파일은 읽지 않고, 캐시는 JSON으로 저장"""
+    clear_process_cache()
+    path = write_contract("design-contract.yaml", "design_contract:\n  task_id: T1\n")
+    sessions = path.parents[3]
+    marker = project / "unpickled"
+    (sessions / "contract-cache.pickle").write_bytes(pickle.dumps(Exploit(str(marker))))
+
+    assert load_contract(str(path)) == {"task_id": "T1"}
+    assert not marker.exists()
+
+    cache = json.loads((sessions / "contract-cache.json").read_text(encoding="utf-8"))
+    assert cache["entries"][str(path)][1] == {"task_id": "T1"}
+
+    # 새 훅 프로세스처럼 프로세스 내 캐시를 비우면 디스크 캐시에서 같은 내용
+    clear_process_cache()
+    assert load_contract(str(path)) == {"task_id": "T1"}
+
+
+def test_non_json_content_is_not_persisted(project):
+    """JSON으로 왕복되지 않는 내용(날짜)은 디스크 캐시에 넣지 않음"""
+    clear_process_cache()
+    path = write_contract("design-contract.yaml", "design_contract:\n  created: 2024-01-02\n")
+    content = load_contract(str(path))
+    assert str(content["created"]) == "2024-01-02"
+
+    cache_path = path.parents[3] / "contract-cache.json"
+    assert not cache_path.exists() or str(path) not in json.loads(cache_path.read_text())["entries"]
@@ -0,0 +1,109 @@
+"""Contract manifest 조회 (hit / miss)"""
+
+import hashlib
+import json
+
+import pytest
+
+from hooks import common
+from hooks.common import (
+    check_contract_exists_for_gate,
+    contract_exists,
+    find_contract,
+    get_contract_manifest_path,
+    get_contracts_path,
+    get_project_hash,
+    load_contract_manifest,
+    rebuild_contract_manifest,
+    register_contract_file,
+)
+
+CURRENT_WORK = {"request_id": "R1", "task_id": "T1", "subtask_id": "T1-S1"}
+
+
+def write_contract(project_hash: str, relative: str, content: str):
+    path = get_contracts_path(project_hash) / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+    return path
+
+
+def manifest_keys(project_hash: str) -> list:
+    return sorted(json.loads(get_contract_manifest_path(project_hash).read_text())["contracts"])
+
+
+def test_registered_contract_is_found_without_stat(project, monkeypatch):
+    """등록된 contract는 manifest 키 조회만으로 찾고, 게이트는 request/task/subtask scope 중 하나를 허용"""
+    project_hash = get_project_hash()
+    design = write_contract(project_hash, "R1/T1/design-contract.yaml", "design_contract: {task_id: T1}\n")
+    register_contract_file(project_hash, str(design))
+
+    entry = find_contract(project_hash, [("R1", "T1", "")], "design-contract.yaml")
+    assert entry["level"] == "task"
+    assert entry["size"] == design.stat().st_size
+    assert entry["hash"] == hashlib.blake2b(design.read_bytes(), digest_size=16).hexdigest()
+    assert manifest_keys(project_hash) == ["R1/T1/design-contract.yaml"]
+
+    def no_stat(*args, **kwargs):
+        raise AssertionError("manifest hit should not stat the contract")
+
+    monkeypatch.setattr(common, "build_contract_entry", no_stat)
+    assert check_contract_exists_for_gate(project_hash, CURRENT_WORK, "design-contract.yaml")
+    assert contract_exists(project_hash, ("R1", "T1", ""), "design-contract.yaml")
+
+
+def test_unregistered_file_is_registered_on_miss(project):
+    """manifest에 없으면 경로를 stat하여 (PostToolUse를 거치지 않은 파일) 있으면 등록, 없으면 None"""
+    project_hash = get_project_hash()
+    get_contracts_path(project_hash).mkdir(parents=True)
+    rebuild_contract_manifest(project_hash)
+    write_contract(project_hash, "R1/explored.yaml", "explored: {}\n")
+    assert manifest_keys(project_hash) == []
+
+    assert not check_contract_exists_for_gate(project_hash, CURRENT_WORK, "test-contract.yaml")
+    assert manifest_keys(project_hash) == []
+
+    write_contract(project_hash, "R1/T1/T1-S1/test-contract.yaml", "test_contract: {}\n")
+    assert check_contract_exists_for_gate(project_hash, CURRENT_WORK, "test-contract.yaml")
+    assert find_contract(project_hash, [("R1", "", "")], "explored.yaml")["level"] == "request"
+    assert manifest_keys(project_hash) == ["R1/T1/T1-S1/test-contract.yaml", "R1/explored.yaml"]
+
+
+def test_rebuild_drops_deleted_and_reuses_unchanged_hashes(project):
+    """SessionStart 재구성은 삭제된 파일을 빼고, mtime/size가 같은 파일은 해시를 다시 계산하지 않음"""
+    project_hash = get_project_hash()
+    kept = write_contract(project_hash, "R1/T1/design-contract.yaml", "design_contract: {task_id: T1}\n")
+    removed = write_contract(project_hash, "R1/T1/T1-S1/test-contract.yaml", "test_contract: {}\n")
+    # request/task/subtask 깊이의 *.yaml만 contract
+    write_contract(project_hash, "R1/T1/T1-S1/extra/notes.yaml", "x: 1\n")
+    write_contract(project_hash, "R1/T1/README.md", "notes\n")
+    assert sorted(load_contract_manifest(project_hash)["contracts"]) == [
+        "R1/T1/T1-S1/test-contract.yaml", "R1/T1/design-contract.yaml"]
+
+    manifest = json.loads(get_contract_manifest_path(project_hash).read_text())
+    manifest["contracts"]["R1/T1/design-contract.yaml"]["hash"] = "cached"
+    get_contract_manifest_path(project_hash).write_text(json.dumps(manifest))
+    removed.unlink()
+
+    # 재구성 전에는 manifest 기록을 그대로 믿음
+    assert contract_exists(project_hash, ("R1", "T1", "T1-S1"), "test-contract.yaml")
+
+    rebuilt = rebuild_contract_manifest(project_hash)["contracts"]
+    assert sorted(rebuilt) == ["R1/T1/design-contract.yaml"]
+    assert rebuilt["R1/T1/design-contract.yaml"]["hash"] == "cached"
+    assert not contract_exists(project_hash, ("R1", "T1", "T1-S1"), "test-contract.yaml")
+
+    kept.write_text("design_contract: {task_id: T1, changed: true}\n", encoding="utf-8")
+    register_contract_file(project_hash, str(kept))
+    assert find_contract(project_hash, [("R1", "T1", "")], "design-contract.yaml")["hash"] == (
+        hashlib.blake2b(kept.read_bytes(), digest_size=16).hexdigest())
+
+
+@pytest.mark.parametrize("content", ["", "not json", json.dumps({"version": 0, "contracts": {}})])
+def test_unreadable_manifest_is_rebuilt(project, content):
+    """manifest가 깨졌거나 형식이 다르면 디렉토리 순회로 다시 만듦"""
+    project_hash = get_project_hash()
+    write_contract(project_hash, "R1/explored.yaml", "explored: {}\n")
+    get_contract_manifest_path(project_hash).write_text(content)
+    assert contract_exists(project_hash, ("R1", "", ""), "explored.yaml")
+    assert manifest_keys(project_hash) == ["R1/explored.yaml"]
@@ -0,0 +1,56 @@
+"""detect_code_patterns 단일 패스 규칙 엔진"""
+
+import pytest
+
+from hooks import common
+from hooks.common import compile_marker, compile_pattern_rules, detect_code_patterns
+
+
+@pytest.fixture
+def rules(monkeypatch):
+    """규칙 테이블 교체"""
+    def use(table):
+        monkeypatch.setattr(common, "_PATTERN_ENGINE", compile_pattern_rules(table))
+    yield use
+
+
+@pytest.mark.parametrize("file_path, content, expected", [
+    ("src/test/UserControllerTest.java", "import org.junit.jupiter.api.Test;\n@Test void a() { Mockito.mock(A.class); }",
+     {"testing": "JUnit 5", "mocking": "Mockito", "architecture_hint": "MVC/Layered", "language": "Java"}),
+    ("src/test/AppTest.java", "@Test void a() {}  // org.junit", {"testing": "JUnit 4", "language": "Java"}),
+    ("web/app.test.ts", "describe('a', () => it('b', () => {})) // VITEST", {"testing": "Vitest", "language": "TypeScript"}),
+    ("build.gradle", "id 'org.SpringFramework.boot'", {"build_tool": "Gradle", "framework": "Spring"}),
+    ("package.json", '{"dependencies": {"vue": "3", "react": "18"}}', {"build_tool": "npm", "framework": "React"}),
+    ("src/Api.java", "@RestController\n@Service class Api {}",
+     {"architecture_hint": "MVC/Layered", "service_layer": "Service Layer", "language": "Java"}),
+    ("docs/notes.md", "orgXjunit IT( @test", {}),
+])
+def test_builtin_rules(file_path, content, expected):
+    """기본 규칙 테이블 감지 결과와 key 순서"""
+    assert list(detect_code_patterns(file_path, content).items()) == list(expected.items())
+
+
+def test_overlapping_and_regex_markers(rules):
+    """겹치거나 같은 위치에서 시작하는 marker와 정규식 marker를 모두 찾음"""
+    rules([
+        {"key": "a", "value": "ab", "markers": [["abc"]]},
+        {"key": "b", "value": "bcd", "markers": [["bcd"]]},
+        {"key": "c", "value": "prefix", "markers": [["ab"]]},
+        {"key": "d", "value": "import", "markers": [[r"import\s+pytest\b"]]},
+        {"key": "e", "value": "annotation", "markers": [[r"@(?:Rest)?Controller\b"]]},
+        {"key": "f", "value": "absent", "markers": [["(?i)zzz"]]},
+    ])
+    assert detect_code_patterns("x.py", "abcd\nimport   pytest\n@RestController") == {
+        "a": "ab", "b": "bcd", "c": "prefix", "d": "import", "e": "annotation",
+    }
+    # 파일 시작 위치의 marker (lookbehind가 내용 앞을 보지 않음)
+    assert detect_code_patterns("x.py", "bcd") == {"b": "bcd"}
+    # 정규식 조건까지 원문에서 확인
+    assert detect_code_patterns("x.py", "import pytester @Controllers") == {}
+
+
+@pytest.mark.parametrize("marker", [r"\bfoo", "(?:a|b)c", "a|b", "x*y", "(?x)a b", "[ab]c", "a("])
+def test_marker_must_start_with_literal(marker):
+    """literal로 시작하지 않거나 잘못된 marker는 컴파일 시 거부"""
+    with pytest.raises(ValueError):
+        compile_marker(marker)
@@ -0,0 +1,38 @@
+"""file_lock 상호 배제"""
+
+import subprocess
+import sys
+
+from conftest import PLUGIN_ROOT
+
+from hooks.common import file_lock
+
+HOLD_LOCK = """
+import sys, time
+sys.path.insert(0, sys.argv[1])
+from pathlib import Path
+from hooks.common import file_lock
+with file_lock(Path(sys.argv[2]), timeout=1) as acquired:
+    print("held" if acquired else "failed", flush=True)
+    time.sleep(float(sys.argv[3]))
+"""
+
+
+def test_slow_live_holder_keeps_lock(project):
+    """오래 보유 중인 살아 있는 프로세스의 lock을 빼앗지 않음"""
+    lock_path = project / "state.json.lock"
+    holder = subprocess.Popen(
+        [sys.executable, "-c", HOLD_LOCK, str(PLUGIN_ROOT), str(lock_path), "3"],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "held"
+        with file_lock(lock_path, timeout=1.5) as acquired:
+            assert not acquired
+        assert lock_path.exists()
+    finally:
+        holder.wait(10)
+
+    # 보유자가 끝나면 바로 획득
+    with file_lock(lock_path, timeout=1) as acquired:
+        assert acquired
@@ -0,0 +1,69 @@
+"""knowledge 변경 버퍼 (knowledge.durability: batched)"""
+
+import json
+
+from conftest import run_hook
+
+from hooks import common
+from hooks.common import (
+    flush_knowledge_updates,
+    get_knowledge_pending_path,
+    get_project_hash,
+    load_knowledge,
+    queue_knowledge_update,
+)
+
+PITFALL = {"op": "pitfalls", "items": [{"description": "login test flaky on CI", "learned_from": "T1-S1"}]}
+DECISION = {"op": "decisions", "items": [{"id": "DD-001", "decision": "JWT 사용"}]}
+
+
+def test_queue_appends_without_saving(project):
+    """batched면 PostToolUse 경로는 버퍼에 append만 하고 knowledge는 flush 때 저장"""
+    project_hash = get_project_hash()
+    assert queue_knowledge_update(project_hash, PITFALL) == []
+    assert queue_knowledge_update(project_hash, DECISION) == []
+    assert load_knowledge(project_hash) is None
+    assert len(get_knowledge_pending_path(project_hash).read_text().splitlines()) == 2
+
+    assert flush_knowledge_updates(project_hash) == ["Pitfall added: login test flaky on CI...",
+                                                     "Decision added: DD-001"]
+    assert not get_knowledge_pending_path(project_hash).exists()
+    assert flush_knowledge_updates(project_hash) == []
+
+
+def test_failed_flush_keeps_pending(project, monkeypatch):
+    """저장에 실패하면 버퍼를 지우지 않고 다음 경계에서 다시 반영"""
+    project_hash = get_project_hash()
+    queue_knowledge_update(project_hash, PITFALL)
+    pending = get_knowledge_pending_path(project_hash).read_text()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(common, "save_knowledge", lambda *args: False)
+        assert flush_knowledge_updates(project_hash) is None
+    assert get_knowledge_pending_path(project_hash).read_text() == pending
+
+    assert flush_knowledge_updates(project_hash) == ["Pitfall added: login test flaky on CI..."]
+    assert not get_knowledge_pending_path(project_hash).exists()
+    assert load_knowledge(project_hash)["pitfalls"][0]["count"] == 1
+
+
+def test_session_start_replays_crashed_session(project):
+    """이전 세션이 flush 전에 끝나 남은 버퍼는 SessionStart가 관측 시각 그대로 반영"""
+    project_hash = get_project_hash()
+    pending_path = get_knowledge_pending_path(project_hash)
+    pending_path.parent.mkdir(parents=True, exist_ok=True)
+    observed_at = 1700000000.0
+    lines = [{**PITFALL, "at": observed_at}, {**PITFALL, "at": observed_at + 60}, {**DECISION, "at": observed_at}]
+    # 비정상 종료로 잘린 마지막 줄은 건너뜀
+    pending_path.write_text("".join(json.dumps(line) + "\n" for line in lines) + '{"op": "pitf',
+                            encoding="utf-8")
+
+    result = run_hook(project, "session_start", {})
+    assert result.returncode == 0, result.stderr
+    assert not pending_path.exists()
+    knowledge = load_knowledge(project_hash)
+    assert [d["id"] for d in knowledge["decisions"]] == ["DD-001"]
+    [pitfall] = knowledge["pitfalls"]
+    assert pitfall["count"] == 2
+    assert pitfall["first_seen"] == "2023-11-14T22:13:20Z"
+    assert pitfall["last_seen"] == "2023-11-14T22:14:20Z"
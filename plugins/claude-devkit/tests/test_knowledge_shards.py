@@ -0,0 +1,106 @@
+"""knowledge shard 저장 (knowledge.yaml + decisions.jsonl / pitfalls.jsonl)"""
+
+import json
+
+from hooks.common import (
+    KnowledgeSession,
+    get_knowledge_path,
+    get_knowledge_shard_path,
+    get_project_hash,
+    get_timestamp,
+    get_yaml,
+    load_knowledge,
+    record_decisions,
+    record_pitfalls,
+)
+
+
+def file_id(path):
+    """원자적 교체(새 inode)나 내용 변경을 구분하는 식별값"""
+    stat = path.stat()
+    return stat.st_ino, stat.st_mtime_ns, path.read_bytes()
+
+
+def shard_records(project_hash: str, section: str) -> list:
+    return [json.loads(line) for line in get_knowledge_shard_path(project_hash, section).read_text().splitlines()]
+
+
+def test_list_updates_append_without_rewriting_core(project):
+    """decision/pitfall 추가는 shard에 한 줄씩 append하고 knowledge.yaml은 그대로 둠"""
+    project_hash = get_project_hash()
+    with KnowledgeSession(project_hash) as session:
+        session.knowledge["patterns"]["testing"] = "pytest"
+        session.mark_dirty()
+    core = file_id(get_knowledge_path(project_hash))
+
+    for description in ("login flaky", "token expired"):
+        with KnowledgeSession(project_hash) as session:
+            record_pitfalls(session.knowledge, [{"description": description}])
+            # updated_at만 바뀐 knowledge.yaml은 다시 쓰지 않음
+            session.knowledge["updated_at"] = get_timestamp()
+            session.mark_dirty()
+    with KnowledgeSession(project_hash) as session:
+        record_decisions(session.knowledge, [{"id": "DD-001", "decision": "JWT 사용"}])
+        session.mark_dirty()
+
+    assert file_id(get_knowledge_path(project_hash)) == core
+    assert "pitfalls" not in get_yaml().safe_load(get_knowledge_path(project_hash).read_text())
+    assert [(r["op"], r["item"]["description"]) for r in shard_records(project_hash, "pitfalls")] == [
+        ("put", "login flaky"), ("put", "token expired")]
+    assert [r["id"] for r in shard_records(project_hash, "decisions")] == ["DD-001"]
+
+    knowledge = load_knowledge(project_hash)
+    assert knowledge["patterns"] == {"testing": "pytest"}
+    assert sorted(p["description"] for p in knowledge["pitfalls"]) == ["login flaky", "token expired"]
+    assert knowledge["decisions"] == [{"id": "DD-001", "decision": "JWT 사용"}]
+
+    # 목록이 아닌 섹션이 바뀌면 knowledge.yaml을 다시 씀
+    with KnowledgeSession(project_hash) as session:
+        session.knowledge["patterns"]["testing"] = "JUnit 5"
+        session.mark_dirty()
+    assert file_id(get_knowledge_path(project_hash)) != core
+    assert load_knowledge(project_hash)["patterns"] == {"testing": "JUnit 5"}
+    assert len(shard_records(project_hash, "pitfalls")) == 2
+
+
+def test_repeat_and_removal_are_single_records(project):
+    """기존 항목 갱신은 같은 id의 put, 제거는 del 한 줄이며 로드 시 나중 기록이 이김"""
+    project_hash = get_project_hash()
+    with KnowledgeSession(project_hash) as session:
+        record_pitfalls(session.knowledge, [{"description": "login flaky"}, {"description": "db locked"}])
+        session.mark_dirty()
+    with KnowledgeSession(project_hash) as session:
+        record_pitfalls(session.knowledge, [{"description": "login flaky"}])
+        session.knowledge["pitfalls"] = [p for p in session.knowledge["pitfalls"] if p["description"] != "db locked"]
+        session.mark_dirty()
+
+    records = shard_records(project_hash, "pitfalls")
+    assert [r["op"] for r in records] == ["put", "put", "del", "put"]
+    [pitfall] = load_knowledge(project_hash)["pitfalls"]
+    assert pitfall["description"] == "login flaky"
+    assert pitfall["count"] == 2
+
+
+def test_legacy_knowledge_migrates_on_next_save(project):
+    """목록이 knowledge.yaml 안에 있는 이전 형식은 그대로 로드하고 다음 저장에서 shard로 옮김"""
+    project_hash = get_project_hash()
+    knowledge_path = get_knowledge_path(project_hash)
+    knowledge_path.parent.mkdir(parents=True, exist_ok=True)
+    knowledge_path.write_text(get_yaml().dump({
+        "version": 1, "patterns": {"testing": "pytest"},
+        "decisions": [{"id": "DD-001", "decision": "JWT 사용"}],
+        "pitfalls": [{"description": "login flaky"}],
+    }, allow_unicode=True))
+
+    knowledge = load_knowledge(project_hash)
+    assert [d["id"] for d in knowledge["decisions"]] == ["DD-001"]
+    assert not get_knowledge_shard_path(project_hash, "decisions").exists()
+
+    with KnowledgeSession(project_hash) as session:
+        session.mark_dirty()
+    core = get_yaml().safe_load(knowledge_path.read_text())
+    assert "decisions" not in core and "pitfalls" not in core
+    assert [r["id"] for r in shard_records(project_hash, "decisions")] == ["DD-001"]
+    migrated = load_knowledge(project_hash)
+    assert migrated["decisions"] == knowledge["decisions"]
+    assert [p["description"] for p in migrated["pitfalls"]] == ["login flaky"]
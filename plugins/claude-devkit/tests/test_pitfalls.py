@@ -0,0 +1,58 @@
+"""pitfall 중복 제거 / 용량 제한"""
+
+from hooks import common
+from hooks.common import get_pitfall_key, record_pitfalls
+
+NOW = 1700000000.0
+DAY = 86400
+
+
+def pitfall(description: str) -> dict:
+    return {"description": description, "reason": "test failure", "learned_from": "T1-S1"}
+
+
+def test_same_failure_increments_count(project):
+    """재시도마다 달라지는 숫자/주소/공백만 다른 실패는 한 항목의 count와 last_seen만 갱신"""
+    knowledge = {"pitfalls": []}
+    assert record_pitfalls(knowledge, [pitfall("Timeout 30 sec in test_login_1")], NOW) == [
+        "Pitfall added: Timeout 30 sec in test_login_1..."]
+    assert record_pitfalls(knowledge, [pitfall("timeout 45 sec in test_login_1")], NOW + 60) == [
+        "Pitfall repeated (x2): timeout 45 sec in test_login_1..."]
+
+    [stored] = knowledge["pitfalls"]
+    assert stored["key"] == get_pitfall_key(pitfall("Timeout 30 sec in test_login_1"))
+    assert stored["id"] == f"P-{stored['key'][:8]}"
+    assert stored["count"] == 2
+    assert stored["first_seen"] == "2023-11-14T22:13:20Z"
+    assert stored["last_seen"] == "2023-11-14T22:14:20Z"
+    # 이름에 붙은 숫자(test_login_1 / test_login_2)는 다른 실패
+    record_pitfalls(knowledge, [pitfall("Timeout 30 sec in test_login_2")], NOW)
+    assert len(knowledge["pitfalls"]) == 2
+
+
+def test_legacy_entries_without_key_are_merged(project):
+    """key가 없는 이전 형식 항목은 key를 채우고 같은 내용끼리 합침"""
+    knowledge = {"pitfalls": [pitfall("NPE in UserService"), pitfall("NPE in  userservice")]}
+    record_pitfalls(knowledge, [pitfall("npe in UserService")], NOW)
+    [stored] = knowledge["pitfalls"]
+    assert stored["count"] == 3
+    assert stored["key"] == get_pitfall_key(pitfall("NPE in UserService"))
+
+
+def test_capacity_drops_lowest_scores(project, monkeypatch):
+    """pitfall_capacity를 넘으면 count × 최근성 점수가 낮은 항목부터 제거"""
+    monkeypatch.setattr(common, "get_knowledge_config",
+                        lambda: {"pitfall_capacity": 3, "pitfall_half_life_days": 30})
+    knowledge = {"pitfalls": []}
+    record_pitfalls(knowledge, [pitfall("old but frequent")] * 4, NOW - 30 * DAY)
+    record_pitfalls(knowledge, [pitfall("old once")], NOW - 60 * DAY)
+    record_pitfalls(knowledge, [pitfall("recent once")], NOW - DAY)
+    record_pitfalls(knowledge, [pitfall("newest once")], NOW)
+    assert len(knowledge["pitfalls"]) == 3
+    # 점수: old but frequent 4 × 2^-1 = 2 > newest 1 > recent 2^(-1/30) > old once 0.25
+    assert [p["description"] for p in knowledge["pitfalls"]] == [
+        "old but frequent", "newest once", "recent once"]
+
+    for i in range(10):
+        record_pitfalls(knowledge, [pitfall(f"failure {chr(ord('a') + i)}")], NOW + i)
+    assert len(knowledge["pitfalls"]) == 3
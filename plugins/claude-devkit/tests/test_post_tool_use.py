@@ -0,0 +1,23 @@
+"""PostToolUse 상태 전환"""
+
+from conftest import run_hook
+
+from hooks.common import get_contracts_path, get_project_hash, initialize_session, load_state
+
+
+def test_contract_write_during_global_discovery(project):
+    """현재 Task가 없는 Global Discovery 중 Contract 저장이 훅을 중단시키지 않음"""
+    project_hash = get_project_hash()
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+
+    for name in ("explored.yaml", "task-breakdown.yaml"):
+        path = get_contracts_path(project_hash) / "R1" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("placeholder: true\n", encoding="utf-8")
+
+        result = run_hook(project, "post_tool_use", {"tool_name": "Write", "tool_input": {"file_path": str(path)}})
+        assert result.returncode == 0, result.stderr
+        assert "Traceback" not in result.stderr
+        assert "Global Discovery progress" in result.stdout
+
+    assert load_state(project_hash)["request"]["global_phase"] == "global_discovery"
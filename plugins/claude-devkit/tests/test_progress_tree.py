@@ -0,0 +1,130 @@
+"""진행 트리 예산 / memoize"""
+
+import copy
+
+import pytest
+
+from hooks.common import (
+    StateSession,
+    apply_task_breakdown_in_state,
+    convert_task_breakdown_to_state,
+    format_progress_tree,
+    get_project_hash,
+    get_state_revision,
+    initialize_session,
+    load_state,
+    rebuild_state_rollups,
+    render_progress_tree,
+)
+
+
+def make_breakdown(task_count: int, subtask_count: int) -> dict:
+    return {"task_breakdown": {"tasks": [
+        {"id": f"T{t}", "name": f"task {t}", "subtasks": [
+            {"id": f"T{t}-S{s}", "name": f"sub {s}"} for s in range(1, subtask_count + 1)
+        ]}
+        for t in range(1, task_count + 1)
+    ]}}
+
+
+def make_state(task_count: int, subtask_count: int, done_tasks: int, current_subtask: int) -> dict:
+    """앞 done_tasks개 Task 완료, 다음 Task의 current_subtask번째 subtask 진행 중인 state"""
+    converted = convert_task_breakdown_to_state(make_breakdown(task_count, subtask_count))
+    current_task_id = f"T{done_tasks + 1}"
+    state = {"request": {"current_task": current_task_id}, "task_order": converted["task_order"],
+             "tasks": converted["tasks"]}
+    for t in range(1, done_tasks + 1):
+        task = state["tasks"][f"T{t}"]
+        task["status"] = "completed"
+        for subtask in task["subtasks"].values():
+            subtask["status"] = "completed"
+    task = state["tasks"][current_task_id]
+    task["status"] = "in_progress"
+    task["current_subtask"] = f"{current_task_id}-S{current_subtask}"
+    for s in range(1, current_subtask):
+        task["subtasks"][f"{current_task_id}-S{s}"]["status"] = "completed"
+    task["subtasks"][task["current_subtask"]].update(status="in_progress", phase="implementation")
+    rebuild_state_rollups(state)
+    return state
+
+
+def test_full_tree_within_budget():
+    """예산 안이면 모든 Task/subtask를 펼침"""
+    lines = render_progress_tree(make_state(3, 2, 1, 1), 40, 4096, 1).splitlines()
+    assert lines == [
+        "|- T1 task 1 [v]",
+        "|  |- T1-S1 sub 1 [v]",
+        "|  `- T1-S2 sub 2 [v]",
+        "|- T2 task 2 [>] <- current",
+        "|  |- T2-S1 sub 1 [>] (implementation) <- current",
+        "|  `- T2-S2 sub 2 [ ]",
+        "`- T3 task 3 [ ]",
+        "   |- T3-S1 sub 1 [ ]",
+        "   `- T3-S2 sub 2 [ ]",
+    ]
+
+
+def test_collapses_tasks_outside_lookahead():
+    """완료/대기 Task는 한 줄로 접고 현재 Task와 lookahead Task만 펼침"""
+    lines = render_progress_tree(make_state(12, 10, 4, 5), 40, 4096, 1).splitlines()
+    assert lines[0] == "|- T1 ~ T4 [v] 4 tasks completed (40 subtasks)"
+    assert lines[1] == "|- T5 task 5 [>] <- current"
+    assert "|- T6 task 6 [ ]" in lines
+    assert lines[-1] == "`- T7 ~ T12 [ ] 6 tasks pending (60 subtasks)"
+    assert len(lines) == 24
+
+
+def test_windows_subtasks_when_still_over_budget():
+    """접은 트리도 넘으면 현재 subtask 주변만 남기고, 그래도 넘으면 lookahead를 줄임"""
+    state = make_state(12, 10, 4, 5)
+    assert render_progress_tree(state, 12, 4096, 1).splitlines() == [
+        "|- T1 ~ T4 [v] 4 tasks completed (40 subtasks)",
+        "|- T5 task 5 [>] <- current",
+        "|  |- T5-S1 ~ T5-S4 [v] 4 subtasks completed",
+        "|  |- T5-S5 sub 5 [>] (implementation) <- current",
+        "|  `- T5-S6 ~ T5-S10 [ ] 5 subtasks pending",
+        "|- T6 task 6 [ ]",
+        "|  |- T6-S1 sub 1 [ ]",
+        "|  `- T6-S2 ~ T6-S10 [ ] 9 subtasks pending",
+        "`- T7 ~ T12 [ ] 6 tasks pending (60 subtasks)",
+    ]
+    assert render_progress_tree(state, 8, 4096, 1).splitlines()[-1] == "`- T6 ~ T12 [ ] 7 tasks pending (70 subtasks)"
+
+
+@pytest.mark.parametrize("max_lines, max_bytes", [(40, 4096), (12, 4096), (8, 1024), (5, 200), (40, 150)])
+def test_output_within_line_and_byte_budget(max_lines, max_bytes):
+    """어떤 예산에서도 줄 수/바이트 한도를 넘지 않음 (최소 형태도 넘으면 잘라내고 생략 줄 수 표시)"""
+    tree = render_progress_tree(make_state(12, 10, 4, 5), max_lines, max_bytes, 1)
+    lines = tree.splitlines()
+    assert len(lines) <= max_lines
+    assert len(tree.encode("utf-8")) <= max_bytes
+    if max_lines == 5:
+        assert lines[-1] == "... (3 more lines)"
+
+
+def test_snapshot_commit_refreshes_memoized_tree(project):
+    """이벤트 없이 snapshot만 저장해도 revision이 올라 memoize된 트리를 다시 계산"""
+    project_hash = get_project_hash()
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+    with StateSession(project_hash) as session:
+        apply_task_breakdown_in_state(session.state, make_breakdown(2, 2))
+        session.mark_dirty()
+    state = load_state(project_hash)
+    assert "T1 task 1" in format_progress_tree(state)
+
+    # StateSession.replace (state 전체 교체)
+    with StateSession(project_hash) as session:
+        replaced = copy.deepcopy(dict(session.state))
+        replaced["tasks"]["T1"]["name"] = "renamed"
+        session.replace(replaced)
+    replaced_state = load_state(project_hash)
+    assert get_state_revision(replaced_state) > get_state_revision(state)
+    assert "T1 renamed" in format_progress_tree(replaced_state)
+
+    # 직접 수정 + mark_dirty(snapshot=True) (state_admin.py rebuild와 같은 경로)
+    with StateSession(project_hash) as session:
+        session.state["tasks"]["T2"]["name"] = "rebuilt"
+        session.mark_dirty(snapshot=True)
+    rebuilt_state = load_state(project_hash)
+    assert get_state_revision(rebuilt_state) > get_state_revision(replaced_state)
+    assert "T2 rebuilt" in format_progress_tree(rebuilt_state)
@@ -0,0 +1,38 @@
+"""프롬프트 의도 분류 정규식"""
+
+import re
+
+import pytest
+
+from hooks import common
+from hooks.common import compile_intent_classifier
+
+
+@pytest.mark.parametrize("pattern, prompt", [
+    ("fix|implement", "please implement it"),
+    ("add(?:ed)? tests?|refactor", "refactor this module"),
+    ("[a|b]x|yz", "say yz"),
+])
+def test_top_level_alternation_matches_like_re_search(pattern, prompt):
+    """최상위 alternation이 있는 trigger도 개별 re.search와 같은 결과"""
+    classifier = compile_intent_classifier({"trigger": [pattern, "구현해\\s*줘"]})
+    assert bool(re.search(pattern, prompt, re.IGNORECASE))
+    assert classifier.search(prompt).lastgroup == "trigger"
+
+
+def test_snapshot_rebuilt_when_builder_code_changes(tmp_path, monkeypatch):
+    """의도 분류기가 든 디스크 snapshot은 config뿐 아니라 common.py가 바뀌어도 다시 계산"""
+    code = tmp_path / "common.py"
+    code.write_text("v1")
+    monkeypatch.setattr(common, "__file__", str(code))
+    monkeypatch.setattr(common, "CONFIG_SNAPSHOT_PATH", tmp_path / ".orchestrator-config.cache")
+    monkeypatch.setattr(common, "_CONFIG_SNAPSHOT", None)
+
+    source_key = common._get_config_source_key()
+    assert common.load_config_snapshot()["source"] == source_key
+    assert common._read_config_snapshot_file(source_key) is not None
+
+    code.write_text("v2 builder")
+    changed_key = common._get_config_source_key()
+    assert changed_key != source_key
+    assert common._read_config_snapshot_file(changed_key) is None
@@ -0,0 +1,156 @@
+"""SQLite 저장소 백엔드 (storage.backend: sqlite)"""
+
+import sqlite3
+
+import pytest
+
+from hooks import common, sqlite_store
+from hooks.common import (
+    KnowledgeSession,
+    StateSession,
+    apply_state_event,
+    complete_subtask_in_state,
+    get_project_hash,
+    initialize_session,
+    load_state,
+    read_state_events,
+    record_subtask_dispatch_in_state,
+    transition_to_task_loop_in_state,
+)
+
+BREAKDOWN = {"task_breakdown": {"tasks": [
+    {"id": "T1", "name": "auth", "subtasks": [
+        {"id": "T1-S1", "name": "login", "depends_on": []},
+        {"id": "T1-S2", "name": "logout", "depends_on": ["T1-S1"]},
+    ]},
+    {"id": "T2", "name": "ui", "depends_on": ["T1"], "subtasks": [{"id": "T2-S1", "name": "form"}]},
+]}}
+
+
+@pytest.fixture
+def sqlite_backend(project, monkeypatch):
+    """common이 sqlite 백엔드를 쓰도록 설정"""
+    monkeypatch.setattr(common, "get_storage_config", lambda: {"backend": "sqlite", "lock_timeout": 1})
+    return project
+
+
+def reader(db_path):
+    """별도 연결 (커밋된 내용만 보임)"""
+    return sqlite3.connect(str(db_path))
+
+
+def test_state_round_trip_matches_file_backend(project, monkeypatch, tmp_path):
+    """file 백엔드 journal의 이벤트를 commit_state로 기록하면 load_state가 같은 state를 조립"""
+    project_hash = get_project_hash()
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+    monkeypatch.setattr(common, "load_task_breakdown", lambda *args: BREAKDOWN)
+    monkeypatch.setattr(common, "check_explored_exists", lambda *args: True)
+    with StateSession(project_hash) as session:
+        state = session.state
+        assert transition_to_task_loop_in_state(project_hash, state)
+        record_subtask_dispatch_in_state(state, "implementer", "implement T1-S1")
+        complete_subtask_in_state(project_hash, state, "T1", "T1-S1")
+        session.mark_dirty()
+    file_state = load_state(project_hash)
+
+    conn = sqlite_store.connect(tmp_path / "orchestrator.db", busy_timeout=1)
+    expected = {}
+    for event in read_state_events(project_hash):
+        # 이벤트 1건씩 기록하여 변경 행만 갱신하는 경로를 사용
+        apply_state_event(expected, event)
+        with sqlite_store.transaction(conn) as txn:
+            sqlite_store.commit_state(txn, project_hash, expected, [dict(event)])
+
+    stored = sqlite_store.load_state(conn, project_hash)
+    assert stored == expected
+    assert [event["type"] for event in sqlite_store.read_events(conn, project_hash)] == [
+        event["type"] for event in read_state_events(project_hash)
+    ]
+    # revision(snapshot 저장마다 증가)과 journal 위치를 제외하면 file 백엔드와 같음
+    for key in ("request", "task_order", "tasks", "rollup"):
+        assert stored[key] == file_state[key]
+    assert stored["request"]["in_flight"] == [["T1", "T1-S2"]]
+    assert stored["tasks"]["T1"]["subtasks"]["T1-S1"]["agent"] == "implementer"
+
+
+def test_nested_transaction_joins_outer(tmp_path):
+    """트랜잭션 안의 transaction()은 바깥 트랜잭션에 합류하여 바깥이 끝날 때 한 번에 커밋"""
+    db_path = tmp_path / "orchestrator.db"
+    conn = sqlite_store.connect(db_path, busy_timeout=1)
+    with sqlite_store.transaction(conn) as outer:
+        sqlite_store.save_knowledge(outer, "p1", {"patterns": {"testing": "JUnit 5"}})
+        with sqlite_store.transaction(conn) as inner:
+            assert inner is conn
+            sqlite_store.save_knowledge(inner, "p2", {"pitfalls": [{"description": "flaky"}]})
+        assert conn.in_transaction
+        assert reader(db_path).execute("SELECT COUNT(*) FROM knowledge").fetchone()[0] == 0
+    assert not conn.in_transaction
+    assert reader(db_path).execute("SELECT COUNT(*) FROM knowledge").fetchone()[0] == 2
+    assert sqlite_store.load_knowledge(conn, "p2")["pitfalls"] == [{"description": "flaky"}]
+
+
+def test_knowledge_session_saves_inside_its_transaction(sqlite_backend):
+    """KnowledgeSession의 save_knowledge는 세션 트랜잭션에 합류하고 세션 종료 시 커밋"""
+    project_hash = get_project_hash()
+    with KnowledgeSession(project_hash) as session:
+        session.knowledge["patterns"]["testing"] = "pytest"
+        session.mark_dirty()
+        conn = common.get_sqlite_connection()
+        assert conn.in_transaction
+    assert session.committed
+    assert not conn.in_transaction
+    row = reader(common.get_sqlite_path()).execute(
+        "SELECT data FROM knowledge WHERE project_hash = ?", (project_hash,)).fetchone()
+    assert '"testing":"pytest"' in row[0]
+
+
+def test_error_rolls_back_transaction(sqlite_backend):
+    """트랜잭션 안에서 예외가 나면 기록한 내용을 모두 되돌림"""
+    project_hash = get_project_hash()
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+    before = load_state(project_hash)
+
+    with pytest.raises(RuntimeError):
+        with StateSession(project_hash) as session:
+            session.state["request"]["status"] = "cancelled"
+            session.mark_dirty(snapshot=True)
+            sqlite_store.commit_state(common.get_sqlite_connection(), project_hash,
+                                      session.state, [], full=True)
+            raise RuntimeError("hook failed")
+
+    conn = common.get_sqlite_connection()
+    assert not conn.in_transaction
+    assert load_state(project_hash) == before
+
+    with pytest.raises(RuntimeError):
+        with sqlite_store.transaction(conn) as txn:
+            sqlite_store.save_knowledge(txn, project_hash, {"patterns": {}})
+            raise RuntimeError("flush failed")
+    assert sqlite_store.load_knowledge(conn, project_hash) is None
+
+
+def test_migrates_v1_schema(tmp_path):
+    """v1 DB(contracts.content_hash 없음)는 연결 시 ALTER TABLE로 v2가 되고 기존 행은 유지"""
+    db_path = tmp_path / "orchestrator.db"
+    legacy = sqlite3.connect(str(db_path))
+    v1_schema = sqlite_store.SCHEMA.replace("    content_hash TEXT,\n", "")
+    assert v1_schema != sqlite_store.SCHEMA
+    legacy.executescript(v1_schema)
+    legacy.execute(
+        "INSERT INTO contracts (project_hash, request_id, task_id, subtask_id, name, path, size, mtime_ns)"
+        " VALUES ('p1', 'R1', '', '', 'explored.yaml', '/x/explored.yaml', 10, 1)")
+    legacy.execute("PRAGMA user_version=1")
+    legacy.commit()
+    legacy.close()
+
+    conn = sqlite_store.connect(db_path, busy_timeout=1)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == sqlite_store.SCHEMA_VERSION
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(contracts)")]
+    assert "content_hash" in columns
+    assert conn.execute("SELECT name, content_hash FROM contracts").fetchall() == [("explored.yaml", None)]
+
+    (tmp_path / "explored.yaml").write_text("explored: {}\n")
+    with sqlite_store.transaction(conn) as txn:
+        sqlite_store.register_contract(txn, "p1", ("R1", "", ""), "explored.yaml",
+                                       tmp_path / "explored.yaml", content_hash="abc")
+    assert sqlite_store.find_contract(conn, "p1", [("R1", "", "")], "explored.yaml")["hash"] == "abc"
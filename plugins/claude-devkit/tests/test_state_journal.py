@@ -0,0 +1,45 @@
+"""상태 이벤트 journal (events.jsonl)"""
+
+import json
+
+from hooks.common import (
+    StateSession,
+    apply_task_breakdown_in_state,
+    get_journal_path,
+    get_project_hash,
+    initialize_session,
+    load_state,
+    record_state_event,
+)
+
+
+def test_events_after_line_larger_than_tail_window(project):
+    """64KB보다 긴 journal 줄 뒤에도 seq가 이어지고 이후 이벤트가 replay됨"""
+    project_hash = get_project_hash()
+    assert initialize_session(project_hash, "대량 작업")
+
+    breakdown = {"task_breakdown": {"tasks": [
+        {"id": f"T{t}", "name": f"task {t}", "subtasks": [
+            {"id": f"T{t}-S{s}", "name": f"subtask {s}", "description": "x" * 1200}
+            for s in range(1, 9)
+        ]}
+        for t in range(1, 11)
+    ]}}
+    with StateSession(project_hash) as session:
+        apply_task_breakdown_in_state(session.state, breakdown)
+        session.mark_dirty()
+    with StateSession(project_hash) as session:
+        record_state_event(session.state, {"type": "global_phase", "phase": "task_loop"})
+        session.mark_dirty()
+    with StateSession(project_hash) as session:
+        record_state_event(session.state, {"type": "request_status", "status": "cancelled"})
+        session.mark_dirty()
+
+    lines = get_journal_path(project_hash).read_bytes().splitlines()
+    assert max(len(line) for line in lines) > 65536
+    seqs = [json.loads(line)["seq"] for line in lines]
+    assert seqs == list(range(1, len(seqs) + 1))
+
+    state = load_state(project_hash)
+    assert state["request"]["global_phase"] == "task_loop"
+    assert state["request"]["status"] == "cancelled"
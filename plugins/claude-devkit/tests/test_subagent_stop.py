@@ -0,0 +1,49 @@
+"""SubagentStop 상태 전환"""
+
+import json
+
+from conftest import run_hook
+
+from hooks.common import get_contracts_path, get_journal_path, get_project_hash, initialize_session, load_state
+
+
+def journal_types(project_hash: str) -> list:
+    return [json.loads(line)["type"] for line in get_journal_path(project_hash).read_text().splitlines()]
+
+
+def write_contract(project_hash: str, name: str, content: str) -> None:
+    path = get_contracts_path(project_hash) / "R1" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+
+BREAKDOWN = json.dumps({"task_breakdown": {"tasks": [
+    {"id": "T1", "name": "auth", "subtasks": [{"id": "T1-S1", "name": "login"}]},
+]}})
+
+
+def test_planner_stop_applies_breakdown_once(project):
+    """planner 종료로 Task Loop에 들어가면 task-breakdown.yaml을 한 번만 반영"""
+    project_hash = get_project_hash()
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+    write_contract(project_hash, "explored.yaml", "explored: {}\n")
+    write_contract(project_hash, "task-breakdown.yaml", BREAKDOWN)
+
+    result = run_hook(project, "subagent_stop", {"agent_type": "planner"})
+    assert result.returncode == 0, result.stderr
+    assert journal_types(project_hash) == ["session_init", "breakdown_applied", "global_phase", "task_started"]
+    assert load_state(project_hash)["tasks"]["T1"]["current_subtask"] == "T1-S1"
+
+
+def test_planner_stop_before_exploration_applies_breakdown(project):
+    """explored.yaml이 아직 없으면 task-breakdown.yaml만 반영하고 Global Discovery 유지"""
+    project_hash = get_project_hash()
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+    write_contract(project_hash, "task-breakdown.yaml", BREAKDOWN)
+
+    result = run_hook(project, "subagent_stop", {"agent_type": "planner"})
+    assert result.returncode == 0, result.stderr
+    assert journal_types(project_hash) == ["session_init", "breakdown_applied"]
+    state = load_state(project_hash)
+    assert state["request"]["global_phase"] == "global_discovery"
+    assert state["task_order"] == ["T1"]
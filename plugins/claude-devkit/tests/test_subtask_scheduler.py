@@ -0,0 +1,168 @@
+"""depends_on 기반 Subtask 스케줄러"""
+
+import json
+
+from conftest import run_hook
+
+from hooks.common import (
+    StateSession,
+    complete_subtask_in_state,
+    get_contracts_path,
+    get_project_hash,
+    initialize_session,
+    load_state,
+    register_contract_file,
+    transition_to_task_loop,
+    update_subtask_phase_for_in_state,
+)
+
+
+def write_contract(project_hash: str, relative: str, content: str) -> str:
+    """Contract 파일 저장 후 manifest 등록"""
+    path = get_contracts_path(project_hash) / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+    register_contract_file(project_hash, str(path))
+    return str(path)
+
+
+def start_task_loop(project_hash: str, tasks: list) -> None:
+    """explored.yaml + task-breakdown.yaml을 저장하고 Task Loop로 전환"""
+    assert initialize_session(project_hash, "로그인 기능 구현해줘")
+    write_contract(project_hash, "R1/explored.yaml", "explored: {}\n")
+    write_contract(project_hash, "R1/task-breakdown.yaml", json.dumps({"task_breakdown": {"tasks": tasks}}))
+    assert transition_to_task_loop(project_hash)
+
+
+def subtask(state: dict, task_id: str, subtask_id: str) -> dict:
+    return state["tasks"][task_id]["subtasks"][subtask_id]
+
+
+def test_same_type_agents_in_flight_are_not_guessed(project):
+    """같은 타입 에이전트가 두 subtask에서 실행 중이면 SubagentStop은 귀속하지 않고 Contract 저장이 전환"""
+    project_hash = get_project_hash()
+    write_contract(project_hash, "R1/T1/design-contract.yaml", "design_contract: {task_id: T1}\n")
+    start_task_loop(project_hash, [{"id": "T1", "name": "auth", "subtasks": [
+        {"id": "T1-S1", "name": "login", "depends_on": []},
+        {"id": "T1-S2", "name": "logout", "depends_on": []},
+    ]}])
+    with StateSession(project_hash) as session:
+        for subtask_id in ("T1-S1", "T1-S2"):
+            update_subtask_phase_for_in_state(session.state, "T1", subtask_id, "implementation")
+        session.mark_dirty()
+
+    for subtask_id in ("T1-S1", "T1-S2"):
+        result = run_hook(project, "pre_tool_use", {"tool_name": "Task", "tool_input": {
+            "subagent_type": "implementer", "prompt": f"implement {subtask_id}"}})
+        assert result.returncode == 0, result.stderr
+
+    result = run_hook(project, "subagent_stop", {"agent_type": "implementer"})
+    assert result.returncode == 0, result.stderr
+    assert "ambiguous between T1-S1, T1-S2" in result.stderr
+    state = load_state(project_hash)
+    assert [subtask(state, "T1", sid)["phase"] for sid in ("T1-S1", "T1-S2")] == ["implementation"] * 2
+
+    # subtask 경로의 test-result.yaml이 그 subtask만 verification을 거쳐 완료
+    path = write_contract(project_hash, "R1/T1/T1-S2/test-result.yaml",
+                          "test_result: {subtask_id: T1-S2, execution: {result: pass}}\n")
+    result = run_hook(project, "post_tool_use", {"tool_name": "Write", "tool_input": {"file_path": path}})
+    assert result.returncode == 0, result.stderr
+    state = load_state(project_hash)
+    assert subtask(state, "T1", "T1-S2")["status"] == "completed"
+    assert subtask(state, "T1", "T1-S1")["phase"] == "implementation"
+
+    # 남은 implementer 하나는 배정된 subtask에 귀속
+    result = run_hook(project, "subagent_stop", {"agent_type": "implementer"})
+    assert result.returncode == 0, result.stderr
+    assert subtask(load_state(project_hash), "T1", "T1-S1")["phase"] == "verification"
+
+
+def test_ready_subtasks_start_when_dependencies_complete(project):
+    """선행 subtask가 끝나면 ready subtask 시작, Task 단위 depends_on은 다른 Task의 모든 subtask에 의존"""
+    project_hash = get_project_hash()
+    start_task_loop(project_hash, [
+        {"id": "T1", "name": "auth", "subtasks": [
+            {"id": "T1-S1", "name": "login"},
+            {"id": "T1-S2", "name": "logout", "depends_on": ["T1-S1"]},
+        ]},
+        {"id": "T2", "name": "ui", "subtasks": [
+            {"id": "T2-S1", "name": "form", "depends_on": []},
+            {"id": "T2-S2", "name": "wire", "depends_on": ["T1-S2", "T2-S1"]},
+        ]},
+        {"id": "T3", "name": "docs", "depends_on": ["T1"], "subtasks": [{"id": "T3-S1", "name": "readme"}]},
+    ])
+    state = load_state(project_hash)
+    assert state["request"]["scheduling"] == "dag"
+    assert state["request"]["in_flight"] == [["T1", "T1-S1"], ["T2", "T2-S1"]]
+    assert subtask(state, "T3", "T3-S1")["depends_on"] == ["T1-S1", "T1-S2"]
+
+    def complete(task_id, subtask_id):
+        with StateSession(project_hash) as session:
+            success, started = complete_subtask_in_state(project_hash, session.state, task_id, subtask_id)
+            session.mark_dirty()
+        assert success
+        return started
+
+    assert complete("T1", "T1-S1") == ["T1-S2"]
+    assert complete("T2", "T2-S1") == []
+    assert complete("T1", "T1-S2") == ["T2-S2", "T3-S1"]
+    state = load_state(project_hash)
+    assert state["tasks"]["T1"]["status"] == "completed"
+    assert state["request"]["in_flight"] == [["T2", "T2-S2"], ["T3", "T3-S1"]]
+
+    complete("T2", "T2-S2")
+    complete("T3", "T3-S1")
+    assert load_state(project_hash)["request"]["status"] == "completed"
+
+
+def test_dependency_cycle_falls_back_to_sequential(project, capsys):
+    """depends_on 순환이면 로그를 남기고 기존 순차 진행"""
+    project_hash = get_project_hash()
+    start_task_loop(project_hash, [{"id": "T1", "name": "auth", "subtasks": [
+        {"id": "T1-S1", "name": "login", "depends_on": ["T1-S2"]},
+        {"id": "T1-S2", "name": "logout", "depends_on": ["T1-S1"]},
+        {"id": "T1-S3", "name": "session", "depends_on": []},
+    ]}])
+    assert "depends_on cycle among T1-S1, T1-S2; falling back to sequential order" in capsys.readouterr().err
+    state = load_state(project_hash)
+    assert "scheduling" not in state["request"]
+    assert state["request"]["current_task"] == "T1"
+    assert state["tasks"]["T1"]["current_subtask"] == "T1-S1"
+    assert "depends_on" not in subtask(state, "T1", "T1-S3")
+
+
+def test_agent_stop_after_contract_transition_is_handled(project):
+    """PostToolUse가 Contract 저장으로 이미 phase를 넘긴 배정 subtask의 QA 종료는 경고 없이 처리"""
+    project_hash = get_project_hash()
+    write_contract(project_hash, "R1/T1/design-contract.yaml", "design_contract: {task_id: T1}\n")
+    start_task_loop(project_hash, [{"id": "T1", "name": "auth", "subtasks": [
+        {"id": "T1-S1", "name": "login", "depends_on": []},
+        {"id": "T1-S2", "name": "logout", "depends_on": ["T1-S1"]},
+    ]}])
+
+    def dispatch_qa_and_write(name, content):
+        result = run_hook(project, "pre_tool_use", {"tool_name": "Task", "tool_input": {
+            "subagent_type": "claude-devkit:qa-engineer", "prompt": "T1-S1 테스트"}})
+        assert result.returncode == 0, result.stderr
+        path = write_contract(project_hash, f"R1/T1/T1-S1/{name}", content)
+        result = run_hook(project, "post_tool_use", {"tool_name": "Write", "tool_input": {"file_path": path}})
+        assert result.returncode == 0, result.stderr
+        result = run_hook(project, "subagent_stop", {"agent_type": "qa-engineer"})
+        assert result.returncode == 0, result.stderr
+        assert "no in-flight subtask" not in result.stderr
+        return result.stderr
+
+    assert "T1-S1: qa-engineer result already applied (phase: implementation)" in dispatch_qa_and_write(
+        "test-contract.yaml", "t: 1\n")
+    state = load_state(project_hash)
+    assert subtask(state, "T1", "T1-S1")["phase"] == "implementation"
+    assert "agent" not in subtask(state, "T1", "T1-S1")
+
+    with StateSession(project_hash) as session:
+        update_subtask_phase_for_in_state(session.state, "T1", "T1-S1", "verification")
+        session.mark_dirty()
+    assert "(phase: complete)" in dispatch_qa_and_write(
+        "test-result.yaml", "test_result: {subtask_id: T1-S1, execution: {result: pass}}\n")
+    state = load_state(project_hash)
+    assert subtask(state, "T1", "T1-S1")["status"] == "completed"
+    assert state["request"]["in_flight"] == [["T1", "T1-S2"]]